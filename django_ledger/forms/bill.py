@@ -4,6 +4,7 @@ from django.forms import (ModelForm, DateInput, TextInput, Select,
 from django.forms import ValidationError
 from django.utils.translation import gettext_lazy as _
 
+from django_ledger.forms.utils import CachedModelChoiceField, ModelChoiceCache, ModelChoiceCacheSelect
 from django_ledger.io.roles import ASSET_CA_CASH, ASSET_CA_PREPAID, LIABILITY_CL_ACC_PAYABLE
 from django_ledger.models import (ItemModel, AccountModel, BillModel, ItemTransactionModel,
                                   VendorModel, EntityUnitModel)
@@ -243,11 +244,15 @@ class BillItemTransactionForm(ModelForm):
             'entity_unit',
             'quantity',
         ]
+        field_classes = {
+            'item_model': CachedModelChoiceField,
+            'entity_unit': CachedModelChoiceField
+        }
         widgets = {
-            'item_model': Select(attrs={
+            'item_model': ModelChoiceCacheSelect(attrs={
                 'class': DJANGO_LEDGER_FORM_INPUT_CLASSES + ' is-small',
             }),
-            'entity_unit': Select(attrs={
+            'entity_unit': ModelChoiceCacheSelect(attrs={
                 'class': DJANGO_LEDGER_FORM_INPUT_CLASSES + ' is-small',
             }),
             'unit_cost': TextInput(attrs={
@@ -281,9 +286,12 @@ class BaseBillItemTransactionFormset(BaseModelFormSet):
             user_model=self.USER_MODEL
         )
 
+        items_choices = ModelChoiceCache(queryset=items_qs)
+        unit_choices = ModelChoiceCache(queryset=unit_qs)
+
         for form in self.forms:
-            form.fields['item_model'].queryset = items_qs
-            form.fields['entity_unit'].queryset = unit_qs
+            form.fields['item_model'].set_choice_cache(items_choices)
+            form.fields['entity_unit'].set_choice_cache(unit_choices)
 
             if not self.BILL_MODEL.can_edit_items():
                 form.fields['item_model'].disabled = True
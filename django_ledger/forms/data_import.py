@@ -1,6 +1,7 @@
 from django import forms
-from django.forms import ModelForm, BaseModelFormSet, modelformset_factory, Select, HiddenInput, ValidationError
+from django.forms import ModelForm, BaseModelFormSet, modelformset_factory, HiddenInput, ValidationError
 
+from django_ledger.forms.utils import CachedModelChoiceField, ModelChoiceCache, ModelChoiceCacheSelect
 from django_ledger.models import StagedTransactionModel, AccountModel, ImportJobModel
 from django_ledger.settings import DJANGO_LEDGER_FORM_INPUT_CLASSES
 from django.utils.translation import gettext_lazy as _
@@ -42,6 +43,10 @@ class StagedTransactionModelForm(ModelForm):
             'import_job',
             'tx'
         ]
+        field_classes = {
+            'earnings_account': CachedModelChoiceField,
+            'import_job': CachedModelChoiceField
+        }
         widgets = {
             'tx': HiddenInput(attrs={
                 'readonly': True
@@ -58,7 +63,7 @@ class StagedTransactionModelForm(ModelForm):
             'amount': HiddenInput(attrs={
                 'readonly': True
             }),
-            'earnings_account': Select(attrs={
+            'earnings_account': ModelChoiceCacheSelect(attrs={
                 'class': DJANGO_LEDGER_FORM_INPUT_CLASSES + ' is-small',
             })
         }
@@ -92,10 +97,13 @@ class BaseStagedTransactionModelFormSet(BaseModelFormSet):
             user_model=self.USER_MODEL
         )
 
+        accounts_choices = ModelChoiceCache(queryset=accounts_qs)
+        import_job_choices = ModelChoiceCache(queryset=import_job_qs)
+
         for form in self.forms:
-            form.fields['earnings_account'].queryset = accounts_qs
+            form.fields['earnings_account'].set_choice_cache(accounts_choices)
             form.fields['earnings_account'].widget.attrs['disabled'] = self.IMPORT_DISABLED
-            form.fields['import_job'].queryset = import_job_qs
+            form.fields['import_job'].set_choice_cache(import_job_choices)
 
 
 StagedTransactionModelFormSet = modelformset_factory(
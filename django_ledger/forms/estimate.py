@@ -10,6 +10,7 @@ from django import forms
 from django.forms import ModelForm, Select, TextInput, BaseModelFormSet, modelformset_factory, Textarea
 from django.utils.translation import gettext_lazy as _
 
+from django_ledger.forms.utils import CachedModelChoiceField, ModelChoiceCache, ModelChoiceCacheSelect
 from django_ledger.models import CustomerModel, ItemTransactionModel, ItemModel, EntityUnitModel
 from django_ledger.models.estimate import EstimateModel
 from django_ledger.settings import DJANGO_LEDGER_FORM_INPUT_CLASSES
@@ -88,11 +89,15 @@ class EstimateItemModelForm(ModelForm):
             'ce_unit_cost_estimate',
             'ce_unit_revenue_estimate',
         ]
+        field_classes = {
+            'item_model': CachedModelChoiceField,
+            'entity_unit': CachedModelChoiceField
+        }
         widgets = {
-            'item_model': Select(attrs={
+            'item_model': ModelChoiceCacheSelect(attrs={
                 'class': DJANGO_LEDGER_FORM_INPUT_CLASSES + ' is-small',
             }),
-            'entity_unit': Select(attrs={
+            'entity_unit': ModelChoiceCacheSelect(attrs={
                 'class': DJANGO_LEDGER_FORM_INPUT_CLASSES + ' is-small',
             }),
             'ce_unit_cost_estimate': TextInput(attrs={
@@ -125,9 +130,12 @@ class BaseEstimateItemModelFormset(BaseModelFormSet):
             user_model=self.USER_MODEL
         )
 
+        items_choices = ModelChoiceCache(queryset=items_qs)
+        unit_choices = ModelChoiceCache(queryset=unit_qs)
+
         for form in self.forms:
-            form.fields['item_model'].queryset = items_qs
-            form.fields['entity_unit'].queryset = unit_qs
+            form.fields['item_model'].set_choice_cache(items_choices)
+            form.fields['entity_unit'].set_choice_cache(unit_choices)
 
             if not self.ESTIMATE_MODEL.can_update_items():
                 form.fields['item_model'].disabled = True
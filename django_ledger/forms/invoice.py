@@ -11,6 +11,7 @@ from django.forms import ModelForm, DateInput, TextInput, Select, CheckboxInput,
 from django.forms.models import BaseModelFormSet
 from django.utils.translation import gettext_lazy as _
 
+from django_ledger.forms.utils import CachedModelChoiceField, ModelChoiceCache, ModelChoiceCacheSelect
 from django_ledger.io.roles import ASSET_CA_CASH, ASSET_CA_RECEIVABLES, LIABILITY_CL_DEFERRED_REVENUE
 from django_ledger.models import (AccountModel, CustomerModel, InvoiceModel, ItemTransactionModel, ItemModel)
 from django_ledger.settings import DJANGO_LEDGER_FORM_INPUT_CLASSES
@@ -212,8 +213,11 @@ class InvoiceItemForm(ModelForm):
             'unit_cost',
             'quantity'
         ]
+        field_classes = {
+            'item_model': CachedModelChoiceField
+        }
         widgets = {
-            'item_model': Select(attrs={
+            'item_model': ModelChoiceCacheSelect(attrs={
                 'class': DJANGO_LEDGER_FORM_INPUT_CLASSES + ' is-small',
             }),
             'unit_cost': TextInput(attrs={
@@ -242,23 +246,24 @@ class BaseInvoiceItemTransactionFormset(BaseModelFormSet):
             user_model=self.USER_MODEL
         )
 
+        items_choices = ModelChoiceCache(queryset=items_qs)
+
         for form in self.forms:
             if not self.INVOICE_MODEL.can_edit_items():
                 form.fields['item_model'].disabled = True
                 form.fields['quantity'].disabled = True
                 form.fields['unit_cost'].disabled = True
                 form.can_delete = False
-            form.fields['item_model'].queryset = items_qs
+            form.fields['item_model'].set_choice_cache(items_choices)
 
     def get_queryset(self):
-        if not self.queryset:
+        # evaluated once and shared by all the forms...
+        if self.queryset is None:
             self.queryset = ItemTransactionModel.objects.for_invoice(
                 entity_slug=self.ENTITY_SLUG,
                 user_model=self.USER_MODEL,
                 invoice_pk=self.INVOICE_MODEL.uuid
-            )
-        else:
-            self.queryset = self.INVOICE_MODEL.itemtransactionmodel_set.all()
+            ).select_related('item_model')
         return self.queryset
 
     def get_form_kwargs(self, index):
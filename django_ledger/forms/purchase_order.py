@@ -6,12 +6,15 @@ Contributions to this module:
 Miguel Sanda <msanda@arrobalytics.com>
 """
 
+from collections import defaultdict
+
 from django.forms import (ModelForm, DateInput, TextInput, Select, BaseModelFormSet,
                           modelformset_factory, Textarea, BooleanField, ValidationError)
 from django.utils.translation import gettext_lazy as _
 
+from django_ledger.forms.utils import CachedModelChoiceField, ModelChoiceCache, ModelChoiceCacheSelect
 from django_ledger.models import (ItemModel, PurchaseOrderModel, ItemTransactionModel, EntityUnitModel)
-from django_ledger.settings import DJANGO_LEDGER_FORM_INPUT_CLASSES
+from django_ledger.settings import DJANGO_LEDGER_FORM_INPUT_CLASSES, DJANGO_LEDGER_PERPETUAL_INVENTORY
 
 
 class PurchaseOrderModelCreateForm(ModelForm):
@@ -104,11 +107,15 @@ class PurchaseOrderItemTransactionForm(ModelForm):
             'po_item_status',
             'create_bill',
         ]
+        field_classes = {
+            'item_model': CachedModelChoiceField,
+            'entity_unit': CachedModelChoiceField
+        }
         widgets = {
-            'item_model': Select(attrs={
+            'item_model': ModelChoiceCacheSelect(attrs={
                 'class': DJANGO_LEDGER_FORM_INPUT_CLASSES + ' is-small',
             }),
-            'entity_unit': Select(attrs={
+            'entity_unit': ModelChoiceCacheSelect(attrs={
                 'class': DJANGO_LEDGER_FORM_INPUT_CLASSES + ' is-small',
             }),
             'po_item_status': Select(attrs={
@@ -162,10 +169,13 @@ class BasePurchaseOrderItemFormset(BaseModelFormSet):
             user_model=self.USER_MODEL
         )
 
+        items_choices = ModelChoiceCache(queryset=items_qs)
+        unit_choices = ModelChoiceCache(queryset=unit_qs)
+
         for form in self.forms:
             form.PO_MODEL = self.PO_MODEL
-            form.fields['item_model'].queryset = items_qs
-            form.fields['entity_unit'].queryset = unit_qs
+            form.fields['item_model'].set_choice_cache(items_choices)
+            form.fields['entity_unit'].set_choice_cache(unit_choices)
             if not self.PO_MODEL.can_edit_items():
                 form.fields['po_unit_cost'].disabled = True
                 form.fields['po_quantity'].disabled = True
@@ -179,8 +189,23 @@ class BasePurchaseOrderItemFormset(BaseModelFormSet):
                 form.fields['po_item_status'].disabled = True
 
     def get_queryset(self):
-        po_item_queryset, _ = self.PO_MODEL.get_itemtxs_data()
-        return po_item_queryset
+        # evaluated once and shared by all the forms...
+        if not hasattr(self, '_queryset'):
+            self._queryset, _ = self.PO_MODEL.get_itemtxs_data()
+        return self._queryset
+
+    def save(self, commit=True):
+        if commit and DJANGO_LEDGER_PERPETUAL_INVENTORY:
+            # status changes post received inventory before the items are saved...
+            status_changes = defaultdict(list)
+            for form in self.initial_forms:
+                if form not in self.deleted_forms and 'po_item_status' in form.changed_data:
+                    status_changes[form.cleaned_data['po_item_status']].append(form.instance.uuid)
+            for po_item_status, itemtxs_uuids in status_changes.items():
+                ItemTransactionModel.objects.filter(
+                    uuid__in=itemtxs_uuids
+                ).update_po_item_status(po_item_status=po_item_status)
+        return super().save(commit=commit)
 
 
 CanEditPurchaseOrderItemFormset = modelformset_factory(
@@ -9,6 +9,7 @@ Michael Noel <noel.michael87@gmail.com>
 
 from django.forms import ModelForm, modelformset_factory, BaseModelFormSet, TextInput, Select
 
+from django_ledger.forms.utils import CachedModelChoiceField, ModelChoiceCache, ModelChoiceCacheSelect
 from django_ledger.io import balance_tx_data
 from django_ledger.models.accounts import AccountModel
 from django_ledger.models.journal_entry import JournalEntryModel
@@ -25,8 +26,11 @@ class TransactionModelForm(ModelForm):
             'amount',
             'description'
         ]
+        field_classes = {
+            'account': CachedModelChoiceField
+        }
         widgets = {
-            'account': Select(attrs={
+            'account': ModelChoiceCacheSelect(attrs={
                 'class': DJANGO_LEDGER_FORM_INPUT_CLASSES + ' is-small',
             }),
             'tx_type': Select(attrs={
@@ -55,20 +59,25 @@ class TransactionModelFormSet(BaseModelFormSet):
             entity_slug=self.ENTITY_SLUG
         )
 
+        account_choices = ModelChoiceCache(queryset=account_qs)
+
         for form in self.forms:
-            form.fields['account'].queryset = account_qs
+            form.fields['account'].set_choice_cache(account_choices)
             if self.JE_MODEL.locked:
                 form.fields['account'].disabled = True
                 form.fields['tx_type'].disabled = True
                 form.fields['amount'].disabled = True
 
     def get_queryset(self):
-        return TransactionModel.objects.for_journal_entry(
-            entity_slug=self.ENTITY_SLUG,
-            user_model=self.USER_MODEL,
-            je_pk=self.JE_MODEL.uuid,
-            ledger_pk=self.LEDGER_PK
-        ).order_by('account__code')
+        # evaluated once and shared by all the forms...
+        if not hasattr(self, '_queryset'):
+            self._queryset = TransactionModel.objects.for_journal_entry(
+                entity_slug=self.ENTITY_SLUG,
+                user_model=self.USER_MODEL,
+                je_pk=self.JE_MODEL.uuid,
+                ledger_pk=self.LEDGER_PK
+            ).order_by('account__code')
+        return self._queryset
 
     def clean(self):
         if any(self.errors):
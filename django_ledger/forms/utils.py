@@ -1,4 +1,7 @@
-from django.forms import ValidationError
+from django.forms import ValidationError, ModelChoiceField, Select
+from django.forms.utils import flatatt
+from django.utils.html import format_html, escape
+from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
 
@@ -15,3 +18,110 @@ def validate_cszc(cleaned_data):
         cleaned_data['country'],
     ]):
         raise ValidationError(message=_('Must provide all City/State/Zip/Country'))
+
+
+class ModelChoiceCache:
+    """
+    Choices of a ModelChoiceField shared by all the forms of a formset. The queryset is evaluated once, the first time
+    a form needs it, and its options are rendered once. Each form then only marks its selected option.
+
+    Parameters
+    ----------
+    queryset: QuerySet
+        The queryset of the choices.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.FIELD = None
+        self._objects = None
+        self._options_html = None
+
+    def bind(self, field: ModelChoiceField):
+        # the first field bound provides the option values and labels...
+        if self.FIELD is None:
+            self.FIELD = field
+
+    def evaluate(self):
+        if self._objects is None:
+            to_field_name = self.FIELD.to_field_name or 'pk'
+            objects = dict()
+            options = list()
+            for obj in self.queryset:
+                value = str(getattr(obj, to_field_name))
+                objects[value] = obj
+                options.append(format_html('<option value="{}">{}</option>',
+                                           value,
+                                           self.FIELD.label_from_instance(obj)))
+            self._objects = objects
+            self._options_html = '\n'.join(options)
+        return self._objects
+
+    def get_object(self, value):
+        return self.evaluate().get(str(value))
+
+    def render_options(self, selected_values, empty_label=None) -> str:
+        self.evaluate()
+        options_html = self._options_html
+        has_selected = False
+        for value in selected_values:
+            if value:
+                option_html = f'<option value="{escape(value)}">'
+                if option_html in options_html:
+                    options_html = options_html.replace(option_html, option_html[:-1] + ' selected>', 1)
+                    has_selected = True
+        if empty_label is not None:
+            # values outside the choices, i.e. a rejected submission, select the empty option...
+            empty_html = format_html('<option value=""{}>{}</option>',
+                                     '' if has_selected else ' selected',
+                                     empty_label)
+            options_html = empty_html + '\n' + options_html
+        return mark_safe(options_html)
+
+
+class ModelChoiceCacheSelect(Select):
+    """
+    Select widget rendering the pre-rendered options of a ModelChoiceCache, if any.
+    """
+    choice_cache = None
+    empty_label = None
+
+    def render(self, name, value, attrs=None, renderer=None):
+        if self.choice_cache is None:
+            return super().render(name, value, attrs=attrs, renderer=renderer)
+        attrs = self.build_attrs(self.attrs, attrs)
+        return format_html('<select name="{}"{}>\n{}\n</select>',
+                           name,
+                           flatatt(attrs),
+                           self.choice_cache.render_options(self.format_value(value), self.empty_label))
+
+
+class CachedModelChoiceField(ModelChoiceField):
+    """
+    ModelChoiceField that can share a ModelChoiceCache with the same field of other forms, so the choices are
+    fetched once per formset instead of once per form.
+    """
+    widget = ModelChoiceCacheSelect
+    choice_cache = None
+
+    def set_choice_cache(self, choice_cache: ModelChoiceCache):
+        self.queryset = choice_cache.queryset
+        self.choice_cache = choice_cache
+        choice_cache.bind(self)
+        if isinstance(self.widget, ModelChoiceCacheSelect):
+            self.widget.choice_cache = choice_cache
+            self.widget.empty_label = self.empty_label
+
+    def to_python(self, value):
+        if self.choice_cache is None or value in self.empty_values:
+            return super().to_python(value)
+        if isinstance(value, self.queryset.model):
+            value = getattr(value, self.to_field_name or 'pk')
+        obj = self.choice_cache.get_object(value)
+        if obj is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
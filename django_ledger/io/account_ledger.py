@@ -0,0 +1,195 @@
+"""
+Django Ledger created by Miguel Sanda <msanda@arrobalytics.com>.
+Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
+
+Contributions to this module:
+Miguel Sanda <msanda@arrobalytics.com>
+
+Account ledger engine. Lists the transactions of a single account for a date window, ordered by
+(journal entry date, transaction uuid), with keyset pagination and a running balance computed by a SQL window
+function. The opening balance is computed once for the first page and carried by the signed page cursor, so every
+following page is a single query regardless of how many transactions the account has. Only posted transactions are
+listed, so balances match the account balances of the financial statements.
+"""
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+from uuid import UUID
+
+from django.core import signing
+from django.db.models import Case, When, F, Sum, Q, Window, DecimalField
+
+from django_ledger.models.utils import lazy_loader
+from django_ledger.settings import DJANGO_LEDGER_ACCOUNT_LEDGER_PAGE_SIZE
+
+BALANCE_PLACES = Decimal('0.01')
+
+
+class AccountLedgerCursorError(ValueError):
+    pass
+
+
+class AccountLedger:
+    """
+    Paginated ledger of a single AccountModel.
+
+    Parameters
+    ----------
+    account_model: AccountModel
+        The account to list. Must already be authorized for the requesting user.
+    from_date: date
+        Optional first journal entry date of the window. Transactions before it make the opening balance.
+    to_date: date
+        Optional last journal entry date of the window.
+    page_size: int
+        Number of transactions per page. Defaults to DJANGO_LEDGER_ACCOUNT_LEDGER_PAGE_SIZE.
+    """
+    CURSOR_SALT = 'django_ledger.account_ledger'
+    ORDER_BY = ('journal_entry__date', 'uuid')
+
+    def __init__(self,
+                 account_model,
+                 from_date: Optional[date] = None,
+                 to_date: Optional[date] = None,
+                 page_size: Optional[int] = None):
+        self.ACCOUNT_MODEL = account_model
+        self.FROM_DATE = from_date
+        self.TO_DATE = to_date
+        self.PAGE_SIZE = page_size or DJANGO_LEDGER_ACCOUNT_LEDGER_PAGE_SIZE
+
+    def get_signed_amount(self):
+        # amounts increasing the account balance are positive...
+        return Case(
+            When(tx_type__exact=self.ACCOUNT_MODEL.balance_type, then=F('amount')),
+            default=-F('amount'),
+            output_field=DecimalField(max_digits=20, decimal_places=2)
+        )
+
+    def get_txs_queryset(self):
+        TransactionModel = lazy_loader.get_txs_model()
+        return TransactionModel.objects.filter(account_id__exact=self.ACCOUNT_MODEL.uuid).posted()
+
+    def get_opening_balance(self) -> Decimal:
+        """
+        Balance of the account before from_date, with a single aggregate query.
+        """
+        if not self.FROM_DATE:
+            return Decimal('0.00')
+        opening_balance = self.get_txs_queryset().filter(
+            journal_entry__date__lt=self.FROM_DATE
+        ).aggregate(balance=Sum(self.get_signed_amount()))['balance']
+        return Decimal(opening_balance or 0).quantize(BALANCE_PLACES)
+
+    def encode_cursor(self, tx_date: date, tx_uuid: UUID, balance: Decimal) -> str:
+        return signing.dumps({
+            'account': str(self.ACCOUNT_MODEL.uuid),
+            'from_date': self.FROM_DATE.isoformat() if self.FROM_DATE else None,
+            'to_date': self.TO_DATE.isoformat() if self.TO_DATE else None,
+            'date': tx_date.isoformat(),
+            'uuid': str(tx_uuid),
+            'balance': str(balance)
+        }, salt=self.CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor: str) -> dict:
+        try:
+            cursor_data = signing.loads(cursor, salt=self.CURSOR_SALT)
+        except signing.BadSignature:
+            raise AccountLedgerCursorError('Invalid account ledger cursor.')
+
+        if any([
+            cursor_data.get('account') != str(self.ACCOUNT_MODEL.uuid),
+            cursor_data.get('from_date') != (self.FROM_DATE.isoformat() if self.FROM_DATE else None),
+            cursor_data.get('to_date') != (self.TO_DATE.isoformat() if self.TO_DATE else None)
+        ]):
+            raise AccountLedgerCursorError('Account ledger cursor does not match the requested account and dates.')
+
+        return {
+            'date': date.fromisoformat(cursor_data['date']),
+            'uuid': UUID(cursor_data['uuid']),
+            'balance': Decimal(cursor_data['balance'])
+        }
+
+    def get_page(self, cursor: Optional[str] = None) -> dict:
+        """
+        Fetches one page of the account ledger.
+
+        Parameters
+        ----------
+        cursor: str
+            The next_cursor of the previous page. The first page is returned when not provided.
+
+        Returns
+        -------
+        dict
+            The page opening_balance, the transactions annotated with their running_balance, the page
+            closing_balance and the next_cursor, which is None on the last page.
+        """
+        txs_qs = self.get_txs_queryset()
+        if self.FROM_DATE:
+            txs_qs = txs_qs.filter(journal_entry__date__gte=self.FROM_DATE)
+        if self.TO_DATE:
+            txs_qs = txs_qs.filter(journal_entry__date__lte=self.TO_DATE)
+
+        if cursor:
+            cursor_data = self.decode_cursor(cursor)
+            opening_balance = cursor_data['balance']
+            txs_qs = txs_qs.filter(
+                Q(journal_entry__date__gt=cursor_data['date']) |
+                Q(journal_entry__date__exact=cursor_data['date'], uuid__gt=cursor_data['uuid'])
+            )
+        else:
+            opening_balance = self.get_opening_balance()
+
+        txs_qs = txs_qs.annotate(
+            page_balance=Window(
+                expression=Sum(self.get_signed_amount()),
+                order_by=[F(f).asc() for f in self.ORDER_BY]
+            )
+        ).select_related(
+            'journal_entry',
+            'journal_entry__ledger',
+            'journal_entry__ledger__billmodel',
+            'journal_entry__ledger__invoicemodel',
+        ).order_by(*self.ORDER_BY)
+
+        # one extra row tells whether there is a next page...
+        txs = list(txs_qs[:self.PAGE_SIZE + 1])
+        has_next = len(txs) > self.PAGE_SIZE
+        txs = txs[:self.PAGE_SIZE]
+
+        closing_balance = opening_balance
+        for tx in txs:
+            # some backends return window sums as floats, converted through str to keep their rounded value...
+            tx.running_balance = (opening_balance + Decimal(str(tx.page_balance or 0))).quantize(BALANCE_PLACES)
+            closing_balance = tx.running_balance
+
+        next_cursor = None
+        if has_next:
+            last_tx = txs[-1]
+            next_cursor = self.encode_cursor(tx_date=last_tx.journal_entry.date,
+                                             tx_uuid=last_tx.uuid,
+                                             balance=closing_balance)
+
+        return {
+            'opening_balance': opening_balance,
+            'closing_balance': closing_balance,
+            'transactions': txs,
+            'next_cursor': next_cursor
+        }
+
+    @staticmethod
+    def page_to_json(page: dict) -> dict:
+        return {
+            'opening_balance': float(page['opening_balance']),
+            'closing_balance': float(page['closing_balance']),
+            'next_cursor': page['next_cursor'],
+            'transactions': [{
+                'uuid': str(tx.uuid),
+                'date': tx.journal_entry.date.isoformat(),
+                'je_uuid': str(tx.journal_entry_id),
+                'tx_type': tx.tx_type,
+                'amount': float(tx.amount or 0),
+                'description': tx.description,
+                'running_balance': float(tx.running_balance)
+            } for tx in page['transactions']]
+        }
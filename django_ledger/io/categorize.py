@@ -0,0 +1,118 @@
+"""
+Django Ledger created by Miguel Sanda <msanda@arrobalytics.com>.
+Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
+
+Contributions to this module:
+Miguel Sanda <msanda@arrobalytics.com>
+
+Payee categorization index used to pre-fill the account of staged bank transactions. The index learns
+payee -> account mappings from transactions already imported and is compiled once into an exact payee map and a
+token prefix trie, so each payee is matched with one dictionary lookup or a short walk down the trie.
+"""
+import re
+from collections import Counter
+from typing import Iterable, Optional, Tuple, Dict
+
+PAYEE_TOKEN_REGEX = re.compile(r'[^\W_]+')
+
+
+def normalize_payee(payee: Optional[str]) -> str:
+    """
+    Collapses whitespace and ignores case, so the same payee always yields the same key.
+    """
+    return ' '.join((payee or '').split()).casefold()
+
+
+def tokenize_payee(payee: str) -> Tuple[str, ...]:
+    return tuple(PAYEE_TOKEN_REGEX.findall(payee))
+
+
+class PayeeTrieNode:
+    __slots__ = ('children', 'counts', 'account')
+
+    def __init__(self):
+        self.children: Dict[str, 'PayeeTrieNode'] = dict()
+        self.counts = dict()
+        self.account = None
+
+
+class PayeeAccountIndex:
+    """
+    Learns payee -> account mappings and matches new payees against them.
+
+    Exact payees map to the account most frequently used with them. Payees that only share their first tokens with
+    learned payees (e.g. "AMAZON MKTPLACE PMTS" and "AMAZON MKTPLACE 1A2B3C") are matched by the longest common token
+    prefix, as long as every learned payee under that prefix used the same account.
+
+    Prefixes must have at least min_prefix_tokens tokens. A single token is often a transaction type shared by
+    unrelated payees (e.g. "CHECK 1001" or "POS 4411 SHELL"), so by default at least two tokens must match.
+    """
+
+    def __init__(self, min_prefix_tokens: int = 2):
+        self.MIN_PREFIX_TOKENS = min_prefix_tokens
+        self.exact_counts: Dict[str, Counter] = dict()
+        self.exact: Dict[str, object] = dict()
+        self.root = PayeeTrieNode()
+        self.compiled = False
+
+    def __len__(self):
+        return len(self.exact)
+
+    def add(self, payee: Optional[str], account, count: int = 1):
+        payee = normalize_payee(payee)
+        if not payee or not account:
+            return
+        self.exact_counts.setdefault(payee, Counter())[account] += count
+        node = self.root
+        for token in tokenize_payee(payee):
+            child = node.children.get(token)
+            if child is None:
+                child = node.children[token] = PayeeTrieNode()
+            node = child
+            node.counts[account] = node.counts.get(account, 0) + count
+        self.compiled = False
+
+    def learn(self, mappings: Iterable[Tuple]) -> 'PayeeAccountIndex':
+        """
+        Adds (payee, account) or (payee, account, count) mappings and compiles the index.
+        """
+        for mapping in mappings:
+            self.add(*mapping)
+        return self.compile()
+
+    def compile(self) -> 'PayeeAccountIndex':
+        """
+        Resolves the account of each exact payee and trie node. Ambiguous trie nodes resolve to no account.
+        """
+        self.exact = {
+            payee: counts.most_common(1)[0][0] for payee, counts in self.exact_counts.items()
+        }
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            node.account = next(iter(node.counts)) if len(node.counts) == 1 else None
+            nodes.extend(node.children.values())
+        self.compiled = True
+        return self
+
+    def match(self, payee: Optional[str]):
+        """
+        Returns the learned account for the payee, or None if there is no unambiguous match.
+        """
+        if not self.compiled:
+            self.compile()
+        payee = normalize_payee(payee)
+        if not payee:
+            return None
+        account = self.exact.get(payee)
+        if account is not None:
+            return account
+
+        node = self.root
+        for depth, token in enumerate(tokenize_payee(payee), start=1):
+            node = node.children.get(token)
+            if node is None:
+                break
+            if node.account is not None and depth >= self.MIN_PREFIX_TOKENS:
+                account = node.account
+        return account
@@ -411,7 +411,8 @@ class EntityDataGenerator(LoggingMixIn):
 
         estimate_items = estimate_model.itemtransactionmodel_set.bulk_create(objs=estimate_items)
 
-        if random() > 0.25:
+        # estimates without cost or revenue cannot be reviewed...
+        if random() > 0.25 and estimate_model.get_cost_estimate() and estimate_model.revenue_estimate:
             date_in_review = self.get_next_date(date_draft)
             estimate_model.mark_as_review(commit=True, date_in_review=date_in_review)
             if random() > 0.50:
@@ -682,7 +683,8 @@ class EntityDataGenerator(LoggingMixIn):
         invoice_model.full_clean()
         invoice_model.save()
 
-        if random() > 0.25:
+        # invoices without amount due (e.g. no inventory left to sell) cannot be reviewed...
+        if random() > 0.25 and invoice_model.amount_due:
             date_review = self.get_next_date(date_draft)
             invoice_model.mark_as_review(commit=True, date_in_review=date_review)
             if random() > 0.50:
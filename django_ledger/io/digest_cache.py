@@ -0,0 +1,142 @@
+"""
+Django Ledger created by Miguel Sanda <msanda@arrobalytics.com>.
+Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
+
+Contributions to this module:
+Miguel Sanda <msanda@arrobalytics.com>
+
+Opt-in cache of IOMixIn digest results. Every EntityModel has a ledger version counter stored in the cache backend,
+which is bumped whenever a Transaction, Journal Entry, Ledger, Account or Entity Unit of the entity changes. The current
+version is part of every digest cache key, so a write makes all previously cached digests of the entity unreachable and
+stale results are never returned. The version is bumped again once the current transaction commits, so digests cached
+by other requests before the commit are not reused.
+"""
+from hashlib import md5
+from threading import Lock
+from time import time_ns
+from typing import Optional
+
+from django.core.cache import caches
+from django.db import transaction
+
+from django_ledger.settings import (DJANGO_LEDGER_DIGEST_CACHE_ENABLED,
+                                    DJANGO_LEDGER_DIGEST_CACHE_ALIAS,
+                                    DJANGO_LEDGER_DIGEST_CACHE_TIMEOUT)
+
+DIGEST_CACHE_KEY_PREFIX = 'djl_digest'
+
+
+class DigestCacheStats:
+    """
+    Keeps track of the digest cache hits and misses of the current process.
+    """
+
+    def __init__(self):
+        self.LOCK = Lock()
+        self.HITS = 0
+        self.MISSES = 0
+
+    def hit(self):
+        with self.LOCK:
+            self.HITS += 1
+
+    def miss(self):
+        with self.LOCK:
+            self.MISSES += 1
+
+    def reset(self):
+        with self.LOCK:
+            self.HITS = 0
+            self.MISSES = 0
+
+    def get_hit_ratio(self) -> Optional[float]:
+        total = self.HITS + self.MISSES
+        return self.HITS / total if total else None
+
+    def as_dict(self) -> dict:
+        return {
+            'hits': self.HITS,
+            'misses': self.MISSES,
+            'hit_ratio': self.get_hit_ratio()
+        }
+
+
+DIGEST_CACHE_STATS = DigestCacheStats()
+
+
+def is_digest_cache_enabled() -> bool:
+    return DJANGO_LEDGER_DIGEST_CACHE_ENABLED
+
+
+def get_digest_cache():
+    return caches[DJANGO_LEDGER_DIGEST_CACHE_ALIAS]
+
+
+def get_digest_version_key(entity_uuid) -> str:
+    return f'{DIGEST_CACHE_KEY_PREFIX}:version:{entity_uuid}'
+
+
+def get_digest_version(entity_uuid) -> int:
+    """
+    Current ledger version of the entity. A missing version (never set or evicted) is initialized with a time based
+    value, so it never matches the version of previously cached digests.
+    """
+    cache = get_digest_cache()
+    version_key = get_digest_version_key(entity_uuid)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time_ns(), timeout=None)
+        version = cache.get(version_key)
+    return version
+
+
+def incr_digest_version(entity_uuid):
+    cache = get_digest_cache()
+    version_key = get_digest_version_key(entity_uuid)
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.add(version_key, time_ns(), timeout=None)
+
+
+def bump_digest_version(entity_uuid):
+    """
+    Invalidates all cached digests of the entity, now and again once the current transaction commits.
+    Does nothing unless DJANGO_LEDGER_DIGEST_CACHE_ENABLED is True, since digests are never cached otherwise.
+    """
+    if not is_digest_cache_enabled() or not entity_uuid:
+        return
+    incr_digest_version(entity_uuid)
+    transaction.on_commit(lambda: incr_digest_version(entity_uuid))
+
+
+def get_digest_cache_key(entity_uuid, io_model, user_model, **kwargs) -> str:
+    version = get_digest_version(entity_uuid)
+    digest_args = repr(sorted((k, repr(v)) for k, v in kwargs.items()))
+    digest_hash = md5(digest_args.encode()).hexdigest()
+    return ':'.join([
+        DIGEST_CACHE_KEY_PREFIX,
+        str(entity_uuid),
+        str(version),
+        io_model.__class__.__name__,
+        str(io_model.uuid),
+        str(user_model.pk),
+        digest_hash
+    ])
+
+
+def get_cached_digest(cache_key: str):
+    cached = get_digest_cache().get(cache_key)
+    if cached is None:
+        DIGEST_CACHE_STATS.miss()
+    else:
+        DIGEST_CACHE_STATS.hit()
+    return cached
+
+
+def set_cached_digest(cache_key: str, digest):
+    get_digest_cache().set(cache_key, digest, timeout=DJANGO_LEDGER_DIGEST_CACHE_TIMEOUT)
+
+
+def get_digest_cache_stats() -> dict:
+    return DIGEST_CACHE_STATS.as_dict()
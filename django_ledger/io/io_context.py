@@ -5,13 +5,130 @@ from django_ledger.models.utils import LazyLoader
 
 lazy_importer = LazyLoader()
 
+# Role -> Role Names lookup index...
+ROLES_INDEX = defaultdict(list)
+for role_names in roles_module.ROLES_DIRECTORY.values():
+    for role_name in role_names:
+        ROLES_INDEX[getattr(roles_module, role_name)].append(role_name)
+
+# Role -> Group Names lookup index...
+GROUPS_INDEX = defaultdict(list)
+for group_name, group_roles in roles_module.GROUPS_DIRECTORY.items():
+    for role in dict.fromkeys(group_roles):
+        GROUPS_INDEX[role].append(group_name)
+
+
+class DigestAggregator:
+    """
+    Accumulates the balances of the digest accounts by role, group and activity in a single sweep over the accounts.
+    Each account is mapped to its role names, group names and activity using lookup indexes built at import time, so
+    the cost is proportional to the number of accounts, regardless of the number of roles, groups or activities.
+    Balances by period and by unit are accumulated during the same sweep when requested.
+    """
+    ROLES = 'roles'
+    GROUPS = 'groups'
+    ACTIVITY = 'activity'
+
+    def __init__(self,
+                 accounts: list,
+                 by_period: bool = False,
+                 by_unit: bool = False,
+                 process_roles: bool = True,
+                 process_groups: bool = True,
+                 process_activity: bool = True):
+
+        self.DIGEST_ACCOUNTS = accounts
+        self.BY_PERIOD = by_period
+        self.BY_UNIT = by_unit
+
+        self.DIMENSIONS = list()
+        if process_roles:
+            self.DIMENSIONS.append(self.ROLES)
+        if process_groups:
+            self.DIMENSIONS.append(self.GROUPS)
+        if process_activity:
+            self.DIMENSIONS.append(self.ACTIVITY)
+
+        self.ACCOUNTS = dict()
+        self.BALANCES = dict()
+        self.BALANCES_BY_PERIOD = dict()
+        self.BALANCES_BY_UNIT = dict()
+        self.PROCESSED = False
+
+    def get_dimension_keys(self, dim: str) -> list:
+        if dim == self.ROLES:
+            return [r for role_names in roles_module.ROLES_DIRECTORY.values() for r in role_names]
+        elif dim == self.GROUPS:
+            return list(roles_module.ROLES_GROUPS)
+        elif dim == self.ACTIVITY:
+            JournalEntryModel = lazy_importer.get_journal_entry_model()
+            return list(JournalEntryModel.VALID_ACTIVITIES)
+        raise ValueError(f'Invalid dimension {dim}.')
+
+    def get_account_keys(self, dim: str, acc: dict, activities: set) -> list:
+        if dim == self.ROLES:
+            return ROLES_INDEX.get(acc['role'], [])
+        elif dim == self.GROUPS:
+            return GROUPS_INDEX.get(acc['role'], [])
+        act = acc['activity']
+        return [act] if act in activities else []
+
+    def process(self):
+        if self.PROCESSED:
+            return self
+
+        activities = set()
+        for dim in self.DIMENSIONS:
+            keys = self.get_dimension_keys(dim)
+            if dim == self.ACTIVITY:
+                activities = set(keys)
+            self.ACCOUNTS[dim] = {k: list() for k in keys}
+            self.BALANCES[dim] = dict.fromkeys(keys, 0)
+            if self.BY_PERIOD:
+                self.BALANCES_BY_PERIOD[dim] = defaultdict(dict)
+            if self.BY_UNIT:
+                self.BALANCES_BY_UNIT[dim] = defaultdict(dict)
+
+        for acc in self.DIGEST_ACCOUNTS:
+            balance = acc['balance']
+            if self.BY_PERIOD:
+                period_key = (acc['period_year'], acc['period_month'])
+            if self.BY_UNIT:
+                unit_key = (acc['unit_uuid'], acc['unit_name'])
+
+            for dim in self.DIMENSIONS:
+                dim_accounts = self.ACCOUNTS[dim]
+                dim_balances = self.BALANCES[dim]
+                for k in self.get_account_keys(dim, acc, activities):
+                    dim_accounts[k].append(acc)
+                    dim_balances[k] += balance
+                    if self.BY_PERIOD:
+                        period_balances = self.BALANCES_BY_PERIOD[dim][period_key]
+                        period_balances[k] = period_balances.get(k, 0) + balance
+                    if self.BY_UNIT:
+                        unit_balances = self.BALANCES_BY_UNIT[dim][unit_key]
+                        unit_balances[k] = unit_balances.get(k, 0) + balance
+
+        self.PROCESSED = True
+        return self
+
+    def get_results(self, dim: str):
+        if dim not in self.DIMENSIONS:
+            raise ValueError(f'Dimension {dim} was not requested.')
+        self.process()
+        return (self.ACCOUNTS[dim],
+                self.BALANCES[dim],
+                self.BALANCES_BY_PERIOD.get(dim),
+                self.BALANCES_BY_UNIT.get(dim))
+
 
 class RoleManager:
 
     def __init__(self,
                  tx_digest: dict,
                  by_period: bool = False,
-                 by_unit: bool = False):
+                 by_unit: bool = False,
+                 aggregator: DigestAggregator = None):
 
         self.BY_PERIOD = by_period
         self.BY_UNIT = by_unit
@@ -21,19 +138,20 @@ class RoleManager:
         self.DIGEST['role_balance'] = None
 
         self.ACCOUNTS = tx_digest['accounts']
+        self.AGGREGATOR = aggregator
 
         self.ROLES_ACCOUNTS = dict()
         self.ROLES_BALANCES = dict()
 
         if self.BY_PERIOD:
-            self.ROLES_BALANCES_BY_PERIOD = defaultdict(lambda: dict())
+            self.ROLES_BALANCES_BY_PERIOD = defaultdict(dict)
             self.DIGEST['role_balance_by_period'] = None
         if self.BY_UNIT:
-            self.ROLES_BALANCES_BY_UNIT = defaultdict(lambda: dict())
+            self.ROLES_BALANCES_BY_UNIT = defaultdict(dict)
             self.DIGEST['role_balance_by_unit'] = None
 
         if self.BY_PERIOD and self.BY_UNIT:
-            self.ROLES_BALANCES_BY_PERIOD_AND_UNIT = defaultdict(lambda: dict())
+            self.ROLES_BALANCES_BY_PERIOD_AND_UNIT = defaultdict(dict)
 
     def digest(self):
 
@@ -49,26 +167,21 @@ class RoleManager:
         return self.DIGEST
 
     def process_roles(self):
+        if not self.AGGREGATOR:
+            self.AGGREGATOR = DigestAggregator(accounts=self.ACCOUNTS,
+                                               by_period=self.BY_PERIOD,
+                                               by_unit=self.BY_UNIT,
+                                               process_roles=True,
+                                               process_groups=False,
+                                               process_activity=False)
 
-        for c, l in roles_module.ROLES_DIRECTORY.items():
-            for r in l:
-                acc_list = list(acc for acc in self.ACCOUNTS if acc['role'] == getattr(roles_module, r))
-
-                self.ROLES_ACCOUNTS[r] = acc_list
-                self.ROLES_BALANCES[r] = sum(acc['balance'] for acc in acc_list)
+        results = self.AGGREGATOR.get_results(DigestAggregator.ROLES)
+        self.ROLES_ACCOUNTS, self.ROLES_BALANCES, by_period, by_unit = results
 
-                if self.BY_PERIOD or self.BY_UNIT:
-                    for acc in acc_list:
-                        if self.BY_PERIOD:
-                            key = (acc['period_year'], acc['period_month'])
-                            self.ROLES_BALANCES_BY_PERIOD[key][r] = sum(acc['balance'] for acc in acc_list if all([
-                                acc['period_year'] == key[0],
-                                acc['period_month'] == key[1]]
-                            ))
-                        if self.BY_UNIT:
-                            key = (acc['unit_uuid'], acc['unit_name'])
-                            self.ROLES_BALANCES_BY_UNIT[key][r] = sum(
-                                acc['balance'] for acc in acc_list if acc['unit_uuid'] == key[0])
+        if self.BY_PERIOD:
+            self.ROLES_BALANCES_BY_PERIOD = by_period
+        if self.BY_UNIT:
+            self.ROLES_BALANCES_BY_UNIT = by_unit
 
 
 class GroupManager:
@@ -80,7 +193,8 @@ class GroupManager:
     def __init__(self,
                  io_digest: dict,
                  by_period: bool = False,
-                 by_unit: bool = False):
+                 by_unit: bool = False,
+                 aggregator: DigestAggregator = None):
 
         self.BY_PERIOD = by_period
         self.BY_UNIT = by_unit
@@ -91,20 +205,21 @@ class GroupManager:
         self.IO_DIGEST[self.GROUP_BALANCE_KEY] = None
 
         self.DIGEST_ACCOUNTS = io_digest['accounts']
+        self.AGGREGATOR = aggregator
 
         self.GROUPS_ACCOUNTS = dict()
         self.GROUPS_BALANCES = dict()
 
         if self.BY_PERIOD:
-            self.GROUPS_BALANCES_BY_PERIOD = defaultdict(lambda: dict())
+            self.GROUPS_BALANCES_BY_PERIOD = defaultdict(dict)
             self.IO_DIGEST[self.GROUP_BALANCE_BY_PERIOD_KEY] = None
 
         if self.BY_UNIT:
-            self.GROUPS_BALANCES_BY_UNIT = defaultdict(lambda: dict())
+            self.GROUPS_BALANCES_BY_UNIT = defaultdict(dict)
             self.IO_DIGEST[self.GROUP_BALANCE_BY_UNIT_KEY] = None
 
         if self.BY_PERIOD and self.BY_UNIT:
-            self.GROUPS_BALANCES_BY_PERIOD_AND_UNIT = defaultdict(lambda: dict())
+            self.GROUPS_BALANCES_BY_PERIOD_AND_UNIT = defaultdict(dict)
             self.IO_DIGEST[self.GROUP_BALANCE_BY_PERIOD_KEY] = None
 
     def digest(self):
@@ -123,25 +238,21 @@ class GroupManager:
         return (acc for acc in self.DIGEST_ACCOUNTS if acc['role'] in getattr(mod, g))
 
     def process_groups(self):
-        for g in roles_module.ROLES_GROUPS:
-            acc_list = list(self.get_accounts_generator(roles_module, g))
-            self.GROUPS_ACCOUNTS[g] = acc_list
-            self.GROUPS_BALANCES[g] = sum(acc['balance'] for acc in acc_list)
+        if not self.AGGREGATOR:
+            self.AGGREGATOR = DigestAggregator(accounts=self.DIGEST_ACCOUNTS,
+                                               by_period=self.BY_PERIOD,
+                                               by_unit=self.BY_UNIT,
+                                               process_roles=False,
+                                               process_groups=True,
+                                               process_activity=False)
 
-            if self.BY_PERIOD or self.BY_UNIT:
-                for acc in acc_list:
-                    if self.BY_PERIOD:
-                        key = (acc['period_year'], acc['period_month'])
-                        self.GROUPS_BALANCES_BY_PERIOD[key][g] = sum(
-                            acc['balance'] for acc in acc_list if all([
-                                acc['period_year'] == key[0],
-                                acc['period_month'] == key[1]]
-                            ))
-                    if self.BY_UNIT:
-                        key = (acc['unit_uuid'], acc['unit_name'])
-                        self.GROUPS_BALANCES_BY_UNIT[key][g] = sum(
-                            acc['balance'] for acc in acc_list if acc['unit_uuid'] == key[0]
-                        )
+        results = self.AGGREGATOR.get_results(DigestAggregator.GROUPS)
+        self.GROUPS_ACCOUNTS, self.GROUPS_BALANCES, by_period, by_unit = results
+
+        if self.BY_PERIOD:
+            self.GROUPS_BALANCES_BY_PERIOD = by_period
+        if self.BY_UNIT:
+            self.GROUPS_BALANCES_BY_UNIT = by_unit
 
 
 class ActivityManager:
@@ -149,7 +260,8 @@ class ActivityManager:
     def __init__(self,
                  tx_digest: dict,
                  by_unit: bool = False,
-                 by_period: bool = False):
+                 by_period: bool = False,
+                 aggregator: DigestAggregator = None):
 
         self.DIGEST = tx_digest
         self.DIGEST['activity_account'] = None
@@ -159,17 +271,18 @@ class ActivityManager:
         self.BY_UNIT = by_unit
 
         self.ACCOUNTS = tx_digest['accounts']
+        self.AGGREGATOR = aggregator
         self.ACTIVITY_ACCOUNTS = dict()
         self.ACTIVITY_BALANCES = dict()
 
         if self.BY_PERIOD:
-            self.ACTIVITY_BALANCES_BY_PERIOD = defaultdict(lambda: dict())
+            self.ACTIVITY_BALANCES_BY_PERIOD = defaultdict(dict)
             self.DIGEST['activity_balance_by_period'] = None
         if self.BY_UNIT:
-            self.ACTIVITY_BALANCES_BY_UNIT = defaultdict(lambda: dict())
+            self.ACTIVITY_BALANCES_BY_UNIT = defaultdict(dict)
             self.DIGEST['activity_balance_by_unit'] = None
         if self.BY_PERIOD and self.BY_UNIT:
-            self.ROLES_BALANCES_BY_PERIOD_AND_UNIT = defaultdict(lambda: dict())
+            self.ROLES_BALANCES_BY_PERIOD_AND_UNIT = defaultdict(dict)
 
     def digest(self):
 
@@ -180,27 +293,24 @@ class ActivityManager:
         if self.BY_PERIOD:
             self.DIGEST['activity_balance_by_period'] = self.ACTIVITY_BALANCES_BY_PERIOD
         if self.BY_UNIT:
-            self.DIGEST['activity_balance_by_unit'] = self.ACTIVITY_BALANCES_BY_PERIOD
+            self.DIGEST['activity_balance_by_unit'] = self.ACTIVITY_BALANCES_BY_UNIT
 
     def get_accounts_generator(self, activity: str):
         return (acc for acc in self.ACCOUNTS if acc['activity'] == activity)
 
     def process_activity(self):
-        JournalEntryModel = lazy_importer.get_journal_entry_model()
-        for act in JournalEntryModel.VALID_ACTIVITIES:
-            acc_list = list(self.get_accounts_generator(act))
-            self.ACTIVITY_ACCOUNTS[act] = acc_list
-            self.ACTIVITY_BALANCES[act] = sum(acc['balance'] for acc in acc_list)
-
-            if self.BY_PERIOD or self.BY_UNIT:
-                for acc in acc_list:
-                    if self.BY_PERIOD:
-                        key = (acc['period_year'], acc['period_month'])
-                        self.ACTIVITY_BALANCES_BY_PERIOD[key][act] = sum(acc['balance'] for acc in acc_list if all([
-                            acc['period_year'] == key[0],
-                            acc['period_month'] == key[1]]
-                        ))
-                    if self.BY_UNIT:
-                        key = (acc['unit_uuid'], acc['unit_name'])
-                        self.ACTIVITY_BALANCES_BY_UNIT[key][act] = sum(
-                            acc['balance'] for acc in acc_list if acc['unit_uuid'] == key[0])
+        if not self.AGGREGATOR:
+            self.AGGREGATOR = DigestAggregator(accounts=self.ACCOUNTS,
+                                               by_period=self.BY_PERIOD,
+                                               by_unit=self.BY_UNIT,
+                                               process_roles=False,
+                                               process_groups=False,
+                                               process_activity=True)
+
+        results = self.AGGREGATOR.get_results(DigestAggregator.ACTIVITY)
+        self.ACTIVITY_ACCOUNTS, self.ACTIVITY_BALANCES, by_period, by_unit = results
+
+        if self.BY_PERIOD:
+            self.ACTIVITY_BALANCES_BY_PERIOD = by_period
+        if self.BY_UNIT:
+            self.ACTIVITY_BALANCES_BY_UNIT = by_unit
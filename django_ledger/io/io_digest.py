@@ -0,0 +1,184 @@
+"""
+Django Ledger created by Miguel Sanda <msanda@arrobalytics.com>.
+Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
+
+Contributions to this module:
+Miguel Sanda <msanda@arrobalytics.com>
+
+Compact containers for the IOMixIn digest results. Account balances are stored as AccountBalance records with
+__slots__ and interned strings instead of one dictionary per account bucket. Role, group, activity, unit and period
+lists are views holding references to the same records. Both classes keep a dict-compatible interface, so existing
+code and templates can keep using item access.
+"""
+from sys import intern
+
+from django_ledger.io.io_context import ROLES_INDEX, GROUPS_INDEX
+
+
+class AccountBalance:
+    """
+    Balance of a single digest account bucket (account, unit, period, activity, tx_type).
+    Supports item access, so it can be used as a read/write dictionary with the same keys.
+    """
+    __slots__ = (
+        'account_uuid',
+        'unit_uuid',
+        'unit_name',
+        'activity',
+        'period_year',
+        'period_month',
+        'role_bs',
+        'role',
+        'code',
+        'name',
+        'balance_type',
+        'tx_type',
+        'balance'
+    )
+
+    # repeated string values are shared across all records...
+    INTERNED_FIELDS = ('unit_name', 'activity', 'role_bs', 'role', 'code', 'name', 'balance_type', 'tx_type')
+
+    def __init__(self, **kwargs):
+        for f in self.__slots__:
+            v = kwargs.get(f)
+            if f in self.INTERNED_FIELDS and type(v) is str:
+                v = intern(v)
+            setattr(self, f, v)
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        if isinstance(other, (AccountBalance, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.to_dict()})'
+
+    def __getstate__(self):
+        return tuple(getattr(self, f) for f in self.__slots__)
+
+    def __setstate__(self, state):
+        for f, v in zip(self.__slots__, state):
+            if f in self.INTERNED_FIELDS and type(v) is str:
+                v = intern(v)
+            setattr(self, f, v)
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def values(self):
+        return [getattr(self, f) for f in self.__slots__]
+
+    def items(self):
+        return [(f, getattr(self, f)) for f in self.__slots__]
+
+    def to_dict(self) -> dict:
+        return {f: getattr(self, f) for f in self.__slots__}
+
+
+class IODigest(dict):
+    """
+    Result of the IOMixIn digest. Behaves like the previous defaultdict(dict) container, where missing keys default
+    to an empty dictionary, and exposes lazy views of the digest accounts by role, group, activity, unit and period.
+    Views are built in a single sweep on first access and share the same AccountBalance records.
+    """
+    ACCOUNTS_KEY = 'accounts'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.VIEWS = None
+
+    def __missing__(self, key):
+        value = dict()
+        self[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        if key == self.ACCOUNTS_KEY:
+            self.VIEWS = None
+        super().__setitem__(key, value)
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def get_accounts(self) -> list:
+        return self.get(self.ACCOUNTS_KEY) or list()
+
+    def build_views(self) -> dict:
+        views = {
+            'role': dict(),
+            'group': dict(),
+            'activity': dict(),
+            'unit': dict(),
+            'period': dict()
+        }
+        for acc in self.get_accounts():
+            views['role'].setdefault(acc['role'], list()).append(acc)
+            for g in GROUPS_INDEX.get(acc['role'], []):
+                views['group'].setdefault(g, list()).append(acc)
+            views['activity'].setdefault(acc['activity'], list()).append(acc)
+            views['unit'].setdefault((acc['unit_uuid'], acc['unit_name']), list()).append(acc)
+            views['period'].setdefault((acc['period_year'], acc['period_month']), list()).append(acc)
+        return views
+
+    def get_view(self, view_name: str) -> dict:
+        if self.VIEWS is None:
+            self.VIEWS = self.build_views()
+        return self.VIEWS[view_name]
+
+    def by_role(self) -> dict:
+        """
+        Digest accounts by role name (e.g. ASSET_CA_CASH).
+        """
+        return {
+            role_name: accs for role, accs in self.get_view('role').items() for role_name in ROLES_INDEX.get(role, [])
+        }
+
+    def by_group(self) -> dict:
+        return self.get_view('group')
+
+    def by_activity(self) -> dict:
+        return self.get_view('activity')
+
+    def by_unit(self) -> dict:
+        """
+        Digest accounts by (unit_uuid, unit_name). Only meaningful on digests requested by_unit.
+        """
+        return self.get_view('unit')
+
+    def by_period(self) -> dict:
+        """
+        Digest accounts by (period_year, period_month). Only meaningful on digests requested by_period.
+        """
+        return self.get_view('period')
+
+    @staticmethod
+    def get_balance(accounts: list):
+        return sum(acc['balance'] for acc in accounts)
+
+    def get_balances(self, view: dict) -> dict:
+        return {k: self.get_balance(accs) for k, accs in view.items()}
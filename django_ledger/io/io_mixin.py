@@ -5,28 +5,40 @@ Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
 Contributions to this module:
 Miguel Sanda <msanda@arrobalytics.com>
 """
+from calendar import monthrange
 from collections import defaultdict
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from heapq import nlargest
 from itertools import groupby
-from random import choice
 from typing import List, Set, Union, Tuple, Optional
 
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db.models import Sum, QuerySet
+from django.db import transaction
+from django.db.models import Sum, QuerySet, Q, Case, When, F, Value, DecimalField, IntegerField
 from django.db.models.functions import TruncMonth
 from django.http import Http404
 from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.timezone import localdate, make_aware, is_naive
+from django.utils.translation import gettext_lazy as _
 
 from django_ledger.exceptions import InvalidDateInputError, TransactionNotInBalanceError
 from django_ledger.io import roles as roles_module
+from django_ledger.io.digest_cache import (is_digest_cache_enabled, get_digest_cache_key, get_cached_digest,
+                                           set_cached_digest, bump_digest_version)
 from django_ledger.io.financial_statements import CashFlowStatement
-from django_ledger.io.io_context import RoleManager, GroupManager, ActivityManager
+from django_ledger.io.io_context import RoleManager, GroupManager, ActivityManager, DigestAggregator
+from django_ledger.io.io_digest import AccountBalance, IODigest
 from django_ledger.io.ratios import FinancialRatioManager
 from django_ledger.models.utils import LazyLoader
 from django_ledger.settings import (DJANGO_LEDGER_TRANSACTION_MAX_TOLERANCE,
-                                    DJANGO_LEDGER_TRANSACTION_CORRECTION)
+                                    DJANGO_LEDGER_TRANSACTION_CORRECTION,
+                                    DJANGO_LEDGER_USE_PERIOD_BALANCES,
+                                    DJANGO_LEDGER_SQL_DIGEST,
+                                    DJANGO_LEDGER_DIGEST_STREAM,
+                                    DJANGO_LEDGER_DIGEST_CHUNK_SIZE,
+                                    DJANGO_LEDGER_DENORMALIZED_TXS)
 
 UserModel = get_user_model()
 
@@ -60,6 +72,60 @@ def diff_tx_data(tx_data: list, raise_exception: bool = True):
     return IS_TX_MODEL, is_valid, diff
 
 
+def allocate_tx_correction(tx_data: list, diff: Decimal, is_tx_model: bool):
+    """
+    Removes the difference between credits and debits of tx_data in a single pass, in place.
+    The difference is split into DJANGO_LEDGER_TRANSACTION_CORRECTION units, which are allocated across all
+    transactions proportionally to their amounts using the largest remainder method. Ties are resolved by amount and
+    then by position, so identical tx_data always results in identical amounts. Any difference smaller than one
+    correction unit is allocated to the largest transaction.
+    """
+    TransactionModel = lazy_importer.get_txs_model()
+    CORRECTION = DJANGO_LEDGER_TRANSACTION_CORRECTION
+
+    if is_tx_model:
+        amounts = [tx.amount for tx in tx_data]
+        tx_types = [tx.tx_type for tx in tx_data]
+    else:
+        amounts = [tx['amount'] for tx in tx_data]
+        tx_types = [tx['tx_type'] for tx in tx_data]
+
+    units, remainder = divmod(abs(diff), CORRECTION)
+    units = int(units)
+
+    weights = [abs(amt) for amt in amounts]
+    total_weight = sum(weights)
+    if not total_weight:
+        weights = [1] * len(tx_data)
+        total_weight = len(tx_data)
+
+    quotas = [Decimal(units) * w / total_weight for w in weights]
+    allocation = [int(q) for q in quotas]
+    pending = units - sum(allocation)
+    if pending:
+        for i in nlargest(pending,
+                          range(len(tx_data)),
+                          key=lambda i: (quotas[i] - allocation[i], weights[i], -i)):
+            allocation[i] += 1
+
+    largest_idx = max(range(len(tx_data)), key=lambda i: (weights[i], -i))
+
+    # credits exceeding debits (diff > 0) increase debits & decrease credits...
+    sign = 1 if diff > 0 else -1
+    for i, tx in enumerate(tx_data):
+        adjustment = allocation[i] * CORRECTION
+        if i == largest_idx:
+            adjustment += remainder
+        if not adjustment:
+            continue
+        if tx_types[i] != TransactionModel.DEBIT:
+            adjustment = -adjustment
+        if is_tx_model:
+            tx.amount = amounts[i] + sign * adjustment
+        else:
+            tx['amount'] = amounts[i] + sign * adjustment
+
+
 def balance_tx_data(tx_data: list, perform_correction: bool = True) -> bool:
     if tx_data:
 
@@ -68,28 +134,8 @@ def balance_tx_data(tx_data: list, perform_correction: bool = True) -> bool:
         if not perform_correction and abs(diff) > DJANGO_LEDGER_TRANSACTION_MAX_TOLERANCE:
             return False
 
-        while not is_valid:
-
-            tx_type_choice = choice(['debit', 'credit'])
-            txs_candidates = list(tx for tx in tx_data if tx.tx_type == tx_type_choice)
-            if len(txs_candidates) > 0:
-                tx = choice(list(tx for tx in tx_data if tx.tx_type == tx_type_choice))
-
-                if any([diff > 0 and tx_type_choice == 'debit',
-                        diff < 0 and tx_type_choice == 'credit']):
-                    if IS_TX_MODEL:
-                        tx.amount += DJANGO_LEDGER_TRANSACTION_CORRECTION
-                    else:
-                        tx['amount'] += DJANGO_LEDGER_TRANSACTION_CORRECTION
-
-                elif any([diff < 0 and tx_type_choice == 'debit',
-                          diff > 0 and tx_type_choice == 'credit']):
-                    if IS_TX_MODEL:
-                        tx.amount -= DJANGO_LEDGER_TRANSACTION_CORRECTION
-                    else:
-                        tx['amount'] += DJANGO_LEDGER_TRANSACTION_CORRECTION
-
-                IS_TX_MODEL, is_valid, diff = diff_tx_data(tx_data)
+        if not is_valid:
+            allocate_tx_correction(tx_data, diff=diff, is_tx_model=IS_TX_MODEL)
 
     return True
 
@@ -140,6 +186,45 @@ def validate_activity(activity: str, raise_404: bool = False):
     return activity
 
 
+def get_period_start(dt: date) -> date:
+    """
+    The first day of the period (month) of the given date.
+    """
+    return dt.replace(day=1)
+
+
+def get_next_period_start(dt: date) -> date:
+    """
+    The first day of the period (month) following the given date.
+    """
+    return get_period_start(dt) + timedelta(days=monthrange(dt.year, dt.month)[1])
+
+
+def get_period_balances_range(from_date: Optional[date],
+                              to_date: Optional[date],
+                              rollup_date: Optional[date]) -> Optional[Tuple[Optional[date], date]]:
+    """
+    Determines the range of whole, rolled up periods between from_date and to_date that can be read from the
+    materialized AccountPeriodBalanceModel. Returns None if no complete period can be used.
+    """
+    if not rollup_date:
+        return None
+
+    bal_from = from_date
+    if from_date and from_date.day != 1:
+        bal_from = get_next_period_start(from_date)
+
+    bal_to = rollup_date
+    if to_date:
+        next_period = get_next_period_start(to_date)
+        bal_to = min(next_period if to_date + timedelta(days=1) == next_period else get_period_start(to_date),
+                     rollup_date)
+
+    if bal_from and bal_from >= bal_to:
+        return None
+    return bal_from, bal_to
+
+
 class IOError(ValidationError):
     pass
 
@@ -164,9 +249,26 @@ class IOMixIn:
                         by_activity: bool = False,
                         by_tx_type: bool = False,
                         by_period: bool = False,
-                        by_unit: bool = False):
+                        by_unit: bool = False,
+                        signed: bool = False,
+                        segments: Optional[List[date]] = None,
+                        by_entity: bool = False):
+        """
+        Aggregates the transactions into account balances. By default, returns one row per account and tx_type (plus
+        journal entry date, unit and activity as requested), to be signed and grouped by python_digest.
+
+        When signed is True, balances are signed against the account balance type and grouped in SQL, returning
+        exactly one row per account bucket (account, unit, month, activity, tx_type as requested).
+
+        When a sorted list of segments dates is provided, every transaction is also bucketed by the index k of the date
+        segment [segments[k - 1], segments[k]) it belongs to, available as segment_idx.
 
-        if not queryset:
+        When by_entity is True, rows are also grouped by the EntityModel of the transaction ledger. Used by consolidated
+        digests across multiple entities.
+        """
+
+        # evaluating the truth value of a QuerySet would fetch all transactions...
+        if queryset is None:
             TransactionModel = lazy_importer.get_txs_model()
 
             # If IO is on entity model....
@@ -228,6 +330,10 @@ class IOMixIn:
         if role:
             txs_qs = txs_qs.for_roles(role_list=role)
 
+        # denormalized transactions are bucketed without joining journal entries...
+        JE_DATE_FIELD = 'je_date' if DJANGO_LEDGER_DENORMALIZED_TXS else 'journal_entry__date'
+        VALUES_EXPRESSIONS = dict()
+
         VALUES = [
             'account__uuid',
             'account__balance_type',
@@ -239,13 +345,32 @@ class IOMixIn:
         ANNOTATE = {'balance': Sum('amount')}
         ORDER_BY = ['account__uuid']
 
-        if by_period:
-            ORDER_BY.append('journal_entry__date')
-            ANNOTATE['dt_idx'] = TruncMonth('journal_entry__date')
+        if signed:
+            # tx_type is only a grouping key when by_tx_type...
+            VALUES.remove('tx_type')
+            ANNOTATE['balance'] = Sum(
+                Case(
+                    When(tx_type=F('account__balance_type'), then=F('amount')),
+                    default=-F('amount'),
+                    output_field=DecimalField(max_digits=20, decimal_places=2)
+                )
+            )
+
+        if by_period and signed:
+            # the month is part of the GROUP BY clause...
+            txs_qs = txs_qs.annotate(dt_idx=TruncMonth(JE_DATE_FIELD))
+            VALUES.append('dt_idx')
+            ORDER_BY.append('dt_idx')
+        elif by_period:
+            ORDER_BY.append(JE_DATE_FIELD)
+            ANNOTATE['dt_idx'] = TruncMonth(JE_DATE_FIELD)
 
         if by_unit:
             VALUES += ['journal_entry__entity_unit__uuid', 'journal_entry__entity_unit__name']
             ORDER_BY.append('journal_entry__entity_unit__uuid')
+            if DJANGO_LEDGER_DENORMALIZED_TXS:
+                VALUES_EXPRESSIONS['journal_entry__entity_unit__uuid'] = F('entity_unit_id')
+                VALUES_EXPRESSIONS['journal_entry__entity_unit__name'] = F('entity_unit__name')
 
         if by_activity:
             VALUES.append('journal_entry__activity')
@@ -255,7 +380,133 @@ class IOMixIn:
             VALUES.append('tx_type')
             ORDER_BY.append('tx_type')
 
-        return txs_qs.values(*VALUES).annotate(**ANNOTATE).order_by(*ORDER_BY)
+        if by_entity:
+            VALUES += ['journal_entry__ledger__entity__uuid', 'journal_entry__ledger__entity__name']
+            ORDER_BY.insert(0, 'journal_entry__ledger__entity__uuid')
+            if DJANGO_LEDGER_DENORMALIZED_TXS:
+                VALUES_EXPRESSIONS['journal_entry__ledger__entity__uuid'] = F('entity_id')
+                VALUES_EXPRESSIONS['journal_entry__ledger__entity__name'] = F('entity__name')
+
+        if segments:
+            txs_qs = txs_qs.annotate(
+                segment_idx=Case(
+                    *[When(**{f'{JE_DATE_FIELD}__lt': dt}, then=Value(k)) for k, dt in enumerate(segments)],
+                    default=Value(len(segments)),
+                    output_field=IntegerField()
+                )
+            )
+            VALUES.append('segment_idx')
+            ORDER_BY.append('segment_idx')
+
+        # closed periods may be read from the materialized AccountPeriodBalanceModel...
+        entity_model = None
+        if all([DJANGO_LEDGER_USE_PERIOD_BALANCES, queryset is None, not segments, posted, exclude_zero_bal]):
+            if isinstance(self, lazy_importer.get_entity_model()):
+                entity_model = self
+            elif isinstance(self, lazy_importer.get_unit_model()):
+                entity_model = self.entity
+
+        if entity_model:
+            # periods are rolled up by the rollup_period_balances command, never while reading...
+            AccountPeriodBalanceModel = lazy_importer.get_account_period_balance_model()
+            rollup_date = entity_model.period_balances_date
+            bal_range = get_period_balances_range(from_date=from_date, to_date=to_date, rollup_date=rollup_date)
+
+            if bal_range:
+                bal_from, bal_to = bal_range
+
+                # the open period and any partial periods are read from the transactions table...
+                open_q = Q(**{f'{JE_DATE_FIELD}__gte': bal_to})
+                if bal_from:
+                    open_q |= Q(**{f'{JE_DATE_FIELD}__lt': bal_from})
+                txs_qs = txs_qs.filter(open_q)
+
+                bal_qs = AccountPeriodBalanceModel.objects.for_entity(
+                    entity_model=entity_model,
+                    user_model=user_model
+                ).for_periods(from_period=bal_from, to_period=bal_to)
+
+                if isinstance(self, lazy_importer.get_unit_model()):
+                    bal_qs = bal_qs.filter(entity_unit=self)
+                elif unit_slug:
+                    bal_qs = bal_qs.filter(entity_unit__slug__exact=unit_slug)
+                if accounts:
+                    bal_qs = bal_qs.for_accounts(account_list=accounts)
+                if activity:
+                    bal_qs = bal_qs.for_activity(activity_list=activity)
+                if role:
+                    bal_qs = bal_qs.for_roles(role_list=role)
+
+                return self.merge_period_balances(
+                    txs_values=txs_qs.values(
+                        *[f for f in VALUES if f not in VALUES_EXPRESSIONS], **VALUES_EXPRESSIONS
+                    ).annotate(**ANNOTATE).order_by(*ORDER_BY),
+                    bal_qs=bal_qs,
+                    values=VALUES,
+                    order_by=ORDER_BY,
+                    by_period=by_period,
+                    signed=signed
+                )
+
+        return txs_qs.values(
+            *[f for f in VALUES if f not in VALUES_EXPRESSIONS], **VALUES_EXPRESSIONS
+        ).annotate(**ANNOTATE).order_by(*ORDER_BY)
+
+    @staticmethod
+    def merge_period_balances(txs_values,
+                              bal_qs,
+                              values: list,
+                              order_by: list,
+                              by_period: bool,
+                              signed: bool = False) -> list:
+        """
+        Merges the open period transactions with the materialized period balances into a single list of rows with
+        the same layout and ordering as the database_digest values QuerySet. Signed rows of the same account bucket
+        are added together, so there is still exactly one row per bucket.
+        """
+        # AccountPeriodBalanceModel field -> TransactionModel values() field...
+        bal_fields_map = {
+            'entity_unit__uuid': 'journal_entry__entity_unit__uuid',
+            'entity_unit__name': 'journal_entry__entity_unit__name',
+            'activity': 'journal_entry__activity',
+        }
+        if by_period:
+            bal_fields_map['period'] = 'dt_idx'
+        txs_fields_map = {v: k for k, v in bal_fields_map.items()}
+
+        bal_values = [txs_fields_map.get(f, f) for f in values]
+        if by_period and 'period' not in bal_values:
+            bal_values.append('period')
+
+        if signed:
+            bal_annotate = Sum(
+                Case(
+                    When(tx_type=F('account__balance_type'), then=F('balance')),
+                    default=-F('balance'),
+                    output_field=DecimalField(max_digits=20, decimal_places=2)
+                )
+            )
+        else:
+            bal_annotate = Sum('balance')
+
+        bal_rows = bal_qs.values(*bal_values).annotate(balance=bal_annotate).order_by()
+        rows = list(txs_values) + [
+            {bal_fields_map.get(k, k): v for k, v in r.items()} for r in bal_rows
+        ]
+
+        if signed:
+            rows_idx = dict()
+            for r in rows:
+                k = tuple(r[f] for f in values)
+                if k in rows_idx:
+                    rows_idx[k]['balance'] += r['balance']
+                else:
+                    rows_idx[k] = r
+            rows = list(rows_idx.values())
+
+        sort_keys = ['dt_idx' if k in ('journal_entry__date', 'je_date') else k for k in order_by]
+        rows.sort(key=lambda r: tuple((r.get(k) is not None, str(r.get(k))) for k in sort_keys))
+        return rows
 
     def python_digest(self,
                       user_model: UserModel,
@@ -272,11 +523,39 @@ class IOMixIn:
                       by_unit: bool = False,
                       by_activity: bool = False,
                       by_tx_type: bool = False,
-                      by_period: bool = False) -> list or tuple:
+                      by_period: bool = False,
+                      sql_digest: Optional[bool] = None,
+                      stream: Optional[bool] = None) -> list or tuple:
 
         if equity_only:
             role = roles_module.GROUP_EARNINGS
 
+        if sql_digest is None:
+            sql_digest = DJANGO_LEDGER_SQL_DIGEST
+
+        if stream is None:
+            stream = DJANGO_LEDGER_DIGEST_STREAM
+
+        if stream:
+            txs_qs, gb_digest = self.stream_digest(
+                user_model=user_model,
+                queryset=queryset,
+                to_date=to_date,
+                from_date=from_date,
+                entity_slug=entity_slug,
+                unit_slug=unit_slug,
+                activity=activity,
+                role=role,
+                accounts=accounts,
+                signs=signs,
+                by_unit=by_unit,
+                by_activity=by_activity,
+                by_tx_type=by_tx_type,
+                by_period=by_period,
+                sql_digest=sql_digest)
+            # the digest keeps one record per account bucket, transaction rows are not retained...
+            return txs_qs, list(gb_digest)
+
         txs_qs = self.database_digest(
             user_model=user_model,
             queryset=queryset,
@@ -290,62 +569,194 @@ class IOMixIn:
             by_unit=by_unit,
             by_activity=by_activity,
             by_tx_type=by_tx_type,
-            by_period=by_period)
-
-        for tx in txs_qs:
-            if tx['account__balance_type'] != tx['tx_type']:
-                tx['balance'] = -tx['balance']
-
-        accounts_gb_code = groupby(txs_qs,
-                                   key=lambda a: (
-                                       a['account__uuid'],
-                                       a.get('journal_entry__entity_unit__uuid') if by_unit else None,
-                                       a.get('dt_idx').year if by_period else None,
-                                       a.get('dt_idx').month if by_period else None,
-                                       a.get('journal_entry__activity') if by_activity else None,
-                                       a.get('tx_type') if by_tx_type else None,
-                                   ))
-
-        gb_digest = [
-            self.aggregate_balances(k, g) for k, g in accounts_gb_code
-        ]
+            by_period=by_period,
+            signed=sql_digest)
+
+        if sql_digest:
+            # rows are already signed & grouped by account bucket...
+            gb_digest = [
+                self.get_bucket_balance(tx, by_period=by_period) for tx in txs_qs
+            ]
+        else:
+            for tx in txs_qs:
+                if tx['account__balance_type'] != tx['tx_type']:
+                    tx['balance'] = -tx['balance']
+
+            accounts_gb_code = groupby(txs_qs,
+                                       key=lambda a: (
+                                           a['account__uuid'],
+                                           a.get('journal_entry__entity_unit__uuid') if by_unit else None,
+                                           a.get('dt_idx').year if by_period else None,
+                                           a.get('dt_idx').month if by_period else None,
+                                           a.get('journal_entry__activity') if by_activity else None,
+                                           a.get('tx_type') if by_tx_type else None,
+                                       ))
+
+            gb_digest = [
+                self.aggregate_balances(k, g) for k, g in accounts_gb_code
+            ]
 
         if signs:
-            TransactionModel = lazy_importer.get_txs_model()
-            for acc in gb_digest:
-                if any([
-                    all([acc['role_bs'] == roles_module.BS_ASSET_ROLE,
-                         acc['balance_type'] == TransactionModel.CREDIT]),
-                    all([acc['role_bs'] in (
-                            roles_module.BS_LIABILITIES_ROLE,
-                            roles_module.BS_EQUITY_ROLE
-                    ),
-                         acc['balance_type'] == TransactionModel.DEBIT])
-                ]):
-                    acc['balance'] = -acc['balance']
+            self.sign_balances(gb_digest)
 
         return txs_qs, gb_digest
 
+    def stream_digest(self,
+                      user_model: UserModel,
+                      queryset: QuerySet = None,
+                      to_date: date = None,
+                      from_date: date = None,
+                      activity: str = None,
+                      entity_slug: str = None,
+                      unit_slug: str = None,
+                      role: Optional[Union[Set[str], List[str]]] = None,
+                      accounts: Optional[Union[Set[str], List[str]]] = None,
+                      signs: bool = False,
+                      by_unit: bool = False,
+                      by_activity: bool = False,
+                      by_tx_type: bool = False,
+                      by_period: bool = False,
+                      sql_digest: bool = False,
+                      chunk_size: int = None) -> tuple:
+        """
+        Streaming version of python_digest. The database_digest rows are read in chunks with a server side cursor (where
+        supported by the database backend) and are never held in memory as a whole. Rows arrive ordered by account, so
+        only the balances of the account being read are accumulated at any point. Each account bucket is yielded as
+        soon as all the rows of its account have been read.
+
+        Only the transaction rows are streamed. The yielded AccountBalance records, one per account bucket, are
+        collected into the digest by python_digest. Rows merged with the materialized period balances are already a
+        list, so nothing is streamed when period balances are used.
+
+        Returns
+        -------
+        tuple
+            The database_digest QuerySet (not evaluated) and a generator of AccountBalance records.
+        """
+        if not chunk_size:
+            chunk_size = DJANGO_LEDGER_DIGEST_CHUNK_SIZE
+
+        txs_qs = self.database_digest(
+            user_model=user_model,
+            queryset=queryset,
+            to_date=to_date,
+            from_date=from_date,
+            entity_slug=entity_slug,
+            unit_slug=unit_slug,
+            activity=activity,
+            role=role,
+            accounts=accounts,
+            by_unit=by_unit,
+            by_activity=by_activity,
+            by_tx_type=by_tx_type,
+            by_period=by_period,
+            signed=sql_digest)
+
+        def balances_gen():
+            # merged period balances are already a list, there is nothing to stream...
+            if isinstance(txs_qs, QuerySet):
+                rows = txs_qs.iterator(chunk_size=chunk_size)
+            else:
+                rows = iter(txs_qs)
+
+            if sql_digest:
+                # rows are already signed & grouped by account bucket...
+                for tx in rows:
+                    acc = self.get_bucket_balance(tx, by_period=by_period)
+                    if signs:
+                        self.sign_balances([acc])
+                    yield acc
+                return
+
+            current_account = None
+            account_buckets = dict()
+            for tx in rows:
+                if tx['account__uuid'] != current_account:
+                    if signs:
+                        self.sign_balances(account_buckets.values())
+                    yield from account_buckets.values()
+                    current_account = tx['account__uuid']
+                    account_buckets = dict()
+
+                if tx['account__balance_type'] != tx['tx_type']:
+                    tx['balance'] = -tx['balance']
+
+                k = (
+                    tx['account__uuid'],
+                    tx.get('journal_entry__entity_unit__uuid') if by_unit else None,
+                    tx.get('dt_idx').year if by_period else None,
+                    tx.get('dt_idx').month if by_period else None,
+                    tx.get('journal_entry__activity') if by_activity else None,
+                    tx.get('tx_type') if by_tx_type else None,
+                )
+                acc = account_buckets.get(k)
+                if acc is None:
+                    account_buckets[k] = self.aggregate_balances(k, [tx])
+                else:
+                    acc['balance'] += tx['balance']
+
+            if signs:
+                self.sign_balances(account_buckets.values())
+            yield from account_buckets.values()
+
+        return txs_qs, balances_gen()
+
     @staticmethod
-    def aggregate_balances(k, g):
+    def sign_balances(gb_digest: list):
+        """
+        Flips the balance of contra accounts (credit balance assets, debit balance liabilities & equity).
+        """
+        TransactionModel = lazy_importer.get_txs_model()
+        for acc in gb_digest:
+            if any([
+                all([acc['role_bs'] == roles_module.BS_ASSET_ROLE,
+                     acc['balance_type'] == TransactionModel.CREDIT]),
+                all([acc['role_bs'] in (
+                        roles_module.BS_LIABILITIES_ROLE,
+                        roles_module.BS_EQUITY_ROLE
+                ),
+                     acc['balance_type'] == TransactionModel.DEBIT])
+            ]):
+                acc['balance'] = -acc['balance']
+
+    @staticmethod
+    def aggregate_balances(k, g) -> AccountBalance:
         gl = list(g)
-        return {
-            'account_uuid': k[0],
-            'unit_uuid': k[1],
-            'unit_name': gl[0].get('journal_entry__entity_unit__name'),
-            'activity': gl[0].get('journal_entry__activity'),
-            'period_year': k[2],
-            'period_month': k[3],
-            'role_bs': roles_module.BS_ROLES.get(gl[0]['account__role']),
-            'role': gl[0]['account__role'],
-            'code': gl[0]['account__code'],
-            'name': gl[0]['account__name'],
-            'balance_type': gl[0]['account__balance_type'],
-            'tx_type': k[5],
-            'balance': sum(a['balance'] for a in gl),
-        }
+        tx = gl[0]
+        return AccountBalance(
+            account_uuid=k[0],
+            unit_uuid=k[1],
+            unit_name=tx.get('journal_entry__entity_unit__name'),
+            activity=tx.get('journal_entry__activity'),
+            period_year=k[2],
+            period_month=k[3],
+            role_bs=roles_module.BS_ROLES.get(tx['account__role']),
+            role=tx['account__role'],
+            code=tx['account__code'],
+            name=tx['account__name'],
+            balance_type=tx['account__balance_type'],
+            tx_type=k[5],
+            balance=sum(a['balance'] for a in gl),
+        )
+
+    @staticmethod
+    def get_bucket_balance(tx: dict, by_period: bool = False) -> AccountBalance:
+        return AccountBalance(
+            account_uuid=tx['account__uuid'],
+            unit_uuid=tx.get('journal_entry__entity_unit__uuid'),
+            unit_name=tx.get('journal_entry__entity_unit__name'),
+            activity=tx.get('journal_entry__activity'),
+            period_year=tx['dt_idx'].year if by_period else None,
+            period_month=tx['dt_idx'].month if by_period else None,
+            role_bs=roles_module.BS_ROLES.get(tx['account__role']),
+            role=tx['account__role'],
+            code=tx['account__code'],
+            name=tx['account__name'],
+            balance_type=tx['account__balance_type'],
+            tx_type=tx.get('tx_type'),
+            balance=tx['balance'],
+        )
 
-    # todo: make this method return a Digest class...
     def digest(self,
                user_model: UserModel,
                accounts: Optional[Union[Set[str], List[str]]] = None,
@@ -367,14 +778,65 @@ class IOMixIn:
                by_activity: bool = False,
                by_tx_type: bool = False,
                cash_flow_statement: bool = False,
-               digest_name: str = None
+               digest_name: str = None,
+               use_cache: Optional[bool] = None,
+               sql_digest: Optional[bool] = None,
+               stream: Optional[bool] = None
                ) -> dict or tuple:
+        """
+        Digest of the transactions of the IO model. Returns a tuple of the transactions and the digest results.
+
+        When the digest is cached, the transactions are returned as a list instead of a QuerySet, on cache misses and
+        hits alike, and as None when streamed. Each call returns a new list.
+        """
 
         activity = validate_activity(activity)
         if role:
             role = roles_module.validate_roles(role)
         from_date, to_date = validate_dates(from_date, to_date)
 
+        if use_cache is None:
+            use_cache = is_digest_cache_enabled()
+        elif use_cache and not is_digest_cache_enabled():
+            # cached digests are only invalidated while the cache is enabled...
+            raise IOError(message=_('Digest cache is not enabled. Set DJANGO_LEDGER_DIGEST_CACHE_ENABLED to True.'))
+
+        if stream is None:
+            stream = DJANGO_LEDGER_DIGEST_STREAM
+
+        # a custom queryset cannot be part of the cache key...
+        cache_key = None
+        if use_cache and queryset is None:
+            cache_key = get_digest_cache_key(
+                entity_uuid=self.get_digest_entity_uuid(),
+                io_model=self,
+                user_model=user_model,
+                accounts=sorted(accounts, key=str) if accounts else accounts,
+                role=sorted(role) if role else role,
+                activity=activity,
+                entity_slug=entity_slug,
+                unit_slug=unit_slug,
+                signs=signs,
+                to_date=to_date,
+                from_date=from_date,
+                process_roles=process_roles,
+                process_groups=process_groups,
+                process_ratios=process_ratios,
+                process_activity=process_activity,
+                equity_only=equity_only,
+                by_period=by_period,
+                by_unit=by_unit,
+                by_activity=by_activity,
+                by_tx_type=by_tx_type,
+                cash_flow_statement=cash_flow_statement,
+                digest_name=digest_name
+            )
+            cached_digest = get_cached_digest(cache_key)
+            if cached_digest is not None:
+                # callers get their own list, cache backends that do not pickle values share the cached one...
+                cached_txs, digest_results = cached_digest
+                return list(cached_txs) if cached_txs is not None else None, digest_results
+
         txs_qs, accounts_digest = self.python_digest(
             queryset=queryset,
             user_model=user_model,
@@ -390,19 +852,73 @@ class IOMixIn:
             by_period=by_period,
             by_unit=by_unit,
             by_activity=by_activity,
-            by_tx_type=by_tx_type
+            by_tx_type=by_tx_type,
+            sql_digest=sql_digest,
+            stream=stream
+        )
+
+        io_digest = self.process_digest(
+            accounts_digest=accounts_digest,
+            from_date=from_date,
+            to_date=to_date,
+            by_period=by_period,
+            by_unit=by_unit,
+            process_roles=process_roles,
+            process_groups=process_groups,
+            process_ratios=process_ratios,
+            process_activity=process_activity,
+            cash_flow_statement=cash_flow_statement
         )
 
-        io_digest = defaultdict(lambda: dict())
+        if not digest_name:
+            digest_name = 'tx_digest'
+
+        digest_results = dict()
+        digest_results[digest_name] = io_digest
+
+        if cache_key:
+            # cached and uncached results have the same layout, streamed rows are not retained...
+            txs_qs = list(txs_qs) if not stream else None
+            set_cached_digest(cache_key, (list(txs_qs) if txs_qs is not None else None, digest_results))
+
+        return txs_qs, digest_results
+
+    @staticmethod
+    def process_digest(accounts_digest: list,
+                       from_date: date = None,
+                       to_date: date = None,
+                       by_period: bool = False,
+                       by_unit: bool = False,
+                       process_roles: bool = False,
+                       process_groups: bool = False,
+                       process_ratios: bool = False,
+                       process_activity: bool = False,
+                       cash_flow_statement: bool = False) -> IODigest:
+        """
+        Builds the IODigest of the digest accounts, processing roles, groups, ratios, activity and cash flow statement
+        as requested.
+        """
+        io_digest = IODigest()
         io_digest['accounts'] = accounts_digest
         io_digest['from_date'] = from_date
         io_digest['to_date'] = to_date
 
+        # roles, groups & activity balances are accumulated in a single sweep over the digest accounts...
+        aggregator = DigestAggregator(
+            accounts=accounts_digest,
+            by_period=by_period,
+            by_unit=by_unit,
+            process_roles=process_roles,
+            process_groups=process_groups,
+            process_activity=process_activity
+        )
+
         if process_roles:
             roles_mgr = RoleManager(
                 tx_digest=io_digest,
                 by_period=by_period,
-                by_unit=by_unit
+                by_unit=by_unit,
+                aggregator=aggregator
             )
 
             # todo: change digest() name to something else?...
@@ -412,7 +928,8 @@ class IOMixIn:
             group_mgr = GroupManager(
                 io_digest=io_digest,
                 by_period=by_period,
-                by_unit=by_unit
+                by_unit=by_unit,
+                aggregator=aggregator
             )
             io_digest = group_mgr.digest()
 
@@ -421,19 +938,152 @@ class IOMixIn:
             io_digest = ratio_gen.digest()
 
         if process_activity:
-            activity_manager = ActivityManager(tx_digest=io_digest, by_unit=by_unit, by_period=by_period)
+            activity_manager = ActivityManager(tx_digest=io_digest,
+                                               by_unit=by_unit,
+                                               by_period=by_period,
+                                               aggregator=aggregator)
             activity_manager.digest()
 
         if cash_flow_statement:
             cfs = CashFlowStatement(io_digest=io_digest)
             io_digest = cfs.digest()
 
-        if not digest_name:
-            digest_name = 'tx_digest'
+        return io_digest
+
+    def digest_periods(self,
+                       user_model: UserModel,
+                       periods: List[Tuple[Union[str, date], Union[str, date]]],
+                       accounts: Optional[Union[Set[str], List[str]]] = None,
+                       role: Optional[Union[Set[str], List[str]]] = None,
+                       activity: str = None,
+                       entity_slug: str = None,
+                       unit_slug: str = None,
+                       signs: bool = True,
+                       process_roles: bool = False,
+                       process_groups: bool = False,
+                       process_ratios: bool = False,
+                       process_activity: bool = False,
+                       by_unit: bool = False,
+                       by_activity: bool = False,
+                       by_tx_type: bool = False,
+                       cash_flow_statement: bool = False,
+                       cumulative: bool = True) -> dict:
+        """
+        Digests several periods at once with a single database query, for comparative financial statements.
+        Each transaction is placed into the date segment it belongs to and the segments are added up into the balances
+        of each period. Periods may overlap or leave gaps between them.
+
+        Parameters
+        ----------
+        periods: list
+            A list of (from_date, to_date) tuples. Both dates are inclusive. A from_date of None includes all
+            transactions up to to_date.
+        cumulative: bool
+            Also produce the balance sheet view of each period, made of all transactions up to the period to_date.
+
+        Returns
+        -------
+        dict
+            A dictionary with the IODigest of each period under 'periods' and, if cumulative, the IODigest with all
+            transactions up to the end of each period under 'cumulative'. Both lists follow the order of periods.
+        """
+        if not periods:
+            raise IOError(message=_('At least one period must be provided.'))
 
-        digest_results = dict()
-        digest_results[digest_name] = io_digest
-        return txs_qs, digest_results
+        activity = validate_activity(activity)
+        if role:
+            role = roles_module.validate_roles(role)
+
+        periods = [validate_dates(from_date=fd, to_date=td) for fd, td in periods]
+        for fd, td in periods:
+            if fd and fd > td:
+                raise IOError(message=_('Invalid period %s - %s. From date must be before to date.') % (fd, td))
+
+        # segment boundaries, every period starts & ends on a boundary...
+        segments = sorted(set([fd for fd, _td in periods if fd] + [td + timedelta(days=1) for _fd, td in periods]))
+        segment_idx = {dt: k for k, dt in enumerate(segments)}
+
+        from_date = None
+        if not cumulative and all(fd for fd, _td in periods):
+            from_date = min(fd for fd, _td in periods)
+
+        txs_rows = self.database_digest(
+            user_model=user_model,
+            queryset=None,
+            from_date=from_date,
+            to_date=max(td for _fd, td in periods),
+            activity=activity,
+            role=role,
+            entity_slug=entity_slug,
+            unit_slug=unit_slug,
+            accounts=accounts,
+            by_unit=by_unit,
+            by_activity=by_activity,
+            by_tx_type=by_tx_type,
+            signed=True,
+            segments=segments
+        )
+
+        # account buckets balances by segment...
+        bucket_rows = dict()
+        segment_balances = defaultdict(dict)
+        for tx in txs_rows:
+            k = tuple(tx[f] for f in tx if f not in ('balance', 'segment_idx'))
+            bucket_rows.setdefault(k, tx)
+            segment_balances[tx['segment_idx']][k] = tx['balance']
+
+        def get_accounts_digest(from_idx: int, to_idx: int) -> list:
+            balances = dict()
+            for idx in range(from_idx, to_idx + 1):
+                for k, bal in segment_balances.get(idx, {}).items():
+                    balances[k] = balances.get(k, 0) + bal
+            accounts_digest = [
+                self.get_bucket_balance(dict(bucket_rows[k], balance=bal)) for k, bal in balances.items()
+            ]
+            if signs:
+                self.sign_balances(accounts_digest)
+            return accounts_digest
+
+        process_kwargs = {
+            'by_unit': by_unit,
+            'process_roles': process_roles,
+            'process_groups': process_groups,
+            'process_ratios': process_ratios,
+            'process_activity': process_activity,
+            'cash_flow_statement': cash_flow_statement
+        }
+
+        digest_results = {
+            'periods': [
+                self.process_digest(
+                    accounts_digest=get_accounts_digest(segment_idx[fd] + 1 if fd else 0,
+                                                        segment_idx[td + timedelta(days=1)]),
+                    from_date=fd,
+                    to_date=td,
+                    **process_kwargs
+                ) for fd, td in periods
+            ]
+        }
+
+        if cumulative:
+            digest_results['cumulative'] = [
+                self.process_digest(
+                    accounts_digest=get_accounts_digest(0, segment_idx[td + timedelta(days=1)]),
+                    from_date=None,
+                    to_date=td,
+                    **process_kwargs
+                ) for _fd, td in periods
+            ]
+
+        return digest_results
+
+    def get_digest_entity_uuid(self):
+        """
+        The UUID of the EntityModel the digest belongs to. Used to version cached digests.
+        """
+        if isinstance(self, lazy_importer.get_entity_model()):
+            return self.uuid
+        return self.entity_id
 
     def commit_txs(self,
                    je_date: Union[str, datetime, date],
@@ -507,3 +1157,156 @@ class IOMixIn:
 
         je_model.save(verify=True, post_on_verify=je_posted)
         return je_model, txs_models
+
+    def commit_txs_bulk(self, entries: list, je_posted: bool = False):
+        """
+        Creates many JE from a list of entries within a single database transaction. All entries are balanced,
+        verified and posted in memory before anything is written. JE numbers are reserved as one block per
+        EntityModel and fiscal year, and all JEs and all transactions are inserted with one bulk statement each.
+        Since bulk inserts do not send signals, cached digests and materialized period balances are refreshed
+        once at the end. No JE is created if any of the ledgers is locked.
+
+        ENTRIES = List[{
+            'je_date': Date of the JE,
+            'je_txs': TXS list, same as commit_txs,
+            'je_activity': JE activity,
+            'je_posted': Optional, defaults to je_posted,
+            'je_ledger': LedgerModel. Required when called from an EntityModel,
+            'je_desc': Optional JE description,
+            'je_origin': Optional JE origin
+        }]
+
+        :param entries: The list of entries to commit.
+        :param je_posted: Posts the JEs of the entries that do not specify je_posted.
+        :return: A list of (JournalEntryModel, TXS Models) tuples, in the same order as entries.
+        """
+        if not entries:
+            return list()
+
+        EntityModel = lazy_importer.get_entity_model()
+        EntityStateModel = lazy_importer.get_entity_state_model()
+        AccountModel = lazy_importer.get_account_model()
+        JournalEntryModel = lazy_importer.get_journal_entry_model()
+        TransactionModel = lazy_importer.get_txs_model()
+
+        is_entity = isinstance(self, EntityModel)
+
+        account_ids = set(str(tx['account_id']) for entry in entries for tx in entry['je_txs'])
+        account_idx = {
+            str(acc.uuid): acc for acc in AccountModel.objects.filter(uuid__in=account_ids).only('uuid', 'role')
+        }
+        missing_accounts = account_ids.difference(account_idx)
+        if missing_accounts:
+            raise ValidationError(_('Invalid accounts %s') % ', '.join(sorted(missing_accounts)))
+
+        # balancing, verification & posting happen in memory, before any write...
+        je_data = list()
+        for entry in entries:
+            je_txs = entry['je_txs']
+
+            # Validates that credits/debits balance.
+            balance_tx_data(je_txs)
+
+            # Validates that the activity is valid.
+            je_activity = validate_activity(entry.get('je_activity'))
+
+            je_ledger = entry.get('je_ledger')
+            if is_entity and not je_ledger:
+                raise ValidationError(_('Must pass an instance of LedgerModel'))
+            if not je_ledger:
+                je_ledger = self
+
+            je_date = entry.get('je_date')
+            if isinstance(je_date, datetime):
+                je_date = je_date.date() if is_naive(je_date) else localdate(je_date)
+            else:
+                je_date = validate_io_date(je_date)
+
+            je_model = JournalEntryModel(
+                ledger=je_ledger,
+                description=entry.get('je_desc'),
+                date=je_date,
+                origin=entry.get('je_origin'),
+                activity=je_activity
+            )
+
+            txs_models = list()
+            for tx in je_txs:
+                tx_model = TransactionModel(
+                    tx_type=tx['tx_type'],
+                    amount=tx['amount'],
+                    description=tx['description'],
+                    journal_entry=je_model,
+                    stagedtransactionmodel=tx.get('staged_tx_model')
+                )
+                tx_model.account = account_idx[str(tx['account_id'])]
+                txs_models.append(tx_model)
+
+            je_model.verify(txs_qs=txs_models, raise_exception=True)
+            if entry.get('je_posted', je_posted):
+                je_model.mark_as_posted(commit=False, raise_exception=True)
+
+            je_data.append((je_model, txs_models))
+
+        # locked ledgers cannot take new JEs...
+        LedgerModel = lazy_importer.get_ledger_model()
+        ledger_idx = {je_model.ledger_id: je_model.ledger for je_model, txs_models in je_data}
+        locked_ledgers = [ledger_idx[uuid] for uuid in LedgerModel.objects.filter(
+            uuid__in=ledger_idx,
+            locked=True
+        ).values_list('uuid', flat=True)]
+        if locked_ledgers:
+            raise ValidationError(_('Ledgers are locked: %s') % ', '.join(
+                sorted(str(ledger_model.name or ledger_model.uuid) for ledger_model in locked_ledgers)
+            ))
+
+        entity_ids = set(je_model.ledger.entity_id for je_model, txs_models in je_data)
+        entity_idx = {e.uuid: e for e in EntityModel.objects.filter(uuid__in=entity_ids)}
+
+        je_by_fy = defaultdict(list)
+        for je_model, txs_models in je_data:
+            entity_uuid = je_model.ledger.entity_id
+            fy_key = entity_idx[entity_uuid].get_fy_for_date(dt=je_model.date)
+            je_by_fy[(str(entity_uuid), fy_key)].append(je_model)
+
+        with transaction.atomic():
+            # one block of JE numbers per entity & fiscal year. Sorted, so concurrent calls lock rows in same order.
+            for (entity_uuid, fy_key), je_list in sorted(je_by_fy.items()):
+                state_model = EntityStateModel.objects.reserve_block(
+                    entity_id=entity_uuid,
+                    key=EntityStateModel.KEY_JOURNAL_ENTRY,
+                    block_size=len(je_list),
+                    entity_unit_id=None,
+                    fiscal_year=fy_key
+                )
+                seq = state_model.sequence - len(je_list) + 1
+                for i, je_model in enumerate(je_list):
+                    je_model.je_number = je_model.get_je_number(fiscal_year=fy_key, sequence=seq + i)
+
+            JournalEntryModel.objects.bulk_create([je_model for je_model, txs_models in je_data])
+            txs_list = [tx for je_model, txs_models in je_data for tx in txs_models]
+            if DJANGO_LEDGER_DENORMALIZED_TXS:
+                # Journal Entries & Ledgers are already loaded, bulk_create bypasses save()...
+                for tx in txs_list:
+                    tx.update_denormalized_fields()
+            TransactionModel.objects.bulk_create(txs_list)
+
+            if DJANGO_LEDGER_USE_PERIOD_BALANCES:
+                ledger_dates = defaultdict(set)
+                ledger_idx = dict()
+                for je_model, txs_models in je_data:
+                    if je_model.posted:
+                        ledger_dates[je_model.ledger_id].add(je_model.date)
+                        ledger_idx[je_model.ledger_id] = je_model.ledger
+                for ledger_uuid, dates in ledger_dates.items():
+                    ledger_idx[ledger_uuid].update_period_balances(dates=dates)
+
+        if is_digest_cache_enabled():
+            for entity_uuid in entity_ids:
+                bump_digest_version(entity_uuid)
+
+        # bill & invoice ledger snapshots are no longer valid...
+        BillModel = lazy_importer.get_bill_model()
+        BillModel.reset_ledger_state_snapshot(uuid__in=set(je_model.ledger_id for je_model, txs_models in je_data))
+
+        return je_data
@@ -5,12 +5,23 @@ Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
 Contributions to this module:
 Miguel Sanda <msanda@arrobalytics.com>
 """
+import os
+from codecs import getincrementaldecoder
+from datetime import datetime
+from decimal import Decimal
+from itertools import groupby
+from os import PathLike
+from typing import List, Optional, Iterator, Tuple, NamedTuple, Union
+from xml.etree.ElementTree import Element, SubElement
 
-from typing import List
-
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
 from ofxtools import OFXTree
-from ofxtools.models.bank import STMTRS
+from ofxtools.Parser import TreeBuilder
+from ofxtools.models.bank import STMTRS, STMTTRN, BANKACCTFROM
+from ofxtools.models.base import Aggregate
 from ofxtools.models.ofx import OFX
+from ofxtools.models.signon import FI
 
 
 class OFXFileManager:
@@ -47,3 +58,195 @@ class OFXFileManager:
             st for st in self.ofx_data.statements if st.account.acctid == account
         ))
         return acc_statement.banktranlist
+
+
+class OFXTransaction(NamedTuple):
+    trntype: str
+    dtposted: datetime
+    trnamt: Decimal
+    fitid: str
+    name: Optional[str]
+    memo: Optional[str]
+
+
+class OFXFileReader:
+    """
+    Streaming OFX reader. Reads the OFX file in chunks and yields bank statement transactions as soon as they are
+    parsed, so only one transaction is held in memory at a time. Transaction values are converted with the ofxtools
+    STMTTRN validators, so they have the same types as the ones provided by the OFXFileManager, without building a
+    full ofxtools Aggregate for each transaction.
+    Both OFXv1 (SGML) and OFXv2 (XML) files are supported.
+    """
+    CHUNK_SIZE = 64 * 1024
+    TAG_REGEX = TreeBuilder.regex
+
+    ACCOUNT_TAG = 'BANKACCTFROM'
+    TRANSACTION_TAG = 'STMTTRN'
+    FI_TAG = 'FI'
+    CONVERTED_TAGS = (FI_TAG, ACCOUNT_TAG, TRANSACTION_TAG)
+
+    def __init__(self, ofx_file_or_path, chunk_size: Optional[int] = None):
+        self.FILE = ofx_file_or_path
+        self.CHUNK_SIZE = chunk_size or self.CHUNK_SIZE
+        self.FILE_SIZE: Optional[int] = self.get_file_size()
+        self.bytes_read: int = 0
+        self.org: Optional[str] = None
+        self.fid: Optional[str] = None
+
+    def get_file_size(self) -> Optional[int]:
+        if isinstance(self.FILE, (str, PathLike)):
+            return os.path.getsize(self.FILE)
+        return getattr(self.FILE, 'size', None)
+
+    def get_progress(self) -> Optional[float]:
+        """
+        Fraction of the file read so far, if the file size is known.
+        """
+        if self.FILE_SIZE:
+            return min(self.bytes_read / self.FILE_SIZE, 1.0)
+        return None
+
+    @staticmethod
+    def get_codec(header: bytes) -> str:
+        header = header.upper()
+        if header.lstrip().startswith(b'<?XML') or b'ENCODING:UTF-8' in header:
+            return 'utf-8'
+        # OFXv1 USASCII and CHARSET:1252 files...
+        return 'cp1252'
+
+    def read_chunks(self) -> Iterator[str]:
+        close_file = False
+        ofx_file = self.FILE
+        if isinstance(ofx_file, (str, PathLike)):
+            ofx_file = open(ofx_file, 'rb')
+            close_file = True
+        elif hasattr(ofx_file, 'seek'):
+            ofx_file.seek(0)
+
+        try:
+            decoder = None
+            while True:
+                chunk = ofx_file.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.bytes_read += len(chunk)
+                if decoder is None:
+                    decoder = getincrementaldecoder(self.get_codec(chunk))(errors='replace')
+                yield decoder.decode(chunk)
+            if decoder is not None:
+                yield decoder.decode(b'', final=True)
+        finally:
+            if close_file:
+                ofx_file.close()
+
+    def read_tags(self) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Yields a (tag, text) tuple for every OFX tag. Closing tags are prefixed with "/".
+        Only complete tags are matched, the text after the last "<" of each chunk is kept for the next one.
+        """
+        buffer = ''
+        for data in self.read_chunks():
+            buffer += data
+            cut = buffer.rfind('<')
+            if cut <= 0:
+                continue
+            for match in self.TAG_REGEX.finditer(buffer, 0, cut):
+                yield from self.get_match_tags(match)
+            buffer = buffer[cut:]
+        for match in self.TAG_REGEX.finditer(buffer):
+            yield from self.get_match_tags(match)
+
+    @staticmethod
+    def get_match_tags(match) -> Iterator[Tuple[str, Optional[str]]]:
+        groupdict = match.groupdict()
+        text = groupdict['cdata'] or (groupdict['text'] or '').strip() or None
+        yield groupdict['tag'], text
+        if groupdict['closetag'] and not text:
+            yield '/' + groupdict['tag'], None
+
+    def iter_elements(self) -> Iterator[Union[Aggregate, OFXTransaction]]:
+        """
+        Yields the converted FI, BANKACCTFROM and STMTTRN aggregates in file order, as soon as they are closed.
+        """
+        stack = list()
+        element = None
+        element_depth = None
+
+        for tag, text in self.read_tags():
+            if tag.startswith('/'):
+                tag = tag[1:]
+                # data elements may have an optional closing tag...
+                if tag not in stack:
+                    continue
+                while stack:
+                    depth = len(stack)
+                    closed = stack.pop()
+                    if element is not None and depth == element_depth:
+                        yield self.convert(element)
+                        element = None
+                        element_depth = None
+                    if closed == tag:
+                        break
+            elif text is not None:
+                if element is not None:
+                    SubElement(self.get_parent(element, len(stack) - element_depth), tag).text = text
+            else:
+                stack.append(tag)
+                if element is None:
+                    if tag in self.CONVERTED_TAGS:
+                        element = Element(tag)
+                        element_depth = len(stack)
+                else:
+                    SubElement(self.get_parent(element, len(stack) - element_depth - 1), tag)
+
+    def convert(self, element: Element) -> Union[Aggregate, OFXTransaction]:
+        if element.tag == self.TRANSACTION_TAG:
+            try:
+                return OFXTransaction(**{
+                    f: STMTTRN.__dict__[f].convert(element.findtext(f.upper())) for f in OFXTransaction._fields
+                })
+            except (ValueError, ArithmeticError) as e:
+                raise ValidationError(_('Invalid OFX transaction %(fitid)s: %(error)s'),
+                                      params={'fitid': element.findtext('FITID'), 'error': e})
+        return Aggregate.from_etree(element)
+
+    @staticmethod
+    def get_parent(element: Element, depth: int) -> Element:
+        # aggregates are always appended last, the parent at a given depth is the last child...
+        for _ in range(depth):
+            element = element[-1]
+        return element
+
+    def iter_transactions(self) -> Iterator[Tuple[int, dict, Optional[OFXTransaction]]]:
+        """
+        Yields a (statement index, account, transaction) tuple for every bank statement transaction.
+        A tuple with no transaction is yielded when each statement account is read. Account dictionaries have the
+        same keys as the OFXFileManager get_accounts().
+        """
+        statement_idx = -1
+        account = None
+        for aggregate in self.iter_elements():
+            if isinstance(aggregate, FI):
+                self.org = aggregate.org
+                self.fid = aggregate.fid
+            elif isinstance(aggregate, BANKACCTFROM):
+                statement_idx += 1
+                account = {
+                    'bank': self.org,
+                    'fid': self.fid,
+                    'account_type': aggregate.accttype,
+                    'account_number': aggregate.acctid,
+                    'routing_number': aggregate.bankid,
+                }
+                yield statement_idx, account, None
+            elif isinstance(aggregate, OFXTransaction) and account is not None:
+                yield statement_idx, account, aggregate
+
+    def iter_statements(self) -> Iterator[Tuple[dict, Iterator[OFXTransaction]]]:
+        """
+        Yields an (account, transactions) tuple for every bank statement. Transactions are read lazily and must be
+        consumed before moving to the next statement.
+        """
+        for _, statement_txs in groupby(self.iter_transactions(), key=lambda t: t[0]):
+            _, account, _ = next(statement_txs)
+            yield account, (tx for _, _, tx in statement_txs)
@@ -0,0 +1,36 @@
+"""
+Django Ledger created by Miguel Sanda <msanda@arrobalytics.com>.
+Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
+
+Contributions to this module:
+Miguel Sanda <msanda@arrobalytics.com>
+"""
+from django.core.management.base import BaseCommand
+
+from django_ledger.models.entity import EntityModel
+from django_ledger.models.transactions import TransactionModel
+
+
+class Command(BaseCommand):
+    help = 'Copies the entity, ledger, unit, date and posted state of each journal entry into its transactions. ' \
+           'Must be run once after enabling DJANGO_LEDGER_DENORMALIZED_TXS on an existing database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('entity_slugs',
+                            nargs='*',
+                            help='EntityModel slugs to update. Defaults to all entities.')
+
+    def handle(self, *args, **options):
+        entity_qs = EntityModel.objects.all()
+        if options['entity_slugs']:
+            entity_qs = entity_qs.filter(slug__in=options['entity_slugs'])
+
+        total = 0
+        for entity_model in entity_qs.only('uuid', 'slug'):
+            updated = TransactionModel.objects.filter(
+                journal_entry__ledger__entity_id=entity_model.uuid
+            ).update_denormalized()
+            total += updated
+            self.stdout.write(f'{entity_model.slug}: {updated} transactions.')
+
+        self.stdout.write(self.style.SUCCESS(f'Denormalized {total} transactions.'))
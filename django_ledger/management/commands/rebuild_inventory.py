@@ -0,0 +1,48 @@
+"""
+Django Ledger created by Miguel Sanda <msanda@arrobalytics.com>.
+Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
+
+Contributions to this module:
+Miguel Sanda <msanda@arrobalytics.com>
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from django_ledger.models.entity import EntityModel
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the recorded inventory of each inventory item from the history of received and invoiced items. ' \
+           'With --verify, only reports the items whose recorded inventory does not match history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('entity_slugs',
+                            nargs='*',
+                            help='EntityModel slugs to rebuild. Defaults to all entities.')
+        parser.add_argument('--verify',
+                            action='store_true',
+                            help='Reports mismatches without updating the recorded inventory.')
+
+    def handle(self, *args, **options):
+        verify = options['verify']
+        entity_qs = EntityModel.objects.all().select_related('admin')
+        if options['entity_slugs']:
+            entity_qs = entity_qs.filter(slug__in=options['entity_slugs'])
+
+        mismatches = 0
+        for entity_model in entity_qs:
+            adj, _, _ = entity_model.update_inventory(user_model=entity_model.admin, commit=not verify)
+            for (item_uuid, item_name, uom_name), i in adj.items():
+                if i['count_diff'] or i['value_diff']:
+                    mismatches += 1
+                    self.stdout.write(
+                        f'{entity_model.slug} | {item_name} ({item_uuid}): '
+                        f'recorded {i["recorded"]} {uom_name or ""} / {i["recorded_value"]}, '
+                        f'history {i["counted"]} {uom_name or ""} / {i["counted_value"]}'
+                    )
+
+        if verify:
+            if mismatches:
+                raise CommandError(f'{mismatches} inventory items do not match history.')
+            self.stdout.write(self.style.SUCCESS('Recorded inventory matches history.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt inventory. {mismatches} inventory items updated.'))
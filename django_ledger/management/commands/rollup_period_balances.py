@@ -0,0 +1,38 @@
+"""
+Django Ledger created by Miguel Sanda <msanda@arrobalytics.com>.
+Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
+
+Contributions to this module:
+Miguel Sanda <msanda@arrobalytics.com>
+"""
+from django.core.management.base import BaseCommand
+
+from django_ledger.models.balances import AccountPeriodBalanceModel
+from django_ledger.models.entity import EntityModel
+
+
+class Command(BaseCommand):
+    help = 'Rolls up the closed periods of each entity into the materialized period balances read by digests when ' \
+           'DJANGO_LEDGER_USE_PERIOD_BALANCES is enabled. Periods already rolled up are not aggregated again.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('entity_slugs',
+                            nargs='*',
+                            help='EntityModel slugs to roll up. Defaults to all entities.')
+        parser.add_argument('--rebuild',
+                            action='store_true',
+                            help='Discards all materialized period balances and rolls up all closed periods again.')
+
+    def handle(self, *args, **options):
+        entity_qs = EntityModel.objects.all()
+        if options['entity_slugs']:
+            entity_qs = entity_qs.filter(slug__in=options['entity_slugs'])
+
+        for entity_model in entity_qs.only('uuid', 'slug', 'period_balances_date'):
+            if options['rebuild']:
+                rollup_date = AccountPeriodBalanceModel.objects.rebuild(entity_model=entity_model)
+            else:
+                rollup_date = AccountPeriodBalanceModel.objects.rollup(entity_model=entity_model)
+            self.stdout.write(f'{entity_model.slug}: rolled up to {rollup_date}.')
+
+        self.stdout.write(self.style.SUCCESS('Period balances rolled up.'))
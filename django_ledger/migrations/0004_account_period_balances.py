@@ -0,0 +1,50 @@
+# Generated by Django 4.1.3 on 2026-10-18 18:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_ledger', '0003_alter_accountmodel_role'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entitymodel',
+            name='period_balances_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Period Balances Rolled Up To'),
+        ),
+        migrations.CreateModel(
+            name='AccountPeriodBalanceModel',
+            fields=[
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('period', models.DateField(editable=False, verbose_name='Period')),
+                ('activity', models.CharField(blank=True, editable=False, max_length=20, null=True, verbose_name='Activity')),
+                ('tx_type', models.CharField(choices=[('credit', 'Credit'), ('debit', 'Debit')], editable=False, max_length=10, verbose_name='Tx Type')),
+                ('balance', models.DecimalField(decimal_places=2, editable=False, max_digits=20, verbose_name='Balance')),
+                ('account', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='django_ledger.accountmodel', verbose_name='Account')),
+                ('entity', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='django_ledger.entitymodel', verbose_name='Entity')),
+                ('entity_unit', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='django_ledger.entityunitmodel', verbose_name='Entity Unit')),
+            ],
+            options={
+                'verbose_name': 'Account Period Balance',
+                'verbose_name_plural': 'Account Period Balances',
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='accountperiodbalancemodel',
+            index=models.Index(fields=['entity', 'period'], name='django_ledg_entity__d20a8f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accountperiodbalancemodel',
+            index=models.Index(fields=['entity', 'account', 'period'], name='django_ledg_entity__c88150_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accountperiodbalancemodel',
+            index=models.Index(fields=['entity_unit'], name='django_ledg_entity__ece4ba_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.3 on 2026-10-18 19:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_ledger', '0004_account_period_balances'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billmodel',
+            name='ledger_state',
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name='Ledger State'),
+        ),
+        migrations.AddField(
+            model_name='invoicemodel',
+            name='ledger_state',
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name='Ledger State'),
+        ),
+    ]
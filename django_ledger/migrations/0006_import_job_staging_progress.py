@@ -0,0 +1,23 @@
+# Generated by Django 4.1.3 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_ledger', '0005_ledger_state_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjobmodel',
+            name='staging',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Staging Transactions'),
+        ),
+        migrations.AddField(
+            model_name='importjobmodel',
+            name='txs_staged',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Transactions Staged'),
+        ),
+    ]
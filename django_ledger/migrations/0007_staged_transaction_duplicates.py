@@ -0,0 +1,31 @@
+# Generated by Django 4.1.3 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_ledger', '0006_import_job_staging_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjobmodel',
+            name='txs_duplicate',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Duplicate Transactions Skipped'),
+        ),
+        migrations.AddField(
+            model_name='stagedtransactionmodel',
+            name='tx_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='Normalized Transaction Hash'),
+        ),
+        migrations.AddIndex(
+            model_name='stagedtransactionmodel',
+            index=models.Index(fields=['fitid'], name='django_ledg_fitid_18b8ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stagedtransactionmodel',
+            index=models.Index(fields=['tx_hash'], name='django_ledg_tx_hash_650922_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.1.3 on 2026-10-18 20:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_ledger', '0007_staged_transaction_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionmodel',
+            name='entity',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='django_ledger.entitymodel', verbose_name='Entity'),
+        ),
+        migrations.AddField(
+            model_name='transactionmodel',
+            name='entity_unit',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='django_ledger.entityunitmodel', verbose_name='Entity Unit'),
+        ),
+        migrations.AddField(
+            model_name='transactionmodel',
+            name='je_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Journal Entry Date'),
+        ),
+        migrations.AddField(
+            model_name='transactionmodel',
+            name='ledger',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='django_ledger.ledgermodel', verbose_name='Ledger'),
+        ),
+        migrations.AddField(
+            model_name='transactionmodel',
+            name='posted',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Posted'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionmodel',
+            index=models.Index(fields=['entity', 'posted', 'je_date', 'account', 'tx_type', 'amount'], name='django_ledg_entity__e17c3b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionmodel',
+            index=models.Index(fields=['ledger', 'posted', 'je_date', 'account', 'tx_type', 'amount'], name='django_ledg_ledger__251d00_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionmodel',
+            index=models.Index(fields=['entity_unit', 'posted', 'je_date', 'account', 'tx_type', 'amount'], name='django_ledg_entity__36fa73_idx'),
+        ),
+    ]
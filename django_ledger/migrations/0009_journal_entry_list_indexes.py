@@ -0,0 +1,21 @@
+# Generated by Django 4.1.3 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_ledger', '0008_transaction_denormalized_digest'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journalentrymodel',
+            index=models.Index(fields=['ledger', 'date', 'uuid'], name='django_ledg_ledger__6b018a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentrymodel',
+            index=models.Index(fields=['ledger', 'je_number', 'uuid'], name='django_ledg_ledger__a73cb2_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.3 on 2026-10-18 21:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_ledger', '0009_journal_entry_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stagedtransactionmodel',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='django_ledger.stagedtransactionmodel', verbose_name='Possible Duplicate Of'),
+        ),
+    ]
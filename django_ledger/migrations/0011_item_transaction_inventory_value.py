@@ -0,0 +1,18 @@
+# Generated by Django 4.1.3 on 2026-10-18 21:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_ledger', '0010_staged_transaction_duplicate_of'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemtransactionmodel',
+            name='inventory_value',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, help_text='On-hand inventory value relieved when the invoice was approved, at the moving average cost.', max_digits=20, null=True, verbose_name='Inventory Value Relieved'),
+        ),
+    ]
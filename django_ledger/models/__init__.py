@@ -15,3 +15,4 @@ from django_ledger.models.estimate import *
 from django_ledger.models.vendor import *
 from django_ledger.models.unit import *
 from django_ledger.models.purchase_order import *
+from django_ledger.models.balances import *
@@ -0,0 +1,161 @@
+"""
+Django Ledger created by Miguel Sanda <msanda@arrobalytics.com>.
+Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
+
+Contributions to this module:
+Miguel Sanda <msanda@arrobalytics.com>
+
+Entity authorization layer. Managers filter by entity UUID instead of joining the entity admin and managers tables on
+every query.
+
+By default, the UUIDs come from an inline subquery on the EntityModel table, so no additional query is issued. When
+DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ENABLED is True, the EntityModels of each user are resolved once, the first time they
+are needed, and shared across requests and processes through the cache backend. Every change to an EntityModel or
+EntityManagementModel bumps a cached access version and resolved entities are only reused while the version has not
+changed. Within a request, resolved entities are also kept on the user instance.
+"""
+from time import time_ns
+from typing import Dict, Optional
+from uuid import UUID
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+
+from django_ledger.models.utils import lazy_loader
+from django_ledger.settings import (DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ENABLED,
+                                    DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ALIAS,
+                                    DJANGO_LEDGER_ENTITY_ACCESS_CACHE_TIMEOUT)
+
+ENTITY_ACCESS_CACHE_KEY_PREFIX = 'djl_entity_access'
+ENTITY_ACCESS_VERSION_KEY = f'{ENTITY_ACCESS_CACHE_KEY_PREFIX}:version'
+ENTITY_ACCESS_USER_ATTR = '_djl_entity_access'
+
+
+def is_entity_access_cache_enabled() -> bool:
+    return DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ENABLED
+
+
+def get_entity_access_cache():
+    return caches[DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ALIAS]
+
+
+def get_entity_access_version():
+    cache = get_entity_access_cache()
+    version = cache.get(ENTITY_ACCESS_VERSION_KEY)
+    if version is None:
+        cache.add(ENTITY_ACCESS_VERSION_KEY, time_ns(), timeout=None)
+        version = cache.get(ENTITY_ACCESS_VERSION_KEY)
+    return version
+
+
+def bump_entity_access_version():
+    if is_entity_access_cache_enabled():
+        cache = get_entity_access_cache()
+        try:
+            cache.incr(ENTITY_ACCESS_VERSION_KEY)
+        except ValueError:
+            cache.add(ENTITY_ACCESS_VERSION_KEY, time_ns(), timeout=None)
+
+
+def invalidate_entity_access():
+    """
+    Invalidates the resolved entities of all users. The version is bumped again once the current transaction commits,
+    so entities resolved by other requests before the commit are not reused.
+    """
+    bump_entity_access_version()
+    transaction.on_commit(bump_entity_access_version)
+
+
+def user_entities_queryset(user_model):
+    EntityModel = lazy_loader.get_entity_model()
+    return EntityModel.objects.filter(
+        Q(admin=user_model) |
+        Q(managers__in=[user_model])
+    )
+
+
+def resolve_user_entities(user_model) -> Dict[str, UUID]:
+    return dict(user_entities_queryset(user_model).values_list('slug', 'uuid'))
+
+
+def get_user_entities(user_model) -> Dict[str, UUID]:
+    """
+    The EntityModels the user can access, as administrator or manager. Resolved with one query, unless the cache is
+    enabled and the entities of the user are cached for the current access version.
+
+    @param user_model: The Django User Model making the request.
+    @return: A dictionary of EntityModel slug -> EntityModel UUID.
+    """
+    if not user_model or not getattr(user_model, 'is_authenticated', False) or user_model.pk is None:
+        return dict()
+
+    if not is_entity_access_cache_enabled():
+        return resolve_user_entities(user_model)
+
+    version = get_entity_access_version()
+    resolved = getattr(user_model, ENTITY_ACCESS_USER_ATTR, None)
+    if resolved and resolved[0] == version:
+        return resolved[1]
+
+    cache = get_entity_access_cache()
+    cache_key = f'{ENTITY_ACCESS_CACHE_KEY_PREFIX}:{version}:{user_model.pk}'
+    entities = cache.get(cache_key)
+    if entities is None:
+        entities = resolve_user_entities(user_model)
+        cache.set(cache_key, entities, timeout=DJANGO_LEDGER_ENTITY_ACCESS_CACHE_TIMEOUT)
+
+    setattr(user_model, ENTITY_ACCESS_USER_ATTR, (version, entities))
+    return entities
+
+
+def get_user_entity_uuid(user_model, entity_slug) -> Optional[UUID]:
+    """
+    The UUID of the EntityModel if the user can access it, otherwise None.
+
+    @param user_model: The Django User Model making the request.
+    @param entity_slug: The EntityModel slug, or the EntityModel instance.
+    """
+    entities = get_user_entities(user_model)
+    if isinstance(entity_slug, lazy_loader.get_entity_model()):
+        return entity_slug.uuid if entity_slug.uuid in entities.values() else None
+    entity_uuid = entities.get(entity_slug)
+    if entity_uuid is None and isinstance(entity_slug, str):
+        # slugs are matched case insensitively by some managers...
+        entity_slug = entity_slug.casefold()
+        entity_uuid = next((v for k, v in entities.items() if k.casefold() == entity_slug), None)
+    return entity_uuid
+
+
+def entity_access_q(user_model, entity_field: str = 'entity', entity_slug=None) -> Q:
+    """
+    Filters a QuerySet by the EntityModels the user can access, without joining the entity admin and managers.
+
+    @param user_model: The Django User Model making the request.
+    @param entity_field: The lookup of the EntityModel foreign key, e.g. 'ledger__entity'.
+    @param entity_slug: Optional EntityModel slug or instance. Only that entity is allowed, if the user can access it.
+    @return: A Q object.
+    """
+    if not user_model or not getattr(user_model, 'is_authenticated', False) or user_model.pk is None:
+        return Q(**{f'{entity_field}__in': []})
+
+    if not is_entity_access_cache_enabled():
+        # the UUIDs are selected by an inline subquery...
+        entity_qs = user_entities_queryset(user_model)
+        if entity_slug is not None:
+            if isinstance(entity_slug, lazy_loader.get_entity_model()):
+                entity_qs = entity_qs.filter(uuid__exact=entity_slug.uuid)
+            else:
+                entity_qs = entity_qs.filter(slug__iexact=entity_slug)
+        return Q(**{f'{entity_field}__in': entity_qs.values('uuid')})
+
+    if entity_slug is None:
+        entity_uuids = list(get_user_entities(user_model).values())
+    else:
+        entity_uuid = get_user_entity_uuid(user_model, entity_slug)
+        entity_uuids = [entity_uuid] if entity_uuid else []
+    return Q(**{f'{entity_field}__in': entity_uuids})
+
+
+def entitymodel_access(**kwargs):
+    invalidate_entity_access()
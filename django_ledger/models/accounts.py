@@ -10,13 +10,17 @@ from typing import Union
 from uuid import uuid4
 
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction, IntegrityError
+from django.db.models.signals import post_save, post_delete
 from django.utils.translation import gettext_lazy as _
+from treebeard.exceptions import PathOverflow
 from treebeard.mp_tree import MP_Node, MP_NodeManager, MP_NodeQuerySet
 
+from django_ledger.io.digest_cache import is_digest_cache_enabled, bump_digest_version
 from django_ledger.io.roles import ACCOUNT_ROLES, BS_ROLES, GROUP_INVOICE, GROUP_BILL, validate_roles
 from django_ledger.models import lazy_loader
+from django_ledger.models.access import entity_access_q
+from django_ledger.models.coa import ChartOfAccountModel
 from django_ledger.models.mixins import CreateUpdateMixIn
 
 DEBIT = 'debit'
@@ -72,6 +76,39 @@ class AccountModelManager(MP_NodeManager):
         """
         return AccountModelQuerySet(self.model).order_by('path')
 
+    def bulk_add_roots(self, account_list: list, retries: int = 3) -> list:
+        """
+        Adds many AccountModels as root nodes with a single INSERT. The materialized paths are computed in memory,
+        right after the last existing root node and in the order of the list, instead of running the add_root queries
+        for every account. The last root node is locked while the paths are computed. If a concurrent insert takes
+        the same paths anyway, the paths are computed again after the new last root node.
+
+        @param account_list: The unsaved AccountModels.
+        @param retries: Number of times the INSERT is attempted when the paths are already taken.
+        @return: The list of created AccountModels.
+        """
+        if not account_list:
+            return list()
+
+        for attempt in range(1, retries + 1):
+            try:
+                with transaction.atomic():
+                    last_root = self.get_queryset().filter(
+                        depth=1
+                    ).select_for_update().order_by('-path').first()
+                    last_pos = last_root._get_lastpos_in_path() if last_root else 0
+                    for pos, account_model in enumerate(account_list, start=last_pos + 1):
+                        account_model.clean()
+                        account_model.path = self.model._get_path(None, 1, pos)
+                        if len(account_model.path) > self.model.steplen:
+                            raise PathOverflow(_('No more root accounts can be added.'))
+                        account_model.depth = 1
+                        account_model.numchild = 0
+                    return self.bulk_create(account_list)
+            except IntegrityError:
+                if attempt == retries:
+                    raise
+
     def for_entity(self, user_model, entity_slug, coa_slug: str = None):
         """
         The first level filter takes the entity slug or EntityModel and the user model
@@ -87,11 +124,7 @@ class AccountModelManager(MP_NodeManager):
         if isinstance(entity_slug, EntityModel):
             entity_slug = entity_slug.slug
         qs = qs.filter(
-            Q(coa__entity__slug__exact=entity_slug) &
-            (
-                    Q(coa__entity__admin=user_model) |
-                    Q(coa__entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='coa__entity', entity_slug=entity_slug)
         ).order_by('code')
         if coa_slug:
             qs = qs.filter(coa__slug__iexact=coa_slug)
@@ -227,7 +260,8 @@ class AccountModelAbstract(MP_Node, CreateUpdateMixIn):
                             verbose_name=_('Chart of Accounts'))
     on_coa = AccountModelManager.from_queryset(queryset_class=AccountModelQuerySet)()
 
-    node_order_by = ['uuid']
+    # accounts are root nodes only. Without node_order_by new accounts are appended after the last root,
+    # so existing paths never need to be shifted...
 
     class Meta:
         abstract = True
@@ -277,3 +311,19 @@ class AccountModel(AccountModelAbstract):
     """
     Base Account Model from Account Model Abstract Class
     """
+
+
+def accountmodel_digest_version(instance: AccountModel, **kwargs):
+    # account codes, names & roles are part of the cached digests...
+    if is_digest_cache_enabled():
+        if AccountModel.coa.is_cached(instance):
+            entity_uuid = instance.coa.entity_id
+        else:
+            entity_uuid = ChartOfAccountModel.objects.filter(
+                uuid__exact=instance.coa_id
+            ).values_list('entity_id', flat=True).first()
+        bump_digest_version(entity_uuid)
+
+
+post_save.connect(receiver=accountmodel_digest_version, sender=AccountModel)
+post_delete.connect(receiver=accountmodel_digest_version, sender=AccountModel)
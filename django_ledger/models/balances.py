@@ -0,0 +1,237 @@
+"""
+Django Ledger created by Miguel Sanda <msanda@arrobalytics.com>.
+Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
+
+Contributions to this module:
+Miguel Sanda <msanda@arrobalytics.com>
+
+The AccountPeriodBalanceModel keeps a materialized, pre-aggregated copy of all posted transactions of an EntityModel
+grouped by Account, Entity Unit, month and activity. Only closed months are rolled up, by the rollup_period_balances
+management command, which is meant to be scheduled (e.g. once a month). Digests never write period balances. The
+EntityModel period_balances_date marks the first month that has not been rolled up yet. Any transaction on or after
+that date is considered part of the open period and is always read directly from the TransactionModel table.
+
+Whenever a JournalEntryModel that belongs to a rolled up month gets posted, unposted, deleted or its transactions are
+saved or deleted, the affected months are re-aggregated, so the materialized balances always match the transactions
+they summarize.
+"""
+from datetime import date
+from typing import Iterable, Optional, Set
+from uuid import uuid4
+
+from django.db import models, transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.timezone import localdate
+from django.utils.translation import gettext_lazy as _
+
+from django_ledger.io.io_mixin import get_period_start, get_next_period_start
+from django_ledger.models.access import entity_access_q
+from django_ledger.models.utils import lazy_loader
+
+
+class AccountPeriodBalanceModelQuerySet(models.QuerySet):
+
+    def for_periods(self, from_period: Optional[date] = None, to_period: Optional[date] = None):
+        """
+        Filters balances for periods greater or equal than from_period and strictly less than to_period.
+        """
+        qs = self
+        if from_period:
+            qs = qs.filter(period__gte=from_period)
+        if to_period:
+            qs = qs.filter(period__lt=to_period)
+        return qs
+
+    def for_accounts(self, account_list):
+        if len(account_list) > 0 and isinstance(account_list[0], str):
+            return self.filter(account__code__in=account_list)
+        return self.filter(account__in=account_list)
+
+    def for_roles(self, role_list):
+        return self.filter(account__role__in=role_list)
+
+    def for_activity(self, activity_list):
+        return self.filter(activity__in=activity_list)
+
+
+class AccountPeriodBalanceModelManager(models.Manager):
+
+    def get_queryset(self):
+        return AccountPeriodBalanceModelQuerySet(self.model, using=self._db)
+
+    def for_entity(self, entity_model, user_model):
+        return self.get_queryset().filter(
+            Q(entity_id=entity_model.uuid) &
+            entity_access_q(user_model=user_model, entity_field='entity')
+        )
+
+    @staticmethod
+    def aggregate_transactions(entity_model, from_date: Optional[date] = None, to_date: Optional[date] = None):
+        """
+        Aggregates all posted transactions of the EntityModel between from_date (inclusive) and to_date (exclusive)
+        into period balances.
+        """
+        TransactionModel = lazy_loader.get_txs_model()
+        txs_qs = TransactionModel.objects.filter(
+            journal_entry__ledger__entity_id=entity_model.uuid,
+            amount__gt=0
+        ).posted()
+
+        if from_date:
+            txs_qs = txs_qs.filter(journal_entry__date__gte=from_date)
+        if to_date:
+            txs_qs = txs_qs.filter(journal_entry__date__lt=to_date)
+
+        return txs_qs.annotate(
+            period=TruncMonth('journal_entry__date')
+        ).values(
+            'account_id',
+            'journal_entry__entity_unit_id',
+            'journal_entry__activity',
+            'tx_type',
+            'period'
+        ).annotate(
+            balance=Sum('amount')
+        ).order_by()
+
+    def build_periods(self, entity_model, from_date: Optional[date] = None, to_date: Optional[date] = None):
+        """
+        Replaces all materialized balances of the EntityModel between from_date (inclusive) and to_date (exclusive)
+        with a fresh aggregate of the underlying transactions.
+        """
+        bal_qs = self.get_queryset().filter(entity_id=entity_model.uuid).for_periods(
+            from_period=from_date,
+            to_period=to_date
+        )
+        bal_qs.delete()
+        balance_models = [
+            self.model(
+                entity_id=entity_model.uuid,
+                account_id=b['account_id'],
+                entity_unit_id=b['journal_entry__entity_unit_id'],
+                activity=b['journal_entry__activity'],
+                tx_type=b['tx_type'],
+                period=b['period'],
+                balance=b['balance']
+            ) for b in self.aggregate_transactions(entity_model, from_date=from_date, to_date=to_date)
+        ]
+        return self.bulk_create(balance_models)
+
+    def rollup(self, entity_model, to_date: Optional[date] = None) -> date:
+        """
+        Rolls up all closed periods of the EntityModel up to the period of to_date (exclusive). Defaults to the
+        current period. Periods already rolled up are not aggregated again.
+
+        Returns
+        -------
+        date
+            The new EntityModel period_balances_date.
+        """
+        if not to_date:
+            to_date = localdate()
+        to_period = get_period_start(to_date)
+        from_period = entity_model.period_balances_date
+
+        if from_period and from_period >= to_period:
+            return from_period
+
+        with transaction.atomic():
+            self.build_periods(entity_model, from_date=from_period, to_date=to_period)
+            EntityModel = lazy_loader.get_entity_model()
+            EntityModel.objects.filter(uuid__exact=entity_model.uuid).update(period_balances_date=to_period)
+        entity_model.period_balances_date = to_period
+        return to_period
+
+    def refresh(self, entity_model, dates: Iterable[date]) -> Set[date]:
+        """
+        Re-aggregates the rolled up periods associated with the given dates. Dates that fall into the open period are
+        ignored, since those transactions are never materialized.
+
+        Returns
+        -------
+        set
+            The periods that were re-aggregated.
+        """
+        rollup_date = entity_model.period_balances_date
+        if not rollup_date:
+            return set()
+        periods = set(get_period_start(dt) for dt in dates if dt and dt < rollup_date)
+        if periods:
+            with transaction.atomic():
+                for period in periods:
+                    self.build_periods(entity_model,
+                                       from_date=period,
+                                       to_date=get_next_period_start(period))
+        return periods
+
+    def rebuild(self, entity_model, to_date: Optional[date] = None) -> date:
+        """
+        Discards all materialized balances of the EntityModel and rolls up all closed periods again.
+        """
+        with transaction.atomic():
+            self.get_queryset().filter(entity_id=entity_model.uuid).delete()
+            entity_model.period_balances_date = None
+            return self.rollup(entity_model, to_date=to_date)
+
+
+class AccountPeriodBalanceModelAbstract(models.Model):
+    """
+    Pre-aggregated balance of all posted transactions of an Account, for a specific Entity Unit, period (month)
+    and activity.
+    """
+    CREDIT = 'credit'
+    DEBIT = 'debit'
+
+    TX_TYPE = [
+        (CREDIT, _('Credit')),
+        (DEBIT, _('Debit'))
+    ]
+
+    uuid = models.UUIDField(default=uuid4, editable=False, primary_key=True)
+    entity = models.ForeignKey('django_ledger.EntityModel',
+                               editable=False,
+                               on_delete=models.CASCADE,
+                               verbose_name=_('Entity'))
+    account = models.ForeignKey('django_ledger.AccountModel',
+                                editable=False,
+                                on_delete=models.CASCADE,
+                                verbose_name=_('Account'))
+    entity_unit = models.ForeignKey('django_ledger.EntityUnitModel',
+                                    editable=False,
+                                    on_delete=models.CASCADE,
+                                    blank=True,
+                                    null=True,
+                                    verbose_name=_('Entity Unit'))
+    period = models.DateField(editable=False, verbose_name=_('Period'))
+    activity = models.CharField(max_length=20,
+                                editable=False,
+                                null=True,
+                                blank=True,
+                                verbose_name=_('Activity'))
+    tx_type = models.CharField(max_length=10, choices=TX_TYPE, editable=False, verbose_name=_('Tx Type'))
+    balance = models.DecimalField(decimal_places=2,
+                                  max_digits=20,
+                                  editable=False,
+                                  verbose_name=_('Balance'))
+
+    objects = AccountPeriodBalanceModelManager()
+
+    class Meta:
+        abstract = True
+        verbose_name = _('Account Period Balance')
+        verbose_name_plural = _('Account Period Balances')
+        indexes = [
+            models.Index(fields=['entity', 'period']),
+            models.Index(fields=['entity', 'account', 'period']),
+            models.Index(fields=['entity_unit']),
+        ]
+
+    def __str__(self):
+        return f'{self.__class__.__name__}: {self.account_id} | {self.period} | {self.tx_type}: {self.balance}'
+
+
+class AccountPeriodBalanceModel(AccountPeriodBalanceModelAbstract):
+    """
+    Account Period Balance Model Base Class From Abstract
+    """
@@ -11,11 +11,11 @@ from uuid import uuid4
 
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
 
 from django_ledger.models import CreateUpdateMixIn, BankAccountInfoMixIn
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.utils import lazy_loader
 
 
@@ -39,11 +39,7 @@ class BankAccountModelManager(models.Manager):
         """
         qs = self.get_queryset()
         return qs.filter(
-            Q(entity_model__slug__exact=entity_slug) &
-            (
-                    Q(entity_model__admin=user_model) |
-                    Q(entity_model__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='entity_model', entity_slug=entity_slug)
         )
 
 
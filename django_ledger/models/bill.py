@@ -30,14 +30,17 @@ from django.db.models import Q, Sum, F
 from django.db.models.signals import post_delete
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.timezone import localdate
 from django.utils.translation import gettext_lazy as _
 
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.entity import EntityModel
 from django_ledger.models.items import ItemTransactionModelQuerySet
 from django_ledger.models.mixins import CreateUpdateMixIn, LedgerWrapperMixIn, MarkdownNotesMixIn, PaymentTermsMixIn
 from django_ledger.models.utils import lazy_loader
-from django_ledger.settings import (DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_BILL_NUMBER_PREFIX)
+from django_ledger.settings import (DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_BILL_NUMBER_PREFIX,
+                                    DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS)
 
 
 class BillModelQuerySet(models.QuerySet):
@@ -156,6 +159,133 @@ class BillModelQuerySet(models.QuerySet):
         """
         return self.filter(bill_status__exact=BillModel.BILL_STATUS_APPROVED)
 
+    def bulk_mark_as_approved(self,
+                              user_model,
+                              date_approved: Optional[date] = None,
+                              force_migrate: bool = False) -> list:
+        """
+        Marks all BillModels in the QuerySet as Approved. Equivalent to calling mark_as_approved(commit=True) on each
+        BillModel, but item data is fetched with one query and all resulting Journal Entries and Transactions are
+        inserted in bulk, in a single atomic block. No changes are made if any BillModel cannot be approved, or its
+        state cannot be migrated because its ledger is locked. The ValidationError lists all the rejected BillModels.
+
+        Parameters
+        __________
+
+        user_model
+            UserModel associated with request.
+
+        date_approved: date
+            BillModel approved date. Defaults to localdate().
+
+        force_migrate: bool
+            Forces migration. True if Accounting Method is Accrual.
+
+        Returns
+        _______
+        list
+            The list of approved BillModels.
+        """
+        # distinct models only, for_entity() may yield duplicate rows...
+        bill_list = list({m.uuid: m for m in self.select_related('ledger__entity',
+                                                                 'cash_account',
+                                                                 'prepaid_account',
+                                                                 'unearned_account')}.values())
+        rejected = list()
+        for bill_model in bill_list:
+            try:
+                bill_model.mark_as_approved(user_model=user_model, date_approved=date_approved, commit=False)
+                # approved models always post their ledger...
+                if not bill_model.can_migrate():
+                    raise ValidationError(_('Bill %s ledger is locked.') % bill_model.bill_number)
+            except ValidationError as e:
+                rejected.append(_('Bill %s: %s') % (bill_model.bill_number, ' '.join(e.messages)))
+        if rejected:
+            raise ValidationError(rejected)
+
+        for bill_model in bill_list:
+            if bill_model.can_generate_bill_number():
+                bill_model.generate_bill_number(commit=False)
+
+        now = timezone.now()
+        for bill_model in bill_list:
+            bill_model.updated = now
+
+        LedgerModel = lazy_loader.get_ledger_model()
+        with transaction.atomic():
+            BillModel.objects.bulk_update(bill_list, fields=[
+                'bill_number',
+                'bill_status',
+                'date_approved',
+                'date_due',
+                'updated'
+            ])
+            BillModel.bulk_migrate_state(
+                wrapper_list=[b for b in bill_list if force_migrate or b.accrue],
+                je_date=date_approved
+            )
+            LedgerModel.objects.bulk_post(ledger_list=[b.ledger for b in bill_list])
+        return bill_list
+
+    def bulk_mark_as_paid(self, user_model, date_paid: Optional[date] = None) -> list:
+        """
+        Marks all BillModels in the QuerySet as Paid. Equivalent to calling mark_as_paid(commit=True) on each
+        BillModel, but item data is fetched with one query and all resulting Journal Entries and Transactions are
+        inserted in bulk, in a single atomic block. No changes are made if any BillModel cannot be paid, or its state
+        cannot be migrated because its ledger is locked. The ValidationError lists all the rejected BillModels.
+
+        Parameters
+        __________
+
+        user_model
+            UserModel associated with request.
+
+        date_paid: date
+            BillModel paid date. Defaults to localdate() if None.
+
+        Returns
+        _______
+        list
+            The list of paid BillModels.
+        """
+        # distinct models only, for_entity() may yield duplicate rows...
+        bill_list = list({m.uuid: m for m in self.select_related('ledger__entity',
+                                                                 'cash_account',
+                                                                 'prepaid_account',
+                                                                 'unearned_account')}.values())
+        rejected = list()
+        for bill_model in bill_list:
+            try:
+                if bill_model.is_approved() and not bill_model.can_migrate():
+                    raise ValidationError(_('Bill %s state migration not allowed.') % bill_model.bill_number)
+                bill_model.mark_as_paid(user_model=user_model, date_paid=date_paid, commit=False)
+            except ValidationError as e:
+                rejected.append(_('Bill %s: %s') % (bill_model.bill_number, ' '.join(e.messages)))
+        if rejected:
+            raise ValidationError(rejected)
+
+        now = timezone.now()
+        for bill_model in bill_list:
+            bill_model.updated = now
+
+        ItemTransactionModel = lazy_loader.get_item_transaction_model()
+        LedgerModel = lazy_loader.get_ledger_model()
+        with transaction.atomic():
+            BillModel.objects.bulk_update(bill_list, fields=[
+                'date_paid',
+                'progress',
+                'amount_paid',
+                'bill_status',
+                'updated'
+            ])
+            ItemTransactionModel.objects.filter(
+                bill_model__in=bill_list,
+                po_model_id__isnull=False
+            ).update_po_item_status(po_item_status=ItemTransactionModel.STATUS_ORDERED)
+            BillModel.bulk_migrate_state(wrapper_list=bill_list, je_date=date_paid)
+            LedgerModel.objects.bulk_lock(ledger_list=[b.ledger for b in bill_list])
+        return bill_list
+
 
 class BillModelManager(models.Manager):
     """
@@ -187,10 +317,7 @@ class BillModelManager(models.Manager):
             Returns a BillModelQuerySet with applied filters.
         """
         qs = self.get_queryset()
-        return qs.filter(
-            Q(ledger__entity__admin=user_model) |
-            Q(ledger__entity__managers__in=[user_model])
-        )
+        return qs.filter(entity_access_q(user_model=user_model, entity_field='ledger__entity'))
 
     def for_entity(self, entity_slug, user_model) -> BillModelQuerySet:
         """
@@ -216,20 +343,9 @@ class BillModelManager(models.Manager):
             Returns a BillModelQuerySet with applied filters.
         """
         qs = self.get_queryset()
-        if isinstance(entity_slug, EntityModel):
-            return qs.filter(
-                Q(ledger__entity=entity_slug) & (
-                        Q(ledger__entity__admin=user_model) |
-                        Q(ledger__entity__managers__in=[user_model])
-                )
-            )
-        elif isinstance(entity_slug, str):
-            return qs.filter(
-                Q(ledger__entity__slug__exact=entity_slug) & (
-                        Q(ledger__entity__admin=user_model) |
-                        Q(ledger__entity__managers__in=[user_model])
-                )
-            )
+        return qs.filter(
+            entity_access_q(user_model=user_model, entity_field='ledger__entity', entity_slug=entity_slug)
+        )
 
 
 class BillModelAbstract(LedgerWrapperMixIn,
@@ -309,6 +425,7 @@ class BillModelAbstract(LedgerWrapperMixIn,
     REL_NAME_PREFIX = 'bill'
     IS_DEBIT_BALANCE = False
     ALLOW_MIGRATE = True
+    ITEM_TXS_RELATED_FIELD = 'bill_model'
 
     BILL_STATUS_DRAFT = 'draft'
     BILL_STATUS_REVIEW = 'in_review'
@@ -531,9 +648,29 @@ class BillModelAbstract(LedgerWrapperMixIn,
         else:
             self.validate_item_transaction_qs(queryset)
 
-        return queryset.order_by('item_model__expense_account__uuid',
+        return self.values_migration_data(queryset)
+
+    @staticmethod
+    def values_migration_data(queryset: ItemTransactionModelQuerySet,
+                              *extra_fields) -> ItemTransactionModelQuerySet:
+        """
+        Aggregates the item transaction data by account and entity unit, as needed to perform a migration into the
+        LedgerModel.
+
+        Parameters
+        ----------
+        queryset: ItemTransactionModelQuerySet
+            The ItemTransactionModelQuerySet to aggregate.
+
+        extra_fields:
+            Additional fields to group by, placed first in the ordering. E.g. 'bill_model_id' to aggregate the items of
+            many BillModels with a single query.
+        """
+        return queryset.order_by(*extra_fields,
+                                 'item_model__expense_account__uuid',
                                  'entity_unit__uuid',
                                  'item_model__expense_account__balance_type').values(
+            *extra_fields,
             'item_model__expense_account__uuid',
             'item_model__inventory_account__uuid',
             'item_model__expense_account__balance_type',
@@ -1199,7 +1336,7 @@ class BillModelAbstract(LedgerWrapperMixIn,
             ItemTransactionModel = lazy_loader.get_item_transaction_model()
             itemtxs_qs.filter(
                 po_model_id__isnull=False
-            ).update(po_item_status=ItemTransactionModel.STATUS_ORDERED)
+            ).update_po_item_status(po_item_status=ItemTransactionModel.STATUS_ORDERED)
 
             if not entity_slug:
                 entity_slug = self.ledger.entity.slug
@@ -1577,6 +1714,11 @@ class BillModelAbstract(LedgerWrapperMixIn,
         fy_key = entity_model.get_fy_for_date(dt=self.date_draft)
 
         try:
+            if not DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS:
+                return EntityStateModel.objects.get_next_from_block(entity_id=self.ledger.entity_id,
+                                                                    key=EntityStateModel.KEY_BILL,
+                                                                    fiscal_year=fy_key)
+
             LOOKUP = {
                 'entity_id__exact': self.ledger.entity_id,
                 'entity_unit_id__exact': None,
@@ -26,9 +26,10 @@ from uuid import uuid4
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
-from django.db.models import Manager, Q
+from django.db.models import Manager
 from django.utils.translation import gettext_lazy as _
 
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.mixins import CreateUpdateMixIn, SlugNameMixIn
 
 UserModel = get_user_model()
@@ -90,11 +91,7 @@ class ChartOfAccountModelManager(Manager):
     def for_entity(self, entity_slug: str, user_model):
         qs = self.get_queryset()
         return qs.filter(
-            Q(entity__slug__iexact=entity_slug) &
-            (
-                    Q(entity__admin=user_model) |
-                    Q(entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='entity', entity_slug=entity_slug)
         )
 
 
@@ -14,9 +14,11 @@ from django.db import models, transaction, IntegrityError
 from django.db.models import Q, F
 from django.utils.translation import gettext_lazy as _
 
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.mixins import ContactInfoMixIn, CreateUpdateMixIn, TaxCollectionMixIn
 from django_ledger.models.utils import lazy_loader
-from django_ledger.settings import DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_CUSTOMER_NUMBER_PREFIX
+from django_ledger.settings import (DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_CUSTOMER_NUMBER_PREFIX,
+                                    DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS)
 
 """
 The model for managing the details of the Customers.
@@ -42,10 +44,7 @@ class CustomerModelManager(models.Manager):
         return qs.filter(
             Q(entity__slug__exact=entity_slug) &
             Q(active=True) &
-            (
-                    Q(entity__admin=user_model) |
-                    Q(entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='entity')
         )
 
 
@@ -118,6 +117,10 @@ class CustomerModelAbstract(ContactInfoMixIn, TaxCollectionMixIn, CreateUpdateMi
         EntityStateModel = lazy_loader.get_entity_state_model()
 
         try:
+            if not DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS:
+                return EntityStateModel.objects.get_next_from_block(entity_id=self.entity_id,
+                                                                    key=EntityStateModel.KEY_CUSTOMER)
+
             LOOKUP = {
                 'entity_id__exact': self.entity_id,
                 'key__exact': EntityStateModel.KEY_CUSTOMER
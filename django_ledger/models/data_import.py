@@ -6,13 +6,20 @@ Contributions to this module:
 Miguel Sanda <msanda@arrobalytics.com>
 """
 
+from datetime import date
+from decimal import Decimal
+from hashlib import sha256
+from typing import Iterable, Optional
 from uuid import uuid4
 
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Q, Count
 from django.utils.translation import gettext_lazy as _
 
+from django_ledger.io.categorize import PayeeAccountIndex, normalize_payee
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.mixins import CreateUpdateMixIn
+from django_ledger.settings import DJANGO_LEDGER_IMPORT_BATCH_SIZE
 
 
 class ImportJobModelManager(models.Manager):
@@ -20,11 +27,7 @@ class ImportJobModelManager(models.Manager):
     def for_entity(self, entity_slug: str, user_model):
         qs = self.get_queryset()
         return qs.filter(
-            Q(ledger__entity__slug__exact=entity_slug) &
-            (
-                    Q(ledger__entity__admin=user_model) |
-                    Q(ledger__entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='ledger__entity', entity_slug=entity_slug)
         )
 
 
@@ -37,6 +40,11 @@ class ImportJobModelAbstract(CreateUpdateMixIn):
                                on_delete=models.CASCADE,
                                verbose_name=_('Ledger'))
     completed = models.BooleanField(default=False, verbose_name=_('Import Job Completed'))
+    staging = models.BooleanField(default=False, editable=False, verbose_name=_('Staging Transactions'))
+    txs_staged = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Transactions Staged'))
+    txs_duplicate = models.PositiveIntegerField(default=0,
+                                                editable=False,
+                                                verbose_name=_('Duplicate Transactions Skipped'))
 
     objects = ImportJobModelManager()
 
@@ -48,19 +56,209 @@ class ImportJobModelAbstract(CreateUpdateMixIn):
         ]
 
     def status(self):
+        if self.staging:
+            return _('Staging... %s transactions') % self.txs_staged
         return 'In progress..'
 
+    def stage_transactions(self, txs: Iterable, batch_size: Optional[int] = None) -> int:
+        """
+        Stages the OFX transactions of a bank statement, inserting batch_size StagedTransactionModels at a time.
+        Transactions are consumed lazily. The number of staged transactions is saved after each batch, so the
+        progress of large files can be followed while the import is running.
+
+        Transactions already staged for the same ledger are skipped, so overlapping files can be imported again.
+        See :func:`exclude_duplicates <django_ledger.models.data_import.ImportJobModelAbstract.exclude_duplicates>`.
+
+        A failed import is rolled back: the transactions staged by this call are deleted, the counters are restored
+        and the exception is raised again, so the file can be imported again once fixed. The staging flag is always
+        reset.
+
+        Parameters
+        ----------
+        txs: Iterable
+            The OFX statement transactions. See OFXFileReader.iter_statements().
+        batch_size: int
+            Number of StagedTransactionModels per bulk insert. Defaults to DJANGO_LEDGER_IMPORT_BATCH_SIZE.
+
+        Returns
+        -------
+        int
+            The number of transactions staged by the import job.
+        """
+        batch_size = batch_size or DJANGO_LEDGER_IMPORT_BATCH_SIZE
+        self.staging = True
+        self.save(update_fields=['staging', 'updated'])
+
+        txs_staged, txs_duplicate = self.txs_staged, self.txs_duplicate
+        staged_batches = list()
+        date_posted_field = StagedTransactionModel._meta.get_field('date_posted')
+        try:
+            staged_txs = list()
+            for tx in txs:
+                date_posted = date_posted_field.to_python(tx.dtposted)
+                staged_tx = StagedTransactionModel(
+                    date_posted=date_posted,
+                    fitid=tx.fitid,
+                    tx_hash=StagedTransactionModel.get_tx_hash(
+                        account=self.ledger_id,
+                        date_posted=date_posted,
+                        amount=tx.trnamt,
+                        payee=tx.name or tx.memo
+                    ),
+                    amount=tx.trnamt,
+                    import_job=self,
+                    name=tx.name,
+                    memo=tx.memo
+                )
+                staged_tx.clean()
+                staged_txs.append(staged_tx)
+                if len(staged_txs) >= batch_size:
+                    staged_batches.append(self.bulk_create_staged_txs(staged_txs))
+                    staged_txs = list()
+
+            if staged_txs:
+                staged_batches.append(self.bulk_create_staged_txs(staged_txs))
+        except Exception:
+            # batches are committed as they are staged, so they are removed one at a time...
+            with transaction.atomic():
+                for new_txs in staged_batches:
+                    StagedTransactionModel.objects.filter(uuid__in=[stx.uuid for stx in new_txs]).delete()
+            self.txs_staged, self.txs_duplicate = txs_staged, txs_duplicate
+            raise
+        finally:
+            self.staging = False
+            self.save(update_fields=['staging', 'txs_staged', 'txs_duplicate', 'updated'])
+        return self.txs_staged
+
+    def exclude_duplicates(self, staged_txs: list) -> list:
+        """
+        Removes the StagedTransactionModels already staged for the import job ledger, with a single query.
+        A transaction is a duplicate when its FITID has already been staged. Transactions whose normalized
+        (account, date, amount, payee) hash matches a transaction staged by a previous import job are not removed,
+        since different transactions may share the same hash, but are flagged as possible duplicates of it with
+        duplicate_of. Hashes are not compared within the same import job, since a statement may contain identical
+        transactions.
+
+        Parameters
+        ----------
+        staged_txs: list
+            The list of StagedTransactionModels to be inserted.
+
+        Returns
+        -------
+        list
+            The list of StagedTransactionModels that are not duplicates.
+        """
+        existing_qs = StagedTransactionModel.objects.filter(
+            Q(import_job__ledger_id__exact=self.ledger_id) &
+            (
+                    Q(fitid__in=[stx.fitid for stx in staged_txs]) |
+                    (
+                            Q(tx_hash__in=[stx.tx_hash for stx in staged_txs]) &
+                            ~Q(import_job_id__exact=self.uuid)
+                    )
+            )
+        ).values_list('uuid', 'fitid', 'tx_hash', 'import_job_id')
+
+        existing_fitids = set()
+        existing_hashes = dict()
+        for uuid, fitid, tx_hash, import_job_id in existing_qs:
+            existing_fitids.add(fitid)
+            if import_job_id != self.uuid:
+                existing_hashes.setdefault(tx_hash, uuid)
+
+        new_txs = list()
+        for stx in staged_txs:
+            if stx.fitid in existing_fitids:
+                continue
+            stx.duplicate_of_id = existing_hashes.get(stx.tx_hash)
+            # a FITID repeated within the same batch is also a duplicate...
+            existing_fitids.add(stx.fitid)
+            new_txs.append(stx)
+        return new_txs
+
+    def bulk_create_staged_txs(self, staged_txs: list) -> list:
+        new_txs = self.exclude_duplicates(staged_txs)
+        with transaction.atomic():
+            StagedTransactionModel.objects.bulk_create(new_txs)
+            self.txs_staged += len(new_txs)
+            self.txs_duplicate += len(staged_txs) - len(new_txs)
+            self.save(update_fields=['txs_staged', 'txs_duplicate', 'updated'])
+        return new_txs
+
+    def get_payee_account_index(self) -> PayeeAccountIndex:
+        """
+        Builds the payee index from the transactions already imported into the entity, with a single query.
+        Only accounts that are still active and unlocked are learned.
+
+        Returns
+        -------
+        PayeeAccountIndex
+            The compiled payee -> earnings account index.
+        """
+        learned_qs = StagedTransactionModel.objects.filter(
+            import_job__ledger__entity_id__exact=self.ledger.entity_id,
+            tx__isnull=False,
+            earnings_account__isnull=False,
+            earnings_account__active=True,
+            earnings_account__locked=False
+        ).values('name', 'memo', 'earnings_account_id').annotate(
+            tx_count=Count('uuid')
+        ).order_by()
+        return PayeeAccountIndex().learn(
+            (stx['name'] or stx['memo'], stx['earnings_account_id'], stx['tx_count']) for stx in learned_qs
+        )
+
+    def auto_categorize(self, exclude_accounts: Optional[Iterable] = None) -> int:
+        """
+        Pre-fills the earnings account of the import job transactions pending import, based on the accounts
+        previously used for the same payees. Transactions that already have an earnings account are not changed.
+        Payees are matched in memory and the transactions are updated with one query per account.
+
+        Parameters
+        ----------
+        exclude_accounts: Iterable
+            AccountModel UUIDs never to be assigned, e.g. the cash account of the bank statement.
+
+        Returns
+        -------
+        int
+            The number of transactions categorized.
+        """
+        index = self.get_payee_account_index()
+        if not len(index):
+            return 0
+
+        exclude_accounts = set(exclude_accounts or [])
+        pending_qs = StagedTransactionModel.objects.filter(
+            import_job_id__exact=self.uuid,
+            tx__isnull=True,
+            earnings_account__isnull=True
+        )
+
+        # groups the matched transactions by account, so each account is assigned with a single update...
+        account_txs = dict()
+        for stx_uuid, name, memo in pending_qs.values_list('uuid', 'name', 'memo'):
+            account_id = index.match(name or memo)
+            if account_id and account_id not in exclude_accounts:
+                account_txs.setdefault(account_id, list()).append(stx_uuid)
+
+        batch_size = DJANGO_LEDGER_IMPORT_BATCH_SIZE
+        with transaction.atomic():
+            for account_id, stx_uuids in account_txs.items():
+                for i in range(0, len(stx_uuids), batch_size):
+                    pending_qs.filter(
+                        uuid__in=stx_uuids[i:i + batch_size]
+                    ).update(earnings_account_id=account_id)
+        return sum(len(stx_uuids) for stx_uuids in account_txs.values())
+
 
 class StagedTransactionModelManager(models.Manager):
 
     def for_job(self, entity_slug: str, user_model, job_pk):
         qs = self.get_queryset()
         return qs.filter(
-            Q(import_job__ledger__entity__slug__exact=entity_slug) &
-            (
-                    Q(import_job__ledger__entity__admin=user_model) |
-                    Q(import_job__ledger__entity__managers__in=[user_model])
-            ) &
+            entity_access_q(user_model=user_model, entity_field='import_job__ledger__entity', entity_slug=entity_slug) &
             Q(import_job__uuid__exact=job_pk)
         )
 
@@ -75,6 +273,17 @@ class StagedTransactionModelAbstract(CreateUpdateMixIn):
                                          blank=True)
 
     fitid = models.CharField(max_length=100)
+    tx_hash = models.CharField(max_length=64,
+                               editable=False,
+                               null=True,
+                               blank=True,
+                               verbose_name=_('Normalized Transaction Hash'))
+    duplicate_of = models.ForeignKey('django_ledger.StagedTransactionModel',
+                                     on_delete=models.SET_NULL,
+                                     editable=False,
+                                     null=True,
+                                     blank=True,
+                                     verbose_name=_('Possible Duplicate Of'))
     amount = models.DecimalField(decimal_places=2, max_digits=15)
     date_posted = models.DateField()
 
@@ -92,9 +301,21 @@ class StagedTransactionModelAbstract(CreateUpdateMixIn):
         abstract = True
         verbose_name = _('Staged Transaction Model')
         indexes = [
-            models.Index(fields=['import_job'])
+            models.Index(fields=['import_job']),
+            models.Index(fields=['fitid']),
+            models.Index(fields=['tx_hash']),
         ]
 
+    @staticmethod
+    def get_tx_hash(account, date_posted: date, amount, payee: Optional[str]) -> str:
+        """
+        SHA-256 of the normalized (account, date, amount, payee) of a bank transaction. Payee whitespace and case
+        are ignored. Used to detect transactions imported again under a different FITID.
+        """
+        payee = normalize_payee(payee)
+        amount = round(Decimal(amount), 2)
+        return sha256(f'{account}|{date_posted.isoformat()}|{amount}|{payee}'.encode('utf-8')).hexdigest()
+
 
 class ImportJobModel(ImportJobModelAbstract):
     """
@@ -27,21 +27,27 @@ from datetime import date
 from decimal import Decimal
 from random import choices
 from string import ascii_lowercase, digits
-from typing import Tuple, Union, Optional
+from threading import Lock
+from typing import Tuple, Union, Optional, List, Dict
 from uuid import uuid4
 
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 from treebeard.mp_tree import MP_Node, MP_NodeManager, MP_NodeQuerySet
 
-from django_ledger.io import IOMixIn
+from django_ledger.io import IOMixIn, validate_activity, validate_dates
+from django_ledger.io.io_digest import AccountBalance
+from django_ledger.io.roles import validate_roles
 from django_ledger.io.roles import ASSET_CA_CASH, EQUITY_CAPITAL, EQUITY_COMMON_STOCK, EQUITY_PREFERRED_STOCK
+from django_ledger.models.access import entity_access_q, entitymodel_access
 from django_ledger.models.accounts import AccountModel
 from django_ledger.models.coa import ChartOfAccountModel
 from django_ledger.models.coa_default import CHART_OF_ACCOUNTS
@@ -49,6 +55,8 @@ from django_ledger.models.items import ItemModelQuerySet, ItemTransactionModelQu
 from django_ledger.models.journal_entry import JournalEntryModel
 from django_ledger.models.mixins import CreateUpdateMixIn, SlugNameMixIn, ContactInfoMixIn, LoggingMixIn
 from django_ledger.models.utils import lazy_loader
+from django_ledger.settings import (DJANGO_LEDGER_DOCUMENT_NUMBER_BLOCK_SIZE, DJANGO_LEDGER_PERPETUAL_INVENTORY,
+                                    DJANGO_LEDGER_DENORMALIZED_TXS)
 
 UserModel = get_user_model()
 
@@ -120,10 +128,7 @@ class EntityModelManager(MP_NodeManager):
                 2. Is a manager.
         """
         qs = self.get_queryset()
-        return qs.filter(
-            Q(admin=user_model) |
-            Q(managers__in=[user_model])
-        )
+        return qs.filter(entity_access_q(user_model=user_model, entity_field='uuid'))
 
 
 class EntityReportMixIn:
@@ -355,6 +360,26 @@ class EntityReportMixIn:
         qe = self.get_quarter_end(year, quarter, fy_start_month)
         return qs, qe
 
+    def get_fiscal_quarters_dates(self, year: int, fy_start_month: int = None) -> List[Tuple[date, date]]:
+        """
+        Convenience method to get the start and end dates of all quarters of a fiscal year. Useful to produce
+        comparative financial statements with the digest_periods method.
+
+        Parameters
+        ----------
+        year: int
+            The fiscal year associated with the requested quarters.
+
+        fy_start_month: int
+            Optional fiscal year month start. If passed, it will override the EntityModel setting.
+
+        Returns
+        -------
+        list
+            A list of (start date, end date) tuples, one per quarter, in order.
+        """
+        return [self.get_fiscal_quarter_dates(year, q, fy_start_month) for q in self.VALID_QUARTERS]
+
     def get_fy_for_date(self, dt: date, as_str: bool = False) -> Union[str, int]:
         """
         Given a known date, returns the EntityModel fiscal year associated with the given date.
@@ -436,6 +461,10 @@ class EntityModelAbstract(MP_Node,
     fy_start_month: int
         An integer that specifies the month that the Fiscal Year starts.
 
+    period_balances_date: date
+        The first day of the first period (month) not yet rolled up into the materialized AccountPeriodBalanceModel.
+        All posted transactions before this date are pre-aggregated. If None, no periods have been rolled up.
+
     picture
         The image or logo used to identify the company on reports or UI/UX.
     """
@@ -478,6 +507,10 @@ class EntityModelAbstract(MP_Node,
     accrual_method = models.BooleanField(default=False,
                                          verbose_name=_('Use Accrual Method'))
     fy_start_month = models.IntegerField(choices=FY_MONTHS, default=1, verbose_name=_('Fiscal Year Start'))
+    period_balances_date = models.DateField(null=True,
+                                            blank=True,
+                                            editable=False,
+                                            verbose_name=_('Period Balances Rolled Up To'))
     picture = models.ImageField(blank=True, null=True)
     objects = EntityModelManager.from_queryset(queryset_class=EntityModelQuerySet)()
 
@@ -546,6 +579,37 @@ class EntityModelAbstract(MP_Node,
                 'updated'
             ])
 
+    def counted_inventory(self, user_model) -> Union[ItemTransactionModelQuerySet, List[Dict]]:
+        """
+        Inventory count from the history of received and invoiced ItemTransactionModels. When perpetual inventory is
+        enabled, history is replayed using moving average cost. Otherwise, the count uses the average cost of all
+        inventory received.
+
+        Parameters
+        ----------
+        user_model: UserModel
+            The Django UserModel making the request.
+
+        Returns
+        -------
+        ItemTransactionModelQuerySet or list
+            The counted inventory of each item, formatted "as values".
+            See :func:`ItemTransactionModelManager.inventory_count
+            <django_ledger.models.item.ItemTransactionModelManager.inventory_count>` and
+            :func:`ItemTransactionModelManager.inventory_moving_average
+            <django_ledger.models.item.ItemTransactionModelManager.inventory_moving_average>`.
+        """
+        ItemTransactionModel = lazy_loader.get_item_transaction_model()
+        if DJANGO_LEDGER_PERPETUAL_INVENTORY:
+            return ItemTransactionModel.objects.inventory_moving_average(
+                entity_slug=self.slug,
+                user_model=user_model
+            )
+        return ItemTransactionModel.objects.inventory_count(
+            entity_slug=self.slug,
+            user_model=user_model
+        )
+
     def recorded_inventory(self, user_model,
                            item_qs: Optional[ItemModelQuerySet] = None,
                            as_values: bool = True) -> ItemModelQuerySet:
@@ -682,7 +746,9 @@ class EntityModelAbstract(MP_Node,
                          user_model,
                          commit: bool = False) -> Tuple[defaultdict, ItemTransactionModelQuerySet, ItemModelQuerySet]:
         """
-        Triggers an inventory recount with optional commitment of transaction.
+        Triggers an inventory recount with optional commitment of transaction. When perpetual inventory is enabled,
+        the recount rebuilds the on-hand inventory from history and can be used to verify the incrementally
+        maintained values.
 
         Parameters
         ----------
@@ -700,30 +766,43 @@ class EntityModelAbstract(MP_Node,
                 1. The recounted inventory.
                 2. The recorded inventory on Balance Sheet.
         """
-        ItemTransactionModel = lazy_loader.get_item_transaction_model()
         ItemModel = lazy_loader.get_item_model()
 
-        counted_qs: ItemTransactionModelQuerySet = ItemTransactionModel.objects.inventory_count(
-            entity_slug=self.slug,
-            user_model=user_model
-        )
+        counted_qs = self.counted_inventory(user_model=user_model)
         recorded_qs: ItemModelQuerySet = self.recorded_inventory(user_model=user_model, as_values=False)
-        recorded_qs_values = self.recorded_inventory(
-            user_model=user_model,
-            item_qs=recorded_qs,
-            as_values=True)
+
+        # recorded inventory is fetched once. Values are taken from the fetched models...
+        recorded_map = {item_model.uuid: item_model for item_model in recorded_qs}
+        recorded_qs_values = [
+            {
+                'uuid': item_model.uuid,
+                'name': item_model.name,
+                'uom__name': item_model.uom.name if item_model.uom_id else None,
+                'inventory_received': item_model.inventory_received,
+                'inventory_received_value': item_model.inventory_received_value
+            } for item_model in recorded_map.values()
+        ]
 
         adj = self.inventory_adjustment(counted_qs, recorded_qs_values)
 
+        now = timezone.now()
         updated_items = list()
         for (uuid, name, uom), i in adj.items():
-            item_model: ItemModel = recorded_qs.get(uuid__exact=uuid)
+            item_model: ItemModel = recorded_map.get(uuid)
+            if item_model is None:
+                # counted item no longer recorded as an active inventory item...
+                continue
+            if all([
+                item_model.inventory_received == i['counted'],
+                item_model.inventory_received_value == i['counted_value']
+            ]):
+                continue
             item_model.inventory_received = i['counted']
             item_model.inventory_received_value = i['counted_value']
-            item_model.clean()
+            item_model.updated = now
             updated_items.append(item_model)
 
-        if commit:
+        if commit and updated_items:
             ItemModel.objects.bulk_update(updated_items,
                                           fields=[
                                               'inventory_received',
@@ -792,13 +871,63 @@ class EntityModelAbstract(MP_Node,
                 ) for a in CHART_OF_ACCOUNTS
             ]
 
-            for acc in acc_objs:
-                acc.clean()
-                logger.info(msg=f'Adding Account {acc.code}: {acc.name}...')
-                AccountModel.add_root(instance=acc)
+            logger.info(msg=f'Adding {len(acc_objs)} Accounts to {chart_of_accounts.slug}...')
+            AccountModel.on_coa.bulk_add_roots(account_list=acc_objs)
         else:
             raise ValidationError(_('Entity %s already has existing accounts.Use force=True to bypass this check') % self.name)
 
+    def clone_coa(self,
+                  source_coa: ChartOfAccountModel,
+                  activate_accounts: Optional[bool] = None,
+                  force: bool = False,
+                  chart_of_accounts: Optional[ChartOfAccountModel] = None) -> list:
+        """
+        Copies all the accounts of an existing Chart of Accounts, e.g. the default CoA of a template EntityModel, into
+        a Chart of Accounts of this EntityModel. Accounts are fetched with one query and created with a single INSERT.
+
+        Parameters
+        ----------
+        source_coa: ChartOfAccountModel
+            The Chart of Accounts to copy the accounts from.
+
+        activate_accounts: bool
+            Overrides the active status of the copied accounts. If None, the source account status is kept.
+
+        force: bool
+            Copies the accounts even if the Chart of Accounts already has accounts. Codes must not collide.
+
+        chart_of_accounts: ChartOfAccountModel
+            The Chart of Accounts to copy the accounts into. Defaults to the EntityModel default_coa.
+
+        Returns
+        -------
+        list
+            The list of newly created AccountModels.
+        """
+        if not chart_of_accounts:
+            chart_of_accounts: ChartOfAccountModel = self.default_coa
+
+        coa_has_accounts = chart_of_accounts.accountmodel_set.all().exists()
+        if coa_has_accounts and not force:
+            raise ValidationError(_('Entity %s already has existing accounts.Use force=True to bypass this check') % self.name)
+
+        acc_objs = [
+            AccountModel(
+                code=a.code,
+                name=a.name,
+                role=a.role,
+                balance_type=a.balance_type,
+                active=a.active if activate_accounts is None else activate_accounts,
+                locked=a.locked,
+                coa=chart_of_accounts
+            ) for a in AccountModel.on_coa.filter(
+                coa_id=source_coa.uuid
+            ).only('code', 'name', 'role', 'balance_type', 'active', 'locked')
+        ]
+        logger = self.get_logger()
+        logger.info(msg=f'Copying {len(acc_objs)} Accounts from {source_coa.slug} to {chart_of_accounts.slug}...')
+        return AccountModel.on_coa.bulk_add_roots(account_list=acc_objs)
+
     def get_accounts(self, user_model, active_only: bool = True):
         """
         This func does...
@@ -814,6 +943,130 @@ class EntityModelAbstract(MP_Node,
             accounts_qs = accounts_qs.active()
         return accounts_qs
 
+    def digest_consolidated(self,
+                            user_model,
+                            from_date: Union[str, date] = None,
+                            to_date: Union[str, date] = None,
+                            activity: str = None,
+                            role: Optional[List[str]] = None,
+                            accounts: Optional[List[str]] = None,
+                            signs: bool = True,
+                            process_roles: bool = False,
+                            process_groups: bool = False,
+                            process_ratios: bool = False,
+                            process_activity: bool = False,
+                            cash_flow_statement: bool = False,
+                            by_period: bool = False,
+                            by_activity: bool = False,
+                            by_tx_type: bool = False,
+                            eliminate_accounts: Optional[List[str]] = None) -> dict:
+        """
+        Consolidated digest of this EntityModel and all its descendants in the entity tree. Transactions of the whole
+        subtree are selected by an entity subquery on the materialized path prefix and aggregated in a single grouped
+        query.
+        Since every EntityModel has its own Chart of Accounts, consolidated balances are aggregated by account code.
+
+        Parameters
+        ----------
+        user_model
+            The request UserModel. Only entities managed by the user are included.
+
+        eliminate_accounts: list
+            Optional list of intercompany account codes. Their balances are excluded from the consolidated digest and
+            reported separately as eliminations. Entity digests are not affected.
+
+        Returns
+        -------
+        dict
+            A dictionary with the consolidated IODigest under 'consolidated', the eliminated balances IODigest under
+            'eliminations' and the IODigest of each entity with transactions under 'entities', keyed by EntityModel
+            UUID.
+        """
+        activity = validate_activity(activity)
+        if role:
+            role = validate_roles(role)
+        from_date, to_date = validate_dates(from_date, to_date)
+        eliminate_accounts = set(eliminate_accounts or [])
+
+        # entities of the subtree managed by the user, as a subquery. Joining the entity managers would repeat the
+        # transactions of entities with several managers...
+        entity_qs = self.__class__.objects.for_user(user_model=user_model).filter(
+            path__startswith=self.path
+        ).values('uuid')
+
+        TransactionModel = lazy_loader.get_txs_model()
+        if DJANGO_LEDGER_DENORMALIZED_TXS:
+            txs_qs = TransactionModel.objects.filter(entity_id__in=entity_qs)
+        else:
+            txs_qs = TransactionModel.objects.filter(journal_entry__ledger__entity_id__in=entity_qs)
+
+        txs_rows = self.database_digest(
+            user_model=user_model,
+            queryset=txs_qs,
+            from_date=from_date,
+            to_date=to_date,
+            activity=activity,
+            role=role,
+            accounts=accounts,
+            by_activity=by_activity,
+            by_tx_type=by_tx_type,
+            by_period=by_period,
+            signed=True,
+            by_entity=True
+        )
+
+        entity_names = dict()
+        entity_accounts = defaultdict(list)
+        for tx in txs_rows:
+            entity_uuid = tx['journal_entry__ledger__entity__uuid']
+            entity_names[entity_uuid] = tx['journal_entry__ledger__entity__name']
+            entity_accounts[entity_uuid].append(self.get_bucket_balance(tx, by_period=by_period))
+
+        consolidated_idx = dict()
+        eliminations_idx = dict()
+        for accounts_digest in entity_accounts.values():
+            if signs:
+                self.sign_balances(accounts_digest)
+            for acc in accounts_digest:
+                acc_idx = eliminations_idx if acc['code'] in eliminate_accounts else consolidated_idx
+                k = (acc['code'], acc['role'], acc['balance_type'],
+                     acc['period_year'], acc['period_month'], acc['activity'], acc['tx_type'])
+                if k in acc_idx:
+                    acc_idx[k]['balance'] += acc['balance']
+                else:
+                    # consolidated balances do not belong to a specific account or unit...
+                    acc_idx[k] = AccountBalance(**dict(acc.items(), account_uuid=None, unit_uuid=None, unit_name=None))
+
+        process_kwargs = {
+            'from_date': from_date,
+            'to_date': to_date,
+            'by_period': by_period,
+            'process_roles': process_roles,
+            'process_groups': process_groups,
+            'process_ratios': process_ratios,
+            'process_activity': process_activity,
+            'cash_flow_statement': cash_flow_statement
+        }
+
+        entity_digests = dict()
+        for entity_uuid, accounts_digest in entity_accounts.items():
+            io_digest = self.process_digest(accounts_digest=accounts_digest, **process_kwargs)
+            io_digest['entity_uuid'] = entity_uuid
+            io_digest['entity_name'] = entity_names[entity_uuid]
+            entity_digests[entity_uuid] = io_digest
+
+        return {
+            'consolidated': self.process_digest(
+                accounts_digest=[acc for k, acc in sorted(consolidated_idx.items(), key=lambda i: str(i[0]))],
+                **process_kwargs
+            ),
+            'eliminations': self.process_digest(
+                accounts_digest=[acc for k, acc in sorted(eliminations_idx.items(), key=lambda i: str(i[0]))],
+                **process_kwargs
+            ),
+            'entities': entity_digests
+        }
+
     def add_equity(self,
                    user_model,
                    cash_account: Union[str, AccountModel],
@@ -1126,6 +1379,144 @@ class EntityManagementModelAbstract(CreateUpdateMixIn):
         ]
 
 
+class EntityStateSequencePool:
+    """
+    In-process pool of reserved document sequence numbers. Blocks are keyed by entity, entity unit, fiscal year and
+    EntityStateModel key. Each block holds the next available sequence and the last sequence of the reserved range.
+    """
+
+    def __init__(self):
+        self.LOCK = Lock()
+        self.BLOCKS = dict()
+
+    def take(self, pool_key) -> Optional[int]:
+        with self.LOCK:
+            block = self.BLOCKS.get(pool_key)
+            if not block:
+                return None
+            seq, last = block
+            if seq >= last:
+                del self.BLOCKS[pool_key]
+            else:
+                block[0] = seq + 1
+            return seq
+
+    def put(self, pool_key, first: int, last: int):
+        if first > last:
+            return
+        with self.LOCK:
+            self.BLOCKS[pool_key] = [first, last]
+
+    def clear(self):
+        with self.LOCK:
+            self.BLOCKS.clear()
+
+
+ENTITY_STATE_SEQUENCE_POOL = EntityStateSequencePool()
+
+
+class EntityStateModelManager(models.Manager):
+
+    def reserve_block(self,
+                      entity_id,
+                      key: str,
+                      block_size: int,
+                      entity_unit_id=None,
+                      fiscal_year: Optional[int] = None):
+        """
+        Reserves block_size sequence numbers with a single locked update on the EntityStateModel row. The row is
+        created if it does not exist yet. If a concurrent transaction creates the same row first, the block is
+        reserved from that row instead.
+
+        Returns
+        -------
+        EntityStateModel
+            The updated EntityStateModel. Its sequence is the last sequence number of the reserved block.
+        """
+
+        def update_block():
+            state_model = self.get_queryset().filter(
+                entity_id__exact=entity_id,
+                entity_unit_id__exact=entity_unit_id,
+                fiscal_year=fiscal_year,
+                key__exact=key
+            ).select_for_update().get()
+            state_model.sequence = F('sequence') + block_size
+            state_model.save(update_fields=['sequence'])
+            state_model.refresh_from_db(fields=['sequence'])
+            return state_model
+
+        with transaction.atomic():
+            try:
+                state_model = update_block()
+            except ObjectDoesNotExist:
+                try:
+                    # savepoint, so a failed insert does not abort the outer transaction...
+                    with transaction.atomic():
+                        state_model = self.create(entity_id=entity_id,
+                                                  entity_unit_id=entity_unit_id,
+                                                  fiscal_year=fiscal_year,
+                                                  key=key,
+                                                  sequence=block_size)
+                except IntegrityError:
+                    state_model = update_block()
+        return state_model
+
+    def get_next_from_block(self,
+                            entity_id,
+                            key: str,
+                            entity_unit_id=None,
+                            fiscal_year: Optional[int] = None,
+                            block_size: Optional[int] = None):
+        """
+        Hands out the next sequence number from the in-process pool. When the pool is exhausted, a new block of
+        block_size numbers is reserved with a single locked update on the EntityStateModel row. The remaining numbers
+        of the block become available to the pool only after the current transaction commits, so numbers reserved
+        by a transaction that rolls back are never handed out.
+
+        Parameters
+        ----------
+        entity_id
+            The EntityModel UUID.
+        key: str
+            The EntityStateModel key. E.g. EntityStateModel.KEY_BILL.
+        entity_unit_id
+            Optional EntityUnitModel UUID.
+        fiscal_year: int
+            Optional fiscal year of the sequence.
+        block_size: int
+            Optional number of sequences to reserve. Defaults to DJANGO_LEDGER_DOCUMENT_NUMBER_BLOCK_SIZE.
+
+        Returns
+        -------
+        EntityStateModel
+            An EntityStateModel instance where sequence is the allocated number. Must not be saved.
+        """
+        pool_key = (str(entity_id), str(entity_unit_id) if entity_unit_id else None, fiscal_year, key)
+        seq = ENTITY_STATE_SEQUENCE_POOL.take(pool_key)
+
+        if seq is not None:
+            return self.model(entity_id=entity_id,
+                              entity_unit_id=entity_unit_id,
+                              fiscal_year=fiscal_year,
+                              key=key,
+                              sequence=seq)
+
+        if not block_size:
+            block_size = DJANGO_LEDGER_DOCUMENT_NUMBER_BLOCK_SIZE
+
+        state_model = self.reserve_block(entity_id=entity_id,
+                                         key=key,
+                                         entity_unit_id=entity_unit_id,
+                                         fiscal_year=fiscal_year,
+                                         block_size=block_size)
+        last = state_model.sequence
+        seq = last - block_size + 1
+        transaction.on_commit(lambda: ENTITY_STATE_SEQUENCE_POOL.put(pool_key, first=seq + 1, last=last))
+        state_model.sequence = seq
+        return state_model
+
+
 class EntityStateModelAbstract(models.Model):
     KEY_JOURNAL_ENTRY = 'je'
     KEY_PURCHASE_ORDER = 'po'
@@ -1162,6 +1553,8 @@ class EntityStateModelAbstract(models.Model):
     key = models.CharField(choices=KEY_CHOICES, max_length=10)
     sequence = models.BigIntegerField(default=0, validators=[MinValueValidator(limit_value=0)])
 
+    objects = EntityStateModelManager()
+
     class Meta:
         abstract = True
         indexes = [
@@ -1215,3 +1608,10 @@ class EntityManagementModel(EntityManagementModelAbstract):
     """
     EntityManagement Model Base Class From Abstract
     """
+
+
+post_save.connect(receiver=entitymodel_access, sender=EntityModel)
+post_delete.connect(receiver=entitymodel_access, sender=EntityModel)
+post_save.connect(receiver=entitymodel_access, sender=EntityManagementModel)
+post_delete.connect(receiver=entitymodel_access, sender=EntityManagementModel)
+m2m_changed.connect(receiver=entitymodel_access, sender=EntityModel.managers.through)
@@ -21,9 +21,11 @@ from django.urls import reverse
 from django.utils.timezone import localdate
 from django.utils.translation import gettext_lazy as _
 
+from django_ledger.models.access import entity_access_q
 from django_ledger.models import (CreateUpdateMixIn, EntityModel, MarkdownNotesMixIn,
                                   CustomerModel, lazy_loader)
-from django_ledger.settings import DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_ESTIMATE_NUMBER_PREFIX
+from django_ledger.settings import (DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_ESTIMATE_NUMBER_PREFIX,
+                                    DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS)
 
 ESTIMATE_NUMBER_CHARS = ascii_uppercase + digits
 
@@ -67,20 +69,9 @@ class EstimateModelManager(models.Manager):
 
     def for_entity(self, entity_slug: Union[EntityModel, str], user_model):
         qs = self.get_queryset()
-        if isinstance(entity_slug, EntityModel):
-            return qs.filter(
-                Q(entity=entity_slug) & (
-                        Q(entity__admin=user_model) |
-                        Q(entity__managers__in=[user_model])
-                )
-            )
-        elif isinstance(entity_slug, str):
-            return qs.filter(
-                Q(entity__slug__exact=entity_slug) & (
-                        Q(entity__admin=user_model) |
-                        Q(entity__managers__in=[user_model])
-                )
-            )
+        return qs.filter(
+            entity_access_q(user_model=user_model, entity_field='entity', entity_slug=entity_slug)
+        )
 
 
 class EstimateModelAbstract(CreateUpdateMixIn, MarkdownNotesMixIn):
@@ -652,6 +643,11 @@ class EstimateModelAbstract(CreateUpdateMixIn, MarkdownNotesMixIn):
         entity_model = EntityModel.objects.get(uuid__exact=self.entity_id)
         fy_key = entity_model.get_fy_for_date(dt=self.date_draft)
         try:
+            if not DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS:
+                return EntityStateModel.objects.get_next_from_block(entity_id=self.entity_id,
+                                                                    key=EntityStateModel.KEY_ESTIMATE,
+                                                                    fiscal_year=fy_key)
+
             LOOKUP = {
                 'entity_id__exact': self.entity_id,
                 'entity_unit_id': None,
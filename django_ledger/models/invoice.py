@@ -32,13 +32,16 @@ from django.db.models import Q, Sum, F
 from django.db.models.signals import post_delete
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.timezone import localdate
 from django.utils.translation import gettext_lazy as _
 
 from django_ledger.models import lazy_loader, ItemTransactionModelQuerySet
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.entity import EntityModel
 from django_ledger.models.mixins import CreateUpdateMixIn, LedgerWrapperMixIn, MarkdownNotesMixIn, PaymentTermsMixIn
-from django_ledger.settings import DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_INVOICE_NUMBER_PREFIX
+from django_ledger.settings import (DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_INVOICE_NUMBER_PREFIX,
+                                    DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS, DJANGO_LEDGER_PERPETUAL_INVENTORY)
 
 UserModel = get_user_model()
 
@@ -159,6 +162,145 @@ class InvoiceModelQuerySet(models.QuerySet):
         """
         return self.filter(invoice_status__exact=InvoiceModel.INVOICE_STATUS_APPROVED)
 
+    def bulk_mark_as_approved(self,
+                              user_model,
+                              date_approved: date = None,
+                              force_migrate: bool = False) -> list:
+        """
+        Marks all InvoiceModels in the QuerySet as Approved. Equivalent to calling mark_as_approved(commit=True) on
+        each InvoiceModel, but item data is fetched with one query and all resulting Journal Entries and Transactions
+        are inserted in bulk, in a single atomic block. No changes are made if any InvoiceModel cannot be approved, or
+        its state cannot be migrated because its ledger is locked. The ValidationError lists all the rejected
+        InvoiceModels.
+
+        Parameters
+        __________
+
+        user_model
+            UserModel associated with request.
+
+        date_approved: date
+            InvoiceModel approved date. Defaults to localdate().
+
+        force_migrate: bool
+            Forces migration. True if Accounting Method is Accrual.
+
+        Returns
+        _______
+        list
+            The list of approved InvoiceModels.
+        """
+        # distinct models only, for_entity() may yield duplicate rows...
+        invoice_list = list({m.uuid: m for m in self.select_related('ledger__entity',
+                                                                    'cash_account',
+                                                                    'prepaid_account',
+                                                                    'unearned_account')}.values())
+        rejected = list()
+        for invoice_model in invoice_list:
+            try:
+                invoice_model.mark_as_approved(entity_slug=None,
+                                               user_model=user_model,
+                                               date_approved=date_approved,
+                                               commit=False)
+                # approved models always post their ledger...
+                if not invoice_model.can_migrate():
+                    raise ValidationError(_('Invoice %s ledger is locked.') % invoice_model.invoice_number)
+            except ValidationError as e:
+                rejected.append(_('Invoice %s: %s') % (invoice_model.invoice_number, ' '.join(e.messages)))
+        if rejected:
+            raise ValidationError(rejected)
+
+        for invoice_model in invoice_list:
+            if invoice_model.can_generate_invoice_number():
+                invoice_model.generate_invoice_number(commit=False)
+
+        now = timezone.now()
+        for invoice_model in invoice_list:
+            invoice_model.updated = now
+
+        LedgerModel = lazy_loader.get_ledger_model()
+        with transaction.atomic():
+            InvoiceModel.objects.bulk_update(invoice_list, fields=[
+                'invoice_number',
+                'invoice_status',
+                'date_approved',
+                'date_due',
+                'updated'
+            ])
+            InvoiceModel.bulk_migrate_state(
+                wrapper_list=[i for i in invoice_list if force_migrate or i.accrue],
+                je_date=date_approved
+            )
+            LedgerModel.objects.bulk_post(ledger_list=[i.ledger for i in invoice_list])
+            if DJANGO_LEDGER_PERPETUAL_INVENTORY:
+                ItemTransactionModel = lazy_loader.get_item_transaction_model()
+                ItemTransactionModel.objects.filter(invoice_model__in=invoice_list).issue_inventory()
+        return invoice_list
+
+    def bulk_mark_as_paid(self, user_model, date_paid: date = None) -> list:
+        """
+        Marks all InvoiceModels in the QuerySet as Paid. Equivalent to calling mark_as_paid(commit=True) on each
+        InvoiceModel, but item data is fetched with one query and all resulting Journal Entries and Transactions are
+        inserted in bulk, in a single atomic block. No changes are made if any InvoiceModel cannot be paid, or its
+        state cannot be migrated because its ledger is locked. The ValidationError lists all the rejected
+        InvoiceModels.
+
+        Parameters
+        __________
+
+        user_model
+            UserModel associated with request.
+
+        date_paid: date
+            InvoiceModel paid date. Defaults to localdate() if None.
+
+        Returns
+        _______
+        list
+            The list of paid InvoiceModels.
+        """
+        # distinct models only, for_entity() may yield duplicate rows...
+        invoice_list = list({m.uuid: m for m in self.select_related('ledger__entity',
+                                                                    'cash_account',
+                                                                    'prepaid_account',
+                                                                    'unearned_account')}.values())
+        rejected = list()
+        for invoice_model in invoice_list:
+            try:
+                if invoice_model.is_approved() and not invoice_model.can_migrate():
+                    raise ValidationError(_('Invoice %s state migration not allowed.') % invoice_model.invoice_number)
+                invoice_model.mark_as_paid(entity_slug=None, user_model=user_model, date_paid=date_paid, commit=False)
+            except ValidationError as e:
+                rejected.append(_('Invoice %s: %s') % (invoice_model.invoice_number, ' '.join(e.messages)))
+        if rejected:
+            raise ValidationError(rejected)
+
+        for invoice_model in invoice_list:
+            if invoice_model.can_generate_invoice_number():
+                invoice_model.generate_invoice_number(commit=False)
+
+        now = timezone.now()
+        for invoice_model in invoice_list:
+            invoice_model.updated = now
+
+        LedgerModel = lazy_loader.get_ledger_model()
+        with transaction.atomic():
+            InvoiceModel.objects.bulk_update(invoice_list, fields=[
+                'invoice_number',
+                'invoice_status',
+                'date_paid',
+                'date_due',
+                'progress',
+                'amount_paid',
+                'amount_receivable',
+                'amount_unearned',
+                'amount_earned',
+                'updated'
+            ])
+            InvoiceModel.bulk_migrate_state(wrapper_list=invoice_list, je_date=date_paid)
+            LedgerModel.objects.bulk_lock(ledger_list=[i.ledger for i in invoice_list])
+        return invoice_list
+
 
 class InvoiceModelManager(models.Manager):
     """
@@ -185,10 +327,7 @@ class InvoiceModelManager(models.Manager):
         InvoiceModelQuerySet
             A Filtered InvoiceModelQuerySet.
         """
-        qs = self.get_queryset().filter(
-            Q(ledger__entity__admin=user_model) |
-            Q(ledger__entity__managers__in=[user_model])
-        )
+        qs = self.get_queryset().filter(entity_access_q(user_model=user_model, entity_field='ledger__entity'))
         if isinstance(entity_slug, EntityModel):
             return qs.filter(ledger__entity=entity_slug)
         elif isinstance(entity_slug, str):
@@ -277,6 +416,7 @@ class InvoiceModelAbstract(LedgerWrapperMixIn,
 
     IS_DEBIT_BALANCE = True
     REL_NAME_PREFIX = 'invoice'
+    ITEM_TXS_RELATED_FIELD = 'invoice_model'
 
     INVOICE_STATUS_DRAFT = 'draft'
     INVOICE_STATUS_REVIEW = 'in_review'
@@ -505,9 +645,29 @@ class InvoiceModelAbstract(LedgerWrapperMixIn,
         else:
             self.validate_item_transaction_qs(queryset)
 
-        return queryset.select_related('item_model').order_by('item_model__earnings_account__uuid',
+        return self.values_migration_data(queryset)
+
+    @staticmethod
+    def values_migration_data(queryset: ItemTransactionModelQuerySet,
+                              *extra_fields) -> ItemTransactionModelQuerySet:
+        """
+        Aggregates the item transaction data by account and entity unit, as needed to perform a migration into the
+        LedgerModel.
+
+        Parameters
+        ----------
+        queryset: ItemTransactionModelQuerySet
+            The ItemTransactionModelQuerySet to aggregate.
+
+        extra_fields:
+            Additional fields to group by, placed first in the ordering. E.g. 'invoice_model_id' to aggregate the items
+            of many InvoiceModels with a single query.
+        """
+        return queryset.select_related('item_model').order_by(*extra_fields,
+                                                              'item_model__earnings_account__uuid',
                                                               'entity_unit__uuid',
                                                               'item_model__earnings_account__balance_type').values(
+            *extra_fields,
             'item_model__earnings_account__uuid',
             'item_model__earnings_account__balance_type',
             'item_model__cogs_account__uuid',
@@ -519,7 +679,8 @@ class InvoiceModelAbstract(LedgerWrapperMixIn,
             'entity_unit__slug',
             'entity_unit__uuid',
             'quantity',
-            'total_amount').annotate(
+            'total_amount',
+            'inventory_value').annotate(
             account_unit_total=Sum('total_amount'))
 
     def update_amount_due(self,
@@ -1016,6 +1177,9 @@ class InvoiceModelAbstract(LedgerWrapperMixIn,
                     force_migrate=self.accrue
                 )
             self.ledger.post(commit=commit)
+            if DJANGO_LEDGER_PERPETUAL_INVENTORY:
+                # COGS has been recognized at the current moving average cost...
+                self.itemtransactionmodel_set.all().issue_inventory()
 
     def get_mark_as_approved_html_id(self):
         """
@@ -1208,6 +1372,8 @@ class InvoiceModelAbstract(LedgerWrapperMixIn,
             )
             self.save()
             self.lock_ledger(commit=True, raise_exception=False)
+            if DJANGO_LEDGER_PERPETUAL_INVENTORY:
+                self.itemtransactionmodel_set.all().issue_inventory(returned=True)
 
     def get_mark_as_void_html_id(self):
         """
@@ -1475,6 +1641,11 @@ class InvoiceModelAbstract(LedgerWrapperMixIn,
         entity_model = EntityModel.objects.get(uuid__exact=self.ledger.entity_id)
         fy_key = entity_model.get_fy_for_date(dt=self.date_draft)
         try:
+            if not DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS:
+                return EntityStateModel.objects.get_next_from_block(entity_id=self.ledger.entity_id,
+                                                                    key=EntityStateModel.KEY_INVOICE,
+                                                                    fiscal_year=fy_key)
+
             LOOKUP = {
                 'entity_id__exact': self.ledger.entity_id,
                 'entity_unit_id__exact': None,
@@ -7,6 +7,7 @@ Miguel Sanda <msanda@arrobalytics.com>
 Pranav P Tulshyan <ptulshyan77@gmail.com>
 
 """
+from collections import defaultdict
 from decimal import Decimal
 from string import ascii_lowercase, digits
 from uuid import uuid4
@@ -16,14 +17,17 @@ from django.core.validators import MinValueValidator
 from django.db import models, transaction, IntegrityError
 from django.db.models import Q, Sum, F, ExpressionWrapper, DecimalField, Value, Case, When
 from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from treebeard.mp_tree import MP_Node, MP_NodeManager
 
 from django_ledger.models import lazy_loader
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.mixins import CreateUpdateMixIn
 from django_ledger.settings import (DJANGO_LEDGER_TRANSACTION_MAX_TOLERANCE, DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING,
                                     DJANGO_LEDGER_EXPENSE_NUMBER_PREFIX, DJANGO_LEDGER_INVENTORY_NUMBER_PREFIX,
-                                    DJANGO_LEDGER_PRODUCT_NUMBER_PREFIX)
+                                    DJANGO_LEDGER_PRODUCT_NUMBER_PREFIX,
+                                    DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS, DJANGO_LEDGER_PERPETUAL_INVENTORY)
 
 ITEM_LIST_RANDOM_SLUG_SUFFIX = ascii_lowercase + digits
 
@@ -34,17 +38,34 @@ The tems may include Products or even services.
 """
 
 
+def inventory_decimal(value, decimal_places: int) -> Decimal:
+    """
+    Rounds an ItemTransactionModel quantity or amount to the precision of the ItemModel inventory fields.
+    """
+    if value is None:
+        return Decimal('0').quantize(Decimal(10) ** -decimal_places)
+    if not isinstance(value, Decimal):
+        value = Decimal.from_float(value) if isinstance(value, float) else Decimal(value)
+    return round(value, decimal_places)
+
+
+def inventory_issue_value(quantity_onhand, value_onhand, quantity) -> Decimal:
+    """
+    Value of the quantity relieved from the on-hand inventory at its moving average cost. Same as the COGS recognized
+    when an invoice is approved.
+    """
+    if quantity_onhand is None or value_onhand is None or quantity_onhand <= 0:
+        return Decimal('0.00')
+    return round(value_onhand / quantity_onhand * quantity, 2)
+
+
 # UNIT OF MEASURES MODEL....
 class UnitOfMeasureModelManager(models.Manager):
 
     def for_entity(self, entity_slug: str, user_model):
         qs = self.get_queryset()
         return qs.filter(
-            Q(entity__slug__exact=entity_slug) &
-            (
-                    Q(entity__admin=user_model) |
-                    Q(entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='entity', entity_slug=entity_slug)
         )
 
     def for_entity_active(self, entity_slug: str, user_model):
@@ -93,10 +114,7 @@ class ItemModelManager(MP_NodeManager):
         qs = self.get_queryset()
         return qs.filter(
             Q(entity__slug__exact=entity_slug) &
-            (
-                    Q(entity__managers__in=[user_model]) |
-                    Q(entity__admin=user_model)
-            )
+            entity_access_q(user_model=user_model, entity_field='entity')
         ).select_related('uom')
 
     def for_entity_active(self, entity_slug: str, user_model):
@@ -145,6 +163,25 @@ class ItemModelManager(MP_NodeManager):
         qs = qs.filter(itemtransactionmodel__ce_model_id=ce_model_uuid)
         return qs.distinct('uuid')
 
+    # PERPETUAL INVENTORY...
+    def receive_inventory(self, item_uuid, quantity, value) -> int:
+        """
+        Adds received inventory to the on-hand quantity and value of an ItemModel with a single UPDATE statement.
+        The moving average cost is the resulting on-hand value divided by the on-hand quantity.
+        Negative quantity and value reverse a previous receipt.
+        @param item_uuid: ItemModel UUID.
+        @param quantity: Quantity received.
+        @param value: Total cost of the quantity received.
+        @return: Number of updated rows.
+        """
+        quantity = inventory_decimal(quantity, decimal_places=3)
+        value = inventory_decimal(value, decimal_places=2)
+        return self.get_queryset().filter(uuid__exact=item_uuid).update(
+            inventory_received=Coalesce(F('inventory_received'), Value(Decimal('0.000'))) + quantity,
+            inventory_received_value=Coalesce(F('inventory_received_value'), Value(Decimal('0.00'))) + value,
+            updated=timezone.now()
+        )
+
 
 class ItemModelAbstract(MP_Node, CreateUpdateMixIn):
     REL_NAME_PREFIX = 'item'
@@ -334,6 +371,10 @@ class ItemModelAbstract(MP_Node, CreateUpdateMixIn):
         EntityStateModel = lazy_loader.get_entity_state_model()
 
         try:
+            if not DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS:
+                return EntityStateModel.objects.get_next_from_block(entity_id=self.entity_id,
+                                                                    key=EntityStateModel.KEY_ITEM)
+
             LOOKUP = {
                 'entity_id__exact': self.entity_id,
                 'key__exact': EntityStateModel.KEY_ITEM
@@ -449,17 +490,100 @@ class ItemTransactionModelQuerySet(models.QuerySet):
     def is_ordered(self):
         return self.filter(po_item_status=ItemTransactionModel.STATUS_ORDERED)
 
+    def update_po_item_status(self, po_item_status: str) -> int:
+        """
+        Updates the PO item status of all ItemTransactionModels in the QuerySet. When perpetual inventory is enabled,
+        billed inventory items that become received are added to the ItemModel on-hand inventory, and items that are
+        no longer received are reversed from it.
+        @param po_item_status: The new PO item status.
+        @return: Number of updated rows.
+        """
+        if not DJANGO_LEDGER_PERPETUAL_INVENTORY:
+            return self.update(po_item_status=po_item_status)
+
+        moves_qs = self.filter(
+            item_model__for_inventory=True,
+            bill_model__isnull=False,
+            invoice_model__isnull=True
+        ).exclude(po_item_status=po_item_status)
+
+        if po_item_status == ItemTransactionModel.STATUS_RECEIVED:
+            sign = 1
+        else:
+            moves_qs = moves_qs.filter(po_item_status=ItemTransactionModel.STATUS_RECEIVED)
+            sign = -1
+
+        with transaction.atomic():
+            # a single UPDATE per ItemModel...
+            moves = defaultdict(lambda: [Decimal('0.000'), Decimal('0.00')])
+            for itemtxs in moves_qs.values('item_model_id', 'quantity', 'total_amount'):
+                moves[itemtxs['item_model_id']][0] += sign * inventory_decimal(itemtxs['quantity'], decimal_places=3)
+                moves[itemtxs['item_model_id']][1] += sign * inventory_decimal(itemtxs['total_amount'],
+                                                                               decimal_places=2)
+            for item_uuid, (quantity, value) in moves.items():
+                ItemModel.objects.receive_inventory(item_uuid=item_uuid, quantity=quantity, value=value)
+            return self.update(po_item_status=po_item_status)
+
+    def issue_inventory(self, returned: bool = False):
+        """
+        Relieves the quantity of all invoiced inventory items in the QuerySet from the ItemModel on-hand inventory at
+        its moving average cost. The relieved value is kept on each ItemTransactionModel. Must be called after the
+        COGS of the invoice has been recognized. The ItemModels are locked while the values are computed, and are
+        updated with a single UPDATE each.
+        @param returned: Returns the quantity back into the ItemModel on-hand inventory instead, at the value it was
+            relieved at. Used when an invoice is voided, since voiding reverses the COGS recognized on approval.
+        """
+        invoiced_qs = self.filter(
+            item_model__for_inventory=True,
+            invoice_model__isnull=False,
+            bill_model__isnull=True
+        ).only('uuid', 'item_model', 'quantity', 'inventory_value')
+
+        with transaction.atomic():
+            itemtxs_list = list(invoiced_qs)
+            onhand = {
+                i['uuid']: [i['inventory_received'] or Decimal('0.000'), i['inventory_received_value'] or Decimal('0.00')]
+                for i in ItemModel.objects.filter(
+                    uuid__in={itemtxs_model.item_model_id for itemtxs_model in itemtxs_list}
+                ).select_for_update().order_by('uuid').values('uuid',
+                                                              'inventory_received',
+                                                              'inventory_received_value')
+            }
+
+            # items are relieved one after the other, as the on-hand inventory goes down...
+            moves = defaultdict(lambda: [Decimal('0.000'), Decimal('0.00')])
+            for itemtxs_model in itemtxs_list:
+                quantity = inventory_decimal(itemtxs_model.quantity, decimal_places=3)
+                quantity_onhand, value_onhand = onhand[itemtxs_model.item_model_id]
+                if not returned:
+                    value = inventory_issue_value(quantity_onhand=quantity_onhand,
+                                                  value_onhand=value_onhand,
+                                                  quantity=quantity)
+                    itemtxs_model.inventory_value = value
+                    quantity, value = -quantity, -value
+                elif itemtxs_model.inventory_value is not None:
+                    value = itemtxs_model.inventory_value
+                else:
+                    # relieved before the value was kept, returned at the current moving average cost...
+                    value = -inventory_issue_value(quantity_onhand=quantity_onhand,
+                                                   value_onhand=value_onhand,
+                                                   quantity=-quantity)
+                onhand[itemtxs_model.item_model_id] = [quantity_onhand + quantity, value_onhand + value]
+                moves[itemtxs_model.item_model_id][0] += quantity
+                moves[itemtxs_model.item_model_id][1] += value
+
+            for item_uuid, (quantity, value) in moves.items():
+                ItemModel.objects.receive_inventory(item_uuid=item_uuid, quantity=quantity, value=value)
+            if not returned:
+                ItemTransactionModel.objects.bulk_update(itemtxs_list, fields=['inventory_value'])
+
 
 class ItemTransactionModelManager(models.Manager):
 
     def for_entity(self, user_model, entity_slug):
         qs = self.get_queryset()
         return qs.filter(
-            Q(item_model__entity__slug__exact=entity_slug) &
-            (
-                    Q(item_model__entity__admin=user_model) |
-                    Q(item_model__entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='item_model__entity', entity_slug=entity_slug)
         )
 
     def for_bill(self, user_model, entity_slug, bill_pk):
@@ -585,6 +709,125 @@ class ItemTransactionModelManager(models.Manager):
                                   output_field=DecimalField(decimal_places=3)), Value(0.0), output_field=DecimalField())
         )
 
+    def inventory_moving_average(self, entity_slug, user_model) -> list:
+        """
+        Rebuilds the perpetual inventory of all inventory items from history. Received items and items on approved,
+        paid or void invoices are replayed in chronological order, using the same moving average cost rules applied
+        incrementally when perpetual inventory is enabled. Receipts are dated by the PO fulfillment date, or the bill
+        date if the PO is not fulfilled yet. Issues are dated by the invoice approval date, and void invoices return
+        their items on the void date at the value they were relieved at. Within the same day, receipts are replayed
+        first and returns last.
+        @param entity_slug: EntityModel slug field value.
+        @param user_model: UserModel requesting data.
+        @return: A list of dictionaries with the same keys as inventory_count().
+        """
+        InvoiceModel = lazy_loader.get_invoice_model()
+        qs = self.for_entity(entity_slug=entity_slug, user_model=user_model)
+        qs = qs.filter(
+            Q(item_model__for_inventory=True) &
+            (
+                # received inventory...
+                    (
+                            Q(bill_model__isnull=False) &
+                            Q(invoice_model__isnull=True) &
+                            Q(po_item_status__exact=ItemTransactionModel.STATUS_RECEIVED)
+                    ) |
+
+                    # invoiced inventory...
+                    (
+                            Q(invoice_model__isnull=False) &
+                            Q(bill_model__isnull=True) &
+                            Q(invoice_model__date_approved__isnull=False) &
+                            Q(invoice_model__invoice_status__in=[
+                                InvoiceModel.INVOICE_STATUS_APPROVED,
+                                InvoiceModel.INVOICE_STATUS_PAID,
+                                InvoiceModel.INVOICE_STATUS_VOID
+                            ])
+                    )
+            )
+        ).values(
+            'uuid',
+            'item_model_id',
+            'item_model__name',
+            'item_model__uom__name',
+            'invoice_model_id',
+            'invoice_model__date_approved',
+            'invoice_model__date_void',
+            'invoice_model__invoice_status',
+            'po_model__date_fulfilled',
+            'bill_model__date_approved',
+            'bill_model__date_draft',
+            'quantity',
+            'total_amount',
+            'created'
+        ).distinct()
+
+        ISSUE, RECEIPT, RETURN = 'issue', 'receipt', 'return'
+        EVENT_ORDER = {RECEIPT: 0, ISSUE: 1, RETURN: 2}
+
+        def receipt_date(i):
+            if i['po_model__date_fulfilled'] or i['bill_model__date_approved'] or i['bill_model__date_draft']:
+                return i['po_model__date_fulfilled'] or i['bill_model__date_approved'] or i['bill_model__date_draft']
+            created = i['created']
+            if timezone.is_aware(created):
+                created = timezone.localtime(created)
+            return created.date()
+
+        events = list()
+        for i in qs:
+            if not i['invoice_model_id']:
+                events.append((receipt_date(i), RECEIPT, i))
+                continue
+            events.append((i['invoice_model__date_approved'], ISSUE, i))
+            if i['invoice_model__invoice_status'] == InvoiceModel.INVOICE_STATUS_VOID:
+                events.append((i['invoice_model__date_void'] or i['invoice_model__date_approved'], RETURN, i))
+        events.sort(key=lambda e: (e[0], EVENT_ORDER[e[1]], e[2]['created'], e[2]['uuid']))
+
+        inventory = dict()
+        issued_values = dict()
+        for event_date, event, i in events:
+            item = inventory.get(i['item_model_id'])
+            if item is None:
+                item = inventory[i['item_model_id']] = {
+                    'item_model_id': i['item_model_id'],
+                    'item_model__name': i['item_model__name'],
+                    'item_model__uom__name': i['item_model__uom__name'],
+                    'quantity_received': Decimal('0.000'),
+                    'cost_received': Decimal('0.00'),
+                    'quantity_invoiced': Decimal('0.000'),
+                    'revenue_invoiced': Decimal('0.00'),
+                    'quantity_onhand': Decimal('0.000'),
+                    'value_onhand': Decimal('0.00'),
+                }
+            quantity = inventory_decimal(i['quantity'], decimal_places=3)
+            amount = inventory_decimal(i['total_amount'], decimal_places=2)
+            if event == ISSUE:
+                value = inventory_issue_value(quantity_onhand=item['quantity_onhand'],
+                                              value_onhand=item['value_onhand'],
+                                              quantity=quantity)
+                issued_values[i['uuid']] = value
+                item['value_onhand'] -= value
+                item['quantity_onhand'] -= quantity
+                item['quantity_invoiced'] += quantity
+                item['revenue_invoiced'] += amount
+            elif event == RETURN:
+                item['value_onhand'] += issued_values[i['uuid']]
+                item['quantity_onhand'] += quantity
+                item['quantity_invoiced'] -= quantity
+                item['revenue_invoiced'] -= amount
+            else:
+                item['quantity_onhand'] += quantity
+                item['value_onhand'] += amount
+                item['quantity_received'] += quantity
+                item['cost_received'] += amount
+
+        for item in inventory.values():
+            item['cost_average'] = round(
+                item['value_onhand'] / item['quantity_onhand'], 3
+            ) if item['quantity_onhand'] > 0 else None
+
+        return list(inventory.values())
+
     def is_orphan(self, entity_slug, user_model):
         qs = self.get_queryset()
         return qs.filter(
@@ -678,6 +921,16 @@ class ItemTransactionModelAbstract(CreateUpdateMixIn):
                                       null=True,
                                       verbose_name=_('PO Item Status'))
 
+    # Invoice fields...
+    inventory_value = models.DecimalField(max_digits=20,
+                                          decimal_places=DECIMAL_PLACES,
+                                          null=True,
+                                          blank=True,
+                                          editable=False,
+                                          verbose_name=_('Inventory Value Relieved'),
+                                          help_text=_('On-hand inventory value relieved when the invoice was '
+                                                      'approved, at the moving average cost.'))
+
     # Estimate/Contract fields...
     ce_model = models.ForeignKey('django_ledger.EstimateModel',
                                  null=True,
@@ -14,12 +14,16 @@ from uuid import uuid4
 from django.core.exceptions import FieldError, ObjectDoesNotExist
 from django.core.exceptions import ValidationError
 from django.db import models, transaction, IntegrityError
-from django.db.models import Q, Sum, QuerySet, F
+from django.db.models import Sum, QuerySet, F
 from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
 from django.urls import reverse
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localdate
 from django.utils.translation import gettext_lazy as _
 
 from django_ledger.exceptions import JournalEntryValidationError
+from django_ledger.io.digest_cache import is_digest_cache_enabled, bump_digest_version
 from django_ledger.io.roles import (ASSET_CA_CASH, GROUP_CFS_FIN_DIVIDENDS, GROUP_CFS_FIN_ISSUING_EQUITY,
                                     GROUP_CFS_FIN_LT_DEBT_PAYMENTS, GROUP_CFS_FIN_ST_DEBT_PAYMENTS,
                                     GROUP_CFS_INVESTING_AND_FINANCING, GROUP_CFS_INV_PURCHASE_OR_SALE_OF_PPE,
@@ -27,9 +31,25 @@ from django_ledger.io.roles import (ASSET_CA_CASH, GROUP_CFS_FIN_DIVIDENDS, GROU
                                     GROUP_CFS_INV_LTD_OF_SECURITIES, GROUP_CFS_INVESTING_PPE,
                                     GROUP_CFS_INVESTING_SECURITIES)
 from django_ledger.models import CreateUpdateMixIn
+from django_ledger.models.access import entity_access_q
+from django_ledger.models.mixins import LedgerWrapperMixIn
 from django_ledger.models.utils import lazy_loader
 from django_ledger.settings import (DJANGO_LEDGER_JE_NUMBER_PREFIX, DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING,
-                                    DJANGO_LEDGER_JE_NUMBER_NO_UNIT_PREFIX)
+                                    DJANGO_LEDGER_JE_NUMBER_NO_UNIT_PREFIX, DJANGO_LEDGER_USE_PERIOD_BALANCES,
+                                    DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS, DJANGO_LEDGER_DENORMALIZED_TXS)
+
+# role tables used to classify the Journal Entry activity...
+ROLES_CFS_INVESTING_PPE = frozenset(GROUP_CFS_INVESTING_PPE)
+ROLES_CFS_INV_PURCHASE_OR_SALE_OF_PPE = frozenset(GROUP_CFS_INV_PURCHASE_OR_SALE_OF_PPE)
+ROLES_CFS_INV_LTD_OF_PPE = frozenset(GROUP_CFS_INV_LTD_OF_PPE)
+ROLES_CFS_INVESTING_SECURITIES = frozenset(GROUP_CFS_INVESTING_SECURITIES)
+ROLES_CFS_INV_PURCHASE_OF_SECURITIES = frozenset(GROUP_CFS_INV_PURCHASE_OF_SECURITIES)
+ROLES_CFS_INV_LTD_OF_SECURITIES = frozenset(GROUP_CFS_INV_LTD_OF_SECURITIES)
+ROLES_CFS_FIN_DIVIDENDS = frozenset(GROUP_CFS_FIN_DIVIDENDS)
+ROLES_CFS_FIN_ISSUING_EQUITY = frozenset(GROUP_CFS_FIN_ISSUING_EQUITY)
+ROLES_CFS_FIN_ST_DEBT_PAYMENTS = frozenset(GROUP_CFS_FIN_ST_DEBT_PAYMENTS)
+ROLES_CFS_FIN_LT_DEBT_PAYMENTS = frozenset(GROUP_CFS_FIN_LT_DEBT_PAYMENTS)
+ROLES_CFS_INVESTING_AND_FINANCING = frozenset(GROUP_CFS_INVESTING_AND_FINANCING)
 
 
 class JournalEntryModelQuerySet(QuerySet):
@@ -58,11 +78,7 @@ class JournalEntryModelManager(models.Manager):
 
     def for_entity(self, entity_slug: str, user_model):
         return self.get_queryset().filter(
-            Q(ledger__entity__slug__iexact=entity_slug) &
-            (
-                    Q(ledger__entity__admin=user_model) |
-                    Q(ledger__entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='ledger__entity', entity_slug=entity_slug)
 
         )
 
@@ -115,6 +131,12 @@ class JournalEntryModelAbstract(CreateUpdateMixIn):
         a for a in VALID_ACTIVITIES if ActivityEnum.OPERATING.value not in a
     ]
 
+    # fields that affect the materialized AccountPeriodBalanceModel when changed...
+    PERIOD_BALANCE_FIELDS = {'posted', 'date', 'activity', 'entity_unit', 'entity_unit_id', 'ledger', 'ledger_id'}
+
+    # fields copied into the denormalized TransactionModel columns...
+    DENORMALIZED_TXS_FIELDS = {'posted', 'date', 'entity_unit', 'entity_unit_id', 'ledger', 'ledger_id'}
+
     uuid = models.UUIDField(default=uuid4, editable=False, primary_key=True)
     je_number = models.SlugField(max_length=20, editable=False, verbose_name=_('Journal Entry Number'))
     date = models.DateField(verbose_name=_('Date'))
@@ -154,7 +176,11 @@ class JournalEntryModelAbstract(CreateUpdateMixIn):
             models.Index(fields=['entity_unit']),
             models.Index(fields=['locked']),
             models.Index(fields=['posted']),
-            models.Index(fields=['je_number'])
+            models.Index(fields=['je_number']),
+
+            # keyset pagination of the ledger journal entry list...
+            models.Index(fields=['ledger', 'date', 'uuid']),
+            models.Index(fields=['ledger', 'je_number', 'uuid']),
         ]
 
     def __str__(self):
@@ -165,6 +191,8 @@ class JournalEntryModelAbstract(CreateUpdateMixIn):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._verified = False
+        # keeps track of the original date, in case the JE is moved to a different period...
+        self._period_balance_date = self.__dict__.get('date')
 
     def is_verified(self) -> bool:
         return self._verified
@@ -267,13 +295,34 @@ class JournalEntryModelAbstract(CreateUpdateMixIn):
                               'updated'
                           ])
 
+    def update_period_balances(self):
+        """
+        Re-aggregates the materialized AccountPeriodBalanceModel periods affected by this Journal Entry, including
+        its previous period if the Journal Entry date changed. Open period Journal Entries do not trigger any query.
+        """
+        if DJANGO_LEDGER_USE_PERIOD_BALANCES:
+            open_period = localdate().replace(day=1)
+            dates = [parse_date(dt) if isinstance(dt, str) else dt for dt in (self.date, self._period_balance_date)]
+            dates = set(dt for dt in dates if dt and dt < open_period)
+            if dates:
+                # pylint: disable=no-member
+                self.ledger.update_period_balances(dates=dates)
+            self._period_balance_date = self.date
+
+    def update_denormalized_txs(self) -> int:
+        """
+        Copies the Journal Entry state into the denormalized columns of its transactions, with a single query.
+        """
+        # pylint: disable=no-member
+        return self.transactionmodel_set.all().update_denormalized()
+
     def get_txs_qs(self, select_accounts: bool = True):
         if not select_accounts:
             return self.transactionmodel_set.all()
         return self.transactionmodel_set.all().select_related('account')
 
     def get_txs_balances(self, txs_qs=None):
-        if not txs_qs:
+        if txs_qs is None:
             txs_qs = self.get_txs_qs()
         balances = txs_qs.values('tx_type').annotate(
             amount__sum=Coalesce(Sum('amount'),
@@ -282,7 +331,7 @@ class JournalEntryModelAbstract(CreateUpdateMixIn):
         return balances
 
     def get_txs_roles(self, txs_qs=None, exclude_cash_role: bool = False) -> Set:
-        if not txs_qs:
+        if txs_qs is None:
             txs_qs = self.get_txs_qs()
 
         # todo: implement distinct for non SQLite Backends...
@@ -292,23 +341,126 @@ class JournalEntryModelAbstract(CreateUpdateMixIn):
             roles_involved = [i.account.role for i in txs_qs]
         return set(roles_involved)
 
+    @staticmethod
+    def get_txs_summary(txs_qs) -> dict:
+        """
+        Computes the credit & debit totals and the roles involved in a single pass over the transactions.
+        Transactions must have their AccountModel cached via select_related('account').
+
+        Parameters
+        ----------
+        txs_qs: TransactionModelQuerySet or list
+            The Journal Entry transactions.
+
+        Returns
+        -------
+        dict
+            A dictionary with the credit & debit totals and the set of roles involved.
+        """
+        summary = {
+            'credit': Decimal('0.00'),
+            'debit': Decimal('0.00'),
+            'roles': set()
+        }
+        for tx in txs_qs:
+            summary[tx.tx_type] += tx.amount
+            summary['roles'].add(tx.account.role)
+        return summary
+
     def is_balance_valid(self, txs_qs=None):
-        if len(txs_qs) > 0:
-            balances = self.get_txs_balances(txs_qs=txs_qs)
-            bal_idx = {i['tx_type']: i['amount__sum'] for i in balances}
-            return bal_idx['credit'] == bal_idx['debit']
-        return True
+        if txs_qs is None:
+            txs_qs = self.get_txs_qs()
+        summary = self.get_txs_summary(txs_qs)
+        return summary['credit'] == summary['debit']
 
     def is_cash_involved(self, txs_qs=None):
-        return ASSET_CA_CASH in self.get_txs_roles(txs_qs=None)
+        return ASSET_CA_CASH in self.get_txs_roles(txs_qs=txs_qs)
+
+    def get_activity_for_roles(self, roles_involved: Set, raise_exception: bool = True):
+        """
+        Determines the Journal Entry activity from the non-cash roles involved.
+
+        Parameters
+        ----------
+        roles_involved: set
+            The roles involved in the Journal Entry, excluding ASSET_CA_CASH.
+        raise_exception: bool
+            Raises JournalEntryValidationError if the activity cannot be determined.
+
+        Returns
+        -------
+        str
+            The activity or None if the activity cannot be determined.
+        """
+        # determining if investing....
+        is_investing_for_ppe = all([
+            roles_involved <= ROLES_CFS_INVESTING_PPE,  # all roles must be in group
+            not roles_involved.isdisjoint(ROLES_CFS_INV_PURCHASE_OR_SALE_OF_PPE),  # at least one role
+            not roles_involved.isdisjoint(ROLES_CFS_INV_LTD_OF_PPE),  # at least one role
+        ])
+        is_investing_for_securities = all([
+            roles_involved <= ROLES_CFS_INVESTING_SECURITIES,  # all roles must be in group
+            not roles_involved.isdisjoint(ROLES_CFS_INV_PURCHASE_OF_SECURITIES),  # at least one role
+            not roles_involved.isdisjoint(ROLES_CFS_INV_LTD_OF_SECURITIES),  # at least one role
+        ])
+
+        # determining if financing...
+        is_financing_dividends = roles_involved <= ROLES_CFS_FIN_DIVIDENDS
+        is_financing_issuing_equity = roles_involved <= ROLES_CFS_FIN_ISSUING_EQUITY
+        is_financing_st_debt = roles_involved <= ROLES_CFS_FIN_ST_DEBT_PAYMENTS
+        is_financing_lt_debt = roles_involved <= ROLES_CFS_FIN_LT_DEBT_PAYMENTS
+
+        is_operating = roles_involved.isdisjoint(ROLES_CFS_INVESTING_AND_FINANCING)
+
+        if sum([
+            is_investing_for_ppe,
+            is_investing_for_securities,
+            is_financing_lt_debt,
+            is_financing_st_debt,
+            is_financing_issuing_equity,
+            is_financing_dividends,
+            is_operating
+        ]) > 1:
+            if raise_exception:
+                raise JournalEntryValidationError(_('Multiple activities detected in roles JE %s.') % roles_involved)
+        else:
+            if is_investing_for_ppe:
+                return self.INVESTING_PPE
+            elif is_investing_for_securities:
+                return self.INVESTING_SECURITIES
+
+            elif is_financing_st_debt:
+                return self.FINANCING_STD
+            elif is_financing_lt_debt:
+                return self.FINANCING_LTD
+            elif is_financing_issuing_equity:
+                return self.FINANCING_EQUITY
+            elif is_financing_dividends:
+                return self.FINANCING_DIVIDENDS
+            elif is_operating:
+                return self.OPERATING_ACTIVITY
+            else:
+                if raise_exception:
+                    raise JournalEntryValidationError(_('No activity match for roles %s.Split into multiple Journal Entries or check your account selection.') % roles_involved)
 
     def verify(self,
                txs_qs=None,
                force_verify: bool = False,
                raise_exception: bool = True,
                **kwargs):
+        """
+        Verifies the Journal Entry transactions and determines its activity. Transactions are fetched with a single
+        query, unless an already evaluated QuerySet is provided, and credits, debits and roles are computed in one
+        pass.
+        """
         if not self.is_verified() or force_verify:
-            txs_qs = self.get_txs_qs()
+            if txs_qs is None:
+                txs_qs = self.get_txs_qs()
+            elif isinstance(txs_qs, QuerySet) and txs_qs._result_cache is None:
+                txs_qs = txs_qs.select_related('account')
+
+            # evaluates the QuerySet once, all following operations use the result cache...
+            summary = self.get_txs_summary(txs_qs)
 
             # if not len(txs_qs):
             #     if raise_exception:
@@ -319,68 +471,21 @@ class JournalEntryModelAbstract(CreateUpdateMixIn):
             #         raise JournalEntryValidationError(_('At least two transactions required.'))
 
             # CREDIT/DEBIT Balance validation...
-            balance_is_valid = self.is_balance_valid(txs_qs)
+            balance_is_valid = summary['credit'] == summary['debit']
             if not balance_is_valid:
                 if raise_exception:
                     raise JournalEntryValidationError(_('Debits and credits do not match.'))
 
             # activity flag...
-            cash_is_involved = self.is_cash_involved(txs_qs)
+            roles_involved = summary['roles']
+            cash_is_involved = ASSET_CA_CASH in roles_involved
             if not cash_is_involved:
                 self.activity = None
             else:
-                roles_involved = self.get_txs_roles(txs_qs, exclude_cash_role=True)
-
-                # determining if investing....
-                is_investing_for_ppe = all([
-                    all([r in GROUP_CFS_INVESTING_PPE for r in roles_involved]),  # all roles must be in group
-                    sum([r in GROUP_CFS_INV_PURCHASE_OR_SALE_OF_PPE for r in roles_involved]) > 0,  # at least one role
-                    sum([r in GROUP_CFS_INV_LTD_OF_PPE for r in roles_involved]) > 0,  # at least one role
-                ])
-                is_investing_for_securities = all([
-                    all([r in GROUP_CFS_INVESTING_SECURITIES for r in roles_involved]),  # all roles must be in group
-                    sum([r in GROUP_CFS_INV_PURCHASE_OF_SECURITIES for r in roles_involved]) > 0,  # at least one role
-                    sum([r in GROUP_CFS_INV_LTD_OF_SECURITIES for r in roles_involved]) > 0,  # at least one role
-                ])
-
-                # determining if financing...
-                is_financing_dividends = all([r in GROUP_CFS_FIN_DIVIDENDS for r in roles_involved])
-                is_financing_issuing_equity = all([r in GROUP_CFS_FIN_ISSUING_EQUITY for r in roles_involved])
-                is_financing_st_debt = all([r in GROUP_CFS_FIN_ST_DEBT_PAYMENTS for r in roles_involved])
-                is_financing_lt_debt = all([r in GROUP_CFS_FIN_LT_DEBT_PAYMENTS for r in roles_involved])
-
-                is_operating = all([r not in GROUP_CFS_INVESTING_AND_FINANCING for r in roles_involved])
-
-                if sum([
-                    is_investing_for_ppe,
-                    is_investing_for_securities,
-                    is_financing_lt_debt,
-                    is_financing_st_debt,
-                    is_financing_issuing_equity,
-                    is_financing_dividends,
-                    is_operating
-                ]) > 1:
-                    if raise_exception:
-                        raise JournalEntryValidationError(_('Multiple activities detected in roles JE %s.') % roles_involved)
-                else:
-                    if is_investing_for_ppe:
-                        self.activity = self.INVESTING_PPE
-                    elif is_investing_for_securities:
-                        self.activity = self.INVESTING_SECURITIES
-
-                    elif is_financing_st_debt:
-                        self.activity = self.FINANCING_STD
-                    elif is_financing_lt_debt:
-                        self.activity = self.FINANCING_LTD
-                    elif is_financing_issuing_equity:
-                        self.activity = self.FINANCING_EQUITY
-                    elif is_financing_dividends:
-                        self.activity = self.FINANCING_DIVIDENDS
-                    elif is_operating:
-                        self.activity = self.OPERATING_ACTIVITY
-                    else:
-                        if raise_exception:
-                            raise JournalEntryValidationError(_('No activity match for roles %s.Split into multiple Journal Entries or check your account selection.') % roles_involved)
+                roles_involved = roles_involved - {ASSET_CA_CASH}
+                activity = self.get_activity_for_roles(roles_involved, raise_exception=raise_exception)
+                if activity:
+                    self.activity = activity
             self._verified = True
             return txs_qs
         self._verified = False
@@ -423,6 +528,12 @@ class JournalEntryModelAbstract(CreateUpdateMixIn):
         fy_key = entity_model.get_fy_for_date(dt=self.date)
 
         try:
+            if not DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS:
+                return EntityStateModel.objects.get_next_from_block(entity_id=self.ledger.entity_id,
+                                                                    key=EntityStateModel.KEY_JOURNAL_ENTRY,
+                                                                    entity_unit_id=self.entity_unit_id,
+                                                                    fiscal_year=fy_key)
+
             LOOKUP = {
                 'entity_id__exact': self.ledger.entity_id,
                 'entity_unit_id__exact': self.entity_unit_id,
@@ -451,6 +562,21 @@ class JournalEntryModelAbstract(CreateUpdateMixIn):
             if raise_exception:
                 raise e
 
+    def get_je_number(self, fiscal_year: int, sequence: int) -> str:
+        """
+        Formats the Journal Entry document number for the given fiscal year and sequence.
+        @param fiscal_year: The fiscal year of the sequence.
+        @param sequence: The EntityStateModel sequence number.
+        @return: A String, representing the Journal Entry Document Number.
+        """
+        if self.entity_unit_id:
+            unit_prefix = self.entity_unit.document_prefix
+        else:
+            unit_prefix = DJANGO_LEDGER_JE_NUMBER_NO_UNIT_PREFIX
+
+        seq = str(sequence).zfill(DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING)
+        return f'{DJANGO_LEDGER_JE_NUMBER_PREFIX}-{fiscal_year}-{unit_prefix}-{seq}'
+
     def generate_je_number(self, commit: bool = False) -> str:
         """
         Atomic Transaction. Generates the next Journal Entry document number available. The operation
@@ -467,13 +593,8 @@ class JournalEntryModelAbstract(CreateUpdateMixIn):
                 while not state_model:
                     state_model = self._get_next_state_model(raise_exception=False)
 
-                if self.entity_unit_id:
-                    unit_prefix = self.entity_unit.document_prefix
-                else:
-                    unit_prefix = DJANGO_LEDGER_JE_NUMBER_NO_UNIT_PREFIX
-
-                seq = str(state_model.sequence).zfill(DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING)
-                self.je_number = f'{DJANGO_LEDGER_JE_NUMBER_PREFIX}-{state_model.fiscal_year}-{unit_prefix}-{seq}'
+                self.je_number = self.get_je_number(fiscal_year=state_model.fiscal_year,
+                                                    sequence=state_model.sequence)
 
                 if commit:
                     self.save(update_fields=['je_number'])
@@ -505,10 +626,54 @@ class JournalEntryModelAbstract(CreateUpdateMixIn):
             self._verified = False
             self.save(update_fields=['posted', 'updated'], verify=False)
             raise JournalEntryValidationError(e)
+        adding = self._state.adding
         super(JournalEntryModelAbstract, self).save(*args, **kwargs)
 
+        update_fields = kwargs.get('update_fields')
+        if not update_fields or self.PERIOD_BALANCE_FIELDS.intersection(update_fields):
+            self.update_period_balances()
+
+        # a new Journal Entry has no transactions yet...
+        if DJANGO_LEDGER_DENORMALIZED_TXS and not adding:
+            if not update_fields or self.DENORMALIZED_TXS_FIELDS.intersection(update_fields):
+                self.update_denormalized_txs()
+
 
 class JournalEntryModel(JournalEntryModelAbstract):
     """
     Journal Entry Model Base Class From Abstract
     """
+
+
+def journalentrymodel_digest_version(instance: JournalEntryModel, **kwargs):
+    if is_digest_cache_enabled():
+        if JournalEntryModel.ledger.is_cached(instance):
+            entity_uuid = instance.ledger.entity_id
+        else:
+            LedgerModel = lazy_loader.get_ledger_model()
+            entity_uuid = LedgerModel.objects.filter(
+                uuid__exact=instance.ledger_id
+            ).values_list('entity_id', flat=True).first()
+        bump_digest_version(entity_uuid)
+
+
+post_save.connect(receiver=journalentrymodel_digest_version, sender=JournalEntryModel)
+post_delete.connect(receiver=journalentrymodel_digest_version, sender=JournalEntryModel)
+
+
+def journalentrymodel_period_balances(instance: JournalEntryModel, **kwargs):
+    # saved Journal Entries refresh their periods on save()...
+    instance.update_period_balances()
+
+
+post_delete.connect(receiver=journalentrymodel_period_balances, sender=JournalEntryModel)
+
+
+def journalentrymodel_ledger_state(instance: JournalEntryModel, created: bool = False, **kwargs):
+    # new Journal Entries have no transactions yet...
+    if not created:
+        LedgerWrapperMixIn.reset_ledger_state_snapshot(uuid__exact=instance.ledger_id)
+
+
+post_save.connect(receiver=journalentrymodel_ledger_state, sender=JournalEntryModel)
+post_delete.connect(receiver=journalentrymodel_ledger_state, sender=JournalEntryModel)
@@ -6,19 +6,27 @@ Contributions to this module:
 Miguel Sanda <msanda@arrobalytics.com>
 """
 
+from collections import defaultdict
 from random import choice
 from string import ascii_lowercase, digits
+from typing import Iterable, Optional
 from uuid import uuid4
 
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.timezone import localdate
 from django.utils.translation import gettext_lazy as _
 
 from django_ledger.io import IOMixIn
+from django_ledger.io.digest_cache import bump_digest_version
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.accounts import AccountModel
 from django_ledger.models.coa import get_coa_account
-from django_ledger.models.mixins import CreateUpdateMixIn
+from django_ledger.models.mixins import CreateUpdateMixIn, LedgerWrapperMixIn
+from django_ledger.models.utils import lazy_loader
+from django_ledger.settings import DJANGO_LEDGER_USE_PERIOD_BALANCES, DJANGO_LEDGER_DENORMALIZED_TXS
 
 LEDGER_ID_CHARS = ascii_lowercase + digits
 
@@ -32,16 +40,97 @@ class LedgerModelManager(models.Manager):
     def for_entity(self, entity_slug: str, user_model):
         qs = self.get_queryset()
         return qs.filter(
-            Q(entity__slug__exact=entity_slug) &
-            (
-                    Q(entity__admin=user_model) |
-                    Q(entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='entity', entity_slug=entity_slug)
         )
 
     def posted(self):
         return self.get_queryset().filter(posted=True)
 
+    def bulk_post(self, ledger_list: list):
+        """
+        Posts all unposted ledgers in the list with a single UPDATE query. Since update() bypasses save() & signals,
+        period balances, cached digests and ledger state snapshots are refreshed explicitly.
+
+        @param ledger_list: The LedgerModels to post.
+        @return: The list of LedgerModels that were posted.
+        """
+        posted_list = [ledger_model for ledger_model in ledger_list if not ledger_model.posted]
+        if not posted_list:
+            return posted_list
+
+        now = timezone.now()
+        with transaction.atomic():
+            self.get_queryset().filter(
+                uuid__in=[ledger_model.uuid for ledger_model in posted_list]
+            ).update(posted=True, updated=now)
+            for ledger_model in posted_list:
+                ledger_model.posted = True
+                ledger_model.updated = now
+            self.bulk_update_period_balances(ledger_list=posted_list)
+            if DJANGO_LEDGER_DENORMALIZED_TXS:
+                TransactionModel = lazy_loader.get_txs_model()
+                TransactionModel.objects.filter(
+                    journal_entry__ledger_id__in=[ledger_model.uuid for ledger_model in posted_list]
+                ).update_denormalized()
+            LedgerWrapperMixIn.reset_ledger_state_snapshot(uuid__in=[ledger_model.uuid for ledger_model in posted_list])
+
+        for entity_uuid in set(ledger_model.entity_id for ledger_model in posted_list):
+            bump_digest_version(entity_uuid)
+        return posted_list
+
+    def bulk_update_period_balances(self, ledger_list: list, dates: Optional[Iterable] = None) -> set:
+        """
+        Re-aggregates the materialized AccountPeriodBalanceModel periods affected by many ledgers, once per entity.
+        Only periods already rolled up are affected. Does nothing unless DJANGO_LEDGER_USE_PERIOD_BALANCES is enabled.
+
+        @param ledger_list: The LedgerModels with changed Journal Entries.
+        @param dates: The dates of the changed Journal Entries. If None, all Journal Entry dates of the ledgers are
+        fetched with a single query.
+        @return: The set of re-aggregated periods.
+        """
+        if not DJANGO_LEDGER_USE_PERIOD_BALANCES or not ledger_list:
+            return set()
+
+        entity_dates = defaultdict(set)
+        if dates is None:
+            JournalEntryModel = lazy_loader.get_journal_entry_model()
+            je_dates = JournalEntryModel.objects.filter(
+                ledger_id__in=[ledger_model.uuid for ledger_model in ledger_list]
+            ).values_list('ledger__entity_id', 'date').distinct()
+            for entity_uuid, je_date in je_dates:
+                entity_dates[entity_uuid].add(je_date)
+        else:
+            dates = set(dates)
+            for ledger_model in ledger_list:
+                entity_dates[ledger_model.entity_id].update(dates)
+
+        EntityModel = lazy_loader.get_entity_model()
+        AccountPeriodBalanceModel = lazy_loader.get_account_period_balance_model()
+        periods = set()
+        for entity_model in EntityModel.objects.only('uuid', 'period_balances_date').filter(uuid__in=entity_dates):
+            periods |= AccountPeriodBalanceModel.objects.refresh(entity_model=entity_model,
+                                                                 dates=entity_dates[entity_model.uuid])
+        return periods
+
+    def bulk_lock(self, ledger_list: list):
+        """
+        Locks all ledgers in the list with a single UPDATE query.
+
+        @param ledger_list: The LedgerModels to lock.
+        @return: The list of LedgerModels.
+        """
+        now = timezone.now()
+        self.get_queryset().filter(
+            uuid__in=[ledger_model.uuid for ledger_model in ledger_list]
+        ).update(locked=True, updated=now)
+        for ledger_model in ledger_list:
+            ledger_model.locked = True
+            ledger_model.updated = now
+
+        for entity_uuid in set(ledger_model.entity_id for ledger_model in ledger_list):
+            bump_digest_version(entity_uuid)
+        return ledger_list
+
 
 class LedgerModelAbstract(CreateUpdateMixIn, IOMixIn):
     uuid = models.UUIDField(default=uuid4, editable=False, primary_key=True)
@@ -88,6 +177,42 @@ class LedgerModelAbstract(CreateUpdateMixIn, IOMixIn):
                            'ledger_pk': self.uuid
                        })
 
+    def update_period_balances(self, dates: Optional[Iterable] = None):
+        """
+        Re-aggregates the materialized AccountPeriodBalanceModel periods affected by this ledger. Only periods
+        already rolled up are affected. Does nothing unless DJANGO_LEDGER_USE_PERIOD_BALANCES is enabled.
+
+        @param dates: The dates of the changed Journal Entries. If None, all Journal Entry dates of the ledger are used.
+        @return: The set of re-aggregated periods.
+        """
+        if not DJANGO_LEDGER_USE_PERIOD_BALANCES:
+            return set()
+
+        if dates is None:
+            # pylint: disable=no-member
+            dates = self.journal_entries.dates('date', 'month')
+
+        # open period transactions are never rolled up...
+        open_period = localdate().replace(day=1)
+        dates = [dt for dt in dates if dt and dt < open_period]
+        if not dates:
+            return set()
+
+        EntityModel = lazy_loader.get_entity_model()
+        AccountPeriodBalanceModel = lazy_loader.get_account_period_balance_model()
+        entity_model = EntityModel.objects.only('uuid', 'period_balances_date').get(uuid__exact=self.entity_id)
+        return AccountPeriodBalanceModel.objects.refresh(entity_model=entity_model, dates=dates)
+
+    def update_denormalized_txs(self) -> int:
+        """
+        Copies the Ledger and Journal Entries state into the denormalized columns of the ledger transactions, with a
+        single query.
+
+        @return: The number of updated transactions.
+        """
+        TransactionModel = lazy_loader.get_txs_model()
+        return TransactionModel.objects.filter(journal_entry__ledger_id=self.uuid).update_denormalized()
+
     def post(self, commit: bool = False):
         if not self.posted:
             self.posted = True
@@ -96,6 +221,7 @@ class LedgerModelAbstract(CreateUpdateMixIn, IOMixIn):
                     'posted',
                     'updated'
                 ])
+                self.update_period_balances()
 
     def unpost(self, commit: bool = False):
         if self.posted:
@@ -105,6 +231,7 @@ class LedgerModelAbstract(CreateUpdateMixIn, IOMixIn):
                     'posted',
                     'updated'
                 ])
+                self.update_period_balances()
 
     def lock(self, commit: bool = False):
         self.locked = True
@@ -127,3 +254,29 @@ class LedgerModel(LedgerModelAbstract):
     """
     Ledger Model from Abstract
     """
+
+
+def ledgermodel_digest_version(instance: LedgerModel, **kwargs):
+    bump_digest_version(instance.entity_id)
+
+
+post_save.connect(receiver=ledgermodel_digest_version, sender=LedgerModel)
+post_delete.connect(receiver=ledgermodel_digest_version, sender=LedgerModel)
+
+
+def ledgermodel_ledger_state(instance: LedgerModel, update_fields=None, **kwargs):
+    # the posted state changes the ledger balances, unlocked ledgers may be edited outside of migrate_state...
+    if update_fields is None or 'posted' in update_fields or 'locked' in update_fields:
+        LedgerWrapperMixIn.reset_ledger_state_snapshot(uuid__exact=instance.uuid)
+
+
+post_save.connect(receiver=ledgermodel_ledger_state, sender=LedgerModel)
+
+
+def ledgermodel_denormalized_txs(instance: LedgerModel, created: bool, update_fields=None, **kwargs):
+    if DJANGO_LEDGER_DENORMALIZED_TXS and not created:
+        if update_fields is None or 'posted' in update_fields:
+            instance.update_denormalized_txs()
+
+
+post_save.connect(receiver=ledgermodel_denormalized_txs, sender=LedgerModel)
@@ -11,19 +11,23 @@ from datetime import timedelta, date
 from decimal import Decimal
 from itertools import groupby
 from typing import Optional
+from uuid import UUID
 
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator, MinLengthValidator
 from django.core.validators import int_list_validator
-from django.db import models
-from django.db.models import QuerySet
+from django.db import models, transaction
+from django.db.models import QuerySet, Sum
 from django.utils.encoding import force_str
 from django.utils.timezone import localdate
 from django.utils.translation import gettext_lazy as _
 from markdown import markdown
 
 from django_ledger.io import balance_tx_data, ASSET_CA_CASH, ASSET_CA_PREPAID, LIABILITY_CL_DEFERRED_REVENUE
+from django_ledger.io.digest_cache import bump_digest_version
 from django_ledger.models.utils import lazy_loader
+from django_ledger.settings import (DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT, DJANGO_LEDGER_DENORMALIZED_TXS,
+                                    DJANGO_LEDGER_PERPETUAL_INVENTORY)
 
 
 class SlugNameMixIn(models.Model):
@@ -87,6 +91,8 @@ class LedgerWrapperMixIn(models.Model):
     IS_DEBIT_BALANCE = None
     REL_NAME_PREFIX = None
     ALLOW_MIGRATE = True
+    # ItemTransactionModel foreign key to the wrapper model...
+    ITEM_TXS_RELATED_FIELD = None
     TX_TYPE_MAPPING = {
         'ci': 'credit',
         'dd': 'credit',
@@ -156,6 +162,12 @@ class LedgerWrapperMixIn(models.Model):
                                          verbose_name=_('Unearned Account'),
                                          related_name=f'{REL_NAME_PREFIX}_unearned_account')
 
+    # snapshot of the posted ledger balances, as of the last state migration...
+    ledger_state = models.JSONField(null=True,
+                                    blank=True,
+                                    editable=False,
+                                    verbose_name=_('Ledger State'))
+
     class Meta:
         abstract = True
 
@@ -229,6 +241,10 @@ class LedgerWrapperMixIn(models.Model):
     def get_migration_data(self, queryset=None):
         raise NotImplementedError('Must implement get_account_balance_data method.')
 
+    @staticmethod
+    def values_migration_data(queryset, *extra_fields):
+        raise NotImplementedError('Must implement values_migration_data method.')
+
     def get_migrate_state_desc(self, *args, **kwargs):
         """
         Must be implemented.
@@ -297,6 +313,288 @@ class LedgerWrapperMixIn(models.Model):
                 raise ValidationError(_('Bill ledger %s is not posted...') % ledger_model.name)
         ledger_model.post(commit)
 
+    def get_ledger_state_snapshot(self) -> Optional[dict]:
+        """
+        The stored ledger state snapshot, if DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT is enabled and the snapshot has not
+        been discarded by a change to the ledger.
+        :return: A dictionary of {(account_uuid, unit_uuid, balance_type): balance} or None.
+        """
+        if not DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT or self.ledger_state is None:
+            return None
+        return {
+            (UUID(acc_uuid), UUID(unit_uuid) if unit_uuid else None, bal_type): Decimal(bal)
+            for acc_uuid, unit_uuid, bal_type, bal in self.ledger_state
+        }
+
+    def save_ledger_state_snapshot(self, ledger_state: Optional[dict]):
+        """
+        Stores the ledger state snapshot. Only the snapshot column is updated.
+        :param ledger_state: A dictionary of {(account_uuid, unit_uuid, balance_type): balance} or None to discard it.
+        """
+        ledger_state = self.serialize_ledger_state(ledger_state)
+        self.ledger_state = ledger_state
+        self.__class__.objects.filter(uuid__exact=self.uuid).update(ledger_state=ledger_state)
+
+    @staticmethod
+    def serialize_ledger_state(ledger_state: Optional[dict]) -> Optional[list]:
+        """
+        JSON representation of a ledger state, as stored in the ledger_state snapshot column. Zero balances are dropped.
+        :param ledger_state: A dictionary of {(account_uuid, unit_uuid, balance_type): balance} or None.
+        :return: A list of [account_uuid, unit_uuid, balance_type, balance] or None.
+        """
+        if ledger_state is None:
+            return None
+        return [
+            [str(acc_uuid), str(unit_uuid) if unit_uuid else None, bal_type, str(bal)]
+            for (acc_uuid, unit_uuid, bal_type), bal in ledger_state.items() if bal
+        ]
+
+    @staticmethod
+    def get_ledger_states(ledger_uuids: list) -> dict:
+        """
+        The current posted balances of many ledgers, computed with a single aggregate query. Equivalent to the ledger
+        digest by unit used by migrate_state.
+        :param ledger_uuids: The LedgerModel UUIDs.
+        :return: A dictionary of {ledger_uuid: {(account_uuid, unit_uuid, balance_type): balance}}.
+        """
+        TransactionModel = lazy_loader.get_transaction_model()
+        txs_qs = TransactionModel.objects.filter(
+            journal_entry__ledger_id__in=ledger_uuids,
+            journal_entry__date__lte=localdate()
+        ).posted().values(
+            'journal_entry__ledger_id',
+            'account_id',
+            'journal_entry__entity_unit_id',
+            'account__balance_type',
+            'tx_type'
+        ).annotate(
+            amount_sum=Sum('amount')
+        ).order_by()
+
+        ledger_states = {ledger_uuid: dict() for ledger_uuid in ledger_uuids}
+        for tx in txs_qs:
+            k = (tx['account_id'], tx['journal_entry__entity_unit_id'], tx['account__balance_type'])
+            amount = tx['amount_sum'] if tx['tx_type'] == k[2] else -tx['amount_sum']
+            ledger_state = ledger_states[tx['journal_entry__ledger_id']]
+            ledger_state[k] = ledger_state.get(k, Decimal('0.00')) + amount
+        return ledger_states
+
+    @staticmethod
+    def reset_ledger_state_snapshot(**ledger_lookup):
+        """
+        Discards the migrate_state snapshot of all BillModel and InvoiceModel wrapping the ledgers matching the
+        lookup. Must be called whenever the transactions or posted state of a wrapped ledger change outside of
+        migrate_state.
+        :param ledger_lookup: LedgerModel lookup. E.g. uuid__exact=ledger_uuid.
+        """
+        if DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT:
+            lookup = {f'ledger__{k}': v for k, v in ledger_lookup.items()}
+            for wrapper_model in [lazy_loader.get_bill_model(), lazy_loader.get_invoice_model()]:
+                wrapper_model.objects.filter(ledger_state__isnull=False, **lookup).update(ledger_state=None)
+
+    def get_new_ledger_state(self, item_data: list, void: bool = False, commit: bool = True) -> dict:
+        """
+        Computes the ledger balances that correspond to the current state of the model and its items.
+        :param item_data: The migration data, as returned by get_migration_data().
+        :param void: Computes the void state instead.
+        :param commit: Updates the model state fields (amount paid, receivable, unearned & earned).
+        :return: A dictionary of {(account_uuid, unit_uuid, balance_type): balance}.
+        """
+        cogs_adjustment = defaultdict(lambda: Decimal('0.00'))
+        inventory_adjustment = defaultdict(lambda: Decimal('0.00'))
+        progress = self.get_progress()
+
+        if isinstance(self, lazy_loader.get_bill_model()):
+
+            for item in item_data:
+                account_uuid_expense = item.get('item_model__expense_account__uuid')
+                account_uuid_inventory = item.get('item_model__inventory_account__uuid')
+                if account_uuid_expense:
+                    item['account_uuid'] = account_uuid_expense
+                    item['account_balance_type'] = item.get('item_model__expense_account__balance_type')
+                elif account_uuid_inventory:
+                    item['account_uuid'] = account_uuid_inventory
+                    item['account_balance_type'] = item.get('item_model__inventory_account__balance_type')
+
+        elif isinstance(self, lazy_loader.get_invoice_model()):
+
+            for item in item_data:
+
+                account_uuid_earnings = item.get('item_model__earnings_account__uuid')
+                account_uuid_cogs = item.get('item_model__cogs_account__uuid')
+                account_uuid_inventory = item.get('item_model__inventory_account__uuid')
+
+                if account_uuid_earnings:
+                    item['account_uuid'] = account_uuid_earnings
+                    item['account_balance_type'] = item.get('item_model__earnings_account__balance_type')
+
+                if account_uuid_cogs and account_uuid_inventory:
+
+                    try:
+                        irq = item.get('item_model__inventory_received')
+                        irv = item.get('item_model__inventory_received_value')
+                        tot_amt = 0
+                        if DJANGO_LEDGER_PERPETUAL_INVENTORY and item.get('inventory_value') is not None:
+                            # the item has been relieved from the on-hand inventory, which no longer includes it...
+                            tot_amt = item['inventory_value']
+                        elif irq is not None and irv is not None and irq != 0:
+                            qty = item.get('quantity', Decimal('0.00'))
+                            if not isinstance(qty, Decimal):
+                                qty = Decimal.from_float(qty)
+                            cogs_unit_cost = irv / irq
+                            tot_amt = round(cogs_unit_cost * qty, 2)
+                    except ZeroDivisionError:
+                        tot_amt = 0
+
+                    if tot_amt != 0:
+                        # keeps track of necessary transactions to increase COGS account...
+                        cogs_adjustment[(
+                            account_uuid_cogs,
+                            item.get('entity_unit__uuid'),
+                            item.get('item_model__cogs_account__balance_type')
+                        )] += tot_amt * progress
+
+                        # keeps track of necessary transactions to reduce inventory account...
+                        inventory_adjustment[(
+                            account_uuid_inventory,
+                            item.get('entity_unit__uuid'),
+                            item.get('item_model__inventory_account__balance_type')
+                        )] -= tot_amt * progress
+
+        item_data_gb = groupby(item_data,
+                               key=lambda a: (a['account_uuid'],
+                                              a['entity_unit__uuid'],
+                                              a['account_balance_type']))
+
+        # scaling down item amount based on progress...
+        progress_item_idx = {
+            idx: round(sum(a['account_unit_total'] for a in ad) * progress, 2) for idx, ad in item_data_gb
+        }
+
+        # tuple ( unit_uuid, total_amount ) sorted by uuid...
+        # sorting before group by...
+        ua_gen = list((k[1], v) for k, v in progress_item_idx.items())
+        ua_gen.sort(key=lambda a: str(a[0]) if a[0] else '')
+
+        unit_amounts = {
+            u: sum(a[1] for a in l) for u, l in groupby(ua_gen, key=lambda x: x[0])
+        }
+        total_amount = sum(unit_amounts.values())
+
+        # { unit_uuid: float (percent) }
+        unit_percents = {
+            k: (v / total_amount) if progress and total_amount else Decimal('0.00') for k, v in unit_amounts.items()
+        }
+
+        if not void:
+            new_state = self.new_state(commit=commit)
+        else:
+            new_state = self.void_state(commit=commit)
+
+        amount_paid_split = self.split_amount(
+            amount=new_state['amount_paid'],
+            unit_split=unit_percents,
+            account_uuid=self.cash_account_id,
+            account_balance_type='debit'
+        )
+        amount_prepaid_split = self.split_amount(
+            amount=new_state['amount_receivable'],
+            unit_split=unit_percents,
+            account_uuid=self.prepaid_account_id,
+            account_balance_type='debit'
+        )
+        amount_unearned_split = self.split_amount(
+            amount=new_state['amount_unearned'],
+            unit_split=unit_percents,
+            account_uuid=self.unearned_account_id,
+            account_balance_type='credit'
+        )
+
+        new_ledger_state = dict()
+        new_ledger_state.update(amount_paid_split)
+        new_ledger_state.update(amount_prepaid_split)
+        new_ledger_state.update(amount_unearned_split)
+
+        if inventory_adjustment and cogs_adjustment:
+            new_ledger_state.update(cogs_adjustment)
+            new_ledger_state.update(inventory_adjustment)
+
+        new_ledger_state.update(progress_item_idx)
+        return new_ledger_state
+
+    def get_migrate_state_models(self, current_ledger_state: dict, new_ledger_state: dict, je_date: date = None):
+        """
+        Builds the unsaved JournalEntryModels, one per entity unit involved, and the balanced TransactionModels needed
+        to move the ledger from its current state to the new state.
+        :param current_ledger_state: The current ledger balances.
+        :param new_ledger_state: The new ledger balances.
+        :param je_date: The JournalEntryModel date. Defaults to localdate().
+        :return: A tuple of ({unit_uuid: JournalEntryModel}, [(account_uuid, unit_uuid, balance_type)], [TransactionModel])
+        """
+        JournalEntryModel = lazy_loader.get_journal_entry_model()
+        TransactionModel = lazy_loader.get_transaction_model()
+
+        # list of all keys involved
+        idx_keys = set(list(current_ledger_state) + list(new_ledger_state))
+
+        # difference between new vs current
+        diff_idx = {
+            k: new_ledger_state.get(k, Decimal('0.00')) - current_ledger_state.get(k, Decimal('0.00')) for k in
+            idx_keys
+        }
+
+        # eliminates transactions with no amount...
+        diff_idx = {
+            k: v for k, v in diff_idx.items() if v
+        }
+
+        unit_uuids = list(set(k[1] for k in idx_keys))
+        now_date = localdate() if not je_date else je_date
+        je_list = {
+            u: JournalEntryModel(
+                entity_unit_id=u,
+                date=now_date,
+                description=self.get_migrate_state_desc(),
+                origin='migration',
+                ledger_id=self.ledger_id
+            ) for u in unit_uuids
+        }
+
+        txs_list = [
+            (unit_uuid, TransactionModel(
+                journal_entry=je_list.get(unit_uuid),
+                amount=abs(round(amt, 2)),
+                tx_type=self.get_tx_type(acc_bal_type=bal_type, adjustment_amount=amt),
+                account_id=acc_uuid,
+                description=self.get_migrate_state_desc()
+            )) for (acc_uuid, unit_uuid, bal_type), amt in diff_idx.items()
+        ]
+
+        for unit_uuid, tx in txs_list:
+            tx.clean()
+
+        for uid in unit_uuids:
+            # validates each unit txs independently...
+            balance_tx_data(tx_data=[tx for ui, tx in txs_list if uid == ui], perform_correction=True)
+
+        # validates all txs as a whole (for safety)...
+        txs = [tx for ui, tx in txs_list]
+        balance_tx_data(tx_data=txs, perform_correction=True)
+
+        return je_list, list(diff_idx), txs
+
+    @staticmethod
+    def get_migrated_ledger_state(current_ledger_state: dict, txs_keys: list, txs: list) -> dict:
+        """
+        The ledger balances after the migration transactions are posted. Uses the actual transaction amounts, which
+        may include balancing corrections.
+        """
+        ledger_state = dict(current_ledger_state)
+        for k, tx in zip(txs_keys, txs):
+            amount = tx.amount if tx.tx_type == k[2] else -tx.amount
+            ledger_state[k] = ledger_state.get(k, Decimal('0.00')) + amount
+        return ledger_state
+
     def migrate_state(self,
                       user_model,
                       entity_slug: str,
@@ -311,218 +609,226 @@ class LedgerWrapperMixIn(models.Model):
 
         if self.can_migrate() or force_migrate:
 
-            # getting current ledger state
-            txs_qs, txs_digest = self.ledger.digest(
-                user_model=user_model,
-                process_groups=True,
-                process_roles=False,
-                process_ratios=False,
-                signs=False,
-                by_unit=True
-            )
-
-            digest_data = txs_digest['tx_digest']['accounts']
-
-            # Index (account_uuid, unit_uuid, balance_type, role)
-            current_ledger_state = {
-                (a['account_uuid'], a['unit_uuid'], a['balance_type']): a['balance'] for a in digest_data
-                # (a['account_uuid'], a['unit_uuid'], a['balance_type'], a['role']): a['balance'] for a in digest_data
-            }
-
-            item_data = list(self.get_migration_data(queryset=itemtxs_qs))
-            cogs_adjustment = defaultdict(lambda: Decimal('0.00'))
-            inventory_adjustment = defaultdict(lambda: Decimal('0.00'))
-            progress = self.get_progress()
-
-            if isinstance(self, lazy_loader.get_bill_model()):
-
-                for item in item_data:
-                    account_uuid_expense = item.get('item_model__expense_account__uuid')
-                    account_uuid_inventory = item.get('item_model__inventory_account__uuid')
-                    if account_uuid_expense:
-                        item['account_uuid'] = account_uuid_expense
-                        item['account_balance_type'] = item.get('item_model__expense_account__balance_type')
-                    elif account_uuid_inventory:
-                        item['account_uuid'] = account_uuid_inventory
-                        item['account_balance_type'] = item.get('item_model__inventory_account__balance_type')
-
-            elif isinstance(self, lazy_loader.get_invoice_model()):
-
-                for item in item_data:
-
-                    account_uuid_earnings = item.get('item_model__earnings_account__uuid')
-                    account_uuid_cogs = item.get('item_model__cogs_account__uuid')
-                    account_uuid_inventory = item.get('item_model__inventory_account__uuid')
-
-                    if account_uuid_earnings:
-                        item['account_uuid'] = account_uuid_earnings
-                        item['account_balance_type'] = item.get('item_model__earnings_account__balance_type')
-
-                    if account_uuid_cogs and account_uuid_inventory:
-
-                        try:
-                            irq = item.get('item_model__inventory_received')
-                            irv = item.get('item_model__inventory_received_value')
-                            tot_amt = 0
-                            if irq is not None and irv is not None and irq != 0:
-                                qty = item.get('quantity', Decimal('0.00'))
-                                if not isinstance(qty, Decimal):
-                                    qty = Decimal.from_float(qty)
-                                cogs_unit_cost = irv / irq
-                                tot_amt = round(cogs_unit_cost * qty, 2)
-                        except ZeroDivisionError:
-                            tot_amt = 0
-
-                        if tot_amt != 0:
-                            # keeps track of necessary transactions to increase COGS account...
-                            cogs_adjustment[(
-                                account_uuid_cogs,
-                                item.get('entity_unit__uuid'),
-                                item.get('item_model__cogs_account__balance_type')
-                            )] += tot_amt * progress
-
-                            # keeps track of necessary transactions to reduce inventory account...
-                            inventory_adjustment[(
-                                account_uuid_inventory,
-                                item.get('entity_unit__uuid'),
-                                item.get('item_model__inventory_account__balance_type')
-                            )] -= tot_amt * progress
-
-            item_data_gb = groupby(item_data,
-                                   key=lambda a: (a['account_uuid'],
-                                                  a['entity_unit__uuid'],
-                                                  a['account_balance_type']))
-
-            # scaling down item amount based on progress...
-            progress_item_idx = {
-                idx: round(sum(a['account_unit_total'] for a in ad) * progress, 2) for idx, ad in item_data_gb
-            }
-
-            # tuple ( unit_uuid, total_amount ) sorted by uuid...
-            # sorting before group by...
-            ua_gen = list((k[1], v) for k, v in progress_item_idx.items())
-            ua_gen.sort(key=lambda a: str(a[0]) if a[0] else '')
-
-            unit_amounts = {
-                u: sum(a[1] for a in l) for u, l in groupby(ua_gen, key=lambda x: x[0])
-            }
-            total_amount = sum(unit_amounts.values())
-
-            # { unit_uuid: float (percent) }
-            unit_percents = {
-                k: (v / total_amount) if progress and total_amount else Decimal('0.00') for k, v in unit_amounts.items()
-            }
-
-            if not void:
-                new_state = self.new_state(commit=commit)
+            # getting current ledger state, from the snapshot if available...
+            current_ledger_state = self.get_ledger_state_snapshot()
+
+            if current_ledger_state is None:
+                txs_qs, txs_digest = self.ledger.digest(
+                    user_model=user_model,
+                    process_groups=True,
+                    process_roles=False,
+                    process_ratios=False,
+                    signs=False,
+                    by_unit=True,
+                    use_cache=False
+                )
+
+                digest_data = txs_digest['tx_digest']['accounts']
+
+                # Index (account_uuid, unit_uuid, balance_type, role)
+                current_ledger_state = {
+                    (a['account_uuid'], a['unit_uuid'], a['balance_type']): a['balance'] for a in digest_data
+                    # (a['account_uuid'], a['unit_uuid'], a['balance_type'], a['role']): a['balance'] for a in digest_data
+                }
             else:
-                new_state = self.void_state(commit=commit)
-
-            amount_paid_split = self.split_amount(
-                amount=new_state['amount_paid'],
-                unit_split=unit_percents,
-                account_uuid=self.cash_account_id,
-                account_balance_type='debit'
-            )
-            amount_prepaid_split = self.split_amount(
-                amount=new_state['amount_receivable'],
-                unit_split=unit_percents,
-                account_uuid=self.prepaid_account_id,
-                account_balance_type='debit'
-            )
-            amount_unearned_split = self.split_amount(
-                amount=new_state['amount_unearned'],
-                unit_split=unit_percents,
-                account_uuid=self.unearned_account_id,
-                account_balance_type='credit'
-            )
-
-            new_ledger_state = dict()
-            new_ledger_state.update(amount_paid_split)
-            new_ledger_state.update(amount_prepaid_split)
-            new_ledger_state.update(amount_unearned_split)
-
-            if inventory_adjustment and cogs_adjustment:
-                new_ledger_state.update(cogs_adjustment)
-                new_ledger_state.update(inventory_adjustment)
-
-            new_ledger_state.update(progress_item_idx)
-
-            # list of all keys involved
-            idx_keys = set(list(current_ledger_state) + list(new_ledger_state))
-
-            # difference between new vs current
-            diff_idx = {
-                k: new_ledger_state.get(k, Decimal('0.00')) - current_ledger_state.get(k, Decimal('0.00')) for k in
-                idx_keys
-            }
+                digest_data = [
+                    {
+                        'account_uuid': acc_uuid,
+                        'unit_uuid': unit_uuid,
+                        'balance_type': bal_type,
+                        'balance': bal
+                    } for (acc_uuid, unit_uuid, bal_type), bal in current_ledger_state.items()
+                ]
 
-            # eliminates transactions with no amount...
-            diff_idx = {
-                k: v for k, v in diff_idx.items() if v
-            }
+            item_data = list(self.get_migration_data(queryset=itemtxs_qs))
+            new_ledger_state = self.get_new_ledger_state(item_data=item_data, void=void, commit=commit)
 
             if commit:
                 JournalEntryModel = lazy_loader.get_journal_entry_model()
                 TransactionModel = lazy_loader.get_transaction_model()
 
-                unit_uuids = list(set(k[1] for k in idx_keys))
+                je_list, txs_keys, txs = self.get_migrate_state_models(
+                    current_ledger_state=current_ledger_state,
+                    new_ledger_state=new_ledger_state,
+                    je_date=je_date
+                )
                 now_date = localdate() if not je_date else je_date
-                je_list = {
-                    u: JournalEntryModel(
-                        entity_unit_id=u,
-                        date=now_date,
-                        description=self.get_migrate_state_desc(),
-                        origin='migration',
-                        ledger_id=self.ledger_id
-                    ) for u in unit_uuids
-                }
 
                 for u, je in je_list.items():
                     je.clean(verify=False)
 
-                txs_list = [
-                    (unit_uuid, TransactionModel(
-                        journal_entry=je_list.get(unit_uuid),
-                        amount=abs(round(amt, 2)),
-                        tx_type=self.get_tx_type(acc_bal_type=bal_type, adjustment_amount=amt),
-                        account_id=acc_uuid,
-                        description=self.get_migrate_state_desc()
-                    )) for (acc_uuid, unit_uuid, bal_type), amt in diff_idx.items() if amt
-                ]
-
-                for unit_uuid, tx in txs_list:
-                    tx.clean()
-
-                for uid in unit_uuids:
-                    # validates each unit txs independently...
-                    balance_tx_data(tx_data=[tx for ui, tx in txs_list if uid == ui], perform_correction=True)
-
-                # validates all txs as a whole (for safety)...
-                txs = [tx for ui, tx in txs_list]
-                balance_tx_data(tx_data=txs, perform_correction=True)
-                TransactionModel.objects.bulk_create(txs)
-
-                if verify_journal_entries:
-                    for _, je in je_list.items():
-                        # will independently verify and populate appropriate activity for JE.
-                        je.clean(verify=True)
-                        if je.is_verified():
-                            je.mark_as_posted(commit=False, raise_exception=True)
-                            je.mark_as_locked(commit=False, raise_exception=True)
-
-                    if all([je.is_verified() for _, je in je_list.items()]):
-                        # only if all JEs have been verified will be posted and locked...
-                        JournalEntryModel.objects.bulk_update(
-                            objs=[je for _, je in je_list.items()],
-                            fields=['posted', 'locked', 'activity']
-                        )
+                with transaction.atomic():
+                    TransactionModel.objects.bulk_create(txs)
+                    # bulk_create bypasses save() & signals, cached digests must be invalidated explicitly...
+                    bump_digest_version(self.ledger.entity_id)
+
+                    if verify_journal_entries:
+                        for _, je in je_list.items():
+                            # will independently verify and populate appropriate activity for JE.
+                            je.clean(verify=True)
+                            if je.is_verified():
+                                je.mark_as_posted(commit=False, raise_exception=True)
+                                je.mark_as_locked(commit=False, raise_exception=True)
+
+                        if all([je.is_verified() for _, je in je_list.items()]):
+                            # only if all JEs have been verified will be posted and locked...
+                            JournalEntryModel.objects.bulk_update(
+                                objs=[je for _, je in je_list.items()],
+                                fields=['posted', 'locked', 'activity']
+                            )
+
+                            # bulk_update bypasses save(), period balances must be updated explicitly...
+                            self.ledger.update_period_balances(dates=[now_date])
+                            bump_digest_version(self.ledger.entity_id)
+
+                    if DJANGO_LEDGER_DENORMALIZED_TXS:
+                        # bulk_create & bulk_update bypass save()...
+                        TransactionModel.objects.filter(
+                            journal_entry__in=[je for _, je in je_list.items()]
+                        ).update_denormalized()
+
+                    if DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT:
+                        # the snapshot must match the posted ledger balances, otherwise it is discarded...
+                        new_snapshot = None
+                        if all([
+                            verify_journal_entries,
+                            self.ledger.posted,
+                            all([je.posted for _, je in je_list.items()])
+                        ]):
+                            new_snapshot = self.get_migrated_ledger_state(current_ledger_state, txs_keys, txs)
+                        self.save_ledger_state_snapshot(new_snapshot)
 
             return item_data, digest_data
         else:
             if raise_exception:
                 raise ValidationError(f'{self.REL_NAME_PREFIX.upper()} state migration not allowed')
 
+    @classmethod
+    def bulk_migrate_state(cls, wrapper_list: list, je_date: date = None, void: bool = False) -> list:
+        """
+        Migrates the state of many models into their ledgers. Current ledger balances and item data are fetched with
+        one query each, all ledger differences are computed in memory and the resulting Journal Entries and
+        Transactions are inserted with one bulk_create each, in a single atomic block. Journal Entries are posted and
+        locked only if all the Journal Entries of the model are verified.
+        Models must be fetched with select_related('ledger__entity').
+        :param wrapper_list: The models to migrate, all of the same class.
+        :param je_date: The Journal Entries date. Defaults to localdate().
+        :param void: If True, migrates the void state instead of the new state.
+        :return: The list of created JournalEntryModels.
+        """
+        if not wrapper_list:
+            return list()
+
+        JournalEntryModel = lazy_loader.get_journal_entry_model()
+        TransactionModel = lazy_loader.get_transaction_model()
+        AccountModel = lazy_loader.get_account_model()
+        EntityUnitModel = lazy_loader.get_entity_unit_model()
+        EntityStateModel = lazy_loader.get_entity_state_model()
+        ItemTransactionModel = lazy_loader.get_item_transaction_model()
+
+        # current ledger states, from the snapshots if available...
+        current_states = {w.uuid: w.get_ledger_state_snapshot() for w in wrapper_list}
+        missing_ledgers = [w.ledger_id for w in wrapper_list if current_states[w.uuid] is None]
+        if missing_ledgers:
+            ledger_states = cls.get_ledger_states(missing_ledgers)
+            for w in wrapper_list:
+                if current_states[w.uuid] is None:
+                    current_states[w.uuid] = ledger_states[w.ledger_id]
+
+        # item data of all models...
+        fk_field = f'{cls.ITEM_TXS_RELATED_FIELD}_id'
+        itemtxs_qs = ItemTransactionModel.objects.filter(**{
+            f'{fk_field}__in': [w.uuid for w in wrapper_list]
+        })
+        item_data_idx = defaultdict(list)
+        for item in cls.values_migration_data(itemtxs_qs, fk_field):
+            item_data_idx[item.pop(fk_field)].append(item)
+
+        migration_data = list()
+        for w in wrapper_list:
+            new_ledger_state = w.get_new_ledger_state(item_data=item_data_idx[w.uuid], void=void, commit=True)
+            je_idx, txs_keys, txs = w.get_migrate_state_models(
+                current_ledger_state=current_states[w.uuid],
+                new_ledger_state=new_ledger_state,
+                je_date=je_date
+            )
+            migration_data.append((w, je_idx, txs_keys, txs))
+
+        account_idx = {
+            a.uuid: a for a in AccountModel.objects.filter(
+                uuid__in=set(tx.account_id for w, je_idx, txs_keys, txs in migration_data for tx in txs)
+            ).only('uuid', 'role', 'balance_type')
+        }
+        unit_idx = {
+            u.uuid: u for u in EntityUnitModel.objects.filter(
+                uuid__in=set(u for w, je_idx, txs_keys, txs in migration_data for u in je_idx if u)
+            ).only('uuid', 'document_prefix')
+        }
+
+        je_by_fy = defaultdict(list)
+        for w, je_idx, txs_keys, txs in migration_data:
+            for tx in txs:
+                tx.account = account_idx[tx.account_id]
+
+            for unit_uuid, je in je_idx.items():
+                je.ledger = w.ledger
+                if unit_uuid:
+                    je.entity_unit = unit_idx[unit_uuid]
+                je.verify(txs_qs=[tx for tx in txs if tx.journal_entry is je], raise_exception=True)
+                fy_key = w.ledger.entity.get_fy_for_date(dt=je.date)
+                je_by_fy[(str(w.ledger.entity_id), str(unit_uuid) if unit_uuid else '', fy_key)].append(je)
+
+            if all([je.is_verified() for je in je_idx.values()]):
+                # only if all JEs have been verified will be posted and locked...
+                for je in je_idx.values():
+                    je.mark_as_posted(commit=False, raise_exception=True)
+                    je.mark_as_locked(commit=False, raise_exception=True)
+
+        je_list = [je for w, je_idx, txs_keys, txs in migration_data for je in je_idx.values()]
+
+        with transaction.atomic():
+            # one block of JE numbers per entity, unit & fiscal year. Sorted, so concurrent calls lock rows in same order.
+            for (entity_uuid, unit_uuid, fy_key), fy_je_list in sorted(je_by_fy.items()):
+                state_model = EntityStateModel.objects.reserve_block(
+                    entity_id=entity_uuid,
+                    key=EntityStateModel.KEY_JOURNAL_ENTRY,
+                    block_size=len(fy_je_list),
+                    entity_unit_id=unit_uuid or None,
+                    fiscal_year=fy_key
+                )
+                seq = state_model.sequence - len(fy_je_list) + 1
+                for i, je in enumerate(fy_je_list):
+                    je.je_number = je.get_je_number(fiscal_year=fy_key, sequence=seq + i)
+
+            JournalEntryModel.objects.bulk_create(je_list)
+            TransactionModel.objects.bulk_create([tx for w, je_idx, txs_keys, txs in migration_data for tx in txs])
+
+            if DJANGO_LEDGER_DENORMALIZED_TXS:
+                TransactionModel.objects.filter(journal_entry__in=je_list).update_denormalized()
+
+            # bulk_create bypasses save() & signals, period balances must be updated explicitly...
+            LedgerModel = lazy_loader.get_ledger_model()
+            posted_je_list = [je for je in je_list if je.posted]
+            LedgerModel.objects.bulk_update_period_balances(
+                ledger_list=list({je.ledger_id: je.ledger for je in posted_je_list}.values()),
+                dates=set(je.date for je in posted_je_list)
+            )
+
+            if DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT:
+                # the snapshot must match the posted ledger balances, otherwise it is discarded...
+                for w, je_idx, txs_keys, txs in migration_data:
+                    new_snapshot = None
+                    if w.ledger.posted and all([je.posted for je in je_idx.values()]):
+                        new_snapshot = cls.get_migrated_ledger_state(current_states[w.uuid], txs_keys, txs)
+                    w.ledger_state = cls.serialize_ledger_state(new_snapshot)
+                cls.objects.bulk_update(wrapper_list, fields=['ledger_state'])
+
+        # cached digests must be invalidated explicitly...
+        for entity_uuid in set(w.ledger.entity_id for w in wrapper_list):
+            bump_digest_version(entity_uuid)
+
+        return je_list
+
     def void_state(self, commit: bool = False):
         void_state = {
             'amount_paid': Decimal.from_float(0.0),
@@ -769,3 +1075,4 @@ class LoggingMixIn:
     def get_logger(self) -> logging.Logger:
         name = self.get_logger_name()
         return logging.getLogger(name)
+
@@ -22,8 +22,10 @@ from django.utils.timezone import localdate
 from django.utils.translation import gettext_lazy as _
 
 from django_ledger.models import EntityModel, ItemTransactionModel, lazy_loader, BillModel
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.mixins import CreateUpdateMixIn, MarkdownNotesMixIn
-from django_ledger.settings import DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_PO_NUMBER_PREFIX
+from django_ledger.settings import (DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_PO_NUMBER_PREFIX,
+                                    DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS)
 
 PO_NUMBER_CHARS = ascii_uppercase + digits
 
@@ -54,10 +56,7 @@ class PurchaseOrderModelManager(models.Manager):
             qs = qs.filter(entity=entity_slug)
         elif isinstance(entity_slug, str):
             qs = qs.filter(entity__slug__exact=entity_slug)
-        return qs.filter(
-            Q(entity__admin=user_model) |
-            Q(entity__managers__in=[user_model])
-        )
+        return qs.filter(entity_access_q(user_model=user_model, entity_field='entity'))
 
 
 class PurchaseOrderModelAbstract(CreateUpdateMixIn, MarkdownNotesMixIn):
@@ -346,7 +345,9 @@ class PurchaseOrderModelAbstract(CreateUpdateMixIn, MarkdownNotesMixIn):
         self.po_status = self.PO_STATUS_APPROVED
         self.clean()
         if commit:
-            self.itemtransactionmodel_set.all().update(po_item_status=ItemTransactionModel.STATUS_NOT_ORDERED)
+            self.itemtransactionmodel_set.all().update_po_item_status(
+                po_item_status=ItemTransactionModel.STATUS_NOT_ORDERED
+            )
             self.save(update_fields=[
                 'date_approved',
                 'po_status',
@@ -425,7 +426,7 @@ class PurchaseOrderModelAbstract(CreateUpdateMixIn, MarkdownNotesMixIn):
         self.clean()
 
         if commit:
-            po_items.update(po_item_status=ItemTransactionModel.STATUS_RECEIVED)
+            po_items.update_po_item_status(po_item_status=ItemTransactionModel.STATUS_RECEIVED)
             self.save(update_fields=[
                 'date_fulfilled',
                 'po_status',
@@ -508,6 +509,11 @@ class PurchaseOrderModelAbstract(CreateUpdateMixIn, MarkdownNotesMixIn):
         entity_model = EntityModel.objects.get(uuid__exact=self.entity_id)
         fy_key = entity_model.get_fy_for_date(dt=self.date_draft)
         try:
+            if not DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS:
+                return EntityStateModel.objects.get_next_from_block(entity_id=self.entity_id,
+                                                                    key=EntityStateModel.KEY_PURCHASE_ORDER,
+                                                                    fiscal_year=fy_key)
+
             LOOKUP = {
                 'entity_id__exact': self.entity_id,
                 'entity_unit_id': None,
@@ -12,14 +12,19 @@ from uuid import uuid4, UUID
 
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import Q
+from django.db.models import Q, OuterRef, Subquery, Exists
+from django.db.models.signals import post_save, post_delete
 from django.utils.translation import gettext_lazy as _
 
+from django_ledger.io.digest_cache import is_digest_cache_enabled, bump_digest_version
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.accounts import AccountModel
 from django_ledger.models.entity import EntityModel
 from django_ledger.models.ledger import LedgerModel
-from django_ledger.models.mixins import CreateUpdateMixIn
+from django_ledger.models.mixins import CreateUpdateMixIn, LedgerWrapperMixIn
 from django_ledger.models.unit import EntityUnitModel
+from django_ledger.models.utils import lazy_loader
+from django_ledger.settings import DJANGO_LEDGER_DENORMALIZED_TXS, DJANGO_LEDGER_USE_PERIOD_BALANCES
 
 
 """
@@ -39,6 +44,8 @@ class TransactionQuerySet(models.QuerySet):
     """
     def posted(self):
         """ Used to select the transaction which are in 'posted' state """
+        if DJANGO_LEDGER_DENORMALIZED_TXS:
+            return self.filter(posted=True)
         return self.filter(
             Q(journal_entry__posted=True) &
             Q(journal_entry__ledger__posted=True)
@@ -46,10 +53,9 @@ class TransactionQuerySet(models.QuerySet):
 
     def for_user(self, user_model):
         """this will authenticate the user and allow the users only to view the transaction for which he is authorized """
-        return self.filter(
-            Q(journal_entry__ledger__entity__admin=user_model) |
-            Q(journal_entry__ledger__entity__managers__in=[user_model])
-        )
+        if DJANGO_LEDGER_DENORMALIZED_TXS:
+            return self.filter(entity_access_q(user_model=user_model, entity_field='entity'))
+        return self.filter(entity_access_q(user_model=user_model, entity_field='journal_entry__ledger__entity'))
 
     def for_accounts(self, account_list: List[str or AccountModel]):
         """This helps to view the transactions for a particular account. We can pass in one particular account of a list of accounts"""
@@ -61,17 +67,41 @@ class TransactionQuerySet(models.QuerySet):
         return self.filter(account__role__in=role_list)
 
     def for_unit(self, unit_slug: str):
+        if DJANGO_LEDGER_DENORMALIZED_TXS:
+            return self.filter(entity_unit__slug__exact=unit_slug)
         return self.filter(journal_entry__ledger__unit__slug__exact=unit_slug)
 
     def for_activity(self, activity_list: List[str]):
         return self.filter(journal_entry__activity__in=activity_list)
 
     def to_date(self, to_date: str or datetime):
+        if DJANGO_LEDGER_DENORMALIZED_TXS:
+            return self.filter(je_date__lte=to_date)
         return self.filter(journal_entry__date__lte=to_date)
 
     def from_date(self, from_date: str or datetime):
+        if DJANGO_LEDGER_DENORMALIZED_TXS:
+            return self.filter(je_date__gte=from_date)
         return self.filter(journal_entry__date__gte=from_date)
 
+    def update_denormalized(self) -> int:
+        """
+        Copies the entity, ledger, unit, date and effective posted state of the Journal Entry into the denormalized
+        columns of each transaction, with a single UPDATE query. A transaction is posted only when both its Journal
+        Entry and Ledger are posted.
+
+        @return: The number of updated transactions.
+        """
+        JournalEntryModel = lazy_loader.get_journal_entry_model()
+        je_qs = JournalEntryModel.objects.filter(uuid=OuterRef('journal_entry_id'))
+        return self.update(
+            entity_id=Subquery(je_qs.values('ledger__entity_id')[:1]),
+            ledger_id=Subquery(je_qs.values('ledger_id')[:1]),
+            entity_unit_id=Subquery(je_qs.values('entity_unit_id')[:1]),
+            je_date=Subquery(je_qs.values('date')[:1]),
+            posted=Exists(je_qs.filter(posted=True, ledger__posted=True))
+        )
+
 
 class TransactionModelAdmin(models.Manager):
 
@@ -79,15 +109,17 @@ class TransactionModelAdmin(models.Manager):
         return TransactionQuerySet(self.model, using=self._db)
 
     def for_user(self, user_model):
-        return self.filter(
-            Q(journal_entry__ledger__entity__admin=user_model) |
-            Q(journal_entry__ledger__entity__managers__in=[user_model])
-        )
+        return self.get_queryset().for_user(user_model=user_model)
 
     def for_entity(self,
                    user_model,
                    entity_slug: str = None):
         qs = self.for_user(user_model=user_model)
+        if DJANGO_LEDGER_DENORMALIZED_TXS:
+            if isinstance(entity_slug, EntityModel):
+                return qs.filter(entity_id=entity_slug.uuid)
+            elif isinstance(entity_slug, str):
+                return qs.filter(entity_id__in=EntityModel.objects.filter(slug__exact=entity_slug).values('uuid'))
         if isinstance(entity_slug, EntityModel):
             return qs.filter(journal_entry__ledger__entity=entity_slug)
         elif isinstance(entity_slug, str):
@@ -97,6 +129,11 @@ class TransactionModelAdmin(models.Manager):
                    user_model,
                    ledger_model: LedgerModel = None):
         qs = self.for_user(user_model=user_model)
+        if DJANGO_LEDGER_DENORMALIZED_TXS:
+            if isinstance(ledger_model, LedgerModel):
+                return qs.filter(ledger_id=ledger_model.uuid)
+            elif isinstance(ledger_model, str) or isinstance(ledger_model, UUID):
+                return qs.filter(ledger_id=ledger_model)
         if isinstance(ledger_model, LedgerModel):
             return qs.filter(journal_entry__ledger=ledger_model)
         elif isinstance(ledger_model, str) or isinstance(ledger_model, UUID):
@@ -115,6 +152,12 @@ class TransactionModelAdmin(models.Manager):
 
         qs = self.for_entity(user_model=user_model, entity_slug=entity_slug)
 
+        if DJANGO_LEDGER_DENORMALIZED_TXS:
+            if unit_model and isinstance(unit_model, EntityUnitModel):
+                return qs.filter(entity_unit_id=unit_model.uuid)
+            elif unit_slug and isinstance(unit_slug, str):
+                return qs.filter(entity_unit__slug__exact=unit_slug)
+
         if unit_model and isinstance(unit_model, EntityUnitModel):
             return qs.filter(journal_entry__entity_unit=unit_model)
         elif unit_slug and isinstance(unit_slug, str):
@@ -127,13 +170,9 @@ class TransactionModelAdmin(models.Manager):
                           je_pk: str):
         qs = self.get_queryset()
         return qs.filter(
-            Q(journal_entry__ledger__entity__slug__exact=entity_slug) &
             Q(journal_entry__ledger__uuid__exact=ledger_pk) &
             Q(journal_entry__uuid__exact=je_pk) &
-            (
-                    Q(journal_entry__ledger__entity__admin=user_model) |
-                    Q(journal_entry__ledger__entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='journal_entry__ledger__entity', entity_slug=entity_slug)
         )
 
     def for_account(self,
@@ -143,13 +182,9 @@ class TransactionModelAdmin(models.Manager):
                     entity_slug: str = None):
         qs = self.get_queryset()
         return qs.filter(
-            Q(journal_entry__ledger__entity__slug__exact=entity_slug) &
             # Q(account__coa__slug__exact=coa_slug) &
             Q(account_id=account_pk) &
-            (
-                    Q(journal_entry__ledger__entity__admin=user_model) |
-                    Q(journal_entry__ledger__entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='journal_entry__ledger__entity', entity_slug=entity_slug)
         )
 
     def for_bill(self,
@@ -201,6 +236,38 @@ class TransactionModelAbstract(CreateUpdateMixIn):
     description = models.CharField(max_length=100, null=True, blank=True,
                                    verbose_name=_('Tx Description'),
                                    help_text=_('A description to be included with this individual transaction'))
+
+    # denormalized copies of the journal entry state, only maintained when DJANGO_LEDGER_DENORMALIZED_TXS is enabled.
+    entity = models.ForeignKey('django_ledger.EntityModel',
+                               editable=False,
+                               null=True,
+                               blank=True,
+                               related_name='+',
+                               db_index=False,
+                               db_constraint=False,
+                               on_delete=models.DO_NOTHING,
+                               verbose_name=_('Entity'))
+    ledger = models.ForeignKey('django_ledger.LedgerModel',
+                               editable=False,
+                               null=True,
+                               blank=True,
+                               related_name='+',
+                               db_index=False,
+                               db_constraint=False,
+                               on_delete=models.DO_NOTHING,
+                               verbose_name=_('Ledger'))
+    entity_unit = models.ForeignKey('django_ledger.EntityUnitModel',
+                                    editable=False,
+                                    null=True,
+                                    blank=True,
+                                    related_name='+',
+                                    db_index=False,
+                                    db_constraint=False,
+                                    on_delete=models.DO_NOTHING,
+                                    verbose_name=_('Entity Unit'))
+    je_date = models.DateField(editable=False, null=True, blank=True, verbose_name=_('Journal Entry Date'))
+    posted = models.BooleanField(default=False, editable=False, verbose_name=_('Posted'))
+
     objects = TransactionModelAdmin()
 
     class Meta:
@@ -213,7 +280,12 @@ class TransactionModelAbstract(CreateUpdateMixIn):
             models.Index(fields=['account']),
             models.Index(fields=['journal_entry']),
             models.Index(fields=['created']),
-            models.Index(fields=['updated'])
+            models.Index(fields=['updated']),
+
+            # covering indexes of the denormalized digest queries, also used as the entity, ledger & unit indexes...
+            models.Index(fields=['entity', 'posted', 'je_date', 'account', 'tx_type', 'amount']),
+            models.Index(fields=['ledger', 'posted', 'je_date', 'account', 'tx_type', 'amount']),
+            models.Index(fields=['entity_unit', 'posted', 'je_date', 'account', 'tx_type', 'amount']),
         ]
 
     def __str__(self):
@@ -225,9 +297,68 @@ class TransactionModelAbstract(CreateUpdateMixIn):
                                                   # pylint: disable=no-member
                                                   x5=self.account.balance_type)
 
+    def update_denormalized_fields(self):
+        """
+        Copies the entity, ledger, unit, date and effective posted state of the Journal Entry into the transaction.
+        Does not query the database when the Journal Entry and its Ledger are already loaded.
+        """
+        # pylint: disable=no-member
+        je_model = self.journal_entry
+        self.entity_id = je_model.ledger.entity_id
+        self.ledger_id = je_model.ledger_id
+        self.entity_unit_id = je_model.entity_unit_id
+        self.je_date = je_model.date
+        self.posted = je_model.posted and je_model.ledger.posted
+
+    def save(self, *args, **kwargs):
+        if DJANGO_LEDGER_DENORMALIZED_TXS:
+            self.update_denormalized_fields()
+        super().save(*args, **kwargs)
+
 
 class TransactionModel(TransactionModelAbstract):
     """
     Base Transaction Model From Abstract.
     This is a new documentation.
     """
+
+
+def transactionmodel_digest_version(instance: TransactionModel, **kwargs):
+    if is_digest_cache_enabled():
+        JournalEntryModel = lazy_loader.get_journal_entry_model()
+        if TransactionModel.journal_entry.is_cached(instance) and JournalEntryModel.ledger.is_cached(
+                instance.journal_entry):
+            entity_uuid = instance.journal_entry.ledger.entity_id
+        else:
+            entity_uuid = JournalEntryModel.objects.filter(
+                uuid__exact=instance.journal_entry_id
+            ).values_list('ledger__entity_id', flat=True).first()
+        bump_digest_version(entity_uuid)
+
+
+post_save.connect(receiver=transactionmodel_digest_version, sender=TransactionModel)
+post_delete.connect(receiver=transactionmodel_digest_version, sender=TransactionModel)
+
+
+def transactionmodel_period_balances(instance: TransactionModel, **kwargs):
+    if DJANGO_LEDGER_USE_PERIOD_BALANCES:
+        if TransactionModel.journal_entry.is_cached(instance):
+            je_model = instance.journal_entry
+        else:
+            JournalEntryModel = lazy_loader.get_journal_entry_model()
+            je_model = JournalEntryModel.objects.filter(uuid__exact=instance.journal_entry_id).first()
+        # open period Journal Entries are never rolled up...
+        if je_model:
+            je_model.update_period_balances()
+
+
+post_save.connect(receiver=transactionmodel_period_balances, sender=TransactionModel)
+post_delete.connect(receiver=transactionmodel_period_balances, sender=TransactionModel)
+
+
+def transactionmodel_ledger_state(instance: TransactionModel, **kwargs):
+    LedgerWrapperMixIn.reset_ledger_state_snapshot(journal_entries__uuid__exact=instance.journal_entry_id)
+
+
+post_save.connect(receiver=transactionmodel_ledger_state, sender=TransactionModel)
+post_delete.connect(receiver=transactionmodel_ledger_state, sender=TransactionModel)
@@ -11,13 +11,15 @@ from string import ascii_lowercase, digits, ascii_uppercase
 from uuid import uuid4
 
 from django.db import models
-from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 from treebeard.mp_tree import MP_Node, MP_NodeManager
 
+from django_ledger.io.digest_cache import bump_digest_version
 from django_ledger.io.io_mixin import IOMixIn
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.mixins import CreateUpdateMixIn, SlugNameMixIn
 
 ENTITY_UNIT_RANDOM_SLUG_SUFFIX = ascii_lowercase + digits
@@ -39,11 +41,7 @@ class EntityUnitModelManager(MP_NodeManager):
     def for_entity(self, entity_slug: str, user_model):
         qs = self.get_queryset()
         return qs.filter(
-            Q(entity__slug__exact=entity_slug) &
-            (
-                    Q(entity__admin=user_model) |
-                    Q(entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='entity', entity_slug=entity_slug)
 
         )
 
@@ -95,10 +93,19 @@ class EntityUnitModelAbstract(MP_Node, IOMixIn, SlugNameMixIn, CreateUpdateMixIn
 
     def save(self, **kwargs):
         self.clean()
-        super(EntityUnitModelAbstract, self).save(self, **kwargs)
+        super(EntityUnitModelAbstract, self).save(**kwargs)
 
 
 class EntityUnitModel(EntityUnitModelAbstract):
     """
     Base Model Class for EntityUnitModel
     """
+
+
+def entityunitmodel_digest_version(instance: EntityUnitModel, **kwargs):
+    # unit names are part of the cached digests by unit...
+    bump_digest_version(instance.entity_id)
+
+
+post_save.connect(receiver=entityunitmodel_digest_version, sender=EntityUnitModel)
+post_delete.connect(receiver=entityunitmodel_digest_version, sender=EntityUnitModel)
@@ -29,6 +29,7 @@ class LazyLoader:
     TRANSACTION_MODEL = None
     ENTITY_UNIT_MODEL = None
     PURCHASE_ORDER_MODEL = None
+    ACCOUNT_PERIOD_BALANCE_MODEL = None
 
     def get_entity_model(self):
         if not self.ENTITY_MODEL:
@@ -138,5 +139,11 @@ class LazyLoader:
             self.ENTITY_UNIT_MODEL = EntityUnitModel
         return self.ENTITY_UNIT_MODEL
 
+    def get_account_period_balance_model(self):
+        if not self.ACCOUNT_PERIOD_BALANCE_MODEL:
+            from django_ledger.models import AccountPeriodBalanceModel
+            self.ACCOUNT_PERIOD_BALANCE_MODEL = AccountPeriodBalanceModel
+        return self.ACCOUNT_PERIOD_BALANCE_MODEL
+
 
 lazy_loader = LazyLoader()
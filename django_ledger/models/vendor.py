@@ -13,9 +13,11 @@ from django.db import models, transaction, IntegrityError
 from django.db.models import Q, F
 from django.utils.translation import gettext_lazy as _
 
+from django_ledger.models.access import entity_access_q
 from django_ledger.models.mixins import ContactInfoMixIn, CreateUpdateMixIn, BankAccountInfoMixIn, TaxInfoMixIn
 from django_ledger.models.utils import lazy_loader
-from django_ledger.settings import DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_VENDOR_NUMBER_PREFIX
+from django_ledger.settings import (DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING, DJANGO_LEDGER_VENDOR_NUMBER_PREFIX,
+                                    DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS)
 
 
 class VendorModelQuerySet(models.QuerySet):
@@ -29,10 +31,7 @@ class VendorModelManager(models.Manager):
         return qs.filter(
             Q(entity__slug__exact=entity_slug) &
             Q(active=True) &
-            (
-                    Q(entity__admin=user_model) |
-                    Q(entity__managers__in=[user_model])
-            )
+            entity_access_q(user_model=user_model, entity_field='entity')
         )
 
 
@@ -80,6 +79,10 @@ class VendorModelAbstract(ContactInfoMixIn,
         EntityStateModel = lazy_loader.get_entity_state_model()
 
         try:
+            if not DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS:
+                return EntityStateModel.objects.get_next_from_block(entity_id=self.entity_id,
+                                                                    key=EntityStateModel.KEY_VENDOR)
+
             LOOKUP = {
                 'entity_id__exact': self.entity_id,
                 'key__exact': EntityStateModel.KEY_VENDOR
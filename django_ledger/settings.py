@@ -20,6 +20,46 @@ DJANGO_LEDGER_FEEDBACK_FROM_EMAIL = getattr(settings, 'DJANGO_LEDGER_FEEDBACK_FR
 DJANGO_LEDGER_VALIDATE_SCHEMAS_AT_RUNTIME = getattr(settings, 'DJANGO_LEDGER_VALIDATE_SCHEMAS_AT_RUNTIME', False)
 DJANGO_LEDGER_LOGIN_URL = getattr(settings, 'DJANGO_LEDGER_LOGIN_URL', settings.LOGIN_URL)
 
+# digests read closed periods from the materialized period balances. Periods are rolled up by the
+# rollup_period_balances command, which should be scheduled once the setting is enabled.
+DJANGO_LEDGER_USE_PERIOD_BALANCES = getattr(settings, 'DJANGO_LEDGER_USE_PERIOD_BALANCES', False)
+DJANGO_LEDGER_SQL_DIGEST = getattr(settings, 'DJANGO_LEDGER_SQL_DIGEST', False)
+
+# digests read the transaction rows in chunks, with a server side cursor where supported, instead of all at once.
+# Rows merged with period balances are not streamed.
+DJANGO_LEDGER_DIGEST_STREAM = getattr(settings, 'DJANGO_LEDGER_DIGEST_STREAM', False)
+DJANGO_LEDGER_DIGEST_CHUNK_SIZE = getattr(settings, 'DJANGO_LEDGER_DIGEST_CHUNK_SIZE', 2000)
+DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT = getattr(settings, 'DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT', False)
+
+# transactions keep a copy of their entity, ledger, unit, journal entry date and posted state, so digests filter
+# transactions without joining journal entries, ledgers and entities. Run the denormalize_transactions command after
+# enabling it on an existing database.
+DJANGO_LEDGER_DENORMALIZED_TXS = getattr(settings, 'DJANGO_LEDGER_DENORMALIZED_TXS', False)
+
+# inventory ItemModels keep on-hand quantity and value up to date as items are received and invoiced, using a moving
+# average cost. When False, on-hand inventory is only updated by an inventory recount.
+DJANGO_LEDGER_PERPETUAL_INVENTORY = getattr(settings, 'DJANGO_LEDGER_PERPETUAL_INVENTORY', False)
+
+# staged transactions are inserted in batches of this size while an OFX file is read...
+DJANGO_LEDGER_IMPORT_BATCH_SIZE = getattr(settings, 'DJANGO_LEDGER_IMPORT_BATCH_SIZE', 1000)
+
+# number of transactions per page of the account ledger views...
+DJANGO_LEDGER_ACCOUNT_LEDGER_PAGE_SIZE = getattr(settings, 'DJANGO_LEDGER_ACCOUNT_LEDGER_PAGE_SIZE', 100)
+
+# number of journal entries per page of the journal entry list view...
+DJANGO_LEDGER_JE_LIST_PAGE_SIZE = getattr(settings, 'DJANGO_LEDGER_JE_LIST_PAGE_SIZE', 50)
+# journal entries of a ledger are counted up to this limit. Larger ledgers display the limit as a lower bound...
+DJANGO_LEDGER_JE_LIST_COUNT_LIMIT = getattr(settings, 'DJANGO_LEDGER_JE_LIST_COUNT_LIMIT', 10000)
+
+DJANGO_LEDGER_DIGEST_CACHE_ENABLED = getattr(settings, 'DJANGO_LEDGER_DIGEST_CACHE_ENABLED', False)
+DJANGO_LEDGER_DIGEST_CACHE_ALIAS = getattr(settings, 'DJANGO_LEDGER_DIGEST_CACHE_ALIAS', 'default')
+DJANGO_LEDGER_DIGEST_CACHE_TIMEOUT = getattr(settings, 'DJANGO_LEDGER_DIGEST_CACHE_TIMEOUT', 3600)
+
+# the entities each user can access are shared across requests through the cache backend...
+DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ENABLED = getattr(settings, 'DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ENABLED', False)
+DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ALIAS = getattr(settings, 'DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ALIAS', 'default')
+DJANGO_LEDGER_ENTITY_ACCESS_CACHE_TIMEOUT = getattr(settings, 'DJANGO_LEDGER_ENTITY_ACCESS_CACHE_TIMEOUT', 3600)
+
 DJANGO_LEDGER_TRANSACTION_MAX_TOLERANCE = getattr(settings,
                                                   'DJANGO_LEDGER_TRANSACTION_MAX_TOLERANCE',
                                                   Decimal('0.02'))
@@ -108,6 +148,12 @@ DJANGO_LEDGER_PRODUCT_NUMBER_PREFIX = getattr(settings, 'DJANGO_LEDGER_PRODUCT_N
 DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING = getattr(settings, 'DJANGO_LEDGER_DOCUMENT_NUMBER_PADDING', 10)
 DJANGO_LEDGER_JE_NUMBER_NO_UNIT_PREFIX = getattr(settings, 'DJANGO_LEDGER_JE_NUMBER_NO_UNIT_PREFIX', '000')
 
+# gap-free numbering locks the EntityStateModel row for every document. When False, each worker reserves blocks of
+# sequence numbers with a single locked update. Numbers stay unique but may have gaps and are not strictly ordered
+# across workers.
+DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS = getattr(settings, 'DJANGO_LEDGER_DOCUMENT_NUMBER_GAPLESS', True)
+DJANGO_LEDGER_DOCUMENT_NUMBER_BLOCK_SIZE = getattr(settings, 'DJANGO_LEDGER_DOCUMENT_NUMBER_BLOCK_SIZE', 50)
+
 DJANGO_LEDGER_BILL_MODEL_ABSTRACT_CLASS = getattr(settings,
                                                   'DJANGO_LEDGER_BILL_MODEL_ABSTRACT_CLASS',
                                                   'django_ledger.models.bill.BillModelAbstract')
@@ -210,13 +210,20 @@ def jes_table(context, next_url=None):
         'jes': context['journal_entries'],
         'entity_slug': context['view'].kwargs['entity_slug'],
         'ledger_pk': context['view'].kwargs['ledger_pk'],
-        'next_url': next_url
+        'next_url': next_url,
+        'sort': context.get('sort'),
+        'cursor': context.get('cursor'),
+        'next_cursor': context.get('next_cursor'),
+        'je_count': context.get('je_count')
     }
 
 
 @register.inclusion_tag('django_ledger/transaction/tags/txs_table.html')
 def journal_entry_txs_table(journal_entry_model, style='detail'):
-    txs_queryset = journal_entry_model.transactionmodel_set.all().select_related('account')
+    txs_queryset = journal_entry_model.transactionmodel_set.all()
+    # transactions prefetched by the view already have their accounts...
+    if 'transactionmodel_set' not in getattr(journal_entry_model, '_prefetched_objects_cache', {}):
+        txs_queryset = txs_queryset.select_related('account')
     total_credits = sum(tx.amount for tx in txs_queryset if tx.tx_type == 'credit')
     total_debits = sum(tx.amount for tx in txs_queryset if tx.tx_type == 'debit')
     return {
@@ -268,18 +275,20 @@ def ledgers_table(context):
 
 
 @register.inclusion_tag('django_ledger/invoice/tags/invoice_table.html', takes_context=True)
-def invoice_table(context, invoice_qs):
+def invoice_table(context, invoice_qs, bulk_actions: bool = False):
     return {
         'invoices': invoice_qs,
-        'entity_slug': context['view'].kwargs['entity_slug']
+        'entity_slug': context['view'].kwargs['entity_slug'],
+        'bulk_actions': bulk_actions
     }
 
 
 @register.inclusion_tag('django_ledger/bills/includes/bill_table.html', takes_context=True)
-def bill_table(context, bill_qs):
+def bill_table(context, bill_qs, bulk_actions: bool = False):
     return {
         'bills': bill_qs,
-        'entity_slug': context['view'].kwargs['entity_slug']
+        'entity_slug': context['view'].kwargs['entity_slug'],
+        'bulk_actions': bulk_actions
     }
 
 
@@ -316,6 +325,9 @@ def account_txs_table(context, txs_qs):
         'transactions': txs_qs,
         'total_credits': sum(tx.amount for tx in txs_qs if tx.tx_type == 'credit'),
         'total_debits': sum(tx.amount for tx in txs_qs if tx.tx_type == 'debit'),
+        'opening_balance': context.get('opening_balance'),
+        'closing_balance': context.get('closing_balance'),
+        'next_cursor': context.get('next_cursor'),
         'entity_slug': context['view'].kwargs['entity_slug'],
         'account_pk': context['view'].kwargs['account_pk']
     }
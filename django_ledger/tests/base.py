@@ -1,7 +1,10 @@
+import sys
+from contextlib import contextmanager, ExitStack
 from datetime import datetime, date
 from decimal import Decimal
 from logging import getLogger, DEBUG
 from random import randint, choice
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
@@ -79,6 +82,20 @@ class DjangoLedgerBaseTest(TestCase):
         cls.create_entity_models(n=cls.N)
         cls.populate_entity_models()
 
+    @staticmethod
+    @contextmanager
+    def ledger_settings(**ledger_settings):
+        """
+        Overrides DJANGO_LEDGER_* settings. Settings are read once at import time, so the value is replaced in every
+        django_ledger module that imported it.
+        """
+        with ExitStack() as stack:
+            for module in [m for n, m in sys.modules.items() if n.startswith('django_ledger') and m]:
+                for name, value in ledger_settings.items():
+                    if hasattr(module, name):
+                        stack.enter_context(patch.object(module, name, value))
+            yield
+
     @classmethod
     def get_random_date(cls) -> date:
         return date(
@@ -136,6 +153,7 @@ class DjangoLedgerBaseTest(TestCase):
     def populate_entity_models(cls):
         entities_qs = EntityModel.objects.all()
         for entity_model in entities_qs:
+            entity_model.create_chart_of_accounts(assign_as_default=True, commit=True)
             entity_model.populate_default_coa(activate_accounts=True)
             data_generator = EntityDataGenerator(
                 user_model=cls.user_model,
@@ -0,0 +1,92 @@
+from random import choice
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_ledger.models import EntityModel, BillModel, LedgerModel
+from django_ledger.models.access import get_user_entities, DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ALIAS
+from django_ledger.tests.base import DjangoLedgerBaseTest
+
+UserModel = get_user_model()
+
+
+class EntityAccessTests(DjangoLedgerBaseTest):
+
+    def setUp(self) -> None:
+        super(EntityAccessTests, self).setUp()
+        caches[DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ALIAS].clear()
+        self.manager_model = UserModel.objects.create_user(username='testmanager',
+                                                           password=self.PASSWORD,
+                                                           email='testmanager@djangoledger.com')
+
+    def get_entity_data(self, user_model, entity_model: EntityModel) -> dict:
+        return {
+            'entities': set(EntityModel.objects.for_user(user_model=user_model).values_list('uuid', flat=True)),
+            'ledgers': LedgerModel.objects.for_entity(user_model=user_model, entity_slug=entity_model.slug).count(),
+            'bills': BillModel.objects.for_entity(user_model=user_model, entity_slug=entity_model.slug).count()
+        }
+
+    def assertManagerAccess(self):
+        entity_model = choice(self.ENTITY_MODEL_QUERYSET)
+        ledger_count = LedgerModel.objects.filter(entity=entity_model).count()
+        bill_count = BillModel.objects.filter(ledger__entity=entity_model).count()
+        self.assertTrue(ledger_count)
+
+        # a non-member sees nothing, before and after the entities are resolved...
+        no_access = {'entities': set(), 'ledgers': 0, 'bills': 0}
+        self.assertEqual(self.get_entity_data(self.manager_model, entity_model), no_access)
+        self.assertEqual(get_user_entities(self.manager_model), dict())
+        self.assertEqual(self.get_entity_data(self.manager_model, entity_model), no_access)
+
+        # the same user instance sees the entity data once added as manager...
+        entity_model.managers.add(self.manager_model)
+        self.assertEqual(get_user_entities(self.manager_model), {entity_model.slug: entity_model.uuid})
+        self.assertEqual(self.get_entity_data(self.manager_model, entity_model), {
+            'entities': {entity_model.uuid},
+            'ledgers': ledger_count,
+            'bills': bill_count
+        })
+
+        # and loses access once removed...
+        entity_model.managers.remove(self.manager_model)
+        self.assertEqual(self.get_entity_data(self.manager_model, entity_model), no_access)
+        self.assertEqual(get_user_entities(self.manager_model), dict())
+
+        # the admin still sees the entity data...
+        self.assertEqual(self.get_entity_data(self.user_model, entity_model)['ledgers'], ledger_count)
+
+    def test_manager_access(self):
+        self.assertManagerAccess()
+
+    def test_manager_access_cache(self):
+        with self.ledger_settings(DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ENABLED=True):
+            self.assertManagerAccess()
+
+    def test_view_access_cache(self):
+        entity_model = choice(self.ENTITY_MODEL_QUERYSET)
+        self.login_client()
+        bill_list_url = reverse('django_ledger:bill-list', kwargs={'entity_slug': entity_model.slug})
+
+        with self.ledger_settings(DJANGO_LEDGER_ENTITY_ACCESS_CACHE_ENABLED=True):
+            # entities are resolved once, then read from the cache by the following requests...
+            for access_query_count in [1, 0]:
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.CLIENT.get(bill_list_url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context['bills'])
+                access_queries = [q for q in ctx.captured_queries
+                                  if 'django_ledger_entitymanagementmodel' in q['sql']]
+                self.assertEqual(len(access_queries), access_query_count)
+
+            # a non-member sees no bills...
+            self.CLIENT.login(username=self.manager_model.username, password=self.PASSWORD)
+            response = self.CLIENT.get(bill_list_url)
+            self.assertFalse(response.context['bills'])
+
+            # until added as manager...
+            entity_model.managers.add(self.manager_model)
+            response = self.CLIENT.get(bill_list_url)
+            self.assertTrue(response.context['bills'])
@@ -5,11 +5,13 @@ from urllib.parse import urlparse
 from uuid import uuid4
 
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.urls import reverse
 from django.utils.timezone import localdate
 
 from django_ledger.io.roles import ASSET_CA_CASH, ASSET_CA_PREPAID, LIABILITY_CL_DEFERRED_REVENUE
-from django_ledger.models import EntityModel, BillModel, VendorModel
+from django_ledger.models import EntityModel, BillModel, VendorModel, TransactionModel, LedgerModel
 from django_ledger.settings import DJANGO_LEDGER_LOGIN_URL
 from django_ledger.tests.base import DjangoLedgerBaseTest
 from django_ledger.urls.bill import urlpatterns as bill_urls
@@ -27,7 +29,7 @@ class BillModelTests(DjangoLedgerBaseTest):
     def create_bill(self, amount: Decimal, draft_date: date = None, is_accrued: bool = False) -> tuple[
         EntityModel, BillModel]:
         entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
-        vendor_model: VendorModel = entity_model.vendors.first()
+        vendor_model: VendorModel = entity_model.vendormodel_set.first()
         account_qs = entity_model.get_accounts(
             user_model=self.user_model
         )
@@ -319,7 +321,7 @@ class BillModelTests(DjangoLedgerBaseTest):
                                           'bill_pk': bill_model.uuid
                                       })
 
-            with self.assertNumQueries(8):
+            with self.assertNumQueries(7):
                 bill_detail_response = self.CLIENT.get(bill_detail_url)
             self.assertTrue(bill_detail_response.status_code, 200)
 
@@ -393,3 +395,146 @@ class BillModelTests(DjangoLedgerBaseTest):
             self.assertEqual(bill_model.get_amount_open(), Decimal('0.00'))
             self.assertEqual(bill_model.get_amount_prepaid(), Decimal('0.00'))
             self.assertEqual(bill_model.get_amount_unearned(), Decimal('0.00'))
+
+    @staticmethod
+    def get_ledger_state(bill_uuids: list) -> list:
+        bill_qs = BillModel.objects.filter(uuid__in=bill_uuids).select_related('ledger')
+        txs_qs = TransactionModel.objects.filter(
+            journal_entry__ledger__billmodel__uuid__in=bill_uuids
+        ).select_related('journal_entry')
+        return sorted([
+            (str(b.uuid), b.bill_status, b.date_approved, b.date_paid, b.amount_paid, b.ledger.posted, b.ledger.locked)
+            for b in bill_qs
+        ]) + sorted([
+            (str(tx.journal_entry.ledger_id), str(tx.account_id), tx.tx_type, round(tx.amount, 2),
+             tx.journal_entry.date, tx.journal_entry.activity or '', tx.journal_entry.posted, tx.journal_entry.locked)
+            for tx in txs_qs
+        ])
+
+    def assertBulkEqualsSingle(self, bill_status: str, mark_as: str, **kwargs):
+        bill_uuids = list(BillModel.objects.filter(
+            ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+            bill_status__exact=bill_status
+        ).values_list('uuid', flat=True)[:4])
+        self.assertTrue(bill_uuids)
+
+        # bills marked in bulk, then rolled back...
+        try:
+            with transaction.atomic():
+                getattr(BillModel.objects.filter(uuid__in=bill_uuids), f'bulk_{mark_as}')(user_model=self.user_model,
+                                                                                        **kwargs)
+                bulk_ledger_state = self.get_ledger_state(bill_uuids)
+                raise transaction.TransactionManagementError
+        except transaction.TransactionManagementError:
+            pass
+        self.assertNotEqual(self.get_ledger_state(bill_uuids), bulk_ledger_state)
+
+        # JE numbers are generated in durable blocks, so each bill is marked outside of the rolled back block...
+        for bill_model in BillModel.objects.filter(uuid__in=bill_uuids).select_related('ledger__entity'):
+            getattr(bill_model, mark_as)(user_model=self.user_model, commit=True, **kwargs)
+        self.assertEqual(self.get_ledger_state(bill_uuids), bulk_ledger_state)
+
+    def test_bulk_mark_as_approved(self):
+        self.assertBulkEqualsSingle(bill_status=BillModel.BILL_STATUS_REVIEW,
+                                    mark_as='mark_as_approved',
+                                    date_approved=localdate())
+
+    def test_bulk_mark_as_paid(self):
+        self.assertBulkEqualsSingle(bill_status=BillModel.BILL_STATUS_APPROVED,
+                                    mark_as='mark_as_paid',
+                                    date_paid=localdate())
+
+    def test_bulk_mark_as_rejected(self):
+        review_qs = BillModel.objects.filter(ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+                                             bill_status__exact=BillModel.BILL_STATUS_REVIEW)
+        locked_bill, review_bill = review_qs.select_related('ledger')[:2]
+        draft_bill = BillModel.objects.filter(ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+                                              bill_status__exact=BillModel.BILL_STATUS_DRAFT).first()
+        LedgerModel.objects.filter(uuid__exact=locked_bill.ledger_id).update(locked=True)
+        bill_uuids = [locked_bill.uuid, review_bill.uuid, draft_bill.uuid]
+        ledger_state = self.get_ledger_state(bill_uuids)
+
+        # all rejected bills are listed & no bill is approved...
+        with self.assertRaises(ValidationError) as ctx:
+            BillModel.objects.filter(uuid__in=bill_uuids).bulk_mark_as_approved(user_model=self.user_model)
+        self.assertEqual(len(ctx.exception.messages), 2)
+        self.assertIn(locked_bill.bill_number, ctx.exception.messages[0] + ctx.exception.messages[1])
+        self.assertIn(draft_bill.bill_number, ctx.exception.messages[0] + ctx.exception.messages[1])
+        self.assertEqual(self.get_ledger_state(bill_uuids), ledger_state)
+
+    def migrate_bills(self, bill_uuids: list, bulk: bool, snapshot: bool) -> list:
+        bill_qs = BillModel.objects.filter(uuid__in=bill_uuids)
+        if bulk:
+            bill_qs.bulk_mark_as_approved(user_model=self.user_model, date_approved=localdate())
+        else:
+            for bill_model in bill_qs:
+                bill_model.mark_as_approved(user_model=self.user_model, date_approved=localdate(), commit=True)
+
+        # the first migration of a posted ledger keeps a snapshot, used by the following migrations...
+        for progress in [Decimal('0.25'), Decimal('0.75')]:
+            bill_qs.update(progress=progress)
+            bill_list = list(bill_qs.select_related('ledger__entity'))
+            if bulk:
+                BillModel.bulk_migrate_state(wrapper_list=bill_list, je_date=localdate())
+            else:
+                for bill_model in bill_list:
+                    bill_model.migrate_state(user_model=self.user_model,
+                                             entity_slug=bill_model.ledger.entity.slug,
+                                             je_date=localdate())
+            snapshots = list(bill_qs.values_list('ledger_state', flat=True))
+            self.assertEqual(all(s is not None for s in snapshots), snapshot)
+
+        if bulk:
+            bill_qs.bulk_mark_as_paid(user_model=self.user_model, date_paid=localdate())
+        else:
+            for bill_model in bill_qs:
+                bill_model.mark_as_paid(user_model=self.user_model, date_paid=localdate(), commit=True)
+        return self.get_ledger_state(bill_uuids)
+
+    def test_ledger_state_snapshot(self):
+        bill_uuids = list(BillModel.objects.filter(
+            ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+            bill_status__exact=BillModel.BILL_STATUS_REVIEW
+        ).values_list('uuid', flat=True)[:4])
+        self.assertTrue(bill_uuids)
+        # accrued bills are migrated as they progress...
+        BillModel.objects.filter(uuid__in=bill_uuids).update(accrue=True, progress=Decimal('0.00'))
+
+        ledger_states = dict()
+        for snapshot in [False, True]:
+            with self.ledger_settings(DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT=snapshot):
+                try:
+                    with transaction.atomic():
+                        ledger_states[snapshot] = self.migrate_bills(bill_uuids, bulk=True, snapshot=snapshot)
+                        raise transaction.TransactionManagementError
+                except transaction.TransactionManagementError:
+                    pass
+        self.assertEqual(ledger_states[True], ledger_states[False])
+
+        # JE numbers are generated in durable blocks, so single bills are migrated outside of a rolled back block...
+        with self.ledger_settings(DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT=True):
+            self.assertEqual(self.migrate_bills(bill_uuids, bulk=False, snapshot=True), ledger_states[False])
+
+    def test_ledger_state_snapshot_reset(self):
+        bill_model = BillModel.objects.filter(
+            ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+            ledger__posted=True,
+            ledger__journal_entries__isnull=False
+        ).select_related('ledger').first()
+        ledger_model = bill_model.ledger
+        je_model = ledger_model.journal_entries.first()
+        tx_model = je_model.transactionmodel_set.first()
+
+        with self.ledger_settings(DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT=True):
+            for action in [lambda: je_model.save(),
+                           lambda: tx_model.save(),
+                           lambda: ledger_model.unlock(commit=True),
+                           lambda: ledger_model.unpost(commit=True)]:
+                ledger_state = BillModel.get_ledger_states([ledger_model.uuid])[ledger_model.uuid]
+                bill_model.save_ledger_state_snapshot(ledger_state)
+                self.assertIsNotNone(bill_model.get_ledger_state_snapshot())
+
+                # the ledger balances may no longer match the snapshot...
+                action()
+                bill_model.refresh_from_db(fields=['ledger_state'])
+                self.assertIsNone(bill_model.get_ledger_state_snapshot())
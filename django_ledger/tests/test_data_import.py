@@ -0,0 +1,316 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from os import path
+from random import choice
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from django_ledger.io.categorize import PayeeAccountIndex
+from django_ledger.io.ofx import OFXFileManager, OFXFileReader, OFXTransaction
+from django_ledger.models import (EntityModel, ImportJobModel, LedgerModel, StagedTransactionModel, AccountModel,
+                                  TransactionModel)
+from django_ledger.tests.base import DjangoLedgerBaseTest
+from django_ledger.views.data_import import DataImportOFXFileView
+
+OFX_V1_HEADER = 'OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\nSECURITY:NONE\nENCODING:USASCII\nCHARSET:1252\n' \
+                'COMPRESSION:NONE\nOLDFILEUID:NONE\nNEWFILEUID:NONE\n\n'
+OFX_V2_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n' \
+                '<?OFX OFXHEADER="200" VERSION="220" SECURITY="NONE" OLDFILEUID="NONE" NEWFILEUID="NONE"?>\n'
+
+
+def get_statement_txs(account_number: str, n: int, fitid_prefix: str = '') -> list:
+    return [
+        {
+            'dtposted': date(2021, 1, 1) + timedelta(days=i * 3),
+            'trnamt': Decimal(f'{(-1) ** i * (i * 37 % 500 + 0.25):.2f}'),
+            'fitid': f'{fitid_prefix}{account_number}-{i}',
+            'name': f'Payee {i % 5}',
+            'memo': f'Memo &amp; {i}' if i % 3 else None,
+        } for i in range(n)
+    ]
+
+
+def get_ofx(statements: dict, version: int = 1) -> str:
+    """
+    OFX file with one bank statement per account number. OFXv1 elements are not closed, OFXv2 elements are.
+    Every seventh transaction has a PAYEE aggregate instead of a NAME.
+    """
+    if version == 1:
+        def el(tag, value):
+            return f'<{tag}>{value}\n'
+    else:
+        def el(tag, value):
+            return f'<{tag}>{value}</{tag}>'
+
+    stmts = list()
+    for account_number, txs in statements.items():
+        stmt_txs = list()
+        for i, tx in enumerate(txs):
+            if i % 7 == 0:
+                payee = f'<PAYEE>{el("NAME", tx["name"])}{el("ADDR1", "1 Main St")}{el("CITY", "Charlotte")}' \
+                        f'{el("STATE", "NC")}{el("POSTALCODE", "28202")}{el("PHONE", "5555555")}</PAYEE>'
+            else:
+                payee = el('NAME', tx['name'])
+            stmt_txs.append(
+                f'<STMTTRN>{el("TRNTYPE", "DEBIT" if tx["trnamt"] < 0 else "CREDIT")}'
+                f'{el("DTPOSTED", tx["dtposted"].strftime("%Y%m%d120000"))}{el("TRNAMT", tx["trnamt"])}'
+                f'{el("FITID", tx["fitid"])}{payee}{el("MEMO", tx["memo"]) if tx["memo"] else ""}</STMTTRN>\n'
+            )
+        stmts.append(
+            f'<STMTTRNRS>{el("TRNUID", "1")}<STATUS>{el("CODE", "0")}{el("SEVERITY", "INFO")}</STATUS>'
+            f'<STMTRS>{el("CURDEF", "USD")}<BANKACCTFROM>{el("BANKID", "121000248")}{el("ACCTID", account_number)}'
+            f'{el("ACCTTYPE", "CHECKING")}</BANKACCTFROM><BANKTRANLIST>{el("DTSTART", "20210101")}'
+            f'{el("DTEND", "20211231")}{"".join(stmt_txs)}</BANKTRANLIST><LEDGERBAL>{el("BALAMT", "100.00")}'
+            f'{el("DTASOF", "20211231")}</LEDGERBAL></STMTRS></STMTTRNRS>'
+        )
+
+    return (OFX_V1_HEADER if version == 1 else OFX_V2_HEADER) + (
+        f'<OFX><SIGNONMSGSRSV1><SONRS><STATUS>{el("CODE", "0")}{el("SEVERITY", "INFO")}</STATUS>'
+        f'{el("DTSERVER", "20211231")}{el("LANGUAGE", "ENG")}<FI>{el("ORG", "Big Bank")}{el("FID", "1234")}</FI>'
+        f'</SONRS></SIGNONMSGSRSV1><BANKMSGSRSV1>{"".join(stmts)}</BANKMSGSRSV1></OFX>'
+    )
+
+
+class OFXFileReaderTests(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.TMP_DIR = TemporaryDirectory()
+        self.STATEMENTS = {
+            '1111222233': get_statement_txs('1111222233', n=40),
+            '9999888877': get_statement_txs('9999888877', n=15),
+            '5555': list()
+        }
+
+    def tearDown(self) -> None:
+        self.TMP_DIR.cleanup()
+
+    def write_ofx(self, version: int) -> str:
+        ofx_path = path.join(self.TMP_DIR.name, f'statement_v{version}.ofx')
+        with open(ofx_path, 'w', encoding='utf-8') as ofx_file:
+            ofx_file.write(get_ofx(self.STATEMENTS, version=version))
+        return ofx_path
+
+    def assertReaderMatchesManager(self, ofx_path: str):
+        ofx_manager = OFXFileManager(ofx_path)
+        expected = [
+            (account, [
+                (tx.trntype, tx.dtposted, tx.trnamt, tx.fitid, tx.name, tx.memo)
+                for tx in ofx_manager.get_account_txs(account['account_number'])
+            ]) for account in ofx_manager.get_accounts()
+        ]
+        self.assertEqual([len(txs) for account, txs in expected], [40, 15, 0])
+
+        # elements split across chunks are read as a whole...
+        for chunk_size in (7, 256, None):
+            ofx_reader = OFXFileReader(ofx_path, chunk_size=chunk_size)
+            statements = [
+                (account, [tuple(tx) for tx in txs]) for account, txs in ofx_reader.iter_statements()
+            ]
+            self.assertEqual(statements, expected, msg=f'Chunk size {chunk_size} does not match OFXFileManager.')
+            self.assertEqual(ofx_reader.get_progress(), 1.0)
+
+    def test_ofx_v1_reader(self):
+        self.assertReaderMatchesManager(self.write_ofx(version=1))
+
+    def test_ofx_v2_reader(self):
+        self.assertReaderMatchesManager(self.write_ofx(version=2))
+
+
+class PayeeAccountIndexTests(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.INDEX = PayeeAccountIndex().learn([
+            ('Netflix.com', 'subscriptions', 3),
+            ('NETFLIX.COM', 'entertainment', 1),
+            ('AMAZON MKTPLACE PMTS', 'supplies'),
+            ('AMAZON MKTPLACE 1A2B3C', 'supplies'),
+            ('AMAZON PRIME', 'subscriptions'),
+            ('POS DEBIT SHELL 4411', 'fuel'),
+            ('POS DEBIT WALMART 0042', 'supplies'),
+            ('CHECK 1001', 'rent'),
+        ])
+
+    def test_exact_match(self):
+        # the most frequent account of the payee, ignoring case & whitespace...
+        self.assertEqual(self.INDEX.match(' netflix.com '), 'subscriptions')
+        self.assertEqual(self.INDEX.match('Amazon  Prime'), 'subscriptions')
+
+    def test_prefix_match(self):
+        # the longest unambiguous token prefix...
+        self.assertEqual(self.INDEX.match('AMAZON MKTPLACE 9Z8Y7X'), 'supplies')
+        self.assertEqual(self.INDEX.match('AMAZON PRIME VIDEO'), 'subscriptions')
+        self.assertEqual(self.INDEX.match('POS DEBIT SHELL 9876'), 'fuel')
+
+    def test_ambiguous_prefix(self):
+        self.assertIsNone(self.INDEX.match('POS DEBIT TARGET 0001'))
+        self.assertIsNone(self.INDEX.match('AMAZON WEB SERVICES'))
+        self.assertIsNone(self.INDEX.match('UNKNOWN PAYEE'))
+        self.assertIsNone(self.INDEX.match(None))
+
+    def test_min_prefix_tokens(self):
+        # a single shared token is not enough by default...
+        self.assertIsNone(self.INDEX.match('CHECK 2002'))
+        index = PayeeAccountIndex(min_prefix_tokens=1).learn([('CHECK 1001', 'rent')])
+        self.assertEqual(index.match('CHECK 2002'), 'rent')
+
+
+class ImportJobModelTests(DjangoLedgerBaseTest):
+
+    def get_import_job(self, entity_model: EntityModel = None) -> ImportJobModel:
+        entity_model = entity_model or choice(self.ENTITY_MODEL_QUERYSET)
+        ledger_model = LedgerModel.objects.filter(entity=entity_model).first()
+        return ImportJobModel.objects.create(ledger=ledger_model, description='Test Import')
+
+    @staticmethod
+    def get_ofx_txs(txs: list) -> list:
+        return [
+            OFXTransaction(trntype='DEBIT' if tx['trnamt'] < 0 else 'CREDIT',
+                           dtposted=tx['dtposted'],
+                           trnamt=tx['trnamt'],
+                           fitid=tx['fitid'],
+                           name=tx['name'],
+                           memo=tx['memo']) for tx in txs
+        ]
+
+    def test_stage_transactions(self):
+        import_job = self.get_import_job()
+        ofx_txs = self.get_ofx_txs(get_statement_txs('1111222233', n=25))
+
+        staged = import_job.stage_transactions(iter(ofx_txs), batch_size=7)
+
+        import_job.refresh_from_db()
+        self.assertEqual(staged, 25)
+        self.assertEqual(import_job.txs_staged, 25)
+        self.assertFalse(import_job.staging)
+        self.assertEqual(
+            set(StagedTransactionModel.objects.filter(import_job=import_job).values_list('fitid', flat=True)),
+            set(tx.fitid for tx in ofx_txs)
+        )
+
+    def test_failed_import_rolls_back(self):
+        import_job = self.get_import_job()
+        ofx_txs = self.get_ofx_txs(get_statement_txs('1111222233', n=20))
+
+        def txs_gen():
+            # the file is invalid after a few batches have been staged...
+            yield from ofx_txs
+            yield ofx_txs[0]._replace(dtposted='not a date', fitid='invalid')
+
+        with self.assertRaises(ValidationError):
+            import_job.stage_transactions(txs_gen(), batch_size=7)
+
+        import_job.refresh_from_db()
+        self.assertFalse(import_job.staging)
+        self.assertEqual(import_job.txs_staged, 0)
+        self.assertEqual(import_job.txs_duplicate, 0)
+        self.assertFalse(StagedTransactionModel.objects.filter(import_job=import_job).exists())
+
+        # the same file can be imported again once fixed...
+        self.assertEqual(import_job.stage_transactions(iter(ofx_txs), batch_size=7), 20)
+
+    def test_duplicate_import(self):
+        import_job = self.get_import_job()
+        ofx_txs = self.get_ofx_txs(get_statement_txs('1111222233', n=12))
+        import_job.stage_transactions(iter(ofx_txs), batch_size=5)
+
+        # the same file imported again is skipped by FITID...
+        reimport_job = self.get_import_job(entity_model=import_job.ledger.entity)
+        self.assertEqual(reimport_job.ledger_id, import_job.ledger_id)
+        self.assertEqual(reimport_job.stage_transactions(iter(ofx_txs), batch_size=5), 0)
+        reimport_job.refresh_from_db()
+        self.assertEqual(reimport_job.txs_duplicate, 12)
+        self.assertFalse(StagedTransactionModel.objects.filter(import_job=reimport_job).exists())
+
+        # the same transactions under new FITIDs are staged & flagged as possible duplicates...
+        new_fitid_txs = self.get_ofx_txs(get_statement_txs('1111222233', n=12, fitid_prefix='NEW-'))
+        new_fitid_job = self.get_import_job(entity_model=import_job.ledger.entity)
+        self.assertEqual(new_fitid_job.stage_transactions(iter(new_fitid_txs), batch_size=5), 12)
+        new_fitid_job.refresh_from_db()
+        self.assertEqual(new_fitid_job.txs_duplicate, 0)
+
+        staged_uuids = dict(
+            StagedTransactionModel.objects.filter(import_job=import_job).values_list('fitid', 'uuid')
+        )
+        for stx in StagedTransactionModel.objects.filter(import_job=new_fitid_job):
+            self.assertEqual(stx.duplicate_of_id, staged_uuids[stx.fitid.replace('NEW-', '')])
+
+    def test_auto_categorize(self):
+        entity_model = choice(self.ENTITY_MODEL_QUERYSET)
+        account_list = list(AccountModel.objects.filter(coa__entity=entity_model, active=True, locked=False)[:4])
+        expense_account, locked_account, inactive_account, cash_account = account_list
+        payees = {
+            'ACME SUPPLIES 001': expense_account,
+            'LOCKED VENDOR': locked_account,
+            'INACTIVE VENDOR': inactive_account,
+            'CASH PAYEE': cash_account
+        }
+
+        # transactions already imported...
+        import_job = self.get_import_job(entity_model=entity_model)
+        ofx_txs = self.get_ofx_txs(get_statement_txs('1111222233', n=len(payees)))
+        ofx_txs = [tx._replace(name=payee) for tx, payee in zip(ofx_txs, payees)]
+        import_job.stage_transactions(iter(ofx_txs))
+        tx_list = TransactionModel.objects.filter(journal_entry__ledger__entity=entity_model)[:len(payees)]
+        for stx, tx_model in zip(StagedTransactionModel.objects.filter(import_job=import_job), tx_list):
+            stx.tx = tx_model
+            stx.earnings_account = payees[stx.name]
+            stx.save(update_fields=['tx', 'earnings_account'])
+        AccountModel.objects.filter(uuid__exact=locked_account.uuid).update(locked=True)
+        AccountModel.objects.filter(uuid__exact=inactive_account.uuid).update(active=False)
+
+        # new transactions of the same payees...
+        new_job = self.get_import_job(entity_model=entity_model)
+        new_txs = self.get_ofx_txs(get_statement_txs('1111222233', n=len(payees), fitid_prefix='NEW-'))
+        new_payees = ['acme supplies 002', 'Locked Vendor', 'Inactive Vendor', 'Cash Payee']
+        new_job.stage_transactions(iter([tx._replace(name=payee) for tx, payee in zip(new_txs, new_payees)]))
+
+        # locked & inactive accounts are not learned, excluded accounts are never assigned...
+        self.assertEqual(new_job.auto_categorize(exclude_accounts=[cash_account.uuid]), 1)
+        self.assertEqual(
+            dict(StagedTransactionModel.objects.filter(import_job=new_job).values_list('name', 'earnings_account_id')),
+            {'acme supplies 002': expense_account.uuid,
+             'Locked Vendor': None,
+             'Inactive Vendor': None,
+             'Cash Payee': None}
+        )
+
+    def test_ofx_import_view_failed_statement(self):
+        entity_model = choice(self.ENTITY_MODEL_QUERYSET)
+        self.login_client()
+        statements = {
+            '1111222233': get_statement_txs('1111222233', n=6),
+            '9999888877': get_statement_txs('9999888877', n=6),
+        }
+        # the amount of the last transaction of the second statement is invalid...
+        ofx_head, ofx_tail = get_ofx(statements).rsplit('<TRNAMT>', 1)
+        ofx_file = SimpleUploadedFile('statement.ofx', (ofx_head + '<TRNAMT>1,00.x' + ofx_tail).encode())
+        import_qs = ImportJobModel.objects.filter(ledger__entity=entity_model)
+        import_count = import_qs.count()
+
+        # bank accounts are not linked to a ledger yet, each statement is imported into an entity ledger...
+        ledger_model = LedgerModel.objects.filter(entity=entity_model).first()
+
+        def get_bank_account_model(account: dict):
+            return SimpleNamespace(ledger=ledger_model, account_number=account['account_number'], cash_account_id=None)
+
+        with patch.object(DataImportOFXFileView, 'get_bank_account_model', side_effect=get_bank_account_model):
+            response = self.CLIENT.post(reverse('django_ledger:data-import-ofx',
+                                                kwargs={'entity_slug': entity_model.slug}),
+                                        data={'ofx_file': ofx_file})
+
+        # the import job of the failed statement is discarded, the statements already imported are reported...
+        self.assertEqual(response.status_code, 200)
+        errors = response.context['form'].errors['ofx_file']
+        self.assertEqual(len(errors), 2)
+        self.assertIn('9999888877-5', errors[0])
+        self.assertIn('*2233', errors[1])
+        self.assertEqual(import_qs.count(), import_count + 1)
+        self.assertEqual(
+            StagedTransactionModel.objects.filter(import_job__in=import_qs).filter(fitid__startswith='9999').count(), 0
+        )
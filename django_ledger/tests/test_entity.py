@@ -1,12 +1,15 @@
 from datetime import date
 from random import choice
+from unittest.mock import patch
 from urllib.parse import urlparse
 
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from django.urls import reverse
 from django.utils.timezone import localdate
+from django.utils.translation import gettext_lazy as _
 
-from django_ledger.models import EntityModel
+from django_ledger.models import EntityModel, AccountModel, ChartOfAccountModel
 from django_ledger.settings import DJANGO_LEDGER_LOGIN_URL
 from django_ledger.tests.base import DjangoLedgerBaseTest
 from django_ledger.urls.entity import urlpatterns as entity_urls
@@ -170,7 +173,7 @@ class EntityModelTests(DjangoLedgerBaseTest):
                                         })
             response = self.CLIENT.get(entity_update_url)
 
-        with self.assertNumQueries(5):
+        with self.assertNumQueries(4):
             ent_data = response.context['form'].initial
             ent_data['name'] = 'New Cool Name LLC'
             ent_data = {k: v for k, v in ent_data.items() if v}
@@ -254,3 +257,34 @@ class EntityModelTests(DjangoLedgerBaseTest):
             home_url = reverse('django_ledger:home')
             response = self.CLIENT.get(home_url)
             self.assertNotContains(response, text=entity_model.slug)
+
+    def test_clone_coa(self):
+        entity_model = choice(self.ENTITY_MODEL_QUERYSET)
+        source_coa = entity_model.default_coa
+        coa_model = ChartOfAccountModel.objects.create(entity=entity_model,
+                                                       name='Cloned CoA',
+                                                       slug=f'{entity_model.slug}-cloned-coa')
+        last_root = AccountModel.on_coa.filter(depth=1).order_by('-path').first()
+        bulk_create = AccountModel.on_coa.bulk_create
+        attempts = list()
+
+        def concurrent_bulk_create(objs, *args, **kwargs):
+            # another root node took the same paths first...
+            attempts.append([a.path for a in objs])
+            if len(attempts) == 1:
+                raise IntegrityError('duplicate key value violates unique constraint')
+            return bulk_create(objs, *args, **kwargs)
+
+        with patch.object(AccountModel.on_coa, 'bulk_create', side_effect=concurrent_bulk_create):
+            account_list = entity_model.clone_coa(source_coa=source_coa, chart_of_accounts=coa_model)
+
+        self.assertEqual(len(attempts), 2)
+        source_codes = list(AccountModel.on_coa.filter(coa=source_coa).values_list('code', flat=True))
+        cloned_accounts = list(AccountModel.on_coa.filter(coa=coa_model))
+        self.assertEqual(len(account_list), len(source_codes))
+
+        # cloned accounts are appended after the last root, in the order of the source CoA...
+        self.assertEqual([a.code for a in cloned_accounts], source_codes)
+        self.assertTrue(all(a.path > last_root.path for a in cloned_accounts))
+        self.assertEqual(cloned_accounts[0].path,
+                         AccountModel._get_path(None, 1, last_root._get_lastpos_in_path() + 1))
@@ -0,0 +1,118 @@
+import re
+from uuid import uuid4
+
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from django_ledger.forms.transactions import get_transactionmodel_formset_class
+from django_ledger.models import JournalEntryModel, AccountModel
+from django_ledger.tests.base import DjangoLedgerBaseTest
+
+SELECTED_OPTION_RE = re.compile(r'<option value="([^"]*)"[^>]* selected>')
+
+
+class ModelChoiceCacheTests(DjangoLedgerBaseTest):
+
+    def setUp(self) -> None:
+        super(ModelChoiceCacheTests, self).setUp()
+        je_model = JournalEntryModel.objects.annotate(
+            txs_count=Count('transactionmodel')
+        ).filter(
+            txs_count__gte=2,
+            ledger__entity__in=self.ENTITY_MODEL_QUERYSET
+        ).select_related('ledger__entity').order_by('?').first()
+        self.assertIsNotNone(je_model)
+        # the formset disables the transactions of locked journal entries...
+        je_model.locked = False
+        self.je_model = je_model
+        self.entity_slug = je_model.ledger.entity.slug
+
+    def get_formset(self, data=None):
+        TransactionModelFormSet = get_transactionmodel_formset_class(journal_entry_model=self.je_model)
+        return TransactionModelFormSet(data,
+                                       user_model=self.user_model,
+                                       je_model=self.je_model,
+                                       ledger_pk=self.je_model.ledger_id,
+                                       entity_slug=self.entity_slug)
+
+    def get_formset_data(self, formset) -> dict:
+        data = {
+            f'{formset.prefix}-TOTAL_FORMS': len(formset.initial_forms),
+            f'{formset.prefix}-INITIAL_FORMS': len(formset.initial_forms),
+        }
+        for form in formset.initial_forms:
+            for field_name in ['uuid', 'account', 'tx_type', 'amount', 'description']:
+                value = form[field_name].value()
+                data[form.add_prefix(field_name)] = '' if value is None else value
+        return data
+
+    def get_selected_values(self, form) -> list:
+        return SELECTED_OPTION_RE.findall(str(form['account']))
+
+    def test_selected_options(self):
+        formset = self.get_formset()
+        available_accounts = set(str(pk) for pk in AccountModel.on_coa.for_entity_available(
+            user_model=self.user_model,
+            entity_slug=self.entity_slug
+        ).values_list('uuid', flat=True))
+
+        # the account choices are fetched once for the whole formset...
+        with CaptureQueriesContext(connection) as ctx:
+            for form in formset.forms:
+                account_uuid = form.instance.account_id
+                selected_values = self.get_selected_values(form)
+                if account_uuid and str(account_uuid) in available_accounts:
+                    self.assertEqual(selected_values, [str(account_uuid)])
+                elif account_uuid is None:
+                    # extra forms select the empty option...
+                    self.assertEqual(selected_values, [''])
+        account_queries = [q for q in ctx.captured_queries if 'FROM "django_ledger_accountmodel"' in q['sql']]
+        self.assertEqual(len(account_queries), 1)
+        self.assertTrue(formset.extra_forms)
+
+    def test_bound_formset_errors(self):
+        formset = self.get_formset()
+        data = self.get_formset_data(formset)
+        form_0, form_1 = formset.initial_forms[0], formset.initial_forms[1]
+        account_uuid = str(form_0.instance.account_id)
+        data[form_0.add_prefix('amount')] = 'not-an-amount'
+
+        # an account outside the cached choices is rejected...
+        data[form_1.add_prefix('account')] = str(uuid4())
+
+        bound_formset = self.get_formset(data=data)
+        self.assertFalse(bound_formset.is_valid())
+        bound_form_0, bound_form_1 = bound_formset.forms[0], bound_formset.forms[1]
+        self.assertIn('amount', bound_form_0.errors)
+        self.assertNotIn('account', bound_form_0.errors)
+        self.assertEqual(bound_form_0.cleaned_data['account'].uuid, form_0.instance.account_id)
+        self.assertEqual(bound_form_1.errors['account'][0],
+                         bound_form_1.fields['account'].error_messages['invalid_choice'] % {
+                             'value': data[form_1.add_prefix('account')]
+                         })
+
+        # the submitted accounts are selected when the formset is rendered again...
+        self.assertEqual(self.get_selected_values(bound_form_0), [account_uuid])
+        self.assertEqual(self.get_selected_values(bound_form_1), [''])
+
+    def test_disabled_fields(self):
+        self.je_model.locked = True
+        formset = self.get_formset()
+        self.assertFalse(formset.extra_forms)
+        form = formset.forms[0]
+        account_uuid = str(form.instance.account_id)
+        self.assertIn(' disabled', str(form['account']))
+        self.assertEqual(self.get_selected_values(form), [account_uuid])
+
+        # a disabled account ignores the submitted value...
+        data = self.get_formset_data(formset)
+        other_account_uuid = str(formset.forms[1].instance.account_id)
+        data[form.add_prefix('account')] = other_account_uuid
+        bound_formset = self.get_formset(data=data)
+        bound_form = bound_formset.forms[0]
+        bound_form.full_clean()
+        self.assertNotIn('account', bound_form.errors)
+        self.assertEqual(str(bound_form.cleaned_data['account'].uuid), account_uuid)
+        self.assertFalse(bound_form.has_changed())
+        self.assertEqual(self.get_selected_values(bound_form), [account_uuid])
@@ -0,0 +1,327 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import transaction, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate
+
+from django_ledger.models import InvoiceModel, TransactionModel, LedgerModel, ItemModel, ItemTransactionModel, BillModel
+from django_ledger.tests.base import DjangoLedgerBaseTest
+
+
+class InvoiceModelTests(DjangoLedgerBaseTest):
+
+    @staticmethod
+    def get_ledger_state(invoice_uuids: list) -> list:
+        invoice_qs = InvoiceModel.objects.filter(uuid__in=invoice_uuids).select_related('ledger')
+        txs_qs = TransactionModel.objects.filter(
+            journal_entry__ledger__invoicemodel__uuid__in=invoice_uuids
+        ).select_related('journal_entry')
+        return sorted([
+            (str(i.uuid), i.invoice_status, i.date_approved, i.date_paid, i.amount_paid, i.ledger.posted,
+             i.ledger.locked)
+            for i in invoice_qs
+        ]) + sorted([
+            (str(tx.journal_entry.ledger_id), str(tx.account_id), tx.tx_type, round(tx.amount, 2),
+             tx.journal_entry.date, tx.journal_entry.activity or '', tx.journal_entry.posted, tx.journal_entry.locked)
+            for tx in txs_qs
+        ])
+
+    def assertBulkEqualsSingle(self, invoice_status: str, mark_as: str, **kwargs):
+        invoice_uuids = list(InvoiceModel.objects.filter(
+            ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+            invoice_status__exact=invoice_status
+        ).values_list('uuid', flat=True)[:4])
+        self.assertTrue(invoice_uuids)
+
+        # invoices marked in bulk, then rolled back...
+        try:
+            with transaction.atomic():
+                invoice_qs = InvoiceModel.objects.filter(uuid__in=invoice_uuids)
+                getattr(invoice_qs, f'bulk_{mark_as}')(user_model=self.user_model, **kwargs)
+                bulk_ledger_state = self.get_ledger_state(invoice_uuids)
+                raise transaction.TransactionManagementError
+        except transaction.TransactionManagementError:
+            pass
+        self.assertNotEqual(self.get_ledger_state(invoice_uuids), bulk_ledger_state)
+
+        # JE numbers are generated in durable blocks, so each invoice is marked outside of the rolled back block...
+        for invoice_model in InvoiceModel.objects.filter(uuid__in=invoice_uuids).select_related('ledger__entity'):
+            getattr(invoice_model, mark_as)(entity_slug=invoice_model.ledger.entity.slug,
+                                            user_model=self.user_model,
+                                            commit=True,
+                                            **kwargs)
+        self.assertEqual(self.get_ledger_state(invoice_uuids), bulk_ledger_state)
+
+    def test_bulk_mark_as_approved(self):
+        self.assertBulkEqualsSingle(invoice_status=InvoiceModel.INVOICE_STATUS_REVIEW,
+                                    mark_as='mark_as_approved',
+                                    date_approved=localdate())
+
+    def test_bulk_mark_as_paid(self):
+        self.assertBulkEqualsSingle(invoice_status=InvoiceModel.INVOICE_STATUS_APPROVED,
+                                    mark_as='mark_as_paid',
+                                    date_paid=localdate())
+
+    def test_bulk_mark_as_rejected(self):
+        approved_qs = InvoiceModel.objects.filter(ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+                                                  invoice_status__exact=InvoiceModel.INVOICE_STATUS_APPROVED)
+        locked_invoice, approved_invoice = approved_qs.select_related('ledger')[:2]
+        draft_invoice = InvoiceModel.objects.filter(ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+                                                    invoice_status__exact=InvoiceModel.INVOICE_STATUS_DRAFT).first()
+        LedgerModel.objects.filter(uuid__exact=locked_invoice.ledger_id).update(locked=True)
+        invoice_uuids = [locked_invoice.uuid, approved_invoice.uuid, draft_invoice.uuid]
+        ledger_state = self.get_ledger_state(invoice_uuids)
+
+        # all rejected invoices are listed & no invoice is paid...
+        with self.assertRaises(ValidationError) as ctx:
+            InvoiceModel.objects.filter(uuid__in=invoice_uuids).bulk_mark_as_paid(user_model=self.user_model)
+        messages = ' '.join(ctx.exception.messages)
+        self.assertEqual(len(ctx.exception.messages), 2)
+        self.assertIn(locked_invoice.invoice_number, messages)
+        self.assertIn(draft_invoice.invoice_number, messages)
+        self.assertEqual(self.get_ledger_state(invoice_uuids), ledger_state)
+
+    @staticmethod
+    def get_inventory(invoice_model: InvoiceModel) -> dict:
+        return {
+            i.uuid: (i.inventory_received, i.inventory_received_value) for i in ItemModel.objects.filter(
+                itemtransactionmodel__invoice_model=invoice_model,
+                for_inventory=True
+            )
+        }
+
+    def test_rebuild_inventory_verify(self):
+        invoice_model = InvoiceModel.objects.filter(
+            ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+            invoice_status__exact=InvoiceModel.INVOICE_STATUS_REVIEW
+        ).select_related('ledger__entity').first()
+        entity_model = invoice_model.ledger.entity
+
+        with self.ledger_settings(DJANGO_LEDGER_PERPETUAL_INVENTORY=True):
+            call_command('rebuild_inventory', entity_model.slug, stdout=StringIO())
+            call_command('rebuild_inventory', entity_model.slug, '--verify', stdout=StringIO())
+
+            # the invoice sells some of the inventory on hand...
+            item_model = ItemModel.objects.filter(entity=entity_model,
+                                                  for_inventory=True,
+                                                  inventory_received__gt=0).first()
+            itemtxs_model = ItemTransactionModel(invoice_model=invoice_model,
+                                                 item_model=item_model,
+                                                 quantity=float(item_model.inventory_received) / 3,
+                                                 unit_cost=100.0)
+            itemtxs_model.full_clean()
+            itemtxs_model.save()
+            invoice_model.update_amount_due()
+            invoice_model.save()
+            inventory = self.get_inventory(invoice_model)
+
+            # items are relieved at the moving average cost...
+            invoice_model.mark_as_approved(entity_slug=entity_model.slug,
+                                           user_model=self.user_model,
+                                           date_approved=localdate(),
+                                           commit=True)
+            self.assertNotEqual(self.get_inventory(invoice_model), inventory)
+            call_command('rebuild_inventory', entity_model.slug, '--verify', stdout=StringIO())
+
+            # more inventory is received at a different cost...
+            bill_model = BillModel.objects.filter(ledger__entity=entity_model).first()
+            receipt_model = ItemTransactionModel(bill_model=bill_model,
+                                                 item_model=item_model,
+                                                 quantity=2.0,
+                                                 unit_cost=float(item_model.get_average_cost()) * 3 + 1.0)
+            receipt_model.full_clean()
+            receipt_model.save()
+            ItemTransactionModel.objects.filter(
+                uuid__exact=receipt_model.uuid
+            ).update_po_item_status(po_item_status=ItemTransactionModel.STATUS_RECEIVED)
+            received_qty, received_value = inventory[item_model.uuid]
+            inventory[item_model.uuid] = (received_qty + Decimal('2.000'), received_value + receipt_model.total_amount)
+
+            # and the invoice items are returned at the cost they were relieved at...
+            invoice_model.mark_as_void(entity_slug=entity_model.slug,
+                                       user_model=self.user_model,
+                                       date_void=localdate(),
+                                       commit=True)
+            self.assertEqual(self.get_inventory(invoice_model), inventory)
+            call_command('rebuild_inventory', entity_model.slug, '--verify', stdout=StringIO())
+
+    def test_perpetual_inventory_cogs(self):
+        invoice_list = list(InvoiceModel.objects.filter(
+            ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+            invoice_status__exact=InvoiceModel.INVOICE_STATUS_REVIEW
+        ).select_related('ledger__entity')[:2])
+        self.assertEqual(len(invoice_list), 2)
+
+        with self.ledger_settings(DJANGO_LEDGER_PERPETUAL_INVENTORY=True):
+            for invoice_model, accrue in zip(invoice_list, [False, True]):
+                entity_model = invoice_model.ledger.entity
+                call_command('rebuild_inventory', entity_model.slug, stdout=StringIO())
+
+                # the invoice sells all the inventory on hand...
+                item_model = ItemModel.objects.filter(entity=entity_model,
+                                                      for_inventory=True,
+                                                      earnings_account__isnull=False,
+                                                      cogs_account__isnull=False,
+                                                      inventory_account__isnull=False,
+                                                      inventory_received__gt=0).first()
+                self.assertIsNotNone(item_model)
+                invoice_model.itemtransactionmodel_set.all().delete()
+                itemtxs_model = ItemTransactionModel(invoice_model=invoice_model,
+                                                     item_model=item_model,
+                                                     quantity=float(item_model.inventory_received),
+                                                     unit_cost=100.0)
+                itemtxs_model.full_clean()
+                itemtxs_model.save()
+                invoice_model.accrue = accrue
+                invoice_model.progress = Decimal('1.00') if accrue else Decimal('0.00')
+                invoice_model.update_amount_due()
+                invoice_model.save()
+
+                invoice_model.mark_as_approved(entity_slug=entity_model.slug,
+                                               user_model=self.user_model,
+                                               date_approved=localdate(),
+                                               commit=True)
+                item_model.refresh_from_db()
+                self.assertEqual(item_model.inventory_received, Decimal('0.000'))
+
+                # COGS is recognized at the value the items were relieved at, not at the empty on-hand inventory...
+                invoice_model.mark_as_paid(entity_slug=entity_model.slug,
+                                           user_model=self.user_model,
+                                           date_paid=localdate(),
+                                           commit=True)
+                itemtxs_model.refresh_from_db()
+                self.assertTrue(itemtxs_model.inventory_value)
+                for account_uuid, tx_type in [(item_model.cogs_account_id, 'debit'),
+                                              (item_model.inventory_account_id, 'credit')]:
+                    balances = TransactionModel.objects.filter(
+                        journal_entry__ledger=invoice_model.ledger,
+                        account_id=account_uuid
+                    ).values_list('tx_type', 'amount')
+                    balance = sum(a if t == tx_type else -a for t, a in balances)
+                    self.assertEqual(balance, itemtxs_model.inventory_value, msg=f'Accrue: {accrue}')
+
+    def test_inventory_moves_queries(self):
+        invoice_model = InvoiceModel.objects.filter(
+            ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+            invoice_status__exact=InvoiceModel.INVOICE_STATUS_REVIEW
+        ).select_related('ledger__entity').first()
+        entity_model = invoice_model.ledger.entity
+        bill_model = BillModel.objects.filter(ledger__entity=entity_model).first()
+
+        with self.ledger_settings(DJANGO_LEDGER_PERPETUAL_INVENTORY=True):
+            call_command('rebuild_inventory', entity_model.slug, stdout=StringIO())
+            item_model = ItemModel.objects.filter(entity=entity_model,
+                                                  for_inventory=True,
+                                                  inventory_received__gt=0).first()
+            quantity_onhand = item_model.inventory_received
+            value_onhand = item_model.inventory_received_value
+
+            # many lines of the same item are received with a single UPDATE of the item...
+            receipt_list = [
+                ItemTransactionModel(bill_model=bill_model, item_model=item_model, quantity=2.0, unit_cost=10.0 + i)
+                for i in range(3)
+            ]
+            for itemtxs_model in receipt_list:
+                itemtxs_model.full_clean()
+                itemtxs_model.save()
+            with CaptureQueriesContext(connection) as ctx:
+                ItemTransactionModel.objects.filter(
+                    uuid__in=[r.uuid for r in receipt_list]
+                ).update_po_item_status(po_item_status=ItemTransactionModel.STATUS_RECEIVED)
+            self.assertEqual(len([q for q in ctx.captured_queries
+                                  if q['sql'].startswith('UPDATE "django_ledger_itemmodel"')]), 1)
+            item_model.refresh_from_db()
+            self.assertEqual(item_model.inventory_received, quantity_onhand + Decimal('6.000'))
+            self.assertEqual(item_model.inventory_received_value,
+                             value_onhand + sum(r.total_amount for r in receipt_list))
+
+            # many lines of the same item are issued with a single UPDATE of the item & lines...
+            quantity_onhand = item_model.inventory_received
+            value_onhand = item_model.inventory_received_value
+            invoice_model.itemtransactionmodel_set.all().delete()
+            for i in range(3):
+                itemtxs_model = ItemTransactionModel(invoice_model=invoice_model,
+                                                     item_model=item_model,
+                                                     quantity=float(quantity_onhand) / 7,
+                                                     unit_cost=100.0)
+                itemtxs_model.full_clean()
+                itemtxs_model.save()
+            with CaptureQueriesContext(connection) as ctx:
+                invoice_model.itemtransactionmodel_set.all().issue_inventory()
+            self.assertEqual(len([q for q in ctx.captured_queries
+                                  if q['sql'].startswith('UPDATE "django_ledger_itemmodel"')]), 1)
+            self.assertEqual(len([q for q in ctx.captured_queries
+                                  if q['sql'].startswith('UPDATE "django_ledger_itemtransactionmodel"')]), 1)
+
+            item_model.refresh_from_db()
+            issued_values = list(invoice_model.itemtransactionmodel_set.values_list('inventory_value', flat=True))
+            self.assertTrue(all(issued_values))
+            self.assertEqual(item_model.inventory_received_value, value_onhand - sum(issued_values))
+
+            # and returned at the value they were relieved at...
+            invoice_model.itemtransactionmodel_set.all().issue_inventory(returned=True)
+            item_model.refresh_from_db()
+            self.assertEqual(item_model.inventory_received, quantity_onhand)
+            self.assertEqual(item_model.inventory_received_value, value_onhand)
+
+    def migrate_invoices(self, invoice_uuids: list, bulk: bool, snapshot: bool) -> list:
+        invoice_qs = InvoiceModel.objects.filter(uuid__in=invoice_uuids).select_related('ledger__entity')
+        if bulk:
+            invoice_qs.bulk_mark_as_approved(user_model=self.user_model, date_approved=localdate())
+        else:
+            for invoice_model in invoice_qs:
+                invoice_model.mark_as_approved(entity_slug=invoice_model.ledger.entity.slug,
+                                               user_model=self.user_model,
+                                               date_approved=localdate(),
+                                               commit=True)
+
+        # the first migration of a posted ledger keeps a snapshot, used by the following migrations...
+        for progress in [Decimal('0.25'), Decimal('0.75')]:
+            invoice_qs.update(progress=progress)
+            invoice_list = list(invoice_qs)
+            if bulk:
+                InvoiceModel.bulk_migrate_state(wrapper_list=invoice_list, je_date=localdate())
+            else:
+                for invoice_model in invoice_list:
+                    invoice_model.migrate_state(user_model=self.user_model,
+                                                entity_slug=invoice_model.ledger.entity.slug,
+                                                je_date=localdate())
+            snapshots = list(invoice_qs.values_list('ledger_state', flat=True))
+            self.assertEqual(all(s is not None for s in snapshots), snapshot)
+
+        if bulk:
+            invoice_qs.bulk_mark_as_paid(user_model=self.user_model, date_paid=localdate())
+        else:
+            for invoice_model in invoice_qs:
+                invoice_model.mark_as_paid(entity_slug=invoice_model.ledger.entity.slug,
+                                           user_model=self.user_model,
+                                           date_paid=localdate(),
+                                           commit=True)
+        return self.get_ledger_state(invoice_uuids)
+
+    def test_ledger_state_snapshot(self):
+        invoice_uuids = list(InvoiceModel.objects.filter(
+            ledger__entity__in=self.ENTITY_MODEL_QUERYSET,
+            invoice_status__exact=InvoiceModel.INVOICE_STATUS_REVIEW
+        ).values_list('uuid', flat=True)[:4])
+        self.assertTrue(invoice_uuids)
+        # accrued invoices are migrated as they progress...
+        InvoiceModel.objects.filter(uuid__in=invoice_uuids).update(accrue=True, progress=Decimal('0.00'))
+
+        ledger_states = dict()
+        for snapshot in [False, True]:
+            with self.ledger_settings(DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT=snapshot):
+                try:
+                    with transaction.atomic():
+                        ledger_states[snapshot] = self.migrate_invoices(invoice_uuids, bulk=True, snapshot=snapshot)
+                        raise transaction.TransactionManagementError
+                except transaction.TransactionManagementError:
+                    pass
+        self.assertEqual(ledger_states[True], ledger_states[False])
+
+        # JE numbers are generated in durable blocks, so single invoices are migrated outside of a rolled back block...
+        with self.ledger_settings(DJANGO_LEDGER_MIGRATE_STATE_SNAPSHOT=True):
+            self.assertEqual(self.migrate_invoices(invoice_uuids, bulk=False, snapshot=True), ledger_states[False])
@@ -0,0 +1,440 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from random import choice
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db.models import Count
+from django.db.models.query import QuerySet
+
+from django_ledger.io.account_ledger import AccountLedger
+from django_ledger.io.roles import ASSET_CA_CASH, EXPENSE_REGULAR
+from django_ledger.io.digest_cache import DIGEST_CACHE_STATS
+from django_ledger.models import (EntityModel, EntityManagementModel, TransactionModel, AccountPeriodBalanceModel,
+                                  AccountModel, JournalEntryModel, LedgerModel, EntityStateModel)
+from django_ledger.tests.base import DjangoLedgerBaseTest
+
+UserModel = get_user_model()
+
+
+class IODigestTests(DjangoLedgerBaseTest):
+
+    @staticmethod
+    def get_balances(io_digest) -> dict:
+        """
+        Digest account balances by account bucket, excluding zero balances. Balances are rounded to cents, since
+        SQLite adds up decimals as floats.
+        """
+        balances = dict()
+        for acc in io_digest['accounts']:
+            k = (
+                acc['account_uuid'],
+                acc['unit_uuid'],
+                acc['period_year'],
+                acc['period_month'],
+                acc['activity'],
+                acc['tx_type']
+            )
+            balances[k] = balances.get(k, Decimal('0.00')) + acc['balance']
+        balances = {k: round(v, 2) for k, v in balances.items()}
+        return {k: v for k, v in balances.items() if v}
+
+    def get_digest(self, entity_model: EntityModel, **kwargs) -> dict:
+        txs_qs, digest = entity_model.digest(user_model=self.user_model,
+                                             process_roles=True,
+                                             process_groups=True,
+                                             **kwargs)
+        return digest['tx_digest']
+
+    def get_posted_transaction(self, entity_model: EntityModel) -> TransactionModel:
+        return TransactionModel.objects.for_entity(
+            entity_slug=entity_model.slug,
+            user_model=self.user_model
+        ).posted().filter(amount__gt=0).select_related('journal_entry', 'account').order_by('journal_entry__date').first()
+
+    def test_digest_cache_invalidation(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+
+        with self.ledger_settings(DJANGO_LEDGER_DIGEST_CACHE_ENABLED=True):
+            DIGEST_CACHE_STATS.reset()
+            txs_qs, digest = entity_model.digest(user_model=self.user_model, process_groups=True)
+            cached_txs_qs, cached_digest = entity_model.digest(user_model=self.user_model, process_groups=True)
+
+            # second digest is read from the cache, with the same layout...
+            self.assertEqual(DIGEST_CACHE_STATS.HITS, 1)
+            self.assertEqual(DIGEST_CACHE_STATS.MISSES, 1)
+            self.assertIsInstance(txs_qs, list)
+            self.assertIsInstance(cached_txs_qs, list)
+            self.assertEqual(self.get_balances(digest['tx_digest']), self.get_balances(cached_digest['tx_digest']))
+
+            # every call returns its own list of transactions...
+            txs_count = len(txs_qs)
+            txs_qs.clear()
+            cached_txs_qs.clear()
+            hit_txs_qs, _ = entity_model.digest(user_model=self.user_model, process_groups=True)
+            self.assertEqual(DIGEST_CACHE_STATS.HITS, 2)
+            self.assertEqual(len(hit_txs_qs), txs_count)
+
+            # a transaction write invalidates the cached digest...
+            txs_model = self.get_posted_transaction(entity_model)
+            txs_model.amount += Decimal('10.00')
+            txs_model.save()
+
+            new_digest = self.get_digest(entity_model)
+            self.assertEqual(DIGEST_CACHE_STATS.HITS, 2)
+            self.assertNotEqual(self.get_balances(digest['tx_digest']), self.get_balances(new_digest))
+
+        uncached_digest = self.get_digest(entity_model)
+        self.assertEqual(self.get_balances(new_digest), self.get_balances(uncached_digest))
+
+    def test_digest_cache_account_and_unit_writes(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+
+        with self.ledger_settings(DJANGO_LEDGER_DIGEST_CACHE_ENABLED=True):
+            self.get_digest(entity_model)
+
+            # account names are part of the digest...
+            txs_model = self.get_posted_transaction(entity_model)
+            account_model = txs_model.account
+            account_model.name = 'Renamed Account'
+            account_model.save()
+
+            digest = self.get_digest(entity_model)
+            names = set(acc['name'] for acc in digest['accounts'] if acc['account_uuid'] == account_model.uuid)
+            self.assertEqual(names, {'Renamed Account'})
+
+            # unit names are part of the digest by unit...
+            digest = self.get_digest(entity_model, by_unit=True)
+            unit_uuid = next(acc['unit_uuid'] for acc in digest['accounts'] if acc['unit_uuid'])
+            unit_model = entity_model.entityunitmodel_set.get(uuid__exact=unit_uuid)
+            unit_model.name = 'Renamed Unit'
+            unit_model.save()
+            digest = self.get_digest(entity_model, by_unit=True)
+            unit_names = set(acc['unit_name'] for acc in digest['accounts'] if acc['unit_uuid'] == unit_uuid)
+            self.assertEqual(unit_names, {'Renamed Unit'})
+
+    def test_digest_cache_disabled(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+
+        with self.ledger_settings(DJANGO_LEDGER_DIGEST_CACHE_ENABLED=False):
+            # digests cannot be cached while the cached digests are not invalidated...
+            with self.assertRaises(ValidationError):
+                entity_model.digest(user_model=self.user_model, use_cache=True)
+
+    def assertDigestsEqual(self, entity_model: EntityModel, **ledger_settings):
+        """
+        Digests computed with the given settings match the digests computed with all settings off.
+        """
+        start_date = self.START_DATE + timedelta(days=45)
+        end_date = self.START_DATE + timedelta(days=200)
+        digest_kwargs = [
+            dict(),
+            dict(by_period=True),
+            dict(by_unit=True, by_activity=True),
+            dict(by_tx_type=True),
+            dict(from_date=start_date, to_date=end_date),
+            dict(to_date=end_date, by_period=True, by_unit=True),
+        ]
+        for kwargs in digest_kwargs:
+            expected = self.get_digest(entity_model, **kwargs)
+            with self.ledger_settings(**ledger_settings):
+                digest = self.get_digest(entity_model, **kwargs)
+            self.assertEqual(self.get_balances(expected),
+                             self.get_balances(digest),
+                             msg=f'Digest {kwargs} does not match with {ledger_settings}.')
+            self.assertEqual({k: round(v, 2) for k, v in expected['group_balance'].items()},
+                             {k: round(v, 2) for k, v in digest['group_balance'].items()})
+
+    def rollup_period_balances(self, entity_model: EntityModel):
+        call_command('rollup_period_balances', entity_model.slug, stdout=StringIO())
+        entity_model.refresh_from_db()
+
+    def test_period_balances_digest(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+
+        with self.ledger_settings(DJANGO_LEDGER_USE_PERIOD_BALANCES=True):
+            # digests never roll up periods...
+            self.get_digest(entity_model)
+            entity_model.refresh_from_db()
+            self.assertIsNone(entity_model.period_balances_date)
+            self.assertFalse(AccountPeriodBalanceModel.objects.filter(entity=entity_model).exists())
+
+            self.rollup_period_balances(entity_model)
+            self.assertIsNotNone(entity_model.period_balances_date)
+            self.assertTrue(AccountPeriodBalanceModel.objects.filter(entity=entity_model).exists())
+
+        self.assertDigestsEqual(entity_model, DJANGO_LEDGER_USE_PERIOD_BALANCES=True)
+
+    def test_period_balances_refresh(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+
+        with self.ledger_settings(DJANGO_LEDGER_USE_PERIOD_BALANCES=True):
+            self.rollup_period_balances(entity_model)
+
+            # saved transaction...
+            txs_model = self.get_posted_transaction(entity_model)
+            txs_model.amount += Decimal('10.00')
+            txs_model.save()
+
+        self.assertDigestsEqual(entity_model, DJANGO_LEDGER_USE_PERIOD_BALANCES=True)
+
+        with self.ledger_settings(DJANGO_LEDGER_USE_PERIOD_BALANCES=True):
+            # deleted journal entry & transactions...
+            je_model = self.get_posted_transaction(entity_model).journal_entry
+            je_model.transactionmodel_set.all().delete()
+            je_model.delete()
+
+        self.assertDigestsEqual(entity_model, DJANGO_LEDGER_USE_PERIOD_BALANCES=True)
+
+    def test_period_balances_bulk_post(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+
+        with self.ledger_settings(DJANGO_LEDGER_USE_PERIOD_BALANCES=True):
+            self.rollup_period_balances(entity_model)
+
+            # ledgers with rolled up journal entries...
+            ledger_list = list(LedgerModel.objects.filter(
+                entity=entity_model,
+                posted=True,
+                journal_entries__posted=True,
+                journal_entries__date__lt=entity_model.period_balances_date
+            ).distinct()[:5])
+            self.assertTrue(ledger_list)
+
+            LedgerModel.objects.filter(uuid__in=[l.uuid for l in ledger_list]).update(posted=False)
+            for ledger_model in ledger_list:
+                ledger_model.posted = False
+            LedgerModel.objects.bulk_update_period_balances(ledger_list=ledger_list)
+
+        self.assertDigestsEqual(entity_model, DJANGO_LEDGER_USE_PERIOD_BALANCES=True)
+
+        with self.ledger_settings(DJANGO_LEDGER_USE_PERIOD_BALANCES=True):
+            LedgerModel.objects.bulk_post(ledger_list=ledger_list)
+
+        self.assertDigestsEqual(entity_model, DJANGO_LEDGER_USE_PERIOD_BALANCES=True)
+
+    def test_sql_digest(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+        # signed balances aggregated by the database, by unit & by period...
+        self.assertDigestsEqual(entity_model, DJANGO_LEDGER_SQL_DIGEST=True)
+
+    def test_stream_digest(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+        self.assertDigestsEqual(entity_model,
+                                DJANGO_LEDGER_DIGEST_STREAM=True,
+                                DJANGO_LEDGER_DIGEST_CHUNK_SIZE=7)
+        self.assertDigestsEqual(entity_model,
+                                DJANGO_LEDGER_DIGEST_STREAM=True,
+                                DJANGO_LEDGER_SQL_DIGEST=True,
+                                DJANGO_LEDGER_DIGEST_CHUNK_SIZE=7)
+
+        with self.ledger_settings(DJANGO_LEDGER_USE_PERIOD_BALANCES=True):
+            self.rollup_period_balances(entity_model)
+        self.assertDigestsEqual(entity_model,
+                                DJANGO_LEDGER_DIGEST_STREAM=True,
+                                DJANGO_LEDGER_USE_PERIOD_BALANCES=True)
+
+    def test_denormalized_digest(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+        unit_model = entity_model.entityunitmodel_set.first()
+        self.assertIsNotNone(unit_model)
+
+        with self.ledger_settings(DJANGO_LEDGER_DENORMALIZED_TXS=True):
+            call_command('denormalize_transactions', entity_model.slug, stdout=StringIO())
+        self.assertDigestsEqual(entity_model, DJANGO_LEDGER_DENORMALIZED_TXS=True)
+
+        with self.ledger_settings(DJANGO_LEDGER_DENORMALIZED_TXS=True):
+            # journal entry moved to another date & unit...
+            je_model = self.get_posted_transaction(entity_model).journal_entry
+            je_model.date = je_model.date + timedelta(days=40)
+            je_model.entity_unit = unit_model if je_model.entity_unit_id != unit_model.uuid else None
+            je_model.save(verify=False)
+        self.assertDigestsEqual(entity_model, DJANGO_LEDGER_DENORMALIZED_TXS=True)
+
+        with self.ledger_settings(DJANGO_LEDGER_DENORMALIZED_TXS=True):
+            # unposted journal entry...
+            je_model = self.get_posted_transaction(entity_model).journal_entry
+            je_model.posted = False
+            je_model.save(update_fields=['posted', 'updated'], verify=False)
+        self.assertDigestsEqual(entity_model, DJANGO_LEDGER_DENORMALIZED_TXS=True)
+
+        with self.ledger_settings(DJANGO_LEDGER_DENORMALIZED_TXS=True):
+            # unposted ledger...
+            ledger_model = self.get_posted_transaction(entity_model).journal_entry.ledger
+            ledger_model.unpost(commit=True)
+            self.assertFalse(ledger_model.posted)
+        self.assertDigestsEqual(entity_model, DJANGO_LEDGER_DENORMALIZED_TXS=True)
+
+    def test_digest_periods(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+        periods = [
+            (self.START_DATE + timedelta(days=30), self.START_DATE + timedelta(days=60)),
+            (self.START_DATE + timedelta(days=45), self.START_DATE + timedelta(days=120)),
+            (None, self.START_DATE + timedelta(days=90)),
+        ]
+        digest_results = entity_model.digest_periods(user_model=self.user_model,
+                                                     periods=periods,
+                                                     process_groups=True,
+                                                     cumulative=True)
+
+        # overlapping periods & periods without from date match a digest of each period...
+        for (from_date, to_date), period_digest, cumulative_digest in zip(periods,
+                                                                          digest_results['periods'],
+                                                                          digest_results['cumulative']):
+            self.assertEqual(self.get_balances(period_digest),
+                             self.get_balances(self.get_digest(entity_model, from_date=from_date, to_date=to_date)))
+            self.assertEqual(self.get_balances(cumulative_digest),
+                             self.get_balances(self.get_digest(entity_model, to_date=to_date)))
+
+    def test_digest_consolidated(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+
+        # the admin is also one of several managers of the entity...
+        manager_model = UserModel.objects.create_user(username='consolidated-manager', password=self.PASSWORD)
+        EntityManagementModel.objects.create(entity=entity_model, user=self.user_model)
+        EntityManagementModel.objects.create(entity=entity_model, user=manager_model)
+
+        expected = dict()
+        for acc in self.get_digest(entity_model)['accounts']:
+            expected[acc['code']] = expected.get(acc['code'], Decimal('0.00')) + acc['balance']
+        expected = {k: round(v, 2) for k, v in expected.items() if round(v, 2)}
+
+        for user_model in (self.user_model, manager_model):
+            digest_results = entity_model.digest_consolidated(user_model=user_model, process_groups=True)
+            self.assertEqual(list(digest_results['entities']), [entity_model.uuid])
+
+            # transactions are not repeated once per manager...
+            consolidated = dict()
+            for acc in digest_results['consolidated']['accounts']:
+                consolidated[acc['code']] = consolidated.get(acc['code'], Decimal('0.00')) + acc['balance']
+            consolidated = {k: round(v, 2) for k, v in consolidated.items() if round(v, 2)}
+            self.assertEqual(consolidated, expected)
+
+
+class AccountLedgerTests(DjangoLedgerBaseTest):
+
+    def get_account_model(self, entity_model: EntityModel) -> AccountModel:
+        txs_qs = TransactionModel.objects.for_entity(entity_slug=entity_model.slug, user_model=self.user_model)
+        account_uuid = txs_qs.posted().values('account_id').annotate(
+            txs_count=Count('uuid')
+        ).order_by('-txs_count').values_list('account_id', flat=True)[0]
+        return AccountModel.objects.get(uuid__exact=account_uuid)
+
+    def test_keyset_pages(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+        account_model = self.get_account_model(entity_model)
+        txs_qs = TransactionModel.objects.filter(account=account_model)
+
+        # most transactions share the same date, so pages split transactions of the same date...
+        same_date = self.START_DATE + timedelta(days=100)
+        je_uuids = list(txs_qs.values_list('journal_entry_id', flat=True).distinct())
+        JournalEntryModel.objects.filter(uuid__in=je_uuids[:len(je_uuids) * 2 // 3]).update(date=same_date)
+
+        # unposted transactions are not part of the account ledger...
+        JournalEntryModel.objects.filter(uuid__exact=je_uuids[-1]).update(posted=False)
+        txs_qs.filter(journal_entry_id__exact=je_uuids[-1]).update(posted=False)
+        posted_txs = list(txs_qs.posted().select_related('journal_entry').order_by('journal_entry__date', 'uuid'))
+        self.assertLess(len(posted_txs), txs_qs.count())
+        self.assertGreater(len(posted_txs), 10)
+
+        from_date = self.START_DATE + timedelta(days=30)
+        for ledger_from_date in (None, from_date):
+            account_ledger = AccountLedger(account_model=account_model, from_date=ledger_from_date, page_size=4)
+            balance = Decimal('0.00')
+            expected_txs = list()
+            for tx in posted_txs:
+                balance += tx.amount if tx.tx_type == account_model.balance_type else -tx.amount
+                if not ledger_from_date or tx.journal_entry.date >= ledger_from_date:
+                    expected_txs.append((tx.uuid, round(balance, 2)))
+
+            ledger_txs = list()
+            page = account_ledger.get_page()
+            while True:
+                self.assertLessEqual(len(page['transactions']), 4)
+                ledger_txs += [(tx.uuid, tx.running_balance) for tx in page['transactions']]
+                if not page['next_cursor']:
+                    break
+                page = account_ledger.get_page(cursor=page['next_cursor'])
+
+            self.assertEqual(ledger_txs, expected_txs)
+            self.assertEqual(page['closing_balance'], round(balance, 2))
+
+
+class CommitTxsBulkTests(DjangoLedgerBaseTest):
+
+    def get_entries(self, entity_model: EntityModel, ledger_list: list) -> list:
+        account_qs = entity_model.get_accounts(user_model=self.user_model)
+        cash_account = account_qs.filter(role__exact=ASSET_CA_CASH).first()
+        expense_account = account_qs.filter(role__exact=EXPENSE_REGULAR).first()
+        return [
+            {
+                'je_date': self.START_DATE + timedelta(days=i),
+                'je_ledger': ledger_model,
+                'je_activity': None,
+                'je_txs': [
+                    {
+                        'account_id': cash_account.uuid,
+                        'tx_type': 'credit',
+                        'amount': Decimal('100.00'),
+                        'description': 'Bulk Entry'
+                    },
+                    {
+                        'account_id': expense_account.uuid,
+                        'tx_type': 'debit',
+                        'amount': Decimal('100.00'),
+                        'description': 'Bulk Entry'
+                    },
+                ]
+            } for i, ledger_model in enumerate(ledger_list)
+        ]
+
+    def test_commit_txs_bulk(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+        ledger_list = [entity_model.ledgermodel_set.create(name=f'Bulk Ledger {i}') for i in range(3)]
+
+        je_data = entity_model.commit_txs_bulk(entries=self.get_entries(entity_model, ledger_list), je_posted=True)
+        self.assertEqual(len(je_data), 3)
+        self.assertEqual(len(set(je_model.je_number for je_model, txs_models in je_data)), 3)
+        self.assertEqual(TransactionModel.objects.filter(journal_entry__ledger__in=ledger_list).count(), 6)
+
+    def test_commit_txs_bulk_locked_ledger(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+        ledger_list = [entity_model.ledgermodel_set.create(name=f'Bulk Ledger {i}') for i in range(3)]
+        LedgerModel.objects.filter(uuid__exact=ledger_list[1].uuid).update(locked=True)
+
+        # no journal entry is created...
+        with self.assertRaises(ValidationError) as ctx:
+            entity_model.commit_txs_bulk(entries=self.get_entries(entity_model, ledger_list))
+        self.assertIn('Bulk Ledger 1', ctx.exception.messages[0])
+        self.assertFalse(JournalEntryModel.objects.filter(ledger__in=ledger_list).exists())
+
+    def test_reserve_block_concurrent_create(self):
+        entity_model: EntityModel = choice(self.ENTITY_MODEL_QUERYSET)
+        unit_model = entity_model.entityunitmodel_set.first()
+        state_kwargs = dict(entity_id=entity_model.uuid,
+                            key=EntityStateModel.KEY_JOURNAL_ENTRY,
+                            entity_unit_id=unit_model.uuid,
+                            fiscal_year=1999)
+
+        state_model = EntityStateModel.objects.reserve_block(block_size=5, **state_kwargs)
+        self.assertEqual(state_model.sequence, 5)
+
+        # the row is created by a concurrent transaction after it was not found...
+        queryset_get = QuerySet.get
+        not_found = list()
+
+        def get(qs, *args, **kwargs):
+            if qs.model is EntityStateModel and not not_found:
+                not_found.append(qs)
+                raise EntityStateModel.DoesNotExist
+            return queryset_get(qs, *args, **kwargs)
+
+        with patch.object(QuerySet, 'get', autospec=True, side_effect=get):
+            state_model = EntityStateModel.objects.reserve_block(block_size=3, **state_kwargs)
+
+        self.assertTrue(not_found)
+        self.assertEqual(state_model.sequence, 8)
+        self.assertEqual(EntityStateModel.objects.filter(fiscal_year=1999).count(), 1)
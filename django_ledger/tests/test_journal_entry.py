@@ -0,0 +1,118 @@
+from datetime import date
+from unittest.mock import patch
+
+from django.db.models import Count
+from django.urls import reverse
+
+from django_ledger.models import JournalEntryModel, LedgerModel
+from django_ledger.tests.base import DjangoLedgerBaseTest
+from django_ledger.views.journal_entry import JournalEntryListView
+
+
+class JournalEntryModelTests(DjangoLedgerBaseTest):
+
+    def get_journal_entry(self) -> JournalEntryModel:
+        je_model = JournalEntryModel.objects.annotate(
+            txs_count=Count('transactionmodel')
+        ).filter(
+            txs_count__gte=2,
+            ledger__entity__in=self.ENTITY_MODEL_QUERYSET
+        ).order_by('?').first()
+        self.assertIsNotNone(je_model)
+        return JournalEntryModel.objects.get(uuid__exact=je_model.uuid)
+
+    def test_verify_queries(self):
+        je_model = self.get_journal_entry()
+
+        # transactions and their accounts are fetched with a single query...
+        with self.assertNumQueries(1):
+            txs_qs = je_model.verify(force_verify=True)
+        self.assertTrue(je_model.is_verified())
+        self.assertEqual(len(txs_qs), je_model.transactionmodel_set.count())
+
+        # an unevaluated QuerySet without its accounts is still fetched with a single query...
+        with self.assertNumQueries(1):
+            je_model.verify(txs_qs=je_model.get_txs_qs(select_accounts=False), force_verify=True)
+        self.assertTrue(je_model.is_verified())
+
+        # an evaluated QuerySet is not fetched again...
+        with self.assertNumQueries(0):
+            je_model.verify(txs_qs=txs_qs, force_verify=True)
+        self.assertTrue(je_model.is_verified())
+
+
+class JournalEntryListViewTests(DjangoLedgerBaseTest):
+
+    PAGE_SIZE = 2
+
+    def setUp(self) -> None:
+        super(JournalEntryListViewTests, self).setUp()
+        self.login_client()
+        ledger_model = LedgerModel.objects.filter(
+            entity__in=self.ENTITY_MODEL_QUERYSET
+        ).annotate(
+            je_count=Count('journal_entries')
+        ).select_related('entity').order_by('-je_count').first()
+        self.assertGreaterEqual(ledger_model.je_count, self.PAGE_SIZE * 2)
+        self.ledger_model = ledger_model
+        self.je_list_url = reverse('django_ledger:je-list', kwargs={
+            'entity_slug': ledger_model.entity.slug,
+            'ledger_pk': ledger_model.uuid
+        })
+
+        # more journal entries than a page share the same date and number, so ties span pages...
+        je_qs = JournalEntryModel.objects.filter(ledger=ledger_model)
+        tied_uuids = list(je_qs.order_by('?').values_list('uuid', flat=True)[:self.PAGE_SIZE + 1])
+        je_qs.filter(uuid__in=tied_uuids).update(date=date(2022, 6, 30), je_number='JE-TIED')
+
+    def get_je_list(self, **params):
+        response = self.CLIENT.get(self.je_list_url, data=params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_page_walk(self):
+        je_qs = JournalEntryModel.objects.filter(ledger=self.ledger_model)
+        with patch.object(JournalEntryListView, 'paginate_by', self.PAGE_SIZE):
+            for sort in ['date', '-date', 'je_number', '-je_number']:
+                expected_uuids = list(je_qs.order_by(
+                    sort, '-uuid' if sort.startswith('-') else 'uuid'
+                ).values_list('uuid', flat=True))
+
+                je_uuids = list()
+                cursor = None
+                while True:
+                    params = {'sort': sort, 'cursor': cursor} if cursor else {'sort': sort}
+                    response = self.get_je_list(**params)
+                    page_uuids = [je_model.uuid for je_model in response.context['journal_entries']]
+                    self.assertLessEqual(len(page_uuids), self.PAGE_SIZE)
+                    je_uuids += page_uuids
+                    cursor = response.context['next_cursor']
+                    if not cursor:
+                        break
+
+                # every journal entry is listed once, in order...
+                self.assertEqual(je_uuids, expected_uuids, msg=f'Sort {sort} pages differ from ordering.')
+
+    def test_count_limit(self):
+        je_count = self.ledger_model.je_count
+        response = self.get_je_list()
+        self.assertEqual(response.context['je_count'], {'count': je_count, 'is_lower_bound': False})
+
+        with self.ledger_settings(DJANGO_LEDGER_JE_LIST_COUNT_LIMIT=je_count - 1):
+            response = self.get_je_list()
+        self.assertEqual(response.context['je_count'], {'count': je_count - 1, 'is_lower_bound': True})
+
+    def test_invalid_cursor(self):
+        with patch.object(JournalEntryListView, 'paginate_by', self.PAGE_SIZE):
+            cursor = self.get_je_list(sort='date').context['next_cursor']
+            self.assertTrue(cursor)
+            self.get_je_list(sort='date', cursor=cursor)
+
+            # a tampered cursor...
+            tampered_cursor = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+            response = self.CLIENT.get(self.je_list_url, data={'sort': 'date', 'cursor': tampered_cursor})
+            self.assertEqual(response.status_code, 404)
+
+            # a cursor of another sort...
+            response = self.CLIENT.get(self.je_list_url, data={'sort': '-date', 'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
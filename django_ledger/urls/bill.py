@@ -32,6 +32,9 @@ urlpatterns = [
          name='bill-update-items'),
 
     # Actions...
+    path('<slug:entity_slug>/actions/bulk/',
+         views.BillModelBulkActionView.as_view(),
+         name='bill-action-bulk'),
     path('<slug:entity_slug>/actions/<uuid:bill_pk>/mark-as-draft/',
          views.BillModelActionMarkAsDraftView.as_view(),
          name='bill-action-mark-as-draft'),
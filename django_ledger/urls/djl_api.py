@@ -12,6 +12,9 @@ urlpatterns = [
     path('entity/<slug:entity_slug>/data/net-receivables/',
          views.ReceivableNetAPIView.as_view(),
          name='entity-json-net-receivables'),
+    path('entity/<slug:entity_slug>/data/account/<uuid:account_pk>/ledger/',
+         views.AccountLedgerAPIView.as_view(),
+         name='entity-json-account-ledger'),
 
     path('unit/<slug:entity_slug>/<slug:unit_slug>/data/pnl/',
          views.PnLAPIView.as_view(),
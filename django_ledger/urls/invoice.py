@@ -32,6 +32,9 @@ urlpatterns = [
          name='invoice-delete'),
 
     # actions...
+    path('<slug:entity_slug>/actions/bulk/',
+         views.InvoiceModelBulkActionView.as_view(),
+         name='invoice-action-bulk'),
     path('<slug:entity_slug>/actions/<uuid:invoice_pk>/mark-as-draft/',
          views.InvoiceModelActionMarkAsDraftView.as_view(),
          name='invoice-action-mark-as-draft'),
@@ -5,7 +5,7 @@ Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
 Contributions to this module:
 Miguel Sanda <msanda@arrobalytics.com>
 """
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, Http404
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.utils.timezone import localdate
@@ -14,6 +14,7 @@ from django.views.generic import ListView, UpdateView, CreateView, DetailView
 from django.views.generic import RedirectView
 
 from django_ledger.forms.account import AccountModelUpdateForm, AccountModelCreateForm, AccountModelCreateChildForm
+from django_ledger.io.account_ledger import AccountLedger, AccountLedgerCursorError
 from django_ledger.models.accounts import AccountModel
 from django_ledger.models.coa import ChartOfAccountModel
 from django_ledger.views.mixins import (
@@ -185,17 +186,26 @@ class AccountModelYearDetailView(DjangoLedgerSecurityMixIn,
         context = super().get_context_data(**kwargs)
         context['header_title'] = _('Account %s - %s') % (account.code,account.name)
         context['page_title'] = _('Account %s - %s') % (account.code,account.name)
-        txs_qs = self.object.transactionmodel_set.order_by('-journal_entry__date')
-        txs_qs = txs_qs.from_date(self.get_from_date())
-        txs_qs = txs_qs.to_date(self.get_to_date())
-        context['transactions'] = txs_qs
+
+        account_ledger = AccountLedger(account_model=account,
+                                       from_date=self.get_from_date(),
+                                       to_date=self.get_to_date())
+        try:
+            ledger_page = account_ledger.get_page(cursor=self.request.GET.get('cursor'))
+        except AccountLedgerCursorError:
+            raise Http404(_('Invalid page.'))
+
+        context['transactions'] = ledger_page['transactions']
+        context['opening_balance'] = ledger_page['opening_balance']
+        context['closing_balance'] = ledger_page['closing_balance']
+        context['next_cursor'] = ledger_page['next_cursor']
         return context
 
     def get_queryset(self):
         return AccountModel.on_coa.for_entity(
             user_model=self.request.user,
             entity_slug=self.kwargs['entity_slug'],
-        ).prefetch_related('transactionmodel_set')
+        )
 
 
 class AccountModelQuarterDetailView(QuarterlyReportMixIn, AccountModelYearDetailView):
@@ -566,6 +566,50 @@ class BillModelActionUnlockLedgerView(BaseBillActionView):
     action_name = 'unlock_ledger'
 
 
+class BillModelBulkActionView(DjangoLedgerSecurityMixIn, RedirectView):
+    """
+    Applies a state transition to all the Bills selected on the Bill list with a single bulk operation.
+    """
+    http_method_names = ['post']
+    BULK_ACTIONS = {
+        'mark_as_approved': 'bulk_mark_as_approved',
+        'mark_as_paid': 'bulk_mark_as_paid'
+    }
+
+    def get_queryset(self):
+        return BillModel.objects.for_entity(
+            entity_slug=self.kwargs['entity_slug'],
+            user_model=self.request.user
+        )
+
+    def get_redirect_url(self, *args, **kwargs):
+        return reverse('django_ledger:bill-list',
+                       kwargs={
+                           'entity_slug': self.kwargs['entity_slug']
+                       })
+
+    def post(self, request, *args, **kwargs):
+        action_name = request.POST.get('action_name')
+        if action_name not in self.BULK_ACTIONS:
+            return HttpResponseBadRequest()
+
+        bill_pk_list = request.POST.getlist('bill_pk')
+        if bill_pk_list:
+            try:
+                bill_qs = self.get_queryset().filter(uuid__in=bill_pk_list)
+                bill_list = getattr(bill_qs, self.BULK_ACTIONS[action_name])(user_model=self.request.user)
+                messages.add_message(request,
+                                     message=_('Successfully updated %s bills.') % len(bill_list),
+                                     level=messages.SUCCESS,
+                                     extra_tags='is-success')
+            except ValidationError as e:
+                messages.add_message(request,
+                                     message='; '.join(e.messages),
+                                     level=messages.ERROR,
+                                     extra_tags='is-danger')
+        return HttpResponseRedirect(self.get_redirect_url())
+
+
 class BillModelActionForceMigrateView(BaseBillActionView):
     action_name = 'migrate_state'
 
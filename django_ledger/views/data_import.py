@@ -9,6 +9,7 @@ Miguel Sanda <msanda@arrobalytics.com>
 from itertools import chain
 
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils.timezone import now
@@ -17,7 +18,7 @@ from django.views.generic import ListView, FormView, DetailView
 
 from django_ledger.forms.data_import import OFXFileImportForm
 from django_ledger.forms.data_import import StagedTransactionModelFormSet
-from django_ledger.io.ofx import OFXFileManager
+from django_ledger.io.ofx import OFXFileReader
 from django_ledger.models.accounts import AccountModel
 from django_ledger.models.bank_account import BankAccountModel
 from django_ledger.models.data_import import ImportJobModel, StagedTransactionModel
@@ -77,77 +78,58 @@ class DataImportOFXFileView(DjangoLedgerSecurityMixIn, FormView):
                            'entity_slug': self.kwargs['entity_slug']
                        })
 
-    def form_valid(self, form):
-        ofx = OFXFileManager(ofx_file_or_path=form.files['ofx_file'])
-
-        # Pulls accounts from OFX file...
-        accs = ofx.get_accounts()
-        acc_numbers = [
-            a['account_number'] for a in accs
-        ]
-
-        # Gets bank account models if in DB...
-        bank_accounts = BankAccountModel.objects.for_entity(
+    def get_bank_account_model(self, account: dict) -> BankAccountModel:
+        # Gets bank account model if in DB...
+        bank_account_model = BankAccountModel.objects.for_entity(
             entity_slug=self.kwargs['entity_slug'],
             user_model=self.request.user,
-        ).filter(account_number__in=acc_numbers).select_related('ledger')
-
-        ba_values = bank_accounts.values()
-        existing_accounts_list = [
-            a['account_number'] for a in ba_values
-        ]
-
-        # determines if Bank Account models need to be created...
-        to_create = [
-            a for a in accs if a['account_number'] not in existing_accounts_list
-        ]
-
-        if len(to_create) > 0:
-
-            entity_model = EntityModel.objects.for_user(
-                user_model=self.request.user
-            ).get(slug__exact=self.kwargs['entity_slug'])
-
-            new_bank_accs = [
-                BankAccountModel(
-                    name=f'{ba["bank"]} - *{ba["account_number"][-4:]}',
-                    account_type=ba['account_type'].lower(),
-                    account_number=ba['account_number'],
-                    routing_number=ba['routing_number'],
-                ) for ba in to_create]
-
-            for ba in new_bank_accs:
-                ba.clean()
-                ba.configure(
-                    entity_slug=entity_model,
-                    user_model=self.request.user
-                )
-            BankAccountModel.objects.bulk_create(new_bank_accs)
+        ).filter(account_number__exact=account['account_number']).select_related('ledger').first()
+
+        if bank_account_model:
+            return bank_account_model
+
+        entity_model = EntityModel.objects.for_user(
+            user_model=self.request.user
+        ).get(slug__exact=self.kwargs['entity_slug'])
 
-            # fetching all bank account models again
-            bank_accounts = BankAccountModel.objects.for_entity(
-                entity_slug=self.kwargs['entity_slug'],
-                user_model=self.request.user,
-            ).filter(account_number__in=acc_numbers).select_related('ledger')
+        bank_account_model = BankAccountModel(
+            name=f'{account["bank"]} - *{account["account_number"][-4:]}',
+            account_type=account['account_type'].lower(),
+            account_number=account['account_number'],
+            routing_number=account['routing_number'],
+        )
+        bank_account_model.clean()
+        bank_account_model.configure(
+            entity_slug=entity_model,
+            user_model=self.request.user
+        )
+        bank_account_model.save()
+        return bank_account_model
 
-        for ba in bank_accounts:
+    def form_valid(self, form):
+        # statements are read one at a time and staged in batches, the file is never fully loaded in memory...
+        ofx_reader = OFXFileReader(ofx_file_or_path=form.files['ofx_file'])
+
+        imported_accounts = list()
+        for account, txs in ofx_reader.iter_statements():
+            ba = self.get_bank_account_model(account)
             import_job = ba.ledger.importjobmodel_set.create(
                 description='OFX Import for Account *' + ba.account_number[-4:]
             )
-            txs = ofx.get_account_txs(account=ba.account_number)
-            txs_models = [
-                StagedTransactionModel(
-                    date_posted=tx.dtposted,
-                    fitid=tx.fitid,
-                    amount=tx.trnamt,
-                    import_job=import_job,
-                    name=tx.name,
-                    memo=tx.memo
-                ) for tx in txs
-            ]
-            for tx in txs_models:
-                tx.clean()
-            StagedTransactionModel.objects.bulk_create(txs_models)
+            try:
+                import_job.stage_transactions(txs)
+            except ValidationError as e:
+                # the staged transactions are rolled back, the empty import job is discarded...
+                import_job.delete()
+                form.add_error(field='ofx_file', error=e)
+                if imported_accounts:
+                    form.add_error(field='ofx_file', error=_('Statements already imported for accounts: %s.') % (
+                        ', '.join(imported_accounts)
+                    ))
+                return self.form_invalid(form=form)
+            # pre-fills the accounts of known payees...
+            import_job.auto_categorize(exclude_accounts=[ba.cash_account_id])
+            imported_accounts.append('*' + ba.account_number[-4:])
 
         return super().form_valid(form=form)
 
@@ -7,11 +7,14 @@ Miguel Sanda <msanda@arrobalytics.com>
 """
 
 from calendar import month_name
+from datetime import date
 
 from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
 from django.views.generic import View
 
-from django_ledger.models import BillModel, EntityModel, InvoiceModel
+from django_ledger.io.account_ledger import AccountLedger, AccountLedgerCursorError
+from django_ledger.models import BillModel, EntityModel, InvoiceModel, AccountModel
 from django_ledger.utils import accruable_net_summary
 from django_ledger.views.mixins import DjangoLedgerSecurityMixIn, EntityUnitMixIn
 
@@ -125,3 +128,43 @@ class ReceivableNetAPIView(DjangoLedgerSecurityMixIn, EntityUnitMixIn, View):
         return JsonResponse({
             'message': 'Unauthorized'
         }, status=401)
+
+
+class AccountLedgerAPIView(DjangoLedgerSecurityMixIn, View):
+    http_method_names = ['get']
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            account_qs = AccountModel.on_coa.for_entity(
+                entity_slug=self.kwargs['entity_slug'],
+                user_model=request.user
+            )
+            account_model = get_object_or_404(account_qs, uuid__exact=self.kwargs['account_pk'])
+
+            from_date = request.GET.get('fromDate')
+            to_date = request.GET.get('toDate')
+            try:
+                account_ledger = AccountLedger(
+                    account_model=account_model,
+                    from_date=date.fromisoformat(from_date) if from_date else None,
+                    to_date=date.fromisoformat(to_date) if to_date else None
+                )
+                ledger_page = account_ledger.get_page(cursor=request.GET.get('cursor'))
+            except (ValueError, AccountLedgerCursorError) as e:
+                return JsonResponse({
+                    'message': str(e)
+                }, status=400)
+
+            return JsonResponse({
+                'results': {
+                    'entity_slug': self.kwargs['entity_slug'],
+                    'account_uuid': str(account_model.uuid),
+                    'account_code': account_model.code,
+                    'account_name': account_model.name,
+                    **account_ledger.page_to_json(ledger_page)
+                }
+            })
+
+        return JsonResponse({
+            'message': 'Unauthorized'
+        }, status=401)
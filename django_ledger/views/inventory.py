@@ -57,12 +57,8 @@ class InventoryRecountView(DjangoLedgerSecurityMixIn, DetailView):
         )
 
     def counted_inventory(self):
-        entity_slug = self.kwargs['entity_slug']
-        user_model = self.request.user
-        return ItemTransactionModel.objects.inventory_count(
-            entity_slug=entity_slug,
-            user_model=user_model
-        )
+        entity_model: EntityModel = self.get_object()
+        return entity_model.counted_inventory(user_model=self.request.user)
 
     def recorded_inventory(self, queryset=None, as_values=True):
         entity_model: EntityModel = self.get_object()
@@ -8,7 +8,7 @@ Miguel Sanda <msanda@arrobalytics.com>
 
 from django.contrib import messages
 from django.core.exceptions import ImproperlyConfigured, ValidationError
-from django.http import HttpResponseRedirect, HttpResponseNotFound, HttpResponseForbidden
+from django.http import HttpResponseRedirect, HttpResponseNotFound, HttpResponseForbidden, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.utils.timezone import localdate
@@ -486,6 +486,50 @@ class InvoiceModelActionUnlockLedgerView(BaseInvoiceActionView):
     action_name = 'unlock_ledger'
 
 
+class InvoiceModelBulkActionView(DjangoLedgerSecurityMixIn, RedirectView):
+    """
+    Applies a state transition to all the Invoices selected on the Invoice list with a single bulk operation.
+    """
+    http_method_names = ['post']
+    BULK_ACTIONS = {
+        'mark_as_approved': 'bulk_mark_as_approved',
+        'mark_as_paid': 'bulk_mark_as_paid'
+    }
+
+    def get_queryset(self):
+        return InvoiceModel.objects.for_entity(
+            entity_slug=self.kwargs['entity_slug'],
+            user_model=self.request.user
+        )
+
+    def get_redirect_url(self, *args, **kwargs):
+        return reverse('django_ledger:invoice-list',
+                       kwargs={
+                           'entity_slug': self.kwargs['entity_slug']
+                       })
+
+    def post(self, request, *args, **kwargs):
+        action_name = request.POST.get('action_name')
+        if action_name not in self.BULK_ACTIONS:
+            return HttpResponseBadRequest()
+
+        invoice_pk_list = request.POST.getlist('invoice_pk')
+        if invoice_pk_list:
+            try:
+                invoice_qs = self.get_queryset().filter(uuid__in=invoice_pk_list)
+                invoice_list = getattr(invoice_qs, self.BULK_ACTIONS[action_name])(user_model=self.request.user)
+                messages.add_message(request,
+                                     message=_('Successfully updated %s invoices.') % len(invoice_list),
+                                     level=messages.SUCCESS,
+                                     extra_tags='is-success')
+            except ValidationError as e:
+                messages.add_message(request,
+                                     message='; '.join(e.messages),
+                                     level=messages.ERROR,
+                                     extra_tags='is-danger')
+        return HttpResponseRedirect(self.get_redirect_url())
+
+
 class InvoiceModelActionForceMigrateView(BaseInvoiceActionView):
     action_name = 'migrate_state'
 
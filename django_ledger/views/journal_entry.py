@@ -5,8 +5,14 @@ Copyright© EDMA Group Inc licensed under the GPLv3 Agreement.
 Contributions to this module:
 Miguel Sanda <msanda@arrobalytics.com>
 """
+from datetime import date
+from uuid import UUID
+
 from django.contrib import messages
+from django.core import signing
 from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import Q, Prefetch, prefetch_related_objects
+from django.http import Http404
 from django.urls import reverse
 from django.utils.timezone import localdate
 from django.utils.translation import gettext_lazy as _
@@ -16,11 +22,18 @@ from django.views.generic.detail import SingleObjectMixin
 from django_ledger.forms.journal_entry import JournalEntryModelUpdateForm, JournalEntryModelCreateForm
 from django_ledger.models.journal_entry import JournalEntryModel
 from django_ledger.models.ledger import LedgerModel
+from django_ledger.models.transactions import TransactionModel
+from django_ledger.settings import DJANGO_LEDGER_JE_LIST_PAGE_SIZE, DJANGO_LEDGER_JE_LIST_COUNT_LIMIT
 from django_ledger.views.mixins import DjangoLedgerSecurityMixIn
 
 
 # JE Views ---
 class JournalEntryListView(DjangoLedgerSecurityMixIn, ListView):
+    """
+    Journal Entries of a ledger, with keyset pagination. Each page is fetched with a single query filtered by the
+    sort value and UUID of the last Journal Entry of the previous page, carried by a signed cursor, so pages deep
+    into a large ledger are as fast as the first one.
+    """
     context_object_name = 'journal_entries'
     template_name = 'django_ledger/journal_entry/je_list.html'
     PAGE_TITLE = _('Journal Entries')
@@ -29,16 +42,104 @@ class JournalEntryListView(DjangoLedgerSecurityMixIn, ListView):
         'header_title': PAGE_TITLE
     }
     http_method_names = ['get']
+    paginate_by = DJANGO_LEDGER_JE_LIST_PAGE_SIZE
 
-    def get_queryset(self):
+    # each sort field is backed by a (ledger, field, uuid) index...
+    SORT_FIELDS = ('date', 'je_number')
+    DEFAULT_SORT = '-date'
+    CURSOR_SALT = 'django_ledger.je_list'
+
+    def get_sort(self) -> str:
         sort = self.request.GET.get('sort')
-        if not sort:
-            sort = '-updated'
+        if not sort or sort.lstrip('-') not in self.SORT_FIELDS:
+            return self.DEFAULT_SORT
+        return sort
+
+    def get_ordering(self):
+        sort = self.get_sort()
+        return sort, '-uuid' if sort.startswith('-') else 'uuid'
+
+    def get_ledger_queryset(self):
         return JournalEntryModel.on_coa.for_ledger(
             ledger_pk=self.kwargs['ledger_pk'],
             entity_slug=self.kwargs['entity_slug'],
             user_model=self.request.user
-        ).select_related('entity_unit').order_by(sort)
+        )
+
+    def get_queryset(self):
+        return self.get_ledger_queryset().select_related('entity_unit').order_by(*self.get_ordering())
+
+    def get_count_estimate(self) -> dict:
+        """
+        Counts the ledger Journal Entries up to DJANGO_LEDGER_JE_LIST_COUNT_LIMIT, so huge ledgers are never fully
+        counted.
+        """
+        count = self.get_ledger_queryset().order_by()[:DJANGO_LEDGER_JE_LIST_COUNT_LIMIT + 1].count()
+        return {
+            'count': min(count, DJANGO_LEDGER_JE_LIST_COUNT_LIMIT),
+            'is_lower_bound': count > DJANGO_LEDGER_JE_LIST_COUNT_LIMIT
+        }
+
+    def encode_cursor(self, je_model: JournalEntryModel) -> str:
+        sort = self.get_sort()
+        sort_value = getattr(je_model, sort.lstrip('-'))
+        return signing.dumps({
+            'ledger': str(self.kwargs['ledger_pk']),
+            'sort': sort,
+            'value': sort_value.isoformat() if isinstance(sort_value, date) else sort_value,
+            'uuid': str(je_model.uuid)
+        }, salt=self.CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor: str):
+        try:
+            cursor_data = signing.loads(cursor, salt=self.CURSOR_SALT)
+        except signing.BadSignature:
+            raise Http404(_('Invalid page cursor.'))
+        if any([
+            cursor_data.get('ledger') != str(self.kwargs['ledger_pk']),
+            cursor_data.get('sort') != self.get_sort()
+        ]):
+            raise Http404(_('Page cursor does not match the requested ledger and sort.'))
+        sort_value = cursor_data['value']
+        if self.get_sort().lstrip('-') == 'date':
+            sort_value = date.fromisoformat(sort_value)
+        return sort_value, UUID(cursor_data['uuid'])
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get('cursor')
+        if cursor:
+            sort_value, je_uuid = self.decode_cursor(cursor)
+            sort = self.get_sort()
+            sort_field = sort.lstrip('-')
+            lookup = 'lt' if sort.startswith('-') else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{sort_field}__{lookup}': sort_value}) |
+                Q(**{f'{sort_field}__exact': sort_value, f'uuid__{lookup}': je_uuid})
+            )
+
+        # one extra row tells whether there is a next page...
+        je_list = list(queryset[:page_size + 1])
+        has_next = len(je_list) > page_size
+        je_list = je_list[:page_size]
+
+        # transactions are only fetched for the journal entries of the page...
+        prefetch_related_objects(je_list, Prefetch(
+            'transactionmodel_set',
+            queryset=TransactionModel.objects.select_related('account')
+        ))
+        for je_model in je_list:
+            je_model.txs_summary = je_model.get_txs_summary(je_model.transactionmodel_set.all())
+
+        self.next_cursor = self.encode_cursor(je_list[-1]) if has_next else None
+        return None, None, je_list, has_next
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['sort'] = self.get_sort()
+        context['cursor'] = self.request.GET.get('cursor')
+        context['next_cursor'] = self.next_cursor
+        context['je_count'] = self.get_count_estimate()
+        return context
 
 
 class JournalEntryDetailView(DjangoLedgerSecurityMixIn, DetailView):
@@ -59,7 +160,9 @@ class JournalEntryDetailView(DjangoLedgerSecurityMixIn, DetailView):
             entity_slug=self.kwargs['entity_slug'],
             ledger_pk=self.kwargs['ledger_pk'],
             user_model=self.request.user
-        ).select_related('entity_unit')
+        ).select_related('entity_unit').prefetch_related(
+            Prefetch('transactionmodel_set', queryset=TransactionModel.objects.select_related('account'))
+        )
 
 
 class JournalEntryUpdateView(DjangoLedgerSecurityMixIn, UpdateView):
@@ -321,7 +321,7 @@ class PurchaseOrderModelUpdateView(DjangoLedgerSecurityMixIn, UpdateView):
 
             if all(['po_status' in form.changed_data,
                     po_model.po_status == po_model.PO_STATUS_APPROVED]):
-                po_items_qs.update(po_item_status=ItemTransactionModel.STATUS_NOT_ORDERED)
+                po_items_qs.update_po_item_status(po_item_status=ItemTransactionModel.STATUS_NOT_ORDERED)
 
             if 'fulfilled' in form.changed_data:
 
@@ -340,7 +340,7 @@ class PurchaseOrderModelUpdateView(DjangoLedgerSecurityMixIn, UpdateView):
                                              extra_tags='is-success')
                         return self.get(self.request)
 
-                po_items_qs.update(po_item_status=ItemTransactionModel.STATUS_RECEIVED)
+                po_items_qs.update_po_item_status(po_item_status=ItemTransactionModel.STATUS_RECEIVED)
 
         messages.add_message(self.request,
                              messages.SUCCESS,